@@ -2,7 +2,6 @@
 
 from __future__ import annotations
 
-import json
 import sys
 from pathlib import Path
 
@@ -27,6 +26,68 @@ def load_config(config_path: str | None) -> AppConfig:
         sys.exit(1)
 
 
+def config_sources(config: AppConfig, refresh: bool = False, vm: str | None = None):
+    """SourceSet of the configured vCenters, their inventory caches
+    synced (in parallel) where stale, on refresh, or when vm is missing."""
+    from vmware2scw.vmware.sources import SourceSet
+
+    sources = SourceSet.from_config(config)
+    with console.status("[bold green]Syncing VM inventory..."):
+        sources.sync(refresh=refresh, vm_name=vm)
+    return sources
+
+
+def cached_vm(sources, vm: str):
+    """Cached VMInfo of a (vCenter-qualified) VM name; exits when unknown."""
+    try:
+        vm_info = sources.get(vm)
+    except ValueError as e:
+        console.print(f"[red]{e}[/red]")
+        sys.exit(1)
+    if vm_info is None:
+        console.print(f"[red]VM '{vm}' not found in vCenter[/red]")
+        sys.exit(1)
+    return vm_info
+
+
+def instance_catalog(config: AppConfig, zone: str, refresh: bool = False):
+    """Instance catalog of a Scaleway zone: disk-cached, fetched from the
+    API when stale or on refresh, the built-in table as a last resort."""
+    from vmware2scw.scaleway.catalog import get_catalog
+    from vmware2scw.scaleway.instance import ScalewayInstanceAPI
+
+    with console.status(f"[bold green]Loading instance catalog for {zone}..."):
+        api = ScalewayInstanceAPI(
+            access_key=config.scaleway.access_key or "",
+            secret_key=config.scaleway.secret_key.get_secret_value() if config.scaleway.secret_key else "",
+            project_id=config.scaleway.project_id,
+            api_url=config.scaleway.api_url,
+        )
+        return get_catalog(zone, api=api, cache_dir=config.conversion.cache_dir,
+                           ttl=config.scaleway.catalog_ttl_hours * 3600, refresh=refresh)
+
+
+def cached_inventory(host: str, connect, cache_dir, ttl: int, refresh: bool = False,
+                     vm: str | None = None):
+    """Local inventory cache of a vCenter, synced first when it is older
+    than ttl, when refresh is set, or when vm isn't in it yet.
+
+    connect() is only called (and vCenter only contacted) to sync.
+    """
+    from vmware2scw.vmware.cache import get_inventory_cache
+
+    cache = get_inventory_cache(host, cache_dir)
+    if refresh or cache.is_stale(ttl) or (vm and cache.get(vm) is None):
+        with console.status("[bold green]Connecting to vCenter..."):
+            client = connect()
+        try:
+            with console.status("[bold green]Syncing VM inventory..."):
+                cache.sync(client)
+        finally:
+            client.disconnect()
+    return cache
+
+
 @click.group()
 @click.version_option(version="0.1.0", prog_name="vmware2scw")
 def main():
@@ -39,94 +100,151 @@ def main():
 
 
 @main.command()
-@click.option("--vcenter", required=True, help="vCenter hostname or IP")
-@click.option("--username", required=True, help="vCenter username")
+@click.option("--vcenter", help="vCenter hostname or IP (default: every vCenter of the configuration)")
+@click.option("--username", help="vCenter username")
 @click.option("--password-file", type=click.Path(exists=True), help="File containing vCenter password")
 @click.option("--password", help="vCenter password (prefer --password-file)")
 @click.option("--insecure", is_flag=True, default=False, help="Skip SSL verification")
-@click.option("--output", "-o", type=click.Path(), help="Output file (JSON)")
-@click.option("--format", "fmt", type=click.Choice(["table", "json"]), default="table")
-def inventory(vcenter: str, username: str, password_file: str | None, password: str | None,
-              insecure: bool, output: str | None, fmt: str):
-    """List all VMs in a vCenter environment with their specifications."""
-    from vmware2scw.vmware.client import VSphereClient
-    from vmware2scw.vmware.inventory import VMInventory
-
-    # Resolve password
-    if password_file:
-        password = Path(password_file).read_text().strip()
-    elif not password:
-        password = click.prompt("vCenter password", hide_input=True)
+@click.option("--output", "-o", type=click.Path(), help="Output file (json / ndjson; .gz to compress)")
+@click.option("--format", "fmt", type=click.Choice(["table", "json", "ndjson"]), default="table",
+              help="json / ndjson are written record by record")
+@click.option("--name", "pattern", help="Only VMs whose name matches this pattern (* and ? wildcards)")
+@click.option("--host", help="Only VMs on this ESXi host")
+@click.option("--datastore", help="Only VMs with a disk on this datastore")
+@click.option("--guest-os", help="Only VMs with this guest OS ID (wildcards allowed, e.g. 'win*')")
+@click.option("--power-state", type=click.Choice(["poweredOn", "poweredOff", "suspended"]))
+@click.option("--cache-dir", type=click.Path(), default="/var/lib/vmware2scw/cache", show_default=True,
+              help="Where the local inventory cache is kept")
+@click.option("--max-age", type=int, default=600, show_default=True,
+              help="Sync the inventory cache with vCenter when older than this (seconds)")
+@click.option("--refresh", is_flag=True, help="Sync the inventory cache with vCenter even if it is fresh")
+@click.option("--live", is_flag=True, help="Stream VMs straight from vCenter instead of the inventory cache")
+@click.option("--config", "config_path", type=click.Path(exists=True),
+              help="Configuration file: list the VMs of all its vCenters (when --vcenter isn't given)")
+def inventory(vcenter: str | None, username: str | None, password_file: str | None, password: str | None,
+              insecure: bool, output: str | None, fmt: str, pattern: str | None, host: str | None,
+              datastore: str | None, guest_os: str | None, power_state: str | None,
+              cache_dir: str, max_age: int, refresh: bool, live: bool, config_path: str | None):
+    """List all VMs in a vCenter environment with their specifications.
+
+    With --vcenter, one vCenter; otherwise every vCenter of the
+    configuration, collected in parallel and merged (names shown as
+    <vcenter>/<vm>).
+    """
+    import fnmatch
 
-    with console.status("[bold green]Connecting to vCenter..."):
+    from vmware2scw.vmware.client import VSphereClient
+    from vmware2scw.vmware.inventory import VMInventory, open_output, write_inventory
+    from vmware2scw.vmware.sources import SourceSet
+
+    if vcenter and not username:
+        raise click.UsageError("--vcenter needs --username")
+
+    def connect():
+        nonlocal password
+        # Resolve password
+        if password_file:
+            password = Path(password_file).read_text().strip()
+        elif not password:
+            password = click.prompt("vCenter password", hide_input=True)
         client = VSphereClient()
         client.connect(vcenter, username, password, insecure=insecure)
-
-    with console.status("[bold green]Collecting VM inventory..."):
-        inv = VMInventory(client)
-        vms = inv.list_all_vms()
-
-    if fmt == "json":
-        data = [vm.model_dump() for vm in vms]
-        if output:
-            Path(output).write_text(json.dumps(data, indent=2, default=str))
-            console.print(f"[green]Inventory saved to {output}[/green]")
+        return client
+
+    def matches(vm) -> bool:
+        # --live: the filters the cache applies in SQL (the name pattern
+        # is applied by VMInventory, before full retrieval)
+        return ((not host or vm.host == host)
+                and (not datastore or any(d.datastore == datastore for d in vm.disks))
+                and (not guest_os or fnmatch.fnmatchcase(vm.guest_os, guest_os))
+                and (not power_state or vm.power_state == power_state))
+
+    filters = dict(pattern=pattern, host=host, datastore=datastore, guest_os=guest_os,
+                   power_state=power_state)
+    client = cache = sources = None
+    try:
+        if not vcenter:
+            config = load_config(config_path)
+            sources = SourceSet.from_config(config)
+            vcenter = ", ".join(sources.sources)
+            if live:
+                vms = (vm for vm in sources.iter_live(pattern) if matches(vm))
+            else:
+                with console.status("[bold green]Syncing VM inventory..."):
+                    sources.sync(refresh=refresh, ttl=max_age)
+                vms = sources.iter_query(**filters)
+        elif live:
+            with console.status("[bold green]Connecting to vCenter..."):
+                client = connect()
+            vms = (vm for vm in VMInventory(client).iter_vms(pattern) if matches(vm))
         else:
-            console.print_json(json.dumps(data, indent=2, default=str))
-    else:
-        table = Table(title=f"VM Inventory — {vcenter}")
-        table.add_column("Name", style="cyan", no_wrap=True)
-        table.add_column("State", style="green")
-        table.add_column("CPU", justify="right")
-        table.add_column("RAM (MB)", justify="right")
-        table.add_column("Disks", justify="right")
-        table.add_column("Total (GB)", justify="right")
-        table.add_column("OS", style="magenta")
-        table.add_column("Firmware")
-        table.add_column("Tools")
-
-        for vm in vms:
-            total_gb = sum(d.size_gb for d in vm.disks)
-            table.add_row(
-                vm.name,
-                vm.power_state,
-                str(vm.cpu),
-                str(vm.memory_mb),
-                str(len(vm.disks)),
-                f"{total_gb:.1f}",
-                vm.guest_os_full or vm.guest_os,
-                vm.firmware,
-                vm.tools_status,
-            )
-
-        console.print(table)
-        console.print(f"\n[dim]Total: {len(vms)} VMs[/dim]")
-
-    client.disconnect()
+            cache = cached_inventory(vcenter, connect, cache_dir, max_age, refresh=refresh)
+            vms = cache.iter_query(**filters)
+
+        if fmt in ("json", "ndjson"):
+            if output:
+                with open_output(output) as out:
+                    count = write_inventory(vms, out, fmt)
+                console.print(f"[green]{count} VMs saved to {output}[/green]")
+            else:
+                write_inventory(vms, sys.stdout, fmt)
+        else:
+            table = Table(title=f"VM Inventory — {vcenter}")
+            table.add_column("Name", style="cyan", no_wrap=True)
+            table.add_column("State", style="green")
+            table.add_column("CPU", justify="right")
+            table.add_column("RAM (MB)", justify="right")
+            table.add_column("Disks", justify="right")
+            table.add_column("Total (GB)", justify="right")
+            table.add_column("OS", style="magenta")
+            table.add_column("Firmware")
+            table.add_column("Tools")
+
+            count = 0
+            for vm in vms:
+                count += 1
+                total_gb = sum(d.size_gb for d in vm.disks)
+                table.add_row(
+                    vm.qualified_name,
+                    vm.power_state,
+                    str(vm.cpu),
+                    str(vm.memory_mb),
+                    str(len(vm.disks)),
+                    f"{total_gb:.1f}",
+                    vm.guest_os_full or vm.guest_os,
+                    vm.firmware,
+                    vm.tools_status,
+                )
+
+            console.print(table)
+            if live:
+                source = "live"
+            else:
+                source = f"inventory cache synced {(cache or sources).age() or 0:.0f}s ago"
+            console.print(f"\n[dim]Total: {count} VMs ({source})[/dim]")
+    finally:
+        if client is not None:
+            client.disconnect()
 
 
 @main.command()
-@click.option("--vm", required=True, help="VM name to validate")
+@click.option("--vm", required=True, help="VM name to validate (<vcenter>/<vm> with several vCenters)")
 @click.option("--target-type", required=True, help="Scaleway instance type (e.g. PRO2-S)")
+@click.option("--zone", help="Scaleway zone whose catalog to use (default: scaleway.default_zone)")
 @click.option("--config", "config_path", type=click.Path(exists=True), help="Configuration file")
-def validate(vm: str, target_type: str, config_path: str | None):
+@click.option("--refresh", is_flag=True,
+              help="Re-fetch the instance catalog and sync the inventory cache even if they are fresh")
+def validate(vm: str, target_type: str, zone: str | None, config_path: str | None, refresh: bool):
     """Validate that a VM can be migrated to a Scaleway instance type."""
     config = load_config(config_path)
 
     from vmware2scw.pipeline.validator import MigrationValidator
-    from vmware2scw.vmware.client import VSphereClient
-    from vmware2scw.vmware.inventory import VMInventory
-
-    with console.status("[bold green]Connecting to vCenter..."):
-        client = VSphereClient()
-        pw = config.vmware.password.get_secret_value() if config.vmware.password else ""
-        client.connect(config.vmware.vcenter, config.vmware.username, pw, insecure=config.vmware.insecure)
 
-    with console.status(f"[bold green]Fetching VM info for '{vm}'..."):
-        inv = VMInventory(client)
-        vm_info = inv.get_vm_info(vm)
+    catalog = instance_catalog(config, zone or config.scaleway.default_zone, refresh=refresh)
+    sources = config_sources(config, refresh=refresh, vm=vm)
+    vm_info = cached_vm(sources, vm)
 
-    validator = MigrationValidator()
+    validator = MigrationValidator(catalog=catalog)
     report = validator.validate(vm_info, target_type)
 
     if report.passed:
@@ -138,14 +256,12 @@ def validate(vm: str, target_type: str, config_path: str | None):
         icon = "✅" if check.passed else "❌" if check.blocking else "⚠️"
         console.print(f"  {icon} {check.name}: {check.message}")
 
-    client.disconnect()
-
     if not report.passed:
         sys.exit(1)
 
 
 @main.command()
-@click.option("--vm", required=True, help="VM name to migrate")
+@click.option("--vm", required=True, help="VM name to migrate (<vcenter>/<vm> with several vCenters)")
 @click.option("--target-type", required=True, help="Scaleway instance type")
 @click.option("--zone", default="fr-par-1", help="Scaleway availability zone")
 @click.option("--config", "config_path", type=click.Path(exists=True), help="Configuration file")
@@ -186,7 +302,8 @@ def migrate(vm: str, target_type: str, zone: str, config_path: str | None,
 @main.command("migrate-batch")
 @click.option("--plan", "plan_path", required=True, type=click.Path(exists=True), help="Batch migration plan YAML")
 @click.option("--config", "config_path", type=click.Path(exists=True), help="Configuration file")
-def migrate_batch(plan_path: str, config_path: str | None):
+@click.option("--batch-id", help="Re-run an earlier batch: skip VMs that succeeded, resume the others")
+def migrate_batch(plan_path: str, config_path: str | None, batch_id: str | None):
     """Execute a batch migration plan."""
     config = load_config(config_path)
     batch = BatchMigrationPlan.from_yaml(plan_path)
@@ -194,7 +311,27 @@ def migrate_batch(plan_path: str, config_path: str | None):
     from vmware2scw.pipeline.batch import BatchMigrationRunner
 
     runner = BatchMigrationRunner(config)
-    runner.run(batch)
+    result = runner.run(batch, batch_id=batch_id)
+
+    table = Table(title=f"Batch {result.batch_id} ({result.duration})")
+    table.add_column("VM", style="cyan")
+    table.add_column("Migration ID")
+    table.add_column("Status")
+    table.add_column("Duration", justify="right")
+    table.add_column("Error")
+    for r in result.results:
+        table.add_row(
+            r.vm_name,
+            r.migration_id,
+            "[green]OK[/green]" if r.success else f"[red]failed ({r.failed_stage or '-'})[/red]",
+            r.duration,
+            r.error or "",
+        )
+    console.print(table)
+
+    if result.failed:
+        console.print(f"Re-run with --batch-id {result.batch_id} to resume the failed VMs")
+        sys.exit(1)
 
 
 @main.command()
@@ -239,48 +376,72 @@ def resume(migration_id: str, config_path: str | None):
 
 
 @main.command()
-@click.option("--vm", help="VM name to suggest instance types for")
+@click.option("--vm", help="VM name to suggest instance types for (default: all VMs)")
 @click.option("--config", "config_path", type=click.Path(exists=True), help="Configuration file")
-def suggest(vm: str, config_path: str | None):
-    """Suggest Scaleway instance types for a VMware VM."""
+@click.option("--zone", help="Scaleway zone whose catalog to use (default: scaleway.default_zone)")
+@click.option("--refresh", is_flag=True,
+              help="Re-fetch the instance catalog and sync the inventory cache even if they are fresh")
+def suggest(vm: str | None, config_path: str | None, zone: str | None, refresh: bool):
+    """Suggest Scaleway instance types for one VMware VM, or for every VM."""
     config = load_config(config_path)
 
     from vmware2scw.scaleway.mapping import ResourceMapper
-    from vmware2scw.vmware.client import VSphereClient
-    from vmware2scw.vmware.inventory import VMInventory
 
-    with console.status("[bold green]Connecting to vCenter..."):
-        client = VSphereClient()
-        pw = config.vmware.password.get_secret_value() if config.vmware.password else ""
-        client.connect(config.vmware.vcenter, config.vmware.username, pw, insecure=config.vmware.insecure)
+    zone = zone or config.scaleway.default_zone
+    catalog = instance_catalog(config, zone, refresh=refresh)
 
-    with console.status(f"[bold green]Fetching VM info for '{vm}'..."):
-        inv = VMInventory(client)
-        vm_info = inv.get_vm_info(vm)
+    sources = config_sources(config, refresh=refresh, vm=vm)
+    mapper = ResourceMapper(catalog)
 
-    mapper = ResourceMapper()
-    suggestions = mapper.suggest_instance_type(vm_info)
+    if vm:
+        vm_info = cached_vm(sources, vm)
+        suggestions = mapper.suggest_instance_type(vm_info)
 
-    table = Table(title=f"Instance Type Suggestions for '{vm}'")
-    table.add_column("Type", style="cyan")
-    table.add_column("vCPUs", justify="right")
-    table.add_column("RAM (GB)", justify="right")
-    table.add_column("Storage", justify="right")
-    table.add_column("Fit Score", justify="right", style="green")
-    table.add_column("Notes")
+        table = Table(title=f"Instance Type Suggestions for '{vm}' ({zone}, {catalog.source})")
+        table.add_column("Type", style="cyan")
+        table.add_column("vCPUs", justify="right")
+        table.add_column("RAM (GB)", justify="right")
+        table.add_column("€/month", justify="right")
+        table.add_column("Fit Score", justify="right", style="green")
+        table.add_column("Notes")
 
-    for s in suggestions:
-        table.add_row(
-            s.instance_type,
-            str(s.vcpus),
-            str(s.ram_gb),
-            f"{s.storage_gb}GB",
-            f"{s.fit_score:.0%}",
-            s.notes,
-        )
+        for s in suggestions:
+            table.add_row(
+                s.instance_type,
+                str(s.vcpus),
+                str(s.ram_gb),
+                f"{s.price_month_eur:.2f}",
+                f"{s.fit_score:.0%}",
+                s.notes,
+            )
+    else:
+        vms = list(sources.iter_query())
+        by_vm = mapper.suggest_many(vms)
+
+        table = Table(title=f"Instance Type Suggestions ({len(vms)} VMs, {zone}, {catalog.source})")
+        table.add_column("VM", style="cyan")
+        table.add_column("vCPUs", justify="right")
+        table.add_column("RAM (GB)", justify="right")
+        table.add_column("Suggested type", style="green")
+        table.add_column("€/month", justify="right")
+        table.add_column("Fit Score", justify="right")
+
+        total = 0.0
+        for v in vms:
+            best = by_vm[v.qualified_name][0] if by_vm[v.qualified_name] else None
+            if best:
+                total += best.price_month_eur
+            table.add_row(
+                v.qualified_name,
+                str(v.cpu),
+                f"{v.memory_mb / 1024:.0f}",
+                best.instance_type if best else "[red]no fit[/red]",
+                f"{best.price_month_eur:.2f}" if best else "-",
+                f"{best.fit_score:.0%}" if best else "-",
+            )
+        table.caption = f"Estimated total: {total:,.2f} €/month"
 
     console.print(table)
-    client.disconnect()
 
 
 if __name__ == "__main__":
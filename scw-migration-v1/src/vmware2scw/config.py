@@ -19,6 +19,18 @@ class VMwareConfig(BaseModel):
     password_env: Optional[str] = Field(None, description="Environment variable containing the password")
     insecure: bool = Field(False, description="Skip SSL certificate verification")
     port: int = Field(443, description="vCenter port")
+    max_sessions: int = Field(4, ge=1, le=32, description="Max vCenter sessions logged in at once (shared by all stages)")
+    keepalive_seconds: int = Field(300, ge=30, description="Ping idle vCenter sessions this often so they don't expire")
+    vm_index_ttl: int = Field(300, ge=0, description="Rebuild the cached VM name → MoRef index after this many seconds")
+    inventory_cache_ttl: int = Field(600, ge=0, description="CLI commands sync the local inventory cache when it is older than this (seconds)")
+    name: Optional[str] = Field(None, description="Short name for vCenter-qualified VM names ('<name>/<vm>'; default: the vcenter hostname)")
+    parallel_exports: Optional[int] = Field(None, ge=1, description="Concurrent exports from this vCenter (default: migration.parallel_exports)")
+    inventory_concurrency: int = Field(2, ge=1, le=16, description="Datacenters of this vCenter inventoried in parallel (inventory --live)")
+
+    @property
+    def label(self) -> str:
+        """Name of this vCenter in qualified VM names and merged inventories."""
+        return self.name or self.vcenter
 
     @model_validator(mode="after")
     def resolve_password(self) -> "VMwareConfig":
@@ -43,6 +55,8 @@ class ScalewayConfig(BaseModel):
     default_zone: str = Field("fr-par-1", description="Default availability zone")
     s3_region: str = Field("fr-par", description="S3 region for object storage")
     s3_bucket: str = Field("vmware-migration-transit", description="S3 bucket for transit images")
+    api_url: Optional[str] = Field(None, description="Scaleway API base URL (default: SCW_API_URL or https://api.scaleway.com)")
+    catalog_ttl_hours: int = Field(24, ge=0, description="How long a fetched instance catalog is reused before refreshing")
 
     @model_validator(mode="after")
     def resolve_credentials(self) -> "ScalewayConfig":
@@ -59,14 +73,40 @@ class ScalewayConfig(BaseModel):
         return self
 
 
+class ScratchTier(BaseModel):
+    """A scratch directory for migration artifacts."""
+
+    path: Path = Field(..., description="Directory on the device (each migration gets a subdirectory)")
+    throughput: str = Field("bulk", pattern="^(fast|bulk)$", description="fast: overlays, hives, QEMU scratch; bulk: VMDKs and qcow2s")
+    capacity_gb: Optional[int] = Field(None, ge=1, description="Space migrations may hold here (default: the whole filesystem)")
+
+    @field_validator("path")
+    @classmethod
+    def ensure_path(cls, v: Path) -> Path:
+        v.mkdir(parents=True, exist_ok=True)
+        return v
+
+
 class ConversionConfig(BaseModel):
     """Disk conversion settings."""
 
     work_dir: Path = Field(Path("/var/lib/vmware2scw/work"), description="Working directory for temp files")
+    cache_dir: Path = Field(Path("/var/lib/vmware2scw/cache"), description="Persistent cache shared across migrations")
     compress_qcow2: bool = Field(True, description="Compress qcow2 output (slower but smaller)")
     virtio_win_iso: Optional[Path] = Field(None, description="Path to virtio-win.iso for Windows VMs")
     cleanup_on_success: bool = Field(True, description="Remove temp files after successful migration")
     virt_v2v_verbose: bool = Field(False, description="Enable verbose virt-v2v output")
+    v2v_in_place: bool = Field(True, description="Convert the boot disk in place with virt-v2v-in-place when available")
+    stream_data_disks: bool = Field(False, description="Convert data disks straight into S3 (uncompressed qcow2, no local copy)")
+    scratch_tiers: list[ScratchTier] = Field(default_factory=list, description="Scratch directories by throughput class (default: work_dir as the only tier)")
+    workspace_budget_gb: Optional[int] = Field(None, ge=1, description="Space in work_dir migrations may hold at once (default: the whole filesystem)")
+    workspace_reserve_gb: int = Field(20, ge=0, description="Free space kept in work_dir when admitting a migration")
+    boot_memory_budget_mb: Optional[int] = Field(None, ge=2048, description="RAM for concurrent QEMU conversion boots (default: host RAM minus reserve)")
+    boot_cpu_budget: Optional[int] = Field(None, ge=1, description="vCPUs for concurrent QEMU conversion boots (default: host cores)")
+    boot_host_reserve_mb: int = Field(4096, ge=0, description="MemAvailable kept free when admitting a QEMU boot")
+    boot_hugepages: bool = Field(False, description="Back QEMU guest RAM with hugepages when enough are free")
+    smoke_test: str = Field("enforce", pattern="^(enforce|warn|off)$", description="Boot the final image locally before upload: enforce (fail on boot failure), warn or off")
+    smoke_test_timeout: int = Field(600, ge=60, description="Seconds a smoke boot may take to reach a login / SAC prompt")
 
     @field_validator("work_dir")
     @classmethod
@@ -78,8 +118,14 @@ class ConversionConfig(BaseModel):
 class MigrationSettings(BaseModel):
     """Global migration behavior settings."""
 
-    parallel_exports: int = Field(2, ge=1, le=10, description="Max parallel VMDK exports")
+    parallel_exports: int = Field(2, ge=1, le=10, description="Max parallel VMDK exports per vCenter")
+    exports_per_host: int = Field(1, ge=1, le=10, description="Max parallel VMDK exports per ESXi host")
+    parallel_converts: int = Field(2, ge=1, le=16, description="Max disks converted in parallel")
+    parallel_guest_ops: int = Field(2, ge=1, le=16, description="Max VMs in guest modification / smoke test at once")
     parallel_uploads: int = Field(3, ge=1, le=10, description="Max parallel S3 uploads")
+    parallel_imports: int = Field(8, ge=1, le=64, description="Max Scaleway snapshot imports / image creations in flight")
+    batch_vms_in_flight: int = Field(16, ge=1, le=100, description="Upper bound on VMs of a batch in flight; the work_dir space budget admits them")
+    upload_part_concurrency: int = Field(16, ge=1, le=64, description="Max S3 parts in flight per worker (shared by all uploads)")
     retry_count: int = Field(3, ge=0, le=10, description="Retry count for transient errors")
     retry_delay_seconds: int = Field(30, ge=5, description="Base delay between retries")
     export_strategy: str = Field("local", pattern="^(local|streaming)$", description="Export strategy: local or streaming (NBD)")
@@ -88,11 +134,28 @@ class MigrationSettings(BaseModel):
 class AppConfig(BaseModel):
     """Root application configuration."""
 
-    vmware: VMwareConfig
+    vmware: Optional[VMwareConfig] = None
+    vcenters: list[VMwareConfig] = Field(default_factory=list, description="Additional source vCenters (VMs referenced as '<name>/<vm>')")
     scaleway: ScalewayConfig
     conversion: ConversionConfig = ConversionConfig()
     migration: MigrationSettings = MigrationSettings()
 
+    @model_validator(mode="after")
+    def resolve_sources(self) -> "AppConfig":
+        if self.vmware is None:
+            if not self.vcenters:
+                raise ValueError("Configure a source vCenter in 'vmware' (or 'vcenters')")
+            self.vmware = self.vcenters[0]
+        labels = [s.label for s in self.sources()]
+        duplicates = sorted({label for label in labels if labels.count(label) > 1})
+        if duplicates:
+            raise ValueError(f"Several vCenters are named {', '.join(duplicates)} — set a distinct 'name' on each")
+        return self
+
+    def sources(self) -> list[VMwareConfig]:
+        """Every source vCenter, the default one (vmware) first."""
+        return [self.vmware] + [v for v in self.vcenters if v is not self.vmware]
+
     @classmethod
     def from_yaml(cls, path: str | Path) -> "AppConfig":
         """Load configuration from a YAML file."""
@@ -17,6 +17,8 @@ import subprocess
 import time
 from pathlib import Path
 
+from vmware2scw.converter import nbd
+
 logger = logging.getLogger(__name__)
 
 ENV = {"LIBGUESTFS_BACKEND": "direct"}
@@ -101,28 +103,6 @@ def detect_boot_type(qcow2_path: str) -> str:
         return "bios-mbr"
 
 
-def _nbd_connect(qcow2_path: str, nbd_dev: str = "/dev/nbd0") -> str:
-    """Connect qcow2 to an NBD device. Returns the device path."""
-    # Load nbd kernel module
-    _run(["modprobe", "nbd", "max_part=16"], check=False)
-    # Disconnect if already connected
-    _run(["qemu-nbd", "--disconnect", nbd_dev], check=False)
-    time.sleep(0.5)
-    # Connect
-    _run(["qemu-nbd", "--connect", nbd_dev, qcow2_path])
-    time.sleep(1)  # Wait for device to settle
-    # Force kernel to re-read partitions
-    _run(["partprobe", nbd_dev], check=False)
-    time.sleep(0.5)
-    return nbd_dev
-
-
-def _nbd_disconnect(nbd_dev: str = "/dev/nbd0"):
-    """Disconnect NBD device."""
-    _run(["qemu-nbd", "--disconnect", nbd_dev], check=False)
-    time.sleep(0.5)
-
-
 def convert_bios_to_uefi(qcow2_path: str, os_family: str = "linux") -> bool:
     """Convert a BIOS disk to UEFI boot. Returns True if conversion was done."""
 
@@ -145,10 +125,7 @@ def convert_bios_to_uefi(qcow2_path: str, os_family: str = "linux") -> bool:
     logger.info(f"Resized qcow2 by +{ESP_SIZE_MB}MB")
 
     # Step 2-4: Use qemu-nbd for partition operations on the host
-    nbd_dev = "/dev/nbd0"
-    try:
-        _nbd_connect(qcow2_path, nbd_dev)
-
+    with nbd.attach(qcow2_path) as nbd_dev:
         # Fix GPT backup header (must be at end of disk after resize)
         logger.info("Fixing GPT backup header...")
         if boot_type == "bios-gpt":
@@ -195,9 +172,6 @@ def convert_bios_to_uefi(qcow2_path: str, os_family: str = "linux") -> bool:
         logger.info(f"Formatting {esp_dev} as FAT32...")
         _run(["mkfs.vfat", "-F", "32", "-n", "ESP", esp_dev])
 
-    finally:
-        _nbd_disconnect(nbd_dev)
-
     logger.info("=== Phase 2: Guest-side GRUB EFI installation ===")
 
     # Step 5: Install grub-efi inside the guest
@@ -11,7 +11,11 @@ Strategy:
   3. Boot in QEMU with a bcdboot script to install the UEFI bootloader
      - Windows boots via virtio-blk (viostor already installed by inject_virtio)
      - SetupPhase script runs: bcdboot C:\Windows /s <ESP> /f UEFI
-     - Windows reboots, QEMU exits
+     - Windows writes a serial marker and powers off, QEMU exits
+
+This is the fallback path: inject_virtio normally converts BIOS VMs
+in its own boot with mbr2gpt (see windows_virtio), and ensure_uefi
+only lands here when that was not possible (pre-2016 Windows).
 
 Alternative approach if guestfish sgdisk fails:
   Use qemu-nbd + sgdisk on the host (may fail on some qcow2 formats).
@@ -19,13 +23,16 @@ Alternative approach if guestfish sgdisk fails:
 
 import logging
 import os
-import shutil
 import subprocess
 import time
 from pathlib import Path
 
+from vmware2scw.converter import nbd
+
 logger = logging.getLogger(__name__)
 
+BCDBOOT_DONE_MARKER = "VMWARE2SCW-BCDBOOT-DONE"
+
 GUESTFS_ENV = {**os.environ, "LIBGUESTFS_BACKEND": "direct"}
 
 
@@ -38,9 +45,11 @@ def _run(cmd, check=True, env=None, **kw):
     return r
 
 
-def convert_windows_bios_to_uefi(qcow2_path, work_dir=None):
+def convert_windows_bios_to_uefi(qcow2_path, work_dir=None, vm_info=None):
     """Convert a Windows BIOS/MBR qcow2 to UEFI/GPT.
 
+    vm_info (the source VM info dict) sizes the QEMU guest.
+
     Returns True if conversion succeeded.
     """
     qcow2_path = str(qcow2_path)
@@ -64,17 +73,13 @@ def convert_windows_bios_to_uefi(qcow2_path, work_dir=None):
         logger.error("  Partition table conversion failed")
         return False
 
-    # Step 3: Write a bcdboot setup script
-    logger.info("  Writing bcdboot setup script...")
-    _write_bcdboot_script(qcow2_path, work_dir)
-
-    # Step 4: Set SetupPhase to run bcdboot on next boot
-    logger.info("  Setting SetupPhase for bcdboot...")
-    _set_setup_phase(qcow2_path, work_dir)
+    # Step 3+4: Upload the bcdboot script and set SetupPhase (one session)
+    logger.info("  Staging bcdboot script and SetupPhase...")
+    _stage_bcdboot(qcow2_path, work_dir)
 
     # Step 5: Boot in QEMU for bcdboot
     logger.info("  Booting QEMU for bcdboot execution...")
-    ok = _qemu_bcdboot(qcow2_path, work_dir)
+    ok = _qemu_bcdboot(qcow2_path, work_dir, vm_info=vm_info)
 
     if ok:
         logger.info("═══ Windows BIOS → UEFI conversion complete ═══")
@@ -108,29 +113,23 @@ def _convert_partition_table(qcow2_path, esp_size_mb):
             logger.info("  Converting MBR → GPT...")
 
             # Try qemu-nbd + sgdisk on host
-            _run(["modprobe", "nbd", "max_part=16"], check=False, env=None)
-            _run(["qemu-nbd", "--disconnect", "/dev/nbd0"], check=False, env=None)
-            time.sleep(1)
-            _run(["qemu-nbd", "--connect", "/dev/nbd0", qcow2_path], env=None)
-            time.sleep(2)
-
-            try:
+            with nbd.attach(qcow2_path) as nbd_dev:
                 # Convert MBR to GPT
-                r = _run(["sgdisk", "--mbrtogpt", "/dev/nbd0"], check=False, env=None)
+                r = _run(["sgdisk", "--mbrtogpt", nbd_dev], check=False, env=None)
                 if r.returncode != 0:
                     logger.warning(f"  sgdisk --mbrtogpt failed: {r.stderr.strip()[:200]}")
                     # Try gdisk as fallback
-                    r2 = _run(["sgdisk", "-g", "/dev/nbd0"], check=False, env=None)
+                    r2 = _run(["sgdisk", "-g", nbd_dev], check=False, env=None)
                     if r2.returncode != 0:
                         logger.error("  GPT conversion failed")
                         return False
 
                 # Re-read partitions
-                _run(["partprobe", "/dev/nbd0"], check=False, env=None)
+                _run(["partprobe", nbd_dev], check=False, env=None)
                 time.sleep(1)
 
                 # Find last partition number
-                r = _run(["sgdisk", "-p", "/dev/nbd0"], env=None)
+                r = _run(["sgdisk", "-p", nbd_dev], env=None)
                 lines = [l for l in r.stdout.split('\n')
                          if l.strip() and l.strip()[0].isdigit()]
                 if not lines:
@@ -146,15 +145,15 @@ def _convert_partition_table(qcow2_path, esp_size_mb):
                     f"-n{new_part}:0:+{esp_size_mb}M",
                     f"-t{new_part}:EF00",
                     f"-c{new_part}:EFI-System",
-                    "/dev/nbd0",
+                    nbd_dev,
                 ], env=None)
 
                 # Re-read partitions
-                _run(["partprobe", "/dev/nbd0"], check=False, env=None)
+                _run(["partprobe", nbd_dev], check=False, env=None)
                 time.sleep(1)
 
                 # Format ESP as FAT32
-                esp_dev = f"/dev/nbd0p{new_part}"
+                esp_dev = f"{nbd_dev}p{new_part}"
                 if not Path(esp_dev).exists():
                     time.sleep(2)
                 if Path(esp_dev).exists():
@@ -162,32 +161,23 @@ def _convert_partition_table(qcow2_path, esp_size_mb):
                     _run(["mkfs.vfat", "-F", "32", "-n", "ESP", esp_dev], env=None)
                 else:
                     logger.warning(f"  ESP device {esp_dev} not found, will format via guestfish")
-                    # Format via guestfish after disconnect
-                    _run(["qemu-nbd", "--disconnect", "/dev/nbd0"], check=False, env=None)
-                    time.sleep(1)
-                    _run(["guestfish", "-a", qcow2_path, "--",
-                          "run", ":",
-                          f"mkfs", "vfat", f"/dev/sda{new_part}"])
-                    return True
-
-            finally:
-                _run(["qemu-nbd", "--disconnect", "/dev/nbd0"], check=False, env=None)
-                time.sleep(1)
+                    esp_dev = None
+
+            if esp_dev is None:
+                # Format via guestfish once the nbd device is released
+                _run(["guestfish", "-a", qcow2_path, "--",
+                      "run", ":",
+                      f"mkfs", "vfat", f"/dev/sda{new_part}"])
+                return True
 
         elif part_type == "gpt":
             # Already GPT, just need to add ESP
             logger.info("  Disk is already GPT, adding ESP partition...")
-            _run(["modprobe", "nbd", "max_part=16"], check=False, env=None)
-            _run(["qemu-nbd", "--disconnect", "/dev/nbd0"], check=False, env=None)
-            time.sleep(1)
-            _run(["qemu-nbd", "--connect", "/dev/nbd0", qcow2_path], env=None)
-            time.sleep(2)
-
-            try:
+            with nbd.attach(qcow2_path) as nbd_dev:
                 # Fix GPT backup header after resize
-                _run(["sgdisk", "-e", "/dev/nbd0"], env=None)
+                _run(["sgdisk", "-e", nbd_dev], env=None)
 
-                r = _run(["sgdisk", "-p", "/dev/nbd0"], env=None)
+                r = _run(["sgdisk", "-p", nbd_dev], env=None)
                 lines = [l for l in r.stdout.split('\n')
                          if l.strip() and l.strip()[0].isdigit()]
                 last_part = int(lines[-1].split()[0]) if lines else 0
@@ -198,20 +188,16 @@ def _convert_partition_table(qcow2_path, esp_size_mb):
                     f"-n{new_part}:0:+{esp_size_mb}M",
                     f"-t{new_part}:EF00",
                     f"-c{new_part}:EFI-System",
-                    "/dev/nbd0",
+                    nbd_dev,
                 ], env=None)
 
-                _run(["partprobe", "/dev/nbd0"], check=False, env=None)
+                _run(["partprobe", nbd_dev], check=False, env=None)
                 time.sleep(1)
 
-                esp_dev = f"/dev/nbd0p{new_part}"
+                esp_dev = f"{nbd_dev}p{new_part}"
                 if Path(esp_dev).exists():
                     _run(["mkfs.vfat", "-F", "32", "-n", "ESP", esp_dev], env=None)
 
-            finally:
-                _run(["qemu-nbd", "--disconnect", "/dev/nbd0"], check=False, env=None)
-                time.sleep(1)
-
         logger.info("  Partition table conversion OK")
         return True
 
@@ -221,13 +207,14 @@ def _convert_partition_table(qcow2_path, esp_size_mb):
 
 
 def _write_bcdboot_script(qcow2_path, work_dir):
-    """Write bcdboot script and upload to the Windows image."""
+    """Write the bcdboot setup script to work_dir and return its path."""
     # The script will:
     # 1. Find the ESP partition (the new FAT32 partition)
     # 2. Assign it a drive letter
     # 3. Run bcdboot to install the UEFI bootloader
     script = r"""@echo off
 echo [%date% %time%] BIOS-to-UEFI conversion starting... > C:\vmware2scw-bios2uefi.log
+mode COM1: BAUD=115200 PARITY=N DATA=8 STOP=1 >nul 2>&1
 
 REM Find and assign the ESP volume
 echo [%date% %time%] Assigning ESP drive letter... >> C:\vmware2scw-bios2uefi.log
@@ -271,110 +258,68 @@ reg add "HKLM\SYSTEM\Setup" /v SetupType /t REG_DWORD /d 0 /f >> C:\vmware2scw-b
 reg add "HKLM\SYSTEM\Setup" /v SystemSetupInProgress /t REG_DWORD /d 0 /f >> C:\vmware2scw-bios2uefi.log 2>&1
 reg add "HKLM\SYSTEM\Setup" /v CmdLine /t REG_SZ /d "" /f >> C:\vmware2scw-bios2uefi.log 2>&1
 
-echo [%date% %time%] BIOS-to-UEFI conversion complete. Rebooting... >> C:\vmware2scw-bios2uefi.log
-shutdown /r /t 10
-"""
+echo [%date% %time%] BIOS-to-UEFI conversion complete. Powering off... >> C:\vmware2scw-bios2uefi.log
+echo {done_marker}> COM1
+shutdown /s /t 5
+""".replace("{done_marker}", BCDBOOT_DONE_MARKER)
     cmd_file = work_dir / "bios2uefi-setup.cmd"
     cmd_file.write_text(script, encoding="utf-8")
+    return cmd_file
 
-    _run(["guestfish", "-a", qcow2_path, "-i", "--",
-          "upload", str(cmd_file), "/Windows/bios2uefi-setup.cmd"])
-    logger.info("  bcdboot script uploaded")
 
+def _stage_bcdboot(qcow2_path, work_dir):
+    """Upload the bcdboot script and point SetupPhase at it.
 
-def _set_setup_phase(qcow2_path, work_dir):
-    """Set Windows SetupPhase to run bcdboot script on next boot."""
-    reg_text = (
-        "Windows Registry Editor Version 5.00\n\n"
-        "[HKEY_LOCAL_MACHINE\\SYSTEM\\Setup]\n"
-        '"CmdLine"="cmd.exe /c C:\\\\Windows\\\\bios2uefi-setup.cmd"\n'
-        '"SetupType"=dword:00000001\n'
-        '"SystemSetupInProgress"=dword:00000001\n'
+    Uses a single libguestfs session with an in-process hive edit when the
+    Python bindings are available, guestfish + virt-win-reg otherwise.
+    """
+    from vmware2scw.converter.registry import (
+        RegistryEdits, bindings_available, edit_hive, windows_guest,
     )
-    reg_file = work_dir / "bios2uefi-setup.reg"
-    reg_file.write_text(reg_text, encoding="utf-8")
+    from vmware2scw.converter.windows_virtio import _merge_reg, _queue_setup_phase
 
-    # Try virt-win-reg first
-    r = _run(["virt-win-reg", "--merge", qcow2_path, str(reg_file)], check=False)
-    if r.returncode == 0:
-        logger.info("  SetupPhase registry set via virt-win-reg")
+    cmd_file = _write_bcdboot_script(qcow2_path, work_dir)
+    edits = RegistryEdits()
+    _queue_setup_phase(edits, "C:\\Windows\\bios2uefi-setup.cmd")
+
+    if bindings_available():
+        with windows_guest(qcow2_path) as g:
+            g.upload(str(cmd_file), "/Windows/bios2uefi-setup.cmd")
+            edit_hive(g, work_dir, edits)
+        logger.info("  bcdboot script uploaded, SetupPhase set")
         return
 
-    # Fallback: hivexregedit
-    hive = work_dir / "SYSTEM.hive"
-    _run(["guestfish", "-a", qcow2_path, "-i", "--",
-          "download", "/Windows/System32/config/SYSTEM", str(hive)])
-    _run(["hivexregedit", "--merge", str(hive),
-          "--prefix", "HKEY_LOCAL_MACHINE\\SYSTEM", str(reg_file)], check=False)
     _run(["guestfish", "-a", qcow2_path, "-i", "--",
-          "upload", str(hive), "/Windows/System32/config/SYSTEM"])
-    logger.info("  SetupPhase registry set via hivexregedit")
+          "upload", str(cmd_file), "/Windows/bios2uefi-setup.cmd"])
+    logger.info("  bcdboot script uploaded")
+    _merge_reg(qcow2_path, edits.to_reg(), work_dir, "bios2uefi-setup")
 
 
-def _qemu_bcdboot(qcow2_path, work_dir, timeout=600):
+def _qemu_bcdboot(qcow2_path, work_dir, vm_info=None, timeout=600):
     """Boot Windows in QEMU to run bcdboot.
 
     Uses virtio-blk for boot (viostor installed by inject_virtio).
-    Windows SetupPhase runs bcdboot, then reboots. QEMU exits.
+    Windows SetupPhase runs bcdboot, writes a serial marker and powers
+    off; timeout is only an upper bound.
     """
-    ovmf_code = Path("/usr/share/OVMF/OVMF_CODE_4M.fd")
-    ovmf_vars_src = Path("/usr/share/OVMF/OVMF_VARS_4M.fd")
+    from vmware2scw.converter.qemu_boot import boot_available, boot_until_complete
 
-    if not ovmf_code.exists() or not Path("/dev/kvm").exists():
-        logger.warning("  OVMF or KVM not available — cannot run bcdboot via QEMU")
+    if not boot_available("uefi"):
         logger.warning("  You'll need to run bcdboot manually from WinPE/WinRE")
         return False
 
-    work_dir = Path(work_dir)
-
-    # Create overlay
-    overlay = work_dir / "bcdboot-overlay.qcow2"
-    overlay.unlink(missing_ok=True)
-    _run(["qemu-img", "create", "-f", "qcow2",
-          "-b", str(Path(qcow2_path).resolve()), "-F", "qcow2",
-          str(overlay)], env=None)
-
-    ovmf_vars = work_dir / "OVMF_VARS_bcdboot.fd"
-    shutil.copy2(str(ovmf_vars_src), str(ovmf_vars))
-
-    # Boot with UEFI firmware + virtio-blk
-    cmd = [
-        "qemu-system-x86_64", "-enable-kvm",
-        "-m", "4096", "-smp", "2", "-cpu", "host",
-        "-drive", f"if=pflash,format=raw,readonly=on,file={ovmf_code}",
-        "-drive", f"if=pflash,format=raw,file={ovmf_vars}",
-        "-drive", f"file={overlay},format=qcow2,if=virtio",
-        "-display", "none",
-        "-serial", "none",
-        "-no-reboot",
-    ]
-
-    logger.info(f"  Starting QEMU for bcdboot (timeout={timeout}s)...")
-    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    try:
-        proc.communicate(timeout=timeout)
-        logger.info(f"  QEMU exited with code {proc.returncode}")
-    except subprocess.TimeoutExpired:
-        logger.warning(f"  QEMU timed out after {timeout}s — killing")
-        proc.kill()
-        proc.wait()
-
-    # Commit overlay
-    cr = subprocess.run(["qemu-img", "commit", str(overlay)],
-                        capture_output=True, text=True)
-    if cr.returncode == 0:
-        logger.info("  Overlay committed OK")
-    else:
-        logger.info("  Direct commit failed, doing full merge...")
-        merged = work_dir / "merged-bcdboot.qcow2"
-        _run(["qemu-img", "convert", "-O", "qcow2",
-              str(overlay), str(merged)], env=None)
-        shutil.move(str(merged), str(qcow2_path))
-
-    overlay.unlink(missing_ok=True)
+    result = boot_until_complete(
+        qcow2_path, Path(work_dir),
+        done_marker=BCDBOOT_DONE_MARKER,
+        firmware="uefi",
+        timeout=timeout,
+        vm_info=vm_info,
+    )
+    if result.saw(BCDBOOT_DONE_MARKER):
+        return True
 
     # Check if bcdboot log exists
-    log_local = work_dir / "bcdboot.log"
+    log_local = Path(work_dir) / "bcdboot.log"
     r = _run(
         ["guestfish", "--ro", "-a", qcow2_path, "-i", "--",
          "download", "/vmware2scw-bios2uefi.log", str(log_local)],
@@ -385,7 +330,5 @@ def _qemu_bcdboot(qcow2_path, work_dir, timeout=600):
         logger.info("  bcdboot log:")
         for line in text.strip().split("\n"):
             logger.info(f"    {line}")
-        if "conversion complete" in text.lower():
-            return True
 
     return True  # Optimistic — bcdboot often works even without log confirmation
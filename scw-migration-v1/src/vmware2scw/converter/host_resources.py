@@ -0,0 +1,242 @@
+"""Host-resource admission for concurrent KVM conversion boots.
+
+Each Windows migration boots its guest once or twice under QEMU. Running
+several migrations on one worker must neither oversubscribe RAM (the
+kernel OOM-kills QEMU mid-pnputil) nor serialise everything behind a
+single boot. The scheduler admits a boot when its RAM and vCPUs fit in
+the configured budget *and* the host still reports enough MemAvailable,
+and queues it otherwise. Admission is FIFO so a large guest is not
+starved by a stream of small ones.
+
+Hugepages are optional: when enabled and enough free 2 MB pages remain
+(after our own reservations), the reservation is marked so QEMU backs
+guest RAM with /dev/hugepages.
+
+Confidence: 80 — /proc/meminfo accounting is approximate; the host
+reserve absorbs what qemu-img / libguestfs use outside the scheduler.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bounds for sizing a conversion boot from the source VM
+MIN_GUEST_MEMORY_MB = 2048
+MAX_GUEST_MEMORY_MB = 8192
+MIN_GUEST_VCPUS = 1
+MAX_GUEST_VCPUS = 4
+
+HUGEPAGES_MOUNT = Path("/dev/hugepages")
+
+
+def read_meminfo(path: str = "/proc/meminfo") -> dict[str, int]:
+    """Parse /proc/meminfo into {field: value} (kB, or pages for HugePages_*)."""
+    info = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                parts = rest.split()
+                if parts:
+                    info[key] = int(parts[0])
+    except OSError:
+        pass
+    return info
+
+
+def guest_size(vm_info: Optional[dict]) -> tuple[int, int]:
+    """(memory_mb, vcpus) for a conversion boot of this VM.
+
+    The guest only runs pnputil / bcdboot, so the source VM's size is an
+    upper bound rather than a target; clamp it to a sane range.
+    """
+    vm_info = vm_info or {}
+    memory_mb = int(vm_info.get("memory_mb") or 4096)
+    vcpus = int(vm_info.get("cpu") or 2)
+    memory_mb = max(MIN_GUEST_MEMORY_MB, min(MAX_GUEST_MEMORY_MB, memory_mb))
+    vcpus = max(MIN_GUEST_VCPUS, min(MAX_GUEST_VCPUS, vcpus))
+    return memory_mb, vcpus
+
+
+@dataclass(frozen=True)
+class Reservation:
+    """Resources granted to one boot."""
+    label: str
+    memory_mb: int
+    vcpus: int
+    hugepages: bool = False
+
+
+class HostResourceScheduler:
+    """Admit QEMU boots against a RAM / vCPU / hugepage budget.
+
+    Args:
+        memory_budget_mb: RAM available to conversion boots (None = host
+            total minus host_reserve_mb)
+        cpu_budget: vCPUs available to conversion boots (None = host cores)
+        host_reserve_mb: MemAvailable that must remain after admitting a boot
+        use_hugepages: back guest RAM with hugepages when enough are free
+    """
+
+    def __init__(
+        self,
+        memory_budget_mb: Optional[int] = None,
+        cpu_budget: Optional[int] = None,
+        host_reserve_mb: int = 4096,
+        use_hugepages: bool = False,
+    ):
+        self._cond = threading.Condition()
+        self._queue: deque[object] = deque()
+        self._used_memory_mb = 0
+        self._used_vcpus = 0
+        self._used_hugepages = 0
+        self._active: list[Reservation] = []
+        self.configure(memory_budget_mb, cpu_budget, host_reserve_mb, use_hugepages)
+
+    def configure(
+        self,
+        memory_budget_mb: Optional[int] = None,
+        cpu_budget: Optional[int] = None,
+        host_reserve_mb: int = 4096,
+        use_hugepages: bool = False,
+    ) -> None:
+        """(Re)apply budgets; waiting boots are re-evaluated."""
+        with self._cond:
+            total_mb = read_meminfo().get("MemTotal", 0) // 1024
+            self.host_reserve_mb = host_reserve_mb
+            self.memory_budget_mb = memory_budget_mb or max(
+                MIN_GUEST_MEMORY_MB, total_mb - host_reserve_mb)
+            self.cpu_budget = cpu_budget or (os.cpu_count() or 1)
+            self.use_hugepages = use_hugepages
+            self._cond.notify_all()
+
+    # ── Admission ────────────────────────────────────────────────
+
+    def _hugepages_free(self, meminfo: dict[str, int], memory_mb: int) -> bool:
+        if not self.use_hugepages or not HUGEPAGES_MOUNT.is_dir():
+            return False
+        page_kb = meminfo.get("Hugepagesize", 0)
+        if not page_kb:
+            return False
+        needed = (memory_mb * 1024 + page_kb - 1) // page_kb
+        return meminfo.get("HugePages_Free", 0) - self._used_hugepages >= needed
+
+    def _fits(self, memory_mb: int, vcpus: int) -> Optional[bool]:
+        """None if the boot must wait, else whether it gets hugepages."""
+        idle = not self._active
+        if not idle:
+            if self._used_memory_mb + memory_mb > self.memory_budget_mb:
+                return None
+            if self._used_vcpus + vcpus > self.cpu_budget:
+                return None
+
+        meminfo = read_meminfo()
+        if self._hugepages_free(meminfo, memory_mb):
+            return True
+        # Other boots still growing into their RAM aren't in MemAvailable yet
+        pending_mb = sum(r.memory_mb for r in self._active if not r.hugepages)
+        available_mb = meminfo.get("MemAvailable", 0) // 1024 - pending_mb
+        if not idle and available_mb - memory_mb < self.host_reserve_mb:
+            return None
+        return False
+
+    @contextmanager
+    def reserve(self, memory_mb: int, vcpus: int, label: str = "") -> Iterator[Reservation]:
+        """Block until the boot fits, hold its resources for the with-block.
+
+        A boot larger than the whole budget is admitted only when nothing
+        else is running, so it can never deadlock the queue.
+        """
+        memory_mb = min(memory_mb, self.memory_budget_mb)
+        vcpus = min(vcpus, self.cpu_budget)
+        ticket = object()
+        waited_since = time.time()
+        logged = False
+
+        with self._cond:
+            self._queue.append(ticket)
+            try:
+                while True:
+                    if self._queue[0] is ticket:
+                        hugepages = self._fits(memory_mb, vcpus)
+                        if hugepages is not None:
+                            break
+                    if not logged:
+                        logger.info(f"  Waiting for host resources ({memory_mb}MB, {vcpus} vCPU) "
+                                    f"— {len(self._active)} boot(s) running, "
+                                    f"{len(self._queue) - 1} queued")
+                        logged = True
+                    # Re-poll periodically: MemAvailable changes outside our control
+                    self._cond.wait(timeout=15)
+            finally:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+
+            res = Reservation(label=label, memory_mb=memory_mb, vcpus=vcpus, hugepages=hugepages)
+            self._active.append(res)
+            self._used_memory_mb += memory_mb
+            self._used_vcpus += vcpus
+            if hugepages:
+                self._used_hugepages += self._pages_for(memory_mb)
+
+        if logged:
+            logger.info(f"  Host resources granted after {time.time() - waited_since:.0f}s")
+        try:
+            yield res
+        finally:
+            with self._cond:
+                self._active.remove(res)
+                self._used_memory_mb -= memory_mb
+                self._used_vcpus -= vcpus
+                if hugepages:
+                    self._used_hugepages -= self._pages_for(memory_mb)
+                self._cond.notify_all()
+
+    @staticmethod
+    def _pages_for(memory_mb: int) -> int:
+        page_kb = read_meminfo().get("Hugepagesize", 2048) or 2048
+        return (memory_mb * 1024 + page_kb - 1) // page_kb
+
+    def usage(self) -> dict:
+        with self._cond:
+            return {
+                "boots": len(self._active),
+                "queued": len(self._queue),
+                "memory_mb": f"{self._used_memory_mb}/{self.memory_budget_mb}",
+                "vcpus": f"{self._used_vcpus}/{self.cpu_budget}",
+            }
+
+
+_scheduler: Optional[HostResourceScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> HostResourceScheduler:
+    """Process-wide scheduler shared by every migration on this worker."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = HostResourceScheduler()
+        return _scheduler
+
+
+def configure_scheduler(conversion_config) -> HostResourceScheduler:
+    """Apply the budgets from a ConversionConfig to the shared scheduler."""
+    sched = get_scheduler()
+    sched.configure(
+        memory_budget_mb=conversion_config.boot_memory_budget_mb,
+        cpu_budget=conversion_config.boot_cpu_budget,
+        host_reserve_mb=conversion_config.boot_host_reserve_mb,
+        use_hugepages=conversion_config.boot_hugepages,
+    )
+    return sched
@@ -0,0 +1,203 @@
+"""Minimal read-only ISO9660 / Joliet reader.
+
+Used to pull driver packages out of the virtio-win ISO without a loop
+mount (which requires root). Only what the ISO actually needs is
+implemented: primary and Joliet volume descriptors, directory records
+and single-extent files. Rock Ridge and UDF are ignored — the Joliet
+tree already carries the mixed-case long names virtio-win uses.
+
+Confidence: 90 — ECMA-119 directory records are simple and stable.
+"""
+
+from __future__ import annotations
+
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+SECTOR_SIZE = 2048
+_FIRST_DESCRIPTOR = 16
+
+_VD_PRIMARY = 1
+_VD_SUPPLEMENTARY = 2
+_VD_TERMINATOR = 255
+
+_JOLIET_ESCAPES = (b"%/@", b"%/C", b"%/E")
+
+_FLAG_DIRECTORY = 0x02
+
+
+@dataclass(frozen=True)
+class ISOEntry:
+    """A file or directory record inside the image."""
+    name: str
+    extent: int          # first logical block
+    size: int            # data length in bytes
+    is_dir: bool
+
+
+class ISO9660Image:
+    """Random-access reader over an ISO9660 image file.
+
+    Prefers the Joliet supplementary descriptor when present; falls back
+    to the primary (8.3, upper-case) tree otherwise. Path lookups are
+    case-insensitive so callers can use the names as they appear in
+    the Windows driver layout (e.g. ``NetKVM/2k22/amd64``).
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._fh: BinaryIO = open(self.path, "rb")
+        self._dir_cache: dict[int, list[ISOEntry]] = {}
+        try:
+            self.joliet, self._root = self._read_descriptors()
+        except Exception:
+            self._fh.close()
+            raise
+
+    def close(self) -> None:
+        self._fh.close()
+
+    def __enter__(self) -> "ISO9660Image":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    # ── Descriptors ──────────────────────────────────────────────
+
+    def _read_descriptors(self) -> tuple[bool, ISOEntry]:
+        primary_root = None
+        joliet_root = None
+
+        lba = _FIRST_DESCRIPTOR
+        while True:
+            block = self._read(lba * SECTOR_SIZE, SECTOR_SIZE)
+            if len(block) < SECTOR_SIZE or block[1:6] != b"CD001":
+                break
+            vd_type = block[0]
+            if vd_type == _VD_TERMINATOR:
+                break
+            if vd_type == _VD_PRIMARY and primary_root is None:
+                primary_root = self._parse_record(block[156:156 + 34], joliet=False)
+            elif vd_type == _VD_SUPPLEMENTARY and joliet_root is None:
+                if block[88:91] in _JOLIET_ESCAPES:
+                    joliet_root = self._parse_record(block[156:156 + 34], joliet=True)
+            lba += 1
+
+        if joliet_root is not None:
+            return True, joliet_root
+        if primary_root is not None:
+            return False, primary_root
+        raise ValueError(f"{self.path} is not an ISO9660 image (no volume descriptor)")
+
+    # ── Directory records ────────────────────────────────────────
+
+    @staticmethod
+    def _parse_record(rec: bytes, joliet: bool) -> ISOEntry:
+        extent = struct.unpack_from("<I", rec, 2)[0]
+        size = struct.unpack_from("<I", rec, 10)[0]
+        flags = rec[25]
+        name_len = rec[32]
+        raw_name = rec[33:33 + name_len]
+
+        if raw_name in (b"\x00", b"\x01"):
+            name = "." if raw_name == b"\x00" else ".."
+        elif joliet:
+            name = raw_name.decode("utf-16-be", errors="replace")
+        else:
+            name = raw_name.decode("ascii", errors="replace")
+
+        is_dir = bool(flags & _FLAG_DIRECTORY)
+        if not is_dir:
+            name = name.split(";", 1)[0]
+            if not joliet:
+                name = name.rstrip(".")
+        return ISOEntry(name=name, extent=extent, size=size, is_dir=is_dir)
+
+    def _read_dir(self, entry: ISOEntry) -> list[ISOEntry]:
+        cached = self._dir_cache.get(entry.extent)
+        if cached is not None:
+            return cached
+
+        data = self._read(entry.extent * SECTOR_SIZE, entry.size)
+        entries = []
+        pos = 0
+        while pos < len(data):
+            rec_len = data[pos]
+            if rec_len == 0:
+                # Records never straddle sectors — skip the zero padding
+                pos = (pos // SECTOR_SIZE + 1) * SECTOR_SIZE
+                continue
+            rec = self._parse_record(data[pos:pos + rec_len], self.joliet)
+            if rec.name not in (".", ".."):
+                entries.append(rec)
+            pos += rec_len
+
+        self._dir_cache[entry.extent] = entries
+        return entries
+
+    # ── Public API ───────────────────────────────────────────────
+
+    def find(self, path: str) -> ISOEntry | None:
+        """Resolve a slash-separated path (case-insensitive)."""
+        node = self._root
+        for part in [p for p in path.replace("\\", "/").split("/") if p]:
+            if not node.is_dir:
+                return None
+            wanted = part.lower()
+            node = next((e for e in self._read_dir(node) if e.name.lower() == wanted), None)
+            if node is None:
+                return None
+        return node
+
+    def listdir(self, path: str = "/") -> list[ISOEntry]:
+        """List a directory's entries."""
+        node = self.find(path)
+        if node is None or not node.is_dir:
+            raise FileNotFoundError(f"Directory not found in ISO: {path}")
+        return list(self._read_dir(node))
+
+    def walk(self, path: str = "/") -> Iterator[tuple[str, list[ISOEntry]]]:
+        """Yield (dir_path, entries) for every directory under path."""
+        node = self.find(path)
+        if node is None or not node.is_dir:
+            return
+        stack = [(path.strip("/"), node)]
+        while stack:
+            dir_path, dir_node = stack.pop()
+            entries = self._read_dir(dir_node)
+            yield dir_path, entries
+            for e in entries:
+                if e.is_dir:
+                    stack.append((f"{dir_path}/{e.name}".strip("/"), e))
+
+    def extract_file(self, entry: ISOEntry, dest: Path, chunk_size: int = 1024 * 1024) -> None:
+        """Copy a single file out of the image."""
+        remaining = entry.size
+        offset = entry.extent * SECTOR_SIZE
+        with open(dest, "wb") as out:
+            while remaining > 0:
+                chunk = self._read(offset, min(chunk_size, remaining))
+                if not chunk:
+                    raise IOError(f"Short read extracting {entry.name} from {self.path}")
+                out.write(chunk)
+                offset += len(chunk)
+                remaining -= len(chunk)
+
+    def extract_dir(self, path: str, dest: Path) -> list[Path]:
+        """Copy the regular files of one directory (non-recursive)."""
+        dest.mkdir(parents=True, exist_ok=True)
+        written = []
+        for entry in self.listdir(path):
+            if entry.is_dir:
+                continue
+            target = dest / entry.name
+            self.extract_file(entry, target)
+            written.append(target)
+        return written
+
+    def _read(self, offset: int, length: int) -> bytes:
+        self._fh.seek(offset)
+        return self._fh.read(length)
@@ -0,0 +1,90 @@
+"""Host NBD devices for the guest-modification stages.
+
+The guest pool runs several VMs at once, and each host-side disk edit
+(ntfsfix, sgdisk, mkfs.vfat) needs a qcow2 exposed as a /dev/nbdN block
+device. A hard-coded /dev/nbd0 let one VM disconnect, repartition or
+ntfsfix another VM's disk. attach() instead picks a free device — one
+with no /sys/block/nbdN/pid — under a process-wide lock, connects the
+image and always disconnects it on exit. It never disconnects a device
+it did not connect itself.
+
+Confidence: 80 — another process may take a device between the pid
+check and our connect; qemu-nbd then fails with EBUSY and the next free
+device is tried.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+SYS_BLOCK = Path("/sys/block")
+MAX_PART = 16
+# Seconds for the kernel to read the partition table after connecting
+SETTLE_SECONDS = 2
+
+_lock = threading.Lock()
+_claimed: set[str] = set()
+
+
+def _load_module() -> None:
+    subprocess.run(["modprobe", "nbd", f"max_part={MAX_PART}"], capture_output=True)
+
+
+def free_devices() -> list[str]:
+    """/dev/nbdN devices neither connected nor claimed by this process."""
+    names = [p.name for p in SYS_BLOCK.glob("nbd*") if re.fullmatch(r"nbd\d+", p.name)]
+    names.sort(key=lambda n: int(n[3:]))
+    return [f"/dev/{n}" for n in names
+            if f"/dev/{n}" not in _claimed and not (SYS_BLOCK / n / "pid").exists()]
+
+
+def reread_partitions(device: str, settle: float = 0.5) -> None:
+    subprocess.run(["partprobe", device], capture_output=True)
+    time.sleep(settle)
+
+
+@contextmanager
+def attach(image: str | Path) -> Iterator[str]:
+    """Connect image to a free /dev/nbdN for the duration of the block.
+
+    Raises:
+        RuntimeError: no free device, or qemu-nbd could not connect
+    """
+    _load_module()
+    device = None
+    errors = []
+    with _lock:
+        for candidate in free_devices():
+            r = subprocess.run(["qemu-nbd", "--connect", candidate, str(image)],
+                               capture_output=True, text=True)
+            if r.returncode == 0:
+                device = candidate
+                _claimed.add(device)
+                break
+            # Taken by another process since the pid check, or a bad image
+            errors.append(f"{candidate}: {r.stderr.strip()[:200]}")
+            if "busy" not in r.stderr.lower():
+                break
+    if device is None:
+        detail = errors[-1] if errors else "no free /dev/nbdN (is the nbd module loaded?)"
+        raise RuntimeError(f"qemu-nbd connect failed — {detail}")
+
+    logger.debug(f"  {image} → {device}")
+    try:
+        time.sleep(SETTLE_SECONDS)
+        reread_partitions(device)
+        yield device
+    finally:
+        subprocess.run(["qemu-nbd", "--disconnect", device], capture_output=True)
+        time.sleep(0.5)
+        with _lock:
+            _claimed.discard(device)
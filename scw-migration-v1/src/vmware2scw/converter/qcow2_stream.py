@@ -0,0 +1,396 @@
+"""Front-to-back qcow2 writer that streams while it converts.
+
+qemu-img writes qcow2 with random access: it allocates clusters as it
+goes and back-patches L2 tables and refcounts, so the image only becomes
+valid once it is complete on disk. Here, the allocation map of the
+source is known before any data is copied (``qemu-img map``), so the
+whole metadata can be laid out up front:
+
+    cluster 0         header (v3, 64 KiB clusters, 16-bit refcounts)
+    L1 table          one entry per 512 MiB of guest space
+    refcount table
+    refcount blocks   every host cluster has refcount 1
+    L2 tables         only for L1 slots with allocated clusters
+    data clusters     allocated guest clusters, in guest order
+
+Every byte is final when emitted, so the image can be fed straight into
+a sink that only appends (an S3 multipart upload) and never exists as a
+file on the conversion host. Source data is read from a read-only
+``qemu-nbd`` export of the VMDK over a private UNIX socket, so no
+/dev/nbdX device is needed.
+
+The output is uncompressed: compressed clusters have sizes that are
+only known after compressing, which would defeat the fixed layout.
+
+Confidence: 80 — the layout follows docs/interop/qcow2.txt; images are
+accepted by ``qemu-img check``, but only unencrypted, non-backed images
+without snapshots are produced.
+"""
+
+from __future__ import annotations
+
+import bisect
+import json
+import math
+import shutil
+import socket
+import struct
+import subprocess
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterator, Optional, Protocol
+
+from vmware2scw.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+CLUSTER_BITS = 16
+CLUSTER_SIZE = 1 << CLUSTER_BITS
+REFCOUNT_ORDER = 4                                  # 16-bit refcounts
+REFCOUNTS_PER_BLOCK = CLUSTER_SIZE * 8 // (1 << REFCOUNT_ORDER)
+L2_ENTRIES = CLUSTER_SIZE // 8
+QCOW_OFLAG_COPIED = 1 << 63
+
+READ_CHUNK = 8 * 1024 * 1024                        # NBD read size
+
+
+class Sink(Protocol):
+    def write(self, data: bytes) -> object: ...
+
+
+# ── Layout ───────────────────────────────────────────────────────────
+
+@dataclass
+class Qcow2Layout:
+    """Host placement of every qcow2 structure for a given allocation map.
+
+    ranges are sorted, non-overlapping [start, end) guest cluster ranges
+    that hold data; everything else reads as zeros.
+    """
+
+    virtual_size: int
+    ranges: list[tuple[int, int]]
+
+    l1_size: int = 0
+    l1_offset: int = 0
+    refcount_table_offset: int = 0
+    refcount_table_clusters: int = 0
+    refcount_blocks_offset: int = 0
+    refcount_blocks: int = 0
+    l2_offset: int = 0
+    l2_slots: list[int] = field(default_factory=list)   # L1 indexes with an L2 table
+    data_offset: int = 0
+    data_clusters: int = 0
+    total_clusters: int = 0
+
+    _starts: list[int] = field(default_factory=list, repr=False)
+    _ranks: list[int] = field(default_factory=list, repr=False)
+
+    def __post_init__(self) -> None:
+        guest_clusters = math.ceil(self.virtual_size / CLUSTER_SIZE)
+        self.l1_size = max(1, math.ceil(guest_clusters / L2_ENTRIES))
+
+        rank = 0
+        slots = set()
+        for start, end in self.ranges:
+            self._starts.append(start)
+            self._ranks.append(rank)
+            rank += end - start
+            slots.update(range(start // L2_ENTRIES, (end - 1) // L2_ENTRIES + 1))
+        self.data_clusters = rank
+        self.l2_slots = sorted(slots)
+
+        l1_clusters = math.ceil(self.l1_size * 8 / CLUSTER_SIZE)
+        fixed = 1 + l1_clusters + len(self.l2_slots) + self.data_clusters
+        # Refcount structures cover themselves too: iterate to a fixed point
+        blocks = table = 0
+        while True:
+            total = fixed + table + blocks
+            new_blocks = math.ceil(total / REFCOUNTS_PER_BLOCK)
+            new_table = math.ceil(new_blocks * 8 / CLUSTER_SIZE)
+            if (new_blocks, new_table) == (blocks, table):
+                break
+            blocks, table = new_blocks, new_table
+
+        self.refcount_blocks = blocks
+        self.refcount_table_clusters = table
+        self.l1_offset = CLUSTER_SIZE
+        self.refcount_table_offset = self.l1_offset + l1_clusters * CLUSTER_SIZE
+        self.refcount_blocks_offset = self.refcount_table_offset + table * CLUSTER_SIZE
+        self.l2_offset = self.refcount_blocks_offset + blocks * CLUSTER_SIZE
+        self.data_offset = self.l2_offset + len(self.l2_slots) * CLUSTER_SIZE
+        self.total_clusters = self.data_offset // CLUSTER_SIZE + self.data_clusters
+
+    @property
+    def image_size(self) -> int:
+        return self.total_clusters * CLUSTER_SIZE
+
+    def host_offset(self, guest_cluster: int) -> Optional[int]:
+        """Host offset of a guest cluster, or None if unallocated."""
+        i = bisect.bisect_right(self._starts, guest_cluster) - 1
+        if i < 0:
+            return None
+        start, end = self.ranges[i]
+        if guest_cluster >= end:
+            return None
+        return self.data_offset + (self._ranks[i] + guest_cluster - start) * CLUSTER_SIZE
+
+    # ── Metadata emission ────────────────────────────────────────
+
+    def header(self) -> bytes:
+        hdr = struct.pack(
+            ">4sIQIIQIIQQIIQQQQII",
+            b"QFI\xfb", 3,
+            0, 0,                                   # no backing file
+            CLUSTER_BITS, self.virtual_size,
+            0,                                      # no encryption
+            self.l1_size, self.l1_offset,
+            self.refcount_table_offset, self.refcount_table_clusters,
+            0, 0,                                   # no snapshots
+            0, 0, 0,                                # feature bits
+            REFCOUNT_ORDER, 104,
+        )
+        hdr += struct.pack(">II", 0, 0)             # end of header extensions
+        return hdr.ljust(CLUSTER_SIZE, b"\0")
+
+    def metadata(self) -> Iterator[bytes]:
+        """Everything before the first data cluster, one cluster-aligned chunk at a time."""
+        yield self.header()
+
+        l1 = bytearray(math.ceil(self.l1_size * 8 / CLUSTER_SIZE) * CLUSTER_SIZE)
+        for n, slot in enumerate(self.l2_slots):
+            struct.pack_into(">Q", l1, slot * 8, (self.l2_offset + n * CLUSTER_SIZE) | QCOW_OFLAG_COPIED)
+        yield bytes(l1)
+
+        table = bytearray(self.refcount_table_clusters * CLUSTER_SIZE)
+        for j in range(self.refcount_blocks):
+            struct.pack_into(">Q", table, j * 8, self.refcount_blocks_offset + j * CLUSTER_SIZE)
+        yield bytes(table)
+
+        for j in range(self.refcount_blocks):
+            used = min(REFCOUNTS_PER_BLOCK, self.total_clusters - j * REFCOUNTS_PER_BLOCK)
+            yield (b"\0\1" * used).ljust(CLUSTER_SIZE, b"\0")
+
+        for slot in self.l2_slots:
+            yield self._l2_table(slot)
+
+    def _l2_table(self, slot: int) -> bytes:
+        first = slot * L2_ENTRIES
+        last = first + L2_ENTRIES
+        l2 = bytearray(CLUSTER_SIZE)
+        i = max(0, bisect.bisect_right(self._starts, first) - 1)
+        while i < len(self.ranges) and self.ranges[i][0] < last:
+            start, end = self.ranges[i]
+            lo, hi = max(start, first), min(end, last)
+            if lo < hi:
+                base = self.data_offset + (self._ranks[i] + lo - start) * CLUSTER_SIZE
+                for g in range(lo, hi):
+                    struct.pack_into(">Q", l2, (g - first) * 8,
+                                     (base + (g - lo) * CLUSTER_SIZE) | QCOW_OFLAG_COPIED)
+            i += 1
+        return bytes(l2)
+
+
+def cluster_ranges(extents: list[dict], virtual_size: int) -> list[tuple[int, int]]:
+    """Allocated guest cluster ranges from ``qemu-img map --output=json``."""
+    ranges: list[tuple[int, int]] = []
+    for ext in sorted(extents, key=lambda e: e["start"]):
+        if not ext.get("data") or ext.get("zero"):
+            continue
+        start = ext["start"] // CLUSTER_SIZE
+        end = math.ceil(min(ext["start"] + ext["length"], virtual_size) / CLUSTER_SIZE)
+        if ranges and start <= ranges[-1][1]:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], end))
+        elif end > start:
+            ranges.append((start, end))
+    return ranges
+
+
+# ── NBD source ───────────────────────────────────────────────────────
+
+NBD_MAGIC = b"NBDMAGIC"
+NBD_IHAVEOPT = 0x49484156454F5054
+NBD_REP_MAGIC = 0x3E889045565A9
+NBD_REQUEST_MAGIC = 0x25609513
+NBD_REPLY_MAGIC = 0x67446698
+NBD_OPT_GO = 7
+NBD_REP_ACK = 1
+NBD_REP_INFO = 3
+NBD_INFO_EXPORT = 0
+NBD_CMD_READ = 0
+NBD_CMD_DISC = 2
+
+
+class NBDReader:
+    """Read-only NBD client (fixed newstyle handshake, simple replies)."""
+
+    def __init__(self, sock_path: str | Path, export: str = "", connect_timeout: int = 30):
+        deadline = time.time() + connect_timeout
+        while True:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                self.sock.connect(str(sock_path))
+                break
+            except OSError:
+                self.sock.close()
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.2)
+        self.size = 0
+        self._handle = 0
+        self._handshake(export)
+
+    def _recv(self, n: int) -> bytes:
+        buf = bytearray(n)
+        view = memoryview(buf)
+        got = 0
+        while got < n:
+            r = self.sock.recv_into(view[got:])
+            if not r:
+                raise ConnectionError("NBD server closed the connection")
+            got += r
+        return bytes(buf)
+
+    def _handshake(self, export: str) -> None:
+        magic, opt_magic, _flags = struct.unpack(">8sQH", self._recv(18))
+        if magic != NBD_MAGIC or opt_magic != NBD_IHAVEOPT:
+            raise ConnectionError("Not a newstyle NBD server")
+        self.sock.sendall(struct.pack(">I", 1 | 2))     # FIXED_NEWSTYLE | NO_ZEROES
+
+        name = export.encode()
+        data = struct.pack(">I", len(name)) + name + struct.pack(">H", 0)
+        self.sock.sendall(struct.pack(">QII", NBD_IHAVEOPT, NBD_OPT_GO, len(data)) + data)
+        while True:
+            magic, _opt, rtype, length = struct.unpack(">QIII", self._recv(20))
+            payload = self._recv(length) if length else b""
+            if magic != NBD_REP_MAGIC:
+                raise ConnectionError("Bad NBD option reply")
+            if rtype & 0x80000000:
+                raise ConnectionError(f"NBD export '{export}' refused: {payload!r}")
+            if rtype == NBD_REP_INFO and struct.unpack(">H", payload[:2])[0] == NBD_INFO_EXPORT:
+                self.size = struct.unpack(">Q", payload[2:10])[0]
+            elif rtype == NBD_REP_ACK:
+                return
+
+    def read(self, offset: int, length: int) -> bytes:
+        self._handle += 1
+        self.sock.sendall(struct.pack(">IHHQQI", NBD_REQUEST_MAGIC, 0, NBD_CMD_READ,
+                                      self._handle, offset, length))
+        magic, error, handle = struct.unpack(">IIQ", self._recv(16))
+        if magic != NBD_REPLY_MAGIC or handle != self._handle:
+            raise ConnectionError("Unexpected NBD reply")
+        if error:
+            raise OSError(error, f"NBD read failed at offset {offset}")
+        return self._recv(length)
+
+    def close(self) -> None:
+        try:
+            self.sock.sendall(struct.pack(">IHHQQI", NBD_REQUEST_MAGIC, 0, NBD_CMD_DISC, 0, 0, 0))
+        except OSError:
+            pass
+        self.sock.close()
+
+
+# ── Streaming ────────────────────────────────────────────────────────
+
+def image_map(source: str | Path, fmt: str) -> tuple[int, list[tuple[int, int]]]:
+    """(virtual size, allocated cluster ranges) of a source image."""
+    info = json.loads(subprocess.run(
+        ["qemu-img", "info", "--output=json", "-f", fmt, str(source)],
+        capture_output=True, text=True, check=True,
+    ).stdout)
+    extents = json.loads(subprocess.run(
+        ["qemu-img", "map", "--output=json", "-f", fmt, str(source)],
+        capture_output=True, text=True, check=True,
+    ).stdout)
+    size = info["virtual-size"]
+    return size, cluster_ranges(extents, size)
+
+
+def write_qcow2(
+    layout: Qcow2Layout,
+    read: Callable[[int, int], bytes],
+    sink: Sink | BinaryIO,
+    progress_callback: Optional[Callable[[float], None]] = None,
+) -> int:
+    """Emit the image described by layout into sink, front to back.
+
+    read(offset, length) returns guest data. Returns bytes written.
+    """
+    written = 0
+    for chunk in layout.metadata():
+        sink.write(chunk)
+        written += len(chunk)
+
+    per_read = READ_CHUNK // CLUSTER_SIZE
+    done = 0
+    for start, end in layout.ranges:
+        for first in range(start, end, per_read):
+            count = min(per_read, end - first)
+            offset = first * CLUSTER_SIZE
+            length = min(count * CLUSTER_SIZE, layout.virtual_size - offset)
+            data = read(offset, length)
+            if len(data) < count * CLUSTER_SIZE:
+                data = data.ljust(count * CLUSTER_SIZE, b"\0")
+            sink.write(data)
+            written += len(data)
+            done += count
+            if progress_callback and layout.data_clusters:
+                progress_callback(done / layout.data_clusters * 100)
+
+    if written != layout.image_size:
+        raise RuntimeError(f"qcow2 stream size mismatch: wrote {written}, "
+                           f"layout says {layout.image_size}")
+    return written
+
+
+def stream_convert(
+    source: str | Path,
+    fmt: str,
+    open_sink: Callable[[Qcow2Layout], Sink],
+    progress_callback: Optional[Callable[[float], None]] = None,
+) -> Qcow2Layout:
+    """Convert source to qcow2, writing into the sink returned by open_sink.
+
+    open_sink gets the layout first, so it can size its output (e.g.
+    multipart part size) from layout.image_size before any data flows.
+    """
+    if not shutil.which("qemu-nbd"):
+        raise RuntimeError("qemu-nbd not found. Install with: apt-get install qemu-utils")
+
+    source = Path(source)
+    size, ranges = image_map(source, fmt)
+    layout = Qcow2Layout(size, ranges)
+    logger.info(
+        f"Streaming {source.name} as qcow2: virtual {size / (1024**3):.1f}GB, "
+        f"allocated {layout.data_clusters * CLUSTER_SIZE / (1024**3):.1f}GB, "
+        f"image {layout.image_size / (1024**3):.1f}GB"
+    )
+
+    sock_dir = Path(tempfile.mkdtemp(prefix="vmware2scw-nbd-"))
+    sock_path = sock_dir / "nbd.sock"
+    proc = subprocess.Popen(
+        ["qemu-nbd", "--read-only", "--format", fmt, "--socket", str(sock_path),
+         "--cache", "none", str(source)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    reader = None
+    try:
+        reader = NBDReader(sock_path)
+        if reader.size and reader.size != size:
+            raise RuntimeError(f"NBD export size {reader.size} != image size {size}")
+        sink = open_sink(layout)
+        write_qcow2(layout, reader.read, sink, progress_callback)
+    finally:
+        if reader:
+            reader.close()
+        proc.terminate()
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        shutil.rmtree(sock_dir, ignore_errors=True)
+    return layout
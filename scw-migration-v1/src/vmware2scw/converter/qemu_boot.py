@@ -0,0 +1,502 @@
+r"""Headless QEMU boot sessions for offline guest preparation.
+
+A session boots a disk image under KVM from a throwaway qcow2 overlay,
+waits for the guest to signal that its setup script finished, and then
+commits the overlay back into the base image once.
+
+Completion is event-driven rather than timed:
+  - the setup script writes a marker line to COM1, which QEMU logs to a
+    file we tail;
+  - the guest then powers off, which QEMU reports as a QMP ``SHUTDOWN``
+    event (and exits, since we run with -no-reboot).
+The timeout is only an upper bound for guests that hang.
+
+The overlay is opened with cache=unsafe and aio=io_uring: nothing in the
+overlay matters until the guest has shut down and QEMU has exited, so
+host flushes are pure overhead.
+
+smoke_boot() reuses the same session for a pre-upload check of the final
+image: the disks on virtio-scsi, a virtio-net NIC and fresh OVMF vars
+(so the firmware must find the fallback bootloader, as on Scaleway). It
+passes as soon as the serial console shows a login prompt, cloud-init or
+the Windows EMS SAC prompt, and fails fast on panics, emergency shells
+and firmware boot failures. The overlays are thrown away.
+"""
+
+import json
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from vmware2scw.converter.host_resources import HUGEPAGES_MOUNT, get_scheduler, guest_size
+from vmware2scw.utils.capabilities import get_capabilities
+
+logger = logging.getLogger(__name__)
+
+OVMF_CODE = Path("/usr/share/OVMF/OVMF_CODE_4M.fd")
+OVMF_VARS = Path("/usr/share/OVMF/OVMF_VARS_4M.fd")
+
+# How long the guest gets to power off by itself after the done-marker
+SHUTDOWN_GRACE = 120
+
+
+@dataclass
+class BootResult:
+    """Outcome of a boot session."""
+    completed: bool              # done-marker seen or guest shut down cleanly
+    reason: str                  # "marker" | "shutdown" | "exited" | "timeout"
+    elapsed: float
+    serial: str = ""             # full serial console output
+    markers: list = field(default_factory=list)
+
+    def saw(self, marker):
+        return marker in self.markers
+
+
+class QMPClient:
+    """Minimal QMP client over a UNIX socket (events + commands)."""
+
+    def __init__(self, path, connect_timeout=30):
+        self._buf = b""
+        deadline = time.time() + connect_timeout
+        while True:
+            try:
+                self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.sock.connect(str(path))
+                break
+            except OSError:
+                self.sock.close()
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.2)
+        self.events = []
+        self._recv_message(timeout=10)              # greeting
+        self.command("qmp_capabilities")
+
+    def _recv_message(self, timeout):
+        """Return the next JSON message, or None if nothing within timeout."""
+        deadline = time.time() + timeout
+        while b"\n" not in self._buf:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            self.sock.settimeout(remaining)
+            try:
+                chunk = self.sock.recv(65536)
+            except TimeoutError:
+                return None
+            if not chunk:
+                raise ConnectionError("QMP socket closed")
+            self._buf += chunk
+        line, self._buf = self._buf.split(b"\n", 1)
+        return json.loads(line) if line.strip() else self._recv_message(timeout)
+
+    def command(self, name, **arguments):
+        msg = {"execute": name}
+        if arguments:
+            msg["arguments"] = arguments
+        self.sock.sendall(json.dumps(msg).encode() + b"\n")
+        while True:
+            reply = self._recv_message(timeout=30)
+            if reply is None:
+                raise TimeoutError(f"QMP command {name} got no reply")
+            if "event" in reply:
+                self.events.append(reply)
+                continue
+            if "error" in reply:
+                raise RuntimeError(f"QMP {name}: {reply['error'].get('desc')}")
+            return reply.get("return")
+
+    def poll_events(self, wait=1.0):
+        """Collect events received within wait seconds."""
+        deadline = time.time() + wait
+        while True:
+            msg = self._recv_message(timeout=max(0.0, deadline - time.time()))
+            if msg is None:
+                break
+            if "event" in msg:
+                self.events.append(msg)
+        events, self.events = self.events, []
+        return events
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+def io_uring_supported():
+    """QEMU gained aio=io_uring in 5.0."""
+    return get_capabilities().qemu_system_at_least(5, 0)
+
+
+def _ovmf_paths():
+    caps = get_capabilities()
+    if caps.ovmf_code and caps.ovmf_vars:
+        return Path(caps.ovmf_code), Path(caps.ovmf_vars)
+    return OVMF_CODE, OVMF_VARS
+
+
+def boot_available(firmware="uefi"):
+    """KVM is required; OVMF too for UEFI boots."""
+    caps = get_capabilities()
+    if not caps.kvm:
+        logger.error("  /dev/kvm not available — cannot boot QEMU")
+        return False
+    if firmware == "uefi" and not caps.ovmf_code:
+        logger.error("  OVMF not installed!")
+        return False
+    return True
+
+
+def boot_until_complete(
+    disk_path,
+    work_dir,
+    done_marker,
+    markers=(),
+    firmware="uefi",
+    devices=(),
+    timeout=900,
+    vm_info=None,
+    memory_mb=None,
+    smp=None,
+    commit=True,
+):
+    """Boot disk_path once and wait for the guest to finish its setup.
+
+    Args:
+        disk_path: qcow2 image to boot (changes are committed back into it)
+        work_dir: scratch directory for overlay, OVMF vars, serial log
+        done_marker: serial console line written by the guest when done
+        markers: other serial markers to report in BootResult.markers
+        firmware: "uefi" (OVMF) or "bios" (SeaBIOS)
+        devices: extra -device specs (e.g. "virtio-scsi-pci,id=scsi0")
+        timeout: hard upper bound in seconds (not counting time queued
+            for host resources)
+        vm_info: source VM info dict, used to size the guest
+        memory_mb / smp: explicit guest size (overrides vm_info)
+        commit: commit the overlay into disk_path after the boot
+
+    Returns:
+        BootResult
+    """
+    work_dir = Path(work_dir)
+    work_dir.mkdir(parents=True, exist_ok=True)
+    disk_path = Path(disk_path)
+
+    sized_mem, sized_smp = guest_size(vm_info)
+    memory_mb = memory_mb or sized_mem
+    smp = smp or sized_smp
+
+    overlay = work_dir / "boot-overlay.qcow2"
+    overlay.unlink(missing_ok=True)
+    subprocess.run(
+        ["qemu-img", "create", "-f", "qcow2",
+         "-b", str(disk_path.resolve()), "-F", "qcow2", str(overlay)],
+        capture_output=True, text=True, check=True,
+    )
+
+    serial_log = work_dir / "serial.log"
+    serial_log.unlink(missing_ok=True)
+
+    with get_scheduler().reserve(memory_mb, smp, label=disk_path.name) as res:
+        reason, elapsed, serial_text, seen = _run_session(
+            work_dir, [overlay], serial_log, firmware, devices,
+            done_marker, markers, timeout, res,
+        )
+
+    if commit:
+        commit_overlay(overlay, disk_path)
+    overlay.unlink(missing_ok=True)
+
+    return BootResult(
+        completed=reason in ("marker", "shutdown"),
+        reason=reason,
+        elapsed=elapsed,
+        serial=serial_text,
+        markers=seen,
+    )
+
+
+# Serial console output that proves the OS came up
+SMOKE_OK_MARKERS = (
+    "login:",                            # getty on ttyS0
+    "Cloud-init v.",                     # cloud-init reached userspace
+    "SAC>",                              # Windows EMS Special Administration Console
+    "SAC started and initialized",
+)
+# ... and output that proves it will not
+SMOKE_FAIL_MARKERS = (
+    "Kernel panic",
+    "emergency mode",                    # systemd emergency.target
+    "Give root password for maintenance",
+    "Dropping to a shell",               # initramfs-tools: root device not found
+    "dracut Warning: Could not boot",
+    "Dropping to debug shell",           # dracut
+    "INACCESSIBLE_BOOT_DEVICE",
+    "No bootable option or device was found",   # OVMF BdsDxe
+    "UEFI Interactive Shell",
+    "grub rescue>",
+)
+# OVMF handed over to a bootloader
+FIRMWARE_BOOT_MARKER = "BdsDxe: starting"
+
+
+@dataclass
+class SmokeResult:
+    """Outcome of a pre-upload smoke boot."""
+    verdict: str                 # "passed" | "failed" | "inconclusive"
+    reason: str
+    elapsed: float
+    marker: str = ""
+    serial_tail: str = ""
+
+    @property
+    def passed(self):
+        return self.verdict == "passed"
+
+
+def smoke_boot(disk_paths, work_dir, firmware="uefi", timeout=600, vm_info=None):
+    """Boot the final image(s) once and report whether the OS came up.
+
+    Args:
+        disk_paths: qcow2 images, boot disk first (never modified)
+        work_dir: scratch directory for overlays, OVMF vars, serial log
+        firmware: "uefi" (OVMF) or "bios"
+        timeout: seconds to wait for a verdict marker
+        vm_info: source VM info dict, used to size the guest
+
+    Returns:
+        SmokeResult. "inconclusive" when the guest was still running at the
+        timeout without printing anything conclusive (e.g. no serial
+        console configured).
+    """
+    work_dir = Path(work_dir)
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    overlays = []
+    for i, disk in enumerate(disk_paths):
+        overlay = work_dir / f"smoke-overlay-{i}.qcow2"
+        overlay.unlink(missing_ok=True)
+        subprocess.run(
+            ["qemu-img", "create", "-f", "qcow2",
+             "-b", str(Path(disk).resolve()), "-F", "qcow2", str(overlay)],
+            capture_output=True, text=True, check=True,
+        )
+        overlays.append(overlay)
+
+    serial_log = work_dir / "smoke-serial.log"
+    serial_log.unlink(missing_ok=True)
+    memory_mb, smp = guest_size(vm_info)
+
+    try:
+        with get_scheduler().reserve(memory_mb, smp, label=f"smoke {Path(disk_paths[0]).name}") as res:
+            reason, elapsed, serial_text, seen = _run_session(
+                work_dir, overlays, serial_log, firmware, (),
+                None, (FIRMWARE_BOOT_MARKER,), timeout, res,
+                bus="virtio-scsi", nic=True,
+                stop_markers=SMOKE_FAIL_MARKERS + SMOKE_OK_MARKERS,
+            )
+    finally:
+        for overlay in overlays:
+            overlay.unlink(missing_ok=True)
+
+    tail = "\n".join(serial_text.strip().splitlines()[-20:])
+    failed = next((m for m in SMOKE_FAIL_MARKERS if m in seen), None)
+    ok = next((m for m in SMOKE_OK_MARKERS if m in seen), None)
+    if failed:
+        return SmokeResult("failed", f"serial console: {failed!r}", elapsed, failed, tail)
+    if ok:
+        return SmokeResult("passed", f"serial console: {ok!r}", elapsed, ok, tail)
+    if reason in ("exited", "shutdown"):
+        # -no-reboot: a guest reset (crash, triple fault) ends QEMU
+        return SmokeResult("failed", "guest reset or powered off during boot", elapsed, "", tail)
+    if FIRMWARE_BOOT_MARKER in seen:
+        return SmokeResult("inconclusive", f"bootloader started, no OS marker within {timeout}s",
+                           elapsed, FIRMWARE_BOOT_MARKER, tail)
+    return SmokeResult("inconclusive", f"no serial output within {timeout}s", elapsed, "", tail)
+
+
+def _run_session(work_dir, overlays, serial_log, firmware, devices,
+                 done_marker, markers, timeout, res, bus="virtio-blk", nic=False,
+                 stop_markers=()):
+    """Run QEMU until completion; returns (reason, elapsed, serial, markers).
+
+    overlays[0] is the boot disk. With bus="virtio-scsi" the disks hang off
+    one virtio-scsi controller (as on Scaleway) instead of virtio-blk.
+    Any of stop_markers on the serial console ends the session at once
+    (reason "marker"), without waiting for the guest to power off.
+    """
+    qmp_dir = Path(tempfile.mkdtemp(prefix="vmware2scw-qmp-"))
+    qmp_sock = qmp_dir / "qmp.sock"
+
+    cmd = [
+        "qemu-system-x86_64", "-enable-kvm",
+        "-m", str(res.memory_mb), "-smp", str(res.vcpus), "-cpu", "host",
+    ]
+    if res.hugepages:
+        cmd += ["-mem-path", str(HUGEPAGES_MOUNT), "-mem-prealloc"]
+    if firmware == "uefi":
+        ovmf_code, ovmf_vars_src = _ovmf_paths()
+        ovmf_vars = work_dir / "OVMF_VARS.fd"
+        shutil.copy2(str(ovmf_vars_src), str(ovmf_vars))
+        cmd += [
+            "-drive", f"if=pflash,format=raw,readonly=on,file={ovmf_code}",
+            "-drive", f"if=pflash,format=raw,file={ovmf_vars}",
+        ]
+    if bus == "virtio-scsi":
+        cmd += ["-device", "virtio-scsi-pci,id=scsi0"]
+    for i, overlay in enumerate(overlays):
+        drive = f"file={overlay},format=qcow2,if=none,id=disk{i},cache=unsafe"
+        if io_uring_supported():
+            drive += ",aio=io_uring"
+        if bus == "virtio-scsi":
+            dev = f"scsi-hd,drive=disk{i},bus=scsi0.0,channel=0,scsi-id=0,lun={i}"
+        else:
+            dev = f"virtio-blk-pci,drive=disk{i}"
+        cmd += ["-drive", drive, "-device", dev + (",bootindex=0" if i == 0 else "")]
+    if nic:
+        # DHCP from QEMU's user-mode stack; restrict=on keeps the guest off the network
+        cmd += ["-netdev", "user,id=net0,restrict=on", "-device", "virtio-net-pci,netdev=net0"]
+    for dev in devices:
+        cmd += ["-device", dev]
+    cmd += [
+        "-display", "none",
+        "-serial", f"file:{serial_log}",
+        "-qmp", f"unix:{qmp_sock},server=on,wait=off",
+        "-no-reboot",
+    ]
+
+    logger.info(f"  Starting QEMU ({firmware}, {res.memory_mb}MB, {res.vcpus} vCPU"
+                f"{', hugepages' if res.hugepages else ''}, "
+                f"upper bound {timeout}s)...")
+    start = time.time()
+    # To a file, not a pipe: nobody reads stderr until QEMU exits, and a
+    # full pipe would block it mid-boot
+    qemu_log = serial_log.with_name(f"{serial_log.stem}-qemu.log")
+    with open(qemu_log, "wb") as stderr:
+        proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=stderr)
+    qmp = None
+    reason = "timeout"
+    marker_at = None
+    powerdown_at = None
+    seen = []
+    serial_pos = 0
+    serial_text = ""
+
+    try:
+        try:
+            qmp = QMPClient(qmp_sock)
+        except OSError as e:
+            logger.warning(f"  QMP unavailable ({e}) — relying on serial marker / exit")
+
+        while True:
+            if proc.poll() is not None:
+                if reason == "timeout":
+                    reason = "exited"
+                break
+
+            events = qmp.poll_events(wait=1.0) if qmp else []
+            if not qmp:
+                time.sleep(1.0)
+            if any(e.get("event") == "SHUTDOWN" for e in events):
+                reason = "shutdown" if marker_at is None else "marker"
+                logger.info("  Guest powered off (QMP SHUTDOWN)")
+
+            if serial_log.exists():
+                with open(serial_log, "rb") as f:
+                    f.seek(serial_pos)
+                    raw = f.read()
+                serial_pos += len(raw)
+                serial_text += raw.decode("utf-8", errors="replace")
+                for m in (done_marker, *markers, *stop_markers):
+                    if m and m not in seen and m in serial_text:
+                        seen.append(m)
+                        logger.info(f"  Serial marker: {m}")
+                if marker_at is None and done_marker in seen:
+                    marker_at = time.time()
+                    reason = "marker"
+                if any(m in seen for m in stop_markers):
+                    reason = "marker"
+                    _qmp_try(qmp, "quit")
+                    if not qmp:
+                        proc.terminate()
+                    break
+
+            now = time.time()
+            if marker_at and powerdown_at is None and now - marker_at > SHUTDOWN_GRACE:
+                logger.info("  Guest did not power off after setup — sending powerdown")
+                _qmp_try(qmp, "system_powerdown")
+                powerdown_at = now
+            if powerdown_at and now - powerdown_at > 60:
+                logger.warning("  Guest ignored powerdown — quitting QEMU")
+                _qmp_try(qmp, "quit")
+                break
+            if now - start > timeout:
+                logger.warning(f"  No completion signal after {timeout}s — stopping QEMU")
+                _qmp_try(qmp, "quit")
+                break
+    finally:
+        if qmp:
+            qmp.close()
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        shutil.rmtree(qmp_dir, ignore_errors=True)
+
+    elapsed = time.time() - start
+    if proc.returncode not in (0, None) and reason == "exited":
+        logger.warning(f"  QEMU exited with code {proc.returncode}: {_log_tail(qemu_log)} "
+                       f"(full log: {qemu_log})")
+    logger.info(f"  QEMU finished in {elapsed:.0f}s ({reason})")
+    return reason, elapsed, serial_text, seen
+
+
+def _log_tail(path: Path, size: int = 500) -> str:
+    """Last size characters of a log file ("" if unreadable)."""
+    try:
+        with open(path, "rb") as f:
+            f.seek(max(0, f.seek(0, os.SEEK_END) - 4 * size))
+            return f.read().decode(errors="replace").strip()[-size:]
+    except OSError:
+        return ""
+
+
+def _qmp_try(qmp, name):
+    if qmp is None:
+        return
+    try:
+        qmp.command(name)
+    except (OSError, RuntimeError, TimeoutError, ConnectionError):
+        pass
+
+
+def commit_overlay(overlay, base):
+    """Commit overlay into base; full merge if the base refuses commits.
+
+    The merged image is written next to base (the overlay may be on
+    another device) so it can replace it atomically.
+    """
+    logger.info("  Committing overlay changes to base image...")
+    cr = subprocess.run(["qemu-img", "commit", str(overlay)], capture_output=True, text=True)
+    if cr.returncode == 0:
+        logger.info("  Overlay committed OK")
+        return
+    # Compressed base can't accept direct commit — do full merge
+    logger.info("  Direct commit failed, doing full merge...")
+    merged = Path(base).parent / f"{Path(base).stem}.merged.qcow2"
+    r = subprocess.run(["qemu-img", "convert", "-O", "qcow2", str(overlay), str(merged)],
+                       capture_output=True, text=True)
+    if r.returncode != 0:
+        raise RuntimeError(f"Overlay merge failed: {r.stderr.strip()[-500:]}")
+    os.replace(str(merged), str(base))
+    logger.info("  Full merge completed")
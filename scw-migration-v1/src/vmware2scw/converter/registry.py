@@ -0,0 +1,199 @@
+r"""Offline Windows registry editing for guest images.
+
+Edits are queued as plain (key, value) operations and applied to a hive
+file in a single pass through the hivex Python bindings. The same queue
+can be rendered as one ``.reg`` file for the virt-win-reg / hivexregedit
+fallback used when the bindings (python3-hivex, python3-guestfs) are not
+installed on the conversion host.
+
+Key paths are relative to the hive root, e.g. for the SYSTEM hive:
+``ControlSet001\Services\viostor`` or ``Setup``.
+
+Confidence: 85 — hivex is what virt-win-reg uses underneath; the
+bindings just let us skip the extra appliance launches.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import struct
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+REG_SZ = 1
+REG_EXPAND_SZ = 2
+REG_DWORD = 4
+REG_MULTI_SZ = 7
+
+SYSTEM_HIVE = "/Windows/System32/config/SYSTEM"
+
+
+def bindings_available() -> bool:
+    """True if both the libguestfs and hivex Python bindings are importable."""
+    try:
+        import guestfs  # noqa: F401
+        import hivex  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _utf16z(s: str) -> bytes:
+    return s.encode("utf-16-le") + b"\x00\x00"
+
+
+@dataclass
+class RegistryValue:
+    key: str
+    name: str
+    type: int
+    data: bytes
+
+
+class RegistryEdits:
+    """An ordered queue of registry key/value writes for one hive."""
+
+    def __init__(self):
+        self._keys: list[str] = []
+        self._values: list[RegistryValue] = []
+
+    def __len__(self) -> int:
+        return len(self._keys) + len(self._values)
+
+    def add_key(self, key: str) -> None:
+        if key not in self._keys:
+            self._keys.append(key)
+
+    def set_dword(self, key: str, name: str, value: int) -> None:
+        self._values.append(RegistryValue(key, name, REG_DWORD, struct.pack("<I", value)))
+
+    def set_sz(self, key: str, name: str, value: str) -> None:
+        self._values.append(RegistryValue(key, name, REG_SZ, _utf16z(value)))
+
+    def set_expand_sz(self, key: str, name: str, value: str) -> None:
+        self._values.append(RegistryValue(key, name, REG_EXPAND_SZ, _utf16z(value)))
+
+    def set_multi_sz(self, key: str, name: str, values: list[str]) -> None:
+        raw = b"".join(_utf16z(v) for v in values) + b"\x00\x00"
+        self._values.append(RegistryValue(key, name, REG_MULTI_SZ, raw))
+
+    # ── Rendering / applying ─────────────────────────────────────
+
+    def to_reg(self, prefix: str = "HKEY_LOCAL_MACHINE\\SYSTEM") -> str:
+        """Render the queue as a regedit 5.00 file."""
+        sections: dict[str, list[str]] = {k: [] for k in self._keys}
+        for v in self._values:
+            sections.setdefault(v.key, []).append(_render_value(v))
+
+        lines = ["Windows Registry Editor Version 5.00", ""]
+        for key, values in sections.items():
+            lines.append(f"[{prefix}\\{key}]")
+            lines.extend(values)
+            lines.append("")
+        return "\n".join(lines)
+
+    def apply(self, hive_path: str | Path) -> None:
+        """Apply all queued edits to a local hive file and commit it."""
+        import hivex
+
+        h = hivex.Hivex(str(hive_path), write=True)
+        for key in self._keys:
+            _ensure_node(h, key)
+        for v in self._values:
+            node = _ensure_node(h, v.key)
+            h.node_set_value(node, {"key": v.name, "t": v.type, "value": v.data})
+        h.commit(None)
+        logger.info(f"  Applied {len(self)} registry edit(s) to {Path(hive_path).name}")
+
+
+def _render_value(v: RegistryValue) -> str:
+    if v.type == REG_DWORD:
+        return f'"{v.name}"=dword:{struct.unpack("<I", v.data)[0]:08x}'
+    if v.type == REG_SZ:
+        text = v.data[:-2].decode("utf-16-le").replace("\\", "\\\\").replace('"', '\\"')
+        return f'"{v.name}"="{text}"'
+    return f'"{v.name}"=hex({v.type:x}):' + ",".join(f"{b:02x}" for b in v.data)
+
+
+def _ensure_node(h, key: str):
+    node = h.root()
+    for part in [p for p in key.split("\\") if p]:
+        child = h.node_get_child(node, part)
+        node = child if child else h.node_add_child(node, part)
+    return node
+
+
+def list_subkeys(hive_path: str | Path, key: str) -> list[str]:
+    """Names of the direct subkeys of key (empty if the key is missing)."""
+    import hivex
+
+    h = hivex.Hivex(str(hive_path))
+    node = h.root()
+    for part in [p for p in key.split("\\") if p]:
+        node = h.node_get_child(node, part)
+        if not node:
+            return []
+    return [h.node_name(c) for c in h.node_children(node)]
+
+
+# ═══════════════════════════════════════════════════════════════════
+#  Single-appliance guest session
+# ═══════════════════════════════════════════════════════════════════
+
+@contextmanager
+def windows_guest(disk_path: str | Path, readonly: bool = False) -> Iterator[object]:
+    """Launch one libguestfs appliance with the Windows filesystems mounted.
+
+    Everything done on the yielded handle (uploads, mkdir, hive
+    download/upload) shares that single launch.
+    """
+    import guestfs
+
+    g = guestfs.GuestFS(python_return_dict=True)
+    g.set_backend(os.environ.get("LIBGUESTFS_BACKEND", "direct"))
+    g.add_drive_opts(str(disk_path), readonly=readonly)
+    g.launch()
+    try:
+        roots = g.inspect_os()
+        if not roots:
+            raise RuntimeError(f"No operating system found in {disk_path}")
+        mountpoints = g.inspect_get_mountpoints(roots[0])
+        for mp in sorted(mountpoints, key=len):
+            if readonly:
+                g.mount_ro(mountpoints[mp], mp)
+            else:
+                g.mount(mountpoints[mp], mp)
+        yield g
+    finally:
+        try:
+            g.shutdown()
+        finally:
+            g.close()
+
+
+def edit_hive(
+    g,
+    work_dir: Path,
+    edits: RegistryEdits,
+    hive: str = SYSTEM_HIVE,
+    before_apply: Optional[Callable[[Path, RegistryEdits], None]] = None,
+) -> None:
+    """Download a hive once, apply queued edits in-process, upload it once.
+
+    before_apply(local_hive, edits) can read the hive and queue more edits
+    (e.g. per-interface DHCP keys) before anything is written.
+    """
+    remote = g.case_sensitive_path(hive)
+    local = Path(work_dir) / f"{Path(hive).name}.hive"
+    local.unlink(missing_ok=True)
+
+    g.download(remote, str(local))
+    if before_apply is not None:
+        before_apply(local, edits)
+    edits.apply(local)
+    g.upload(str(local), remote)
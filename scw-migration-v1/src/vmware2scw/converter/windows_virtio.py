@@ -2,34 +2,37 @@ r"""Inject VirtIO drivers into Windows guest image for Scaleway.
 
 v0.5.1 — Proven workflow based on extensive testing:
 
-  Phase 1 — Offline preparation (guestfish + hivex):
+  Phase 1 — Offline preparation (one libguestfs session + hivex):
     - Copy .sys files, register Services, stage driver packages
     - Set up Windows SetupPhase (CmdLine → pnputil firstboot)
     - Force DHCP, enable RDP, enable EMS serial console
 
-  Phase 2 — QEMU virtio-blk boot (pnputil):
-    - Boot Windows in QEMU with virtio-blk (-drive if=virtio)
+  Phase 2 — One QEMU boot (virtio-blk + virtio-scsi attached):
     - Windows SetupPhase runs pnputil /add-driver for ALL 3 drivers
-    - pnputil updates DriverStore + DriverDatabase
-    - VM reboots, QEMU exits
+    - vioscsi binds to the virtio-scsi controller in the same pass
+    - BIOS VMs: mbr2gpt converts the disk to GPT/UEFI in the same pass
+    - The script writes a marker to COM1 and powers off; completion is
+      detected from the serial log and the QMP SHUTDOWN event
 
-  IMPORTANT: After Phase 2, the NTFS will be dirty (Windows doesn't
-  do a clean unmount during reboot). This is FINE — the drivers are
-  already installed. Do NOT attempt further writes to the NTFS.
+  IMPORTANT: After Phase 2, the NTFS may be dirty. This is FINE — the
+  drivers are already installed. Do NOT attempt further writes to the NTFS.
 
 Key insight: Scaleway uses virtio-scsi. Phase 2 installs vioscsi
-into the DriverStore via pnputil, which is what Scaleway needs.
+into the DriverStore via pnputil and binds it, which is what Scaleway needs.
 """
 
+import hashlib
+import json
 import logging
 import os
 import re
 import shutil
 import subprocess
 import tempfile
-import time
 from pathlib import Path
 
+from vmware2scw.converter import nbd
+
 logger = logging.getLogger(__name__)
 
 GUESTFS_ENV = {**os.environ, "LIBGUESTFS_BACKEND": "direct"}
@@ -57,7 +60,7 @@ DRIVER_DEFS = {
 
 OS_SUBDIRS = ["2k22/amd64", "2k19/amd64", "2k16/amd64", "w11/amd64", "w10/amd64"]
 
-# QEMU boot timeout — Windows boot + pnputil + reboot typically takes 2-4 min
+# Upper bound for the Phase 2 boot — completion is event-driven, typically 2-4 min
 QEMU_BOOT_TIMEOUT = 900
 
 
@@ -78,37 +81,20 @@ def _run(cmd, check=True, env=None, **kw):
     return r
 
 
-def _str_to_reg_expand_sz(s):
-    raw = s.encode("utf-16-le") + b"\x00\x00"
-    return "hex(2):" + ",".join(f"{b:02x}" for b in raw)
-
-
-def _str_to_reg_multi_sz(strings):
-    raw = b""
-    for s in strings:
-        raw += s.encode("utf-16-le") + b"\x00\x00"
-    raw += b"\x00\x00"
-    return "hex(7):" + ",".join(f"{b:02x}" for b in raw)
-
-
-def _check_kvm():
-    return Path("/dev/kvm").exists()
-
-
 def ensure_prerequisites():
     """Install all required host tools."""
-    needed = []
-    for tool, pkg in [
+    from vmware2scw.utils.capabilities import get_capabilities
+
+    caps = get_capabilities()
+    needed = [pkg for tool, pkg in [
         ("guestfish", "libguestfs-tools"),
         ("hivexregedit", "libwin-hivex-perl"),
         ("qemu-system-x86_64", "qemu-system-x86"),
         ("qemu-nbd", "qemu-utils"),
         ("ntfsfix", "ntfs-3g"),
-    ]:
-        if subprocess.run(["which", tool], capture_output=True).returncode != 0:
-            needed.append(pkg)
+    ] if not caps.has_tool(tool)]
 
-    if not Path("/usr/share/OVMF/OVMF_CODE_4M.fd").exists():
+    if not caps.ovmf_code:
         needed.append("ovmf")
 
     if needed:
@@ -116,6 +102,7 @@ def ensure_prerequisites():
         subprocess.run(["apt-get", "update", "-qq"], capture_output=True)
         subprocess.run(["apt-get", "install", "-y", "-qq"] + needed,
                         capture_output=True)
+        get_capabilities(refresh=True)
 
 
 # ═══════════════════════════════════════════════════════════════════
@@ -133,42 +120,30 @@ def _fix_ntfs_dirty(qcow2_path):
     converting to uncompressed first.
     """
     logger.info("  Clearing NTFS dirty flags...")
-    subprocess.run(["modprobe", "nbd", "max_part=8"], capture_output=True)
-    subprocess.run(["qemu-nbd", "--disconnect", "/dev/nbd0"], capture_output=True)
-    time.sleep(1)
-
-    r = subprocess.run(
-        ["qemu-nbd", "--connect", "/dev/nbd0", str(qcow2_path)],
-        capture_output=True, text=True,
-    )
-    if r.returncode != 0:
-        logger.warning(f"  qemu-nbd connect failed: {r.stderr.strip()[:200]}")
-        return False
-
     fixed = False
     try:
-        time.sleep(2)  # Wait for partition table to be read
-        for i in range(1, 8):
-            part = f"/dev/nbd0p{i}"
-            if not Path(part).exists():
-                continue
-            blkid = subprocess.run(
-                ["blkid", "-o", "value", "-s", "TYPE", part],
-                capture_output=True, text=True,
-            )
-            if "ntfs" in blkid.stdout.lower():
-                r2 = subprocess.run(
-                    ["ntfsfix", "-d", part],
+        with nbd.attach(qcow2_path) as nbd_dev:
+            for i in range(1, 8):
+                part = f"{nbd_dev}p{i}"
+                if not Path(part).exists():
+                    continue
+                blkid = subprocess.run(
+                    ["blkid", "-o", "value", "-s", "TYPE", part],
                     capture_output=True, text=True,
                 )
-                if r2.returncode == 0:
-                    logger.info(f"  ntfsfix OK: {part}")
-                    fixed = True
-                else:
-                    logger.warning(f"  ntfsfix failed on {part}: {r2.stderr.strip()[:100]}")
-    finally:
-        subprocess.run(["qemu-nbd", "--disconnect", "/dev/nbd0"], capture_output=True)
-        time.sleep(1)
+                if "ntfs" in blkid.stdout.lower():
+                    r2 = subprocess.run(
+                        ["ntfsfix", "-d", part],
+                        capture_output=True, text=True,
+                    )
+                    if r2.returncode == 0:
+                        logger.info(f"  ntfsfix OK: {part}")
+                        fixed = True
+                    else:
+                        logger.warning(f"  ntfsfix failed on {part}: {r2.stderr.strip()[:100]}")
+    except RuntimeError as e:
+        logger.warning(f"  {e}")
+        return False
 
     return fixed
 
@@ -186,42 +161,95 @@ def _decompress_qcow2(qcow2_path):
 #  Driver Extraction from ISO
 # ═══════════════════════════════════════════════════════════════════
 
-def _find_driver_dir(mount_dir, drv_name, iso_dir):
+VIRTIO_CACHE_DIR = Path("/var/lib/vmware2scw/cache/virtio-win")
+
+
+def _iso_digest(iso_path, cache_root):
+    """SHA-256 of the ISO, memoised on (path, size, mtime) to avoid rehashing."""
+    st = iso_path.stat()
+    stamp = f"{iso_path.resolve()}:{st.st_size}:{st.st_mtime_ns}"
+    memo = cache_root / "iso-digests.json"
+    known = {}
+    if memo.exists():
+        try:
+            known = json.loads(memo.read_text())
+        except ValueError:
+            known = {}
+    if stamp in known:
+        return known[stamp]
+
+    h = hashlib.sha256()
+    with open(iso_path, "rb") as f:
+        for chunk in iter(lambda: f.read(8 * 1024 * 1024), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+
+    known[stamp] = digest
+    tmp = memo.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(known, indent=2))
+    os.replace(tmp, memo)
+    return digest
+
+
+def _find_driver_dir(iso, drv_name, iso_dir):
     """Find the appropriate driver directory in the virtio-win ISO."""
     for subdir in OS_SUBDIRS:
-        candidate = mount_dir / iso_dir / subdir
-        if (candidate / f"{drv_name}.sys").exists():
+        candidate = f"{iso_dir}/{subdir}"
+        if iso.find(f"{candidate}/{drv_name}.sys") is not None:
             return candidate
-    # Fallback: search recursively
-    for f in mount_dir.rglob(f"{drv_name}.sys"):
-        if "amd64" in str(f).lower():
-            return f.parent
+    # Fallback: search the whole tree
+    for dir_path, entries in iso.walk("/"):
+        if "amd64" not in dir_path.lower():
+            continue
+        if any(e.name.lower() == f"{drv_name}.sys" for e in entries):
+            return dir_path
     return None
 
 
-def _extract_drivers(iso_path, work_dir):
-    """Mount virtio-win ISO and extract all driver packages."""
-    mnt = work_dir / "virtio-iso"
-    mnt.mkdir(parents=True, exist_ok=True)
-    _run(["mount", "-o", "loop,ro", str(iso_path), str(mnt)], env=None)
+def _extract_drivers(iso_path, cache_dir=None):
+    """Extract the driver packages from the virtio-win ISO, once per ISO.
+
+    The ISO is read in-process (no loop mount, no root) and the driver
+    directories for DRIVER_DEFS are unpacked into a cache directory keyed
+    by the ISO's SHA-256. Later migrations reuse the cached packages as-is.
+    """
+    from vmware2scw.converter.iso9660 import ISO9660Image
+
+    cache_root = Path(cache_dir) if cache_dir else VIRTIO_CACHE_DIR
+    cache_root.mkdir(parents=True, exist_ok=True)
+    iso_path = Path(iso_path)
+
+    digest = _iso_digest(iso_path, cache_root)
+    target = cache_root / digest[:16]
+
+    if not target.exists():
+        logger.info(f"  Populating virtio-win driver cache ({digest[:16]})...")
+        staging = Path(tempfile.mkdtemp(prefix=".staging-", dir=cache_root))
+        try:
+            with ISO9660Image(iso_path) as iso:
+                for name, defn in DRIVER_DEFS.items():
+                    src = _find_driver_dir(iso, name, defn["iso_dir"])
+                    if not src:
+                        logger.warning(f"  {name} not found in ISO!")
+                        continue
+                    iso.extract_dir(src, staging / f"drv_{name}")
+                    logger.info(f"  Extracted {name} ({src})")
+            os.chmod(staging, 0o755)
+            try:
+                os.rename(staging, target)
+            except OSError:
+                # Another migration populated the cache concurrently
+                pass
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+    else:
+        logger.info(f"  Using cached virtio-win drivers ({digest[:16]})")
 
     drivers = {}
-    try:
-        for name, defn in DRIVER_DEFS.items():
-            src = _find_driver_dir(mnt, name, defn["iso_dir"])
-            if not src:
-                logger.warning(f"  {name} not found in ISO!")
-                continue
-            pkg_dir = work_dir / f"drv_{name}"
-            pkg_dir.mkdir(parents=True, exist_ok=True)
-            for f in src.iterdir():
-                if f.is_file():
-                    shutil.copy2(str(f), str(pkg_dir / f.name))
+    for name in DRIVER_DEFS:
+        pkg_dir = target / f"drv_{name}"
+        if (pkg_dir / f"{name}.sys").exists():
             drivers[name] = {"sys": pkg_dir / f"{name}.sys", "dir": pkg_dir}
-            logger.info(f"  Extracted {name}")
-    finally:
-        _run(["umount", str(mnt)], check=False, env=None)
-
     return drivers
 
 
@@ -229,34 +257,60 @@ def _extract_drivers(iso_path, work_dir):
 #  Registry Helpers
 # ═══════════════════════════════════════════════════════════════════
 
-def _build_services_reg(driver_names):
-    """Build .reg content for driver Service entries."""
-    lines = ["Windows Registry Editor Version 5.00", ""]
+SERVICES_KEY = "ControlSet001\\Services"
+TCPIP_INTERFACES_KEY = "ControlSet001\\Services\\Tcpip\\Parameters\\Interfaces"
+
+
+def _queue_services(edits, driver_names):
+    """Queue the Service entries for the boot-critical VirtIO drivers."""
     for name in sorted(driver_names):
         d = DRIVER_DEFS[name]
-        base = f"HKEY_LOCAL_MACHINE\\SYSTEM\\ControlSet001\\Services\\{name}"
-        lines += [
-            f"[{base}]",
-            f'"Group"="{d["Group"]}"',
-            f'"ImagePath"={_str_to_reg_expand_sz(d["ImagePath"])}',
-            f'"ErrorControl"=dword:{d["ErrorControl"]:08x}',
-            f'"Start"=dword:{d["Start"]:08x}',
-            f'"Type"=dword:{d["Type"]:08x}',
-        ]
+        base = f"{SERVICES_KEY}\\{name}"
+        edits.add_key(base)
+        edits.set_sz(base, "Group", d["Group"])
+        edits.set_expand_sz(base, "ImagePath", d["ImagePath"])
+        edits.set_dword(base, "ErrorControl", d["ErrorControl"])
+        edits.set_dword(base, "Start", d["Start"])
+        edits.set_dword(base, "Type", d["Type"])
         if "Tag" in d:
-            lines.append(f'"Tag"=dword:{d["Tag"]:08x}')
-        lines += [
-            "", f"[{base}\\Parameters]", "",
-            f"[{base}\\Parameters\\PnpInterface]",
-            '"5"=dword:00000001', "",
-            f"[{base}\\Enum]",
-            '"Count"=dword:00000000', '"NextInstance"=dword:00000000', "",
-        ]
-    return "\n".join(lines)
+            edits.set_dword(base, "Tag", d["Tag"])
+        edits.add_key(f"{base}\\Parameters")
+        edits.set_dword(f"{base}\\Parameters\\PnpInterface", "5", 1)
+        edits.set_dword(f"{base}\\Enum", "Count", 0)
+        edits.set_dword(f"{base}\\Enum", "NextInstance", 0)
 
 
+def _queue_setup_phase(edits, script="C:\\Windows\\vmware2scw-setup.cmd"):
+    """Queue SetupPhase keys so Windows runs script on next boot."""
+    edits.set_sz("Setup", "CmdLine", f"cmd.exe /c {script}")
+    edits.set_dword("Setup", "SetupType", 1)
+    edits.set_dword("Setup", "SystemSetupInProgress", 1)
+
+
+def _queue_dhcp(edits, guids):
+    """Queue keys forcing DHCP on every known TCP/IP interface."""
+    for guid in guids:
+        base = f"{TCPIP_INTERFACES_KEY}\\{guid}"
+        edits.set_dword(base, "EnableDHCP", 1)
+        edits.set_multi_sz(base, "IPAddress", ["0.0.0.0"])
+        edits.set_multi_sz(base, "SubnetMask", ["0.0.0.0"])
+        edits.set_multi_sz(base, "DefaultGateway", [])
+        edits.set_sz(base, "NameServer", "")
+
+
+def _queue_crash_control(edits):
+    """Disable BSOD auto-reboot so a failed boot stays visible."""
+    edits.set_dword("ControlSet001\\Control\\CrashControl", "AutoReboot", 0)
+
+
+# Serial console markers written by the setup script (see qemu_boot)
+SETUP_DONE_MARKER = "VMWARE2SCW-SETUP-DONE"
+UEFI_OK_MARKER = "VMWARE2SCW-UEFI-OK"
+UEFI_FAILED_MARKER = "VMWARE2SCW-UEFI-FAILED"
+
 SETUP_CMD = r"""@echo off
 echo [%date% %time%] vmware2scw Setup Phase starting... > C:\vmware2scw-setup.log
+mode COM1: BAUD=115200 PARITY=N DATA=8 STOP=1 >nul 2>&1
 
 echo [%date% %time%] Installing VirtIO drivers... >> C:\vmware2scw-setup.log
 for /d %%D in (C:\Drivers\*) do (
@@ -266,6 +320,10 @@ for /d %%D in (C:\Drivers\*) do (
     )
 )
 
+echo [%date% %time%] Binding vioscsi to the virtio-scsi controller... >> C:\vmware2scw-setup.log
+pnputil /scan-devices >> C:\vmware2scw-setup.log 2>&1
+powershell -Command "$t = 0; while ($t -lt 180) { if (Get-WmiObject Win32_PnPEntity -EA SilentlyContinue | Where-Object { $_.Service -eq 'vioscsi' -and $_.ConfigManagerErrorCode -eq 0 }) { 'vioscsi bound'; break }; Start-Sleep 5; $t += 5 }" >> C:\vmware2scw-setup.log 2>&1
+{uefi_block}
 echo [%date% %time%] Configuring DHCP... >> C:\vmware2scw-setup.log
 powershell -Command "Get-NetAdapter -EA SilentlyContinue | ForEach-Object { Set-NetIPInterface -InterfaceIndex $_.ifIndex -Dhcp Enabled -EA SilentlyContinue; Set-DnsClientServerAddress -InterfaceIndex $_.ifIndex -ResetServerAddresses -EA SilentlyContinue }" >> C:\vmware2scw-setup.log 2>&1
 
@@ -283,11 +341,37 @@ reg add "HKLM\SYSTEM\Setup" /v SetupType /t REG_DWORD /d 0 /f >> C:\vmware2scw-s
 reg add "HKLM\SYSTEM\Setup" /v SystemSetupInProgress /t REG_DWORD /d 0 /f >> C:\vmware2scw-setup.log 2>&1
 reg add "HKLM\SYSTEM\Setup" /v CmdLine /t REG_SZ /d "" /f >> C:\vmware2scw-setup.log 2>&1
 
-echo [%date% %time%] Setup complete. Rebooting... >> C:\vmware2scw-setup.log
-shutdown /r /t 10
+echo [%date% %time%] Setup complete. Powering off... >> C:\vmware2scw-setup.log
+echo {done_marker}> COM1
+shutdown /s /t 5
+"""
+
+# BIOS VMs: convert the system disk in place while Windows is running.
+# mbr2gpt creates the ESP and runs bcdboot itself (Windows 10 1703+ /
+# Server 2016+). On older releases it is missing and ensure_uefi falls
+# back to the host-side conversion in bios2uefi_windows.
+UEFI_BLOCK = r"""
+echo [%date% %time%] Converting system disk MBR to GPT (mbr2gpt)... >> C:\vmware2scw-setup.log
+mbr2gpt /validate /allowFullOS >> C:\vmware2scw-setup.log 2>&1 && mbr2gpt /convert /allowFullOS >> C:\vmware2scw-setup.log 2>&1
+if errorlevel 1 (
+    echo [%date% %time%] mbr2gpt failed >> C:\vmware2scw-setup.log
+    echo {failed}> COM1
+) else (
+    echo {ok}> COM1
+)
 """
 
 
+def _setup_script(convert_to_uefi=False):
+    """Render the first-boot script, optionally with the mbr2gpt step."""
+    block = ""
+    if convert_to_uefi:
+        block = UEFI_BLOCK.replace("{ok}", UEFI_OK_MARKER).replace("{failed}", UEFI_FAILED_MARKER)
+    return (SETUP_CMD
+            .replace("{uefi_block}", block)
+            .replace("{done_marker}", SETUP_DONE_MARKER))
+
+
 def _merge_reg(qcow2_path, reg_text, work_dir, name="reg"):
     """Merge a .reg file into the SYSTEM hive of a Windows qcow2 image."""
     reg_file = work_dir / f"{name}.reg"
@@ -326,35 +410,29 @@ def _get_interface_guids(qcow2_path):
     return []
 
 
-def _build_dhcp_reg(guids):
-    """Build .reg content to force DHCP on all interfaces."""
-    lines = ["Windows Registry Editor Version 5.00", ""]
-    for guid in guids:
-        base = (f"HKEY_LOCAL_MACHINE\\SYSTEM\\ControlSet001\\Services"
-                f"\\Tcpip\\Parameters\\Interfaces\\{guid}")
-        lines += [
-            f"[{base}]",
-            '"EnableDHCP"=dword:00000001',
-            f'"IPAddress"={_str_to_reg_multi_sz(["0.0.0.0"])}',
-            f'"SubnetMask"={_str_to_reg_multi_sz(["0.0.0.0"])}',
-            f'"DefaultGateway"={_str_to_reg_multi_sz([])}',
-            '"NameServer"=""', "",
-        ]
-    return "\n".join(lines)
-
-
 # ═══════════════════════════════════════════════════════════════════
 #  Phase 1: Offline Preparation
 # ═══════════════════════════════════════════════════════════════════
 
-def _phase1_offline(qcow2_path, virtio_iso, work_dir):
+def _phase1_offline(qcow2_path, virtio_iso, work_dir, cache_dir=None, convert_to_uefi=False):
     """Prepare the Windows image offline: drivers, registry, setup script.
 
-    All writes happen via guestfish which requires NTFS to be clean.
+    All writes happen via libguestfs which requires NTFS to be clean.
     The NTFS dirty flag is cleared via ntfsfix before any writes.
     If the qcow2 is compressed (common after virt-v2v), decompress first
     since qemu-nbd can have I/O errors on compressed images.
+
+    With the guestfs/hivex Python bindings installed, every upload and
+    all registry edits (services, SetupPhase, DHCP, CrashControl) share a
+    single appliance launch and a single SYSTEM hive download/upload.
+    Otherwise the same work is batched into one guestfish call plus one
+    .reg merge.
+
+    With convert_to_uefi the setup script also runs mbr2gpt, so the
+    BIOS → UEFI conversion happens in the same boot as pnputil.
     """
+    from vmware2scw.converter.registry import RegistryEdits, bindings_available
+
     logger.info("═══ Phase 1: Offline Preparation ═══")
 
     # Step 0: Try ntfsfix. If it fails (compressed qcow2), decompress first.
@@ -363,295 +441,162 @@ def _phase1_offline(qcow2_path, virtio_iso, work_dir):
         if not _fix_ntfs_dirty(qcow2_path):
             logger.warning("  ntfsfix still failing — trying writes anyway")
 
-    # Step 1: Extract drivers from ISO
+    # Step 1: Extract drivers from ISO (cached per ISO digest)
     logger.info("  Extracting drivers from ISO...")
-    drivers = _extract_drivers(Path(virtio_iso), work_dir)
+    drivers = _extract_drivers(Path(virtio_iso), cache_dir)
+
+    cmd_file = work_dir / "vmware2scw-setup.cmd"
+    cmd_file.write_text(_setup_script(convert_to_uefi), encoding="utf-8")
+
+    # Registry edits that don't depend on the current hive contents
+    edits = RegistryEdits()
+    _queue_services(edits, drivers.keys())
+    _queue_setup_phase(edits)
+    _queue_crash_control(edits)
+
+    if bindings_available():
+        _phase1_session(qcow2_path, drivers, cmd_file, edits, work_dir)
+    else:
+        logger.info("  guestfs/hivex Python bindings not found — using CLI tools")
+        _phase1_cli(qcow2_path, drivers, cmd_file, edits, work_dir)
+
+    logger.info("═══ Phase 1 complete ═══")
+    return drivers
+
 
-    # Step 2: Upload .sys files to System32\drivers\
+def _guest_uploads(drivers, cmd_file):
+    """(local, guest path) pairs for everything Phase 1 puts on C:."""
+    uploads = []
     for name, d in drivers.items():
-        _run(["guestfish", "-a", str(qcow2_path), "-i", "--",
-              "upload", str(d["sys"]),
-              f"/Windows/System32/drivers/{name}.sys"])
-        logger.info(f"  Uploaded {name}.sys")
-
-    # Step 3: Register Services in registry
-    logger.info("  Registering driver services...")
-    _merge_reg(qcow2_path, _build_services_reg(drivers.keys()),
-               work_dir, "services")
-
-    # Step 4: Stage full driver packages in C:\Drivers\ (for pnputil)
-    logger.info("  Staging driver packages in C:\\Drivers\\...")
+        uploads.append((d["sys"], f"/Windows/System32/drivers/{name}.sys"))
     for name, d in drivers.items():
-        gdir = f"/Drivers/{name}"
-        _run(["guestfish", "-a", str(qcow2_path), "-i", "--", "mkdir-p", gdir])
-        for f in d["dir"].iterdir():
+        for f in sorted(d["dir"].iterdir()):
             if f.is_file():
-                _run(["guestfish", "-a", str(qcow2_path), "-i", "--",
-                      "upload", str(f), f"{gdir}/{f.name}"])
-        logger.info(f"  Staged C:\\Drivers\\{name}\\")
+                uploads.append((f, f"/Drivers/{name}/{f.name}"))
+    uploads.append((cmd_file, "/Windows/vmware2scw-setup.cmd"))
+    return uploads
 
-    # Step 5: Write setup CMD script
-    logger.info("  Writing setup script...")
-    cmd_file = work_dir / "vmware2scw-setup.cmd"
-    cmd_file.write_text(SETUP_CMD, encoding="utf-8")
-    _run(["guestfish", "-a", str(qcow2_path), "-i", "--",
-          "upload", str(cmd_file), "/Windows/vmware2scw-setup.cmd"])
-
-    # Step 6: SetupPhase registry keys
-    logger.info("  Setting SetupPhase registry keys...")
-    setup_reg = (
-        "Windows Registry Editor Version 5.00\n\n"
-        "[HKEY_LOCAL_MACHINE\\SYSTEM\\Setup]\n"
-        '"CmdLine"="cmd.exe /c C:\\\\Windows\\\\vmware2scw-setup.cmd"\n'
-        '"SetupType"=dword:00000001\n'
-        '"SystemSetupInProgress"=dword:00000001\n'
-    )
-    _merge_reg(qcow2_path, setup_reg, work_dir, "setup-phase")
 
-    # Step 7: Force DHCP
-    logger.info("  Forcing DHCP...")
+def _phase1_session(qcow2_path, drivers, cmd_file, edits, work_dir):
+    """Phase 1 in one libguestfs appliance with in-process hive edits."""
+    from vmware2scw.converter.registry import edit_hive, list_subkeys, windows_guest
+
+    def _add_dhcp(hive, queued):
+        guids = list_subkeys(hive, TCPIP_INTERFACES_KEY)
+        _queue_dhcp(queued, guids)
+        logger.info(f"  DHCP forced on {len(guids)} interface(s)")
+
+    with windows_guest(qcow2_path) as g:
+        logger.info("  Uploading drivers and setup script...")
+        for name in drivers:
+            g.mkdir_p(f"/Drivers/{name}")
+        for local, remote in _guest_uploads(drivers, cmd_file):
+            g.upload(str(local), remote)
+        logger.info(f"  Staged {len(drivers)} driver(s) in C:\\Drivers\\ and System32\\drivers")
+
+        logger.info("  Editing SYSTEM hive (services, SetupPhase, DHCP)...")
+        edit_hive(g, work_dir, edits, before_apply=_add_dhcp)
+
+
+def _phase1_cli(qcow2_path, drivers, cmd_file, edits, work_dir):
+    """Phase 1 through guestfish / virt-win-reg when bindings are missing."""
+    logger.info("  Uploading drivers and setup script...")
+    gf_cmds = []
+    for name in drivers:
+        gf_cmds += ["mkdir-p", f"/Drivers/{name}", ":"]
+    for local, remote in _guest_uploads(drivers, cmd_file):
+        gf_cmds += ["upload", str(local), remote, ":"]
+    _run(["guestfish", "-a", str(qcow2_path), "-i", "--"] + gf_cmds[:-1])
+    logger.info(f"  Staged {len(drivers)} driver(s) in C:\\Drivers\\ and System32\\drivers")
+
     guids = _get_interface_guids(qcow2_path)
+    _queue_dhcp(edits, guids)
     if guids:
-        _merge_reg(qcow2_path, _build_dhcp_reg(guids), work_dir, "dhcp")
         logger.info(f"  DHCP forced on {len(guids)} interface(s)")
 
-    # Step 8: Disable BSOD auto-reboot (for debugging)
-    _merge_reg(
-        qcow2_path,
-        'Windows Registry Editor Version 5.00\n\n'
-        '[HKEY_LOCAL_MACHINE\\SYSTEM\\ControlSet001\\Control\\CrashControl]\n'
-        '"AutoReboot"=dword:00000000\n',
-        work_dir, "crash",
-    )
-
-    logger.info("═══ Phase 1 complete ═══")
-    return drivers
+    logger.info("  Merging registry edits (services, SetupPhase, DHCP)...")
+    _merge_reg(qcow2_path, edits.to_reg(), work_dir, "phase1")
 
 
 # ═══════════════════════════════════════════════════════════════════
-#  Phase 2: QEMU Headless Boot (pnputil)
+#  Phase 2: Single QEMU boot (pnputil + vioscsi PnP + optional mbr2gpt)
 # ═══════════════════════════════════════════════════════════════════
 
-def _phase2_qemu_boot(qcow2_path, work_dir, timeout=QEMU_BOOT_TIMEOUT):
-    """Boot Windows in QEMU with virtio-blk to execute pnputil.
+def _phase2_boot_session(qcow2_path, work_dir, firmware="uefi", vm_info=None,
+                         timeout=QEMU_BOOT_TIMEOUT):
+    """Boot Windows once to run the Phase 1 setup script.
 
-    The offline preparation (Phase 1) configured SetupPhase to run
-    vmware2scw-setup.cmd on first boot. This script uses pnputil to
-    install all VirtIO drivers into the Windows DriverStore.
+    The guest boots from virtio-blk (viostor is registered as a
+    boot-critical Service in Phase 1) with a virtio-scsi controller
+    attached, so pnputil's /install binds vioscsi to a real device in
+    the same pass — Scaleway only exposes virtio-scsi.
 
-    We use virtio-blk (-drive if=virtio) because viostor.sys is
-    already registered as a boot-critical Service from Phase 1.
+    firmware is "bios" for VMs that still boot from MBR: the script then
+    converts the disk with mbr2gpt before powering off.
 
-    CRITICAL: We create a qcow2 overlay on top of the base image.
-    The base image may be compressed (virt-v2v output). QEMU writes
-    to the overlay, then we commit changes back.
+    Completion comes from the serial marker and the QMP SHUTDOWN event;
+    QEMU_BOOT_TIMEOUT is only an upper bound. The guest is sized from
+    vm_info and waits in the host-resource scheduler until it fits.
 
-    After this phase, the NTFS will be dirty. This is expected and
+    After this phase, the NTFS may be dirty. This is expected and
     NOT a problem — the drivers are in the DriverStore.
+
+    Returns:
+        qemu_boot.BootResult, or None if KVM/OVMF are unavailable
     """
-    logger.info("═══ Phase 2: QEMU virtio-blk boot (pnputil) ═══")
+    from vmware2scw.converter.qemu_boot import boot_available, boot_until_complete
+
+    logger.info("═══ Phase 2: QEMU boot (pnputil + virtio-scsi PnP) ═══")
+    if not boot_available(firmware):
+        return None
+
+    result = boot_until_complete(
+        qcow2_path, Path(work_dir),
+        done_marker=SETUP_DONE_MARKER,
+        markers=(UEFI_OK_MARKER, UEFI_FAILED_MARKER),
+        firmware=firmware,
+        devices=("virtio-scsi-pci,id=scsi0",),
+        timeout=timeout,
+        vm_info=vm_info,
+    )
 
-    ovmf_code = Path("/usr/share/OVMF/OVMF_CODE_4M.fd")
-    ovmf_vars_src = Path("/usr/share/OVMF/OVMF_VARS_4M.fd")
+    if result.saw(SETUP_DONE_MARKER):
+        logger.info("  ✓ pnputil driver installation confirmed!")
+    else:
+        logger.warning(f"  Setup script did not report completion ({result.reason})")
+        _log_setup_log(qcow2_path, work_dir)
+    if result.saw(UEFI_FAILED_MARKER):
+        logger.warning("  mbr2gpt failed in guest — host-side UEFI conversion will be used")
+    return result
 
-    if not ovmf_code.exists():
-        logger.error("  OVMF not installed!")
-        return False
-    if not _check_kvm():
-        logger.error("  /dev/kvm not available — cannot boot QEMU")
-        return False
 
-    logger.info("  KVM: available")
-
-    # Create writable overlay (handles compressed qcow2)
-    overlay = work_dir / "qemu-overlay.qcow2"
-    overlay.unlink(missing_ok=True)
-    _run(["qemu-img", "create", "-f", "qcow2",
-          "-b", str(Path(qcow2_path).resolve()), "-F", "qcow2",
-          str(overlay)], env=None)
-
-    ovmf_vars = work_dir / "OVMF_VARS.fd"
-    shutil.copy2(str(ovmf_vars_src), str(ovmf_vars))
-
-    cmd = [
-        "qemu-system-x86_64", "-enable-kvm",
-        "-m", "4096", "-smp", "2", "-cpu", "host",
-        "-drive", f"if=pflash,format=raw,readonly=on,file={ovmf_code}",
-        "-drive", f"if=pflash,format=raw,file={ovmf_vars}",
-        "-drive", f"file={overlay},format=qcow2,if=virtio",
-        "-display", "none",
-        "-serial", "none",
-        "-no-reboot",
-    ]
-
-    logger.info(f"  Starting QEMU (timeout={timeout}s)...")
-    logger.info("  Windows will boot → SetupPhase → pnputil → reboot → QEMU exits")
-
-    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    timed_out = False
-    try:
-        proc.communicate(timeout=timeout)
-        logger.info(f"  QEMU exited with code {proc.returncode}")
-    except subprocess.TimeoutExpired:
-        logger.warning(f"  QEMU timed out after {timeout}s — killing")
-        proc.kill()
-        proc.wait()
-        timed_out = True
-
-    # Commit overlay to base image
-    logger.info("  Committing overlay changes to base image...")
-    cr = subprocess.run(
-        ["qemu-img", "commit", str(overlay)],
-        capture_output=True, text=True,
-    )
-    if cr.returncode == 0:
-        logger.info("  Overlay committed OK")
-    else:
-        # Compressed base can't accept direct commit — do full merge
-        logger.info("  Direct commit failed, doing full merge...")
-        merged = work_dir / "merged.qcow2"
-        _run(["qemu-img", "convert", "-O", "qcow2",
-              str(overlay), str(merged)], env=None)
-        shutil.move(str(merged), str(qcow2_path))
-        logger.info("  Full merge completed")
-
-    overlay.unlink(missing_ok=True)
-
-    # Verify: check setup log (read-only — NTFS may be dirty, that's fine)
-    logger.info("  Checking setup log...")
-    log_local = work_dir / "setup.log"
+def _log_setup_log(qcow2_path, work_dir):
+    """Dump C:\\vmware2scw-setup.log for diagnosis (read-only)."""
+    log_local = Path(work_dir) / "setup.log"
     r = _run(
         ["guestfish", "--ro", "-a", str(qcow2_path), "-i", "--",
          "download", "/vmware2scw-setup.log", str(log_local)],
         check=False,
     )
-
     if r.returncode == 0 and log_local.exists():
         text = log_local.read_text(encoding="utf-8", errors="replace")
         logger.info("  Setup log contents:")
         for line in text.strip().split("\n"):
             logger.info(f"    {line}")
-
-        if "Setup complete" in text:
-            logger.info("  ✓ pnputil driver installation confirmed!")
-            return True
-        else:
-            logger.warning("  Setup log exists but incomplete")
-            return False
     else:
-        if timed_out:
-            logger.warning("  QEMU timed out and no setup log found")
-        else:
-            logger.warning("  No setup log found")
-        return False
-
-
-# ═══════════════════════════════════════════════════════════════════
-#  Phase 3: Dual QEMU boot (virtio-blk + virtio-scsi PnP binding)
-# ═══════════════════════════════════════════════════════════════════
-
-PHASE3_TIMEOUT = 600  # 10 minutes — Windows needs to boot + PnP + shutdown
-
-def _phase3_dual_boot(qcow2_path, work_dir, timeout=PHASE3_TIMEOUT):
-    """Boot with both virtio-blk (boot) and virtio-scsi (PnP detection).
-
-    After Phase 2, vioscsi is in the Windows DriverStore but not bound
-    to any PCI device (because Phase 2 used virtio-blk only).
-
-    Scaleway uses virtio-scsi. Windows needs to see the virtio-scsi PCI
-    device to bind vioscsi from the DriverStore. We boot with BOTH
-    controllers so Windows can:
-      1. Boot via virtio-blk (viostor)
-      2. Detect the virtio-scsi PCI device
-      3. Auto-install vioscsi from DriverStore (PnP)
-
-    After this, the image can boot with virtio-scsi only (Scaleway).
-
-    We inject a small firstboot script to do a clean shutdown after
-    giving PnP enough time to complete the binding.
-    """
-    logger.info("═══ Phase 3: Dual boot (virtio-scsi PnP binding) ═══")
-
-    ovmf_code = Path("/usr/share/OVMF/OVMF_CODE_4M.fd")
-    ovmf_vars_src = Path("/usr/share/OVMF/OVMF_VARS_4M.fd")
-
-    if not ovmf_code.exists():
-        logger.error("  OVMF not installed!")
-        return False
-    if not _check_kvm():
-        logger.error("  /dev/kvm not available")
-        return False
-
-    work_dir = Path(work_dir)
-
-    # Create writable overlay
-    overlay = work_dir / "phase3-overlay.qcow2"
-    overlay.unlink(missing_ok=True)
-    _run(["qemu-img", "create", "-f", "qcow2",
-          "-b", str(Path(qcow2_path).resolve()), "-F", "qcow2",
-          str(overlay)], env=None)
-
-    ovmf_vars = work_dir / "OVMF_VARS_phase3.fd"
-    shutil.copy2(str(ovmf_vars_src), str(ovmf_vars))
-
-    # Boot with virtio-blk (boot disk) + virtio-scsi device (for PnP)
-    cmd = [
-        "qemu-system-x86_64", "-enable-kvm",
-        "-m", "4096", "-smp", "2", "-cpu", "host",
-        "-drive", f"if=pflash,format=raw,readonly=on,file={ovmf_code}",
-        "-drive", f"if=pflash,format=raw,file={ovmf_vars}",
-        "-drive", f"file={overlay},format=qcow2,if=virtio",
-        "-device", "virtio-scsi-pci,id=scsi0",
-        "-display", "none",
-        "-serial", "none",
-        "-no-reboot",
-    ]
-
-    logger.info(f"  Starting QEMU dual (virtio-blk + virtio-scsi), timeout={timeout}s")
-    logger.info("  Windows boots via virtio-blk, PnP detects virtio-scsi, binds vioscsi")
-
-    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    try:
-        proc.communicate(timeout=timeout)
-        logger.info(f"  QEMU exited with code {proc.returncode}")
-    except subprocess.TimeoutExpired:
-        # Timeout is expected — Windows boots to login and stays there.
-        # PnP binding happens within the first 2-3 minutes.
-        logger.info(f"  QEMU timeout after {timeout}s (expected — PnP binding done)")
-        proc.kill()
-        proc.wait()
-
-    # Commit overlay
-    logger.info("  Committing overlay changes...")
-    cr = subprocess.run(
-        ["qemu-img", "commit", str(overlay)],
-        capture_output=True, text=True,
-    )
-    if cr.returncode == 0:
-        logger.info("  Overlay committed OK")
-    else:
-        logger.info("  Direct commit failed, doing full merge...")
-        merged = work_dir / "merged-phase3.qcow2"
-        _run(["qemu-img", "convert", "-O", "qcow2",
-              str(overlay), str(merged)], env=None)
-        shutil.move(str(merged), str(qcow2_path))
-        logger.info("  Full merge completed")
-
-    overlay.unlink(missing_ok=True)
-
-    logger.info("═══ Phase 3 complete — vioscsi PnP binding done ═══")
-    return True
+        logger.warning("  No setup log found")
 
 
 # ═══════════════════════════════════════════════════════════════════
 #  Main Entry Point
 # ═══════════════════════════════════════════════════════════════════
 
-def ensure_all_virtio_drivers(qcow2_path, virtio_iso, work_dir=None):
+def ensure_all_virtio_drivers(qcow2_path, virtio_iso, work_dir=None, cache_dir=None, vm_info=None):
     """Install VirtIO drivers in a Windows qcow2 image.
 
     This is the main entry point called by the migration pipeline.
-    Runs Phase 1 (offline prep) + Phase 2 (QEMU pnputil boot).
+    Runs Phase 1 (offline prep) + Phase 2 (one QEMU boot: pnputil and
+    vioscsi binding).
 
     After successful completion, the image has all 3 VirtIO drivers
     (viostor, vioscsi, netkvm) in the Windows DriverStore and is
@@ -661,6 +606,8 @@ def ensure_all_virtio_drivers(qcow2_path, virtio_iso, work_dir=None):
         qcow2_path: Path to the Windows qcow2 image
         virtio_iso: Path to the virtio-win ISO
         work_dir: Working directory (auto-created if None)
+        cache_dir: virtio-win driver cache (defaults to VIRTIO_CACHE_DIR)
+        vm_info: source VM info dict (sizes the QEMU guest)
 
     Raises:
         RuntimeError: If Phase 2 fails (manual DISM needed)
@@ -677,12 +624,12 @@ def ensure_all_virtio_drivers(qcow2_path, virtio_iso, work_dir=None):
     logger.info("╚══════════════════════════════════════════════════╝")
 
     # Phase 1: Offline preparation (guestfish writes)
-    _phase1_offline(qcow2_path, virtio_iso, work_dir)
+    _phase1_offline(qcow2_path, virtio_iso, work_dir, cache_dir=cache_dir)
 
-    # Phase 2: QEMU headless boot (pnputil)
-    phase2_ok = _phase2_qemu_boot(qcow2_path, work_dir)
+    # Phase 2: single QEMU boot (pnputil + virtio-scsi PnP)
+    result = _phase2_boot_session(qcow2_path, work_dir, vm_info=vm_info)
 
-    if phase2_ok:
+    if result is not None and result.saw(SETUP_DONE_MARKER):
         logger.info("╔══════════════════════════════════════════════════╗")
         logger.info("║  ✓ VirtIO drivers installed successfully        ║")
         logger.info("║  Image ready for Scaleway (virtio-scsi)         ║")
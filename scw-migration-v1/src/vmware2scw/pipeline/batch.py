@@ -0,0 +1,171 @@
+"""Batch migrations: many VMs through shared, bounded stage pools.
+
+Every VM runs its own per-disk task graph (see MigrationPipeline), but
+all pipelines of a batch share one set of ResourcePools:
+
+  vcenter:<host> / esxi:<host>  exports (vCenter and ESXi NFC limits; one
+                                vcenter pool per source vCenter, so a plan
+                                naming VMs "<vcenter>/<vm>" exports from
+                                every vCenter at once)
+  convert / guest               qemu-img, libguestfs appliances, QEMU boots
+  upload                        S3 bandwidth
+  import                        Scaleway API (snapshot imports, images)
+
+VMs are started in BatchMigrationPlan.sorted_by_priority() order and
+admitted by the work_dir space budget (pipeline/workspace.py): a VM
+starts when its estimated peak footprint fits next to those already
+running, and each one hands space back as its VMDKs and qcow2s are
+deleted. migration.batch_vms_in_flight only caps the count. Each pool
+hands free slots to the highest-priority waiting VM. The result is a
+pipeline across VMs: VM N+1 exports while VM N converts and VM N-1
+uploads.
+
+Per-VM results are persisted in the state store as a batch record after
+every VM, so running the same batch again (--batch-id) skips VMs that
+already succeeded and resumes the ones that failed.
+
+Confidence: 80 — pool sizes are config-driven; the right values depend
+on the vCenter, the conversion host and the uplink.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Optional
+
+from vmware2scw.config import AppConfig, BatchMigrationPlan, VMMigrationPlan
+from vmware2scw.pipeline.migration import MigrationPipeline, MigrationResult
+from vmware2scw.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class BatchResult:
+    """Outcome of a batch run."""
+    batch_id: str
+    results: list[MigrationResult] = field(default_factory=list)
+    duration: str = ""
+
+    @property
+    def succeeded(self) -> list[MigrationResult]:
+        return [r for r in self.results if r.success]
+
+    @property
+    def failed(self) -> list[MigrationResult]:
+        return [r for r in self.results if not r.success]
+
+
+class BatchMigrationRunner:
+    """Runs a BatchMigrationPlan with stage-level worker pools.
+
+    Args:
+        config: application config (pool sizes from config.migration)
+    """
+
+    def __init__(self, config: AppConfig):
+        self.config = config
+        self.pools = MigrationPipeline.default_pools(config)
+        self.pipeline = MigrationPipeline(config, pools=self.pools)
+        self.state_store = self.pipeline.state_store
+        self._lock = threading.Lock()
+
+    def run(self, batch: BatchMigrationPlan, batch_id: Optional[str] = None) -> BatchResult:
+        """Migrate every VM of the batch.
+
+        Args:
+            batch: plan; VMs start in priority order
+            batch_id: re-run an earlier batch: VMs that succeeded are
+                skipped, failed ones are resumed from their state
+
+        Returns:
+            BatchResult, with results in priority order
+        """
+        batch_id = batch_id or str(uuid.uuid4())[:8]
+        record = self.state_store.load_batch(batch_id) or {
+            "batch_id": batch_id,
+            "started_at": datetime.now().isoformat(),
+            "vms": {},
+        }
+        plans = batch.sorted_by_priority()
+        if not plans:
+            logger.warning(f"Batch {batch_id}: no VMs to migrate")
+            return BatchResult(batch_id, [], "0s")
+        start_time = time.time()
+        workers = min(self.config.migration.batch_vms_in_flight, len(plans))
+
+        logger.info(f"[bold]Batch {batch_id}[/bold]: {len(plans)} VM(s), "
+                    f"up to {workers} in flight, pools: "
+                    + ", ".join(f"{n}={v}" for n, v in self.pools.limits.items()))
+
+        results: list[Optional[MigrationResult]] = [None] * len(plans)
+
+        def migrate(index: int, plan: VMMigrationPlan) -> None:
+            results[index] = self._migrate_one(index, plan, record, batch_id)
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch-vm") as pool:
+            # Submission order is admission order: the pool's queue is FIFO
+            futures = [pool.submit(migrate, i, plan) for i, plan in enumerate(plans)]
+            for f in futures:
+                f.result()
+
+        elapsed = time.time() - start_time
+        result = BatchResult(batch_id, [r for r in results if r is not None], f"{elapsed:.0f}s")
+        with self._lock:
+            record["finished_at"] = datetime.now().isoformat()
+            self.state_store.save_batch(batch_id, record)
+        logger.info(f"[bold]Batch {batch_id} finished in {elapsed:.0f}s[/bold]: "
+                    f"{len(result.succeeded)} succeeded, {len(result.failed)} failed")
+        return result
+
+    def _migrate_one(self, index: int, plan: VMMigrationPlan, record: dict,
+                     batch_id: str) -> MigrationResult:
+        previous = record["vms"].get(plan.vm_name)
+        if previous and previous.get("success"):
+            logger.info(f"[dim]{plan.vm_name}: already migrated in batch {batch_id} "
+                        f"({previous.get('migration_id')}) — skipping[/dim]")
+            return MigrationResult(**{k: previous.get(k) for k in (
+                "success", "migration_id", "vm_name", "instance_id", "image_id",
+                "duration", "failed_stage", "error")},
+                completed_stages=previous.get("completed_stages", []))
+
+        # The batch position is the scheduling priority: ties in
+        # plan.priority keep their order in the plan file
+        migration_id = (previous or {}).get("migration_id") or ""
+        try:
+            if migration_id and self.state_store.load(migration_id):
+                logger.info(f"{plan.vm_name}: resuming migration {migration_id}")
+                result = self.pipeline.resume(migration_id, priority=index)
+            else:
+                migration_id = str(uuid.uuid4())[:8]
+                # Recorded before starting so a crashed batch resumes it
+                with self._lock:
+                    record["vms"][plan.vm_name] = {"migration_id": migration_id, "success": False,
+                                                   "vm_name": plan.vm_name, "error": "in progress"}
+                    self.state_store.save_batch(batch_id, record)
+                result = self.pipeline.run(plan.model_copy(update={"priority": index}),
+                                           migration_id=migration_id)
+        except Exception as e:
+            logger.error(f"[red]{plan.vm_name}: {e}[/red]")
+            result = MigrationResult(
+                success=False,
+                migration_id=migration_id,
+                vm_name=plan.vm_name,
+                error=str(e),
+            )
+
+        with self._lock:
+            record["vms"][plan.vm_name] = {
+                **asdict(result),
+                "priority": plan.priority,
+                "finished_at": datetime.now().isoformat(),
+            }
+            self.state_store.save_batch(batch_id, record)
+        status = "[green]✓[/green]" if result.success else f"[red]✗ {result.failed_stage}[/red]"
+        logger.info(f"{status} {plan.vm_name} ({result.migration_id}, {result.duration})")
+        return result
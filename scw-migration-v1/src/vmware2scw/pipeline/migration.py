@@ -10,7 +10,10 @@ from pathlib import Path
 from typing import Optional
 
 from vmware2scw.config import AppConfig, VMMigrationPlan
+from vmware2scw.pipeline.dag import ResourcePools, TaskFailedError, TaskGraph
 from vmware2scw.pipeline.state import MigrationState, MigrationStateStore
+from vmware2scw.pipeline.placement import Placement
+from vmware2scw.pipeline.workspace import WorkspaceFullError, estimate_footprint
 from vmware2scw.utils.logging import get_logger
 
 logger = get_logger(__name__)
@@ -33,19 +36,27 @@ class MigrationResult:
 class MigrationPipeline:
     """Orchestrates the full VMware → Scaleway migration pipeline.
 
-    Stages (executed in order):
+    Stages:
     1. validate       — Pre-flight compatibility checks
     2. snapshot       — Create VMware snapshot for consistency
     3. export         — Export VMDK disks from VMware
-    4. clean_tools    — Remove VMware tools from guest
-    5. inject_virtio  — Inject VirtIO drivers for KVM
-    6. convert        — Convert VMDK → qcow2
+    4. convert        — Convert VMDK → qcow2 (per disk)
+    5. clean_tools    — Remove VMware tools from guest (boot disk)
+    6. inject_virtio  — Inject VirtIO drivers for KVM (boot disk)
     7. fix_bootloader — Adapt bootloader for KVM (fstab, GRUB, initramfs)
-    8. fix_network    — Adapt network configuration
-    9. upload_s3      — Upload qcow2 to Scaleway Object Storage
-    10. import_scw    — Import image into Scaleway (snapshot → image)
-    11. verify        — Post-migration health checks
-    12. cleanup       — Remove temporary files, snapshots
+    8. ensure_uefi    — Convert BIOS → UEFI if needed
+    9. fix_network    — Adapt network configuration
+    10. smoke_test    — Boot the final image under QEMU/KVM (virtio-scsi, OVMF)
+    11. upload_s3     — Upload qcow2 to Scaleway Object Storage (per disk)
+    12. import_scw    — Import into a Scaleway snapshot (per disk)
+    13. create_image  — Create the image from the boot + data snapshots
+    14. verify        — Post-migration health checks
+    15. cleanup       — Remove temporary files, snapshots
+
+    They run as a per-disk dependency graph (pipeline/dag.py), not as a
+    flat list: each data disk goes convert → upload → import as soon as it
+    is exported, while the boot disk is in the guest stages; create_image
+    waits only on the snapshots.
 
     Each stage is idempotent and can be resumed after failure.
 
@@ -53,6 +64,7 @@ class MigrationPipeline:
     confidence varies (see DESIGN.md for details).
     """
 
+    # Nominal order; the actual schedule comes from _build_graph()
     STAGES = [
         "validate",
         "snapshot",
@@ -63,27 +75,69 @@ class MigrationPipeline:
         "fix_bootloader",
         "ensure_uefi",       # Convert BIOS→UEFI if needed (after bootloader fix)
         "fix_network",
+        "smoke_test",        # Boot the final image locally before spending time on upload/import
         "upload_s3",
         "import_scw",
+        "create_image",
         "verify",
         "cleanup",
     ]
+    # Run once per disk as "<stage>[i]"; the stage counts as completed
+    # when all its disks are. Disk 0 is the boot disk.
+    DISK_STAGES = ("convert", "upload_s3", "import_scw")
+    # Modify the guest OS on the boot disk only, one after the other
+    GUEST_STAGES = ("clean_tools", "inject_virtio", "fix_bootloader", "ensure_uefi", "fix_network")
+    # Workspace component (pipeline/workspace.py) whose files are gone
+    # once the task is done
+    RELEASES = {"convert": "vmdk", "reclaim": "qcow2", "smoke_test": "scratch"}
+
+    def __init__(self, config: AppConfig, pools: Optional[ResourcePools] = None):
+        from vmware2scw.converter.host_resources import configure_scheduler
+        from vmware2scw.utils.capabilities import get_capabilities
 
-    def __init__(self, config: AppConfig):
         self.config = config
         self.state_store = MigrationStateStore(config.conversion.work_dir)
-
-    def run(self, plan: VMMigrationPlan) -> MigrationResult:
+        # Task concurrency per resource class; a batch runner passes pools
+        # shared by all its pipelines
+        self.pools = pools or self.default_pools(config)
+        # QEMU conversion boots from every pipeline in this process share one budget
+        configure_scheduler(config.conversion)
+        # ... and the scratch tiers with their space budgets
+        self.placement = Placement(config.conversion)
+        # Probe host tools once per worker (cached on disk across runs)
+        get_capabilities(config.conversion.cache_dir)
+
+    @staticmethod
+    def default_pools(config: AppConfig) -> ResourcePools:
+        """Task pools sized from config.migration.
+
+        export is bounded per vCenter and per ESXi host, convert and guest
+        by host CPU / appliance capacity, upload by bandwidth and import
+        by the Scaleway API.
+        """
+        m = config.migration
+        return ResourcePools({
+            "vcenter:*": m.parallel_exports,
+            "esxi:*": m.exports_per_host,
+            "convert": m.parallel_converts,
+            "guest": m.parallel_guest_ops,
+            "upload": m.parallel_uploads,
+            "import": m.parallel_imports,
+            # Per-vCenter overrides
+            **{f"vcenter:{s.vcenter}": s.parallel_exports for s in config.sources() if s.parallel_exports},
+        })
+
+    def run(self, plan: VMMigrationPlan, migration_id: Optional[str] = None) -> MigrationResult:
         """Execute a full migration for a single VM.
 
         Args:
             plan: Migration plan with VM name, target type, etc.
+            migration_id: ID to use (default: a new random one)
 
         Returns:
             MigrationResult with success status and details
         """
-        migration_id = str(uuid.uuid4())[:8]
-        start_time = time.time()
+        migration_id = migration_id or str(uuid.uuid4())[:8]
 
         state = MigrationState(
             migration_id=migration_id,
@@ -99,52 +153,9 @@ class MigrationPipeline:
 
         logger.info(f"[bold]Starting migration {migration_id}[/bold]: "
                      f"{plan.vm_name} → {plan.target_type} ({plan.zone})")
+        return self._run_graph(plan, state)
 
-        stages_to_run = self.STAGES
-        if plan.skip_validation:
-            stages_to_run = [s for s in stages_to_run if s != "validate"]
-
-        for stage_name in stages_to_run:
-            state.current_stage = stage_name
-            self.state_store.save(state)
-
-            logger.info(f"[cyan]▶ Stage: {stage_name}[/cyan]")
-            try:
-                self._execute_stage(stage_name, plan, state)
-                state.completed_stages.append(stage_name)
-                self.state_store.save(state)
-                logger.info(f"[green]✓ Stage {stage_name} complete[/green]")
-
-            except Exception as e:
-                elapsed = time.time() - start_time
-                state.error = str(e)
-                self.state_store.save(state)
-
-                logger.error(f"[red]✗ Stage {stage_name} failed: {e}[/red]")
-                return MigrationResult(
-                    success=False,
-                    migration_id=migration_id,
-                    vm_name=plan.vm_name,
-                    failed_stage=stage_name,
-                    error=str(e),
-                    duration=f"{elapsed:.0f}s",
-                    completed_stages=list(state.completed_stages),
-                )
-
-        elapsed = time.time() - start_time
-        logger.info(f"[bold green]Migration {migration_id} complete in {elapsed:.0f}s[/bold green]")
-
-        return MigrationResult(
-            success=True,
-            migration_id=migration_id,
-            vm_name=plan.vm_name,
-            instance_id=state.artifacts.get("scaleway_instance_id"),
-            image_id=state.artifacts.get("scaleway_image_id"),
-            duration=f"{elapsed:.0f}s",
-            completed_stages=list(state.completed_stages),
-        )
-
-    def resume(self, migration_id: str) -> MigrationResult:
+    def resume(self, migration_id: str, priority: Optional[int] = None) -> MigrationResult:
         """Resume a failed migration from the last successful stage."""
         state = self.state_store.load(migration_id)
         if not state:
@@ -158,70 +169,219 @@ class MigrationPipeline:
             target_type=state.target_type,
             zone=state.zone,
         )
+        if priority is not None:
+            plan.priority = priority
+        state.error = None
+        return self._run_graph(plan, state, resumed=True)
 
-        # Find remaining stages
-        remaining = [s for s in self.STAGES if s not in state.completed_stages]
-        if not remaining:
-            return MigrationResult(
-                success=True,
-                migration_id=migration_id,
-                vm_name=state.vm_name,
-                completed_stages=list(state.completed_stages),
-            )
+    def dry_run(self, plan: VMMigrationPlan) -> None:
+        """Simulate a migration without executing any stages."""
+        logger.info(f"[yellow]DRY RUN for VM '{plan.vm_name}'[/yellow]")
+        logger.info(f"Target: {plan.target_type} in {plan.zone}")
+        logger.info(f"Tasks that would execute (example with 2 disks):")
+        from vmware2scw.vmware.sources import SourceSet, split_qualified
+
+        state = MigrationState(migration_id="dry-run", vm_name=plan.vm_name)
+        sources = SourceSet.from_config(self.config)
+        label, name = split_qualified(plan.vm_name, sources.sources)
+        state.artifacts["source"] = {"vcenter": label or sources.default.label, "vm": name}
+        graph = self._build_graph(plan, state, num_disks=2)
+        for i, name in enumerate(graph.order(), 1):
+            task = graph.tasks[name]
+            after = f" [dim](after {', '.join(task.deps)})[/dim]" if task.deps else ""
+            if plan.skip_validation and name == "validate":
+                logger.info(f"  {i}. {name} [dim](skipped)[/dim]")
+            else:
+                logger.info(f"  {i}. {name}{after}")
+
+    # ─── Task graph ──────────────────────────────────────────────────
+
+    def _build_graph(self, plan: VMMigrationPlan, state: MigrationState, num_disks: int) -> TaskGraph:
+        """Per-disk dependency graph of the migration.
 
+        Data disks go export → convert → upload → import on their own while
+        the boot disk goes through the guest stages and the smoke test;
+        create_image waits only on the imported snapshots.
+        """
+        graph = TaskGraph(priority=plan.priority)
+        disks = range(num_disks)
+        source, _ = self._source(plan, state)
+        export_pools = [f"vcenter:{source.vcenter}"]
+        host = state.artifacts.get("vm_info", {}).get("host")
+        if host:
+            export_pools.append(f"esxi:{host}")
+
+        def stage(name: str, disk: Optional[int] = None):
+            return lambda: self._execute_stage(name, plan, state, disk)
+
+        def on_disk_exported(i: int, path: Path) -> None:
+            if i >= num_disks:
+                raise RuntimeError(f"Export produced more than the {num_disks} disk(s) expected")
+            with state.lock:
+                vmdk_paths = state.artifacts.setdefault("vmdk_paths", [None] * num_disks)
+                vmdk_paths[i] = str(path)
+            graph.complete(f"export[{i}]")
+
+        graph.add("validate", stage("validate"))
+        graph.add("snapshot", stage("snapshot"), deps=["validate"])
+        graph.add("export", lambda: self._stage_export(plan, state, on_disk_exported),
+                  deps=["snapshot"], pool=export_pools)
+        for i in disks:
+            graph.milestone(f"export[{i}]", owner="export")
+            graph.add(f"convert[{i}]", stage("convert", i), deps=[f"export[{i}]"], pool="convert")
+
+        previous = "convert[0]"
+        for name in self.GUEST_STAGES:
+            graph.add(name, stage(name), deps=[previous], pool="guest")
+            previous = name
+        # The smoke boot attaches the data disks too
+        graph.add("smoke_test", stage("smoke_test"),
+                  deps=[previous, *(f"convert[{i}]" for i in disks)], pool="guest")
+
+        for i in disks:
+            graph.add(f"upload_s3[{i}]", stage("upload_s3", i),
+                      deps=["smoke_test" if i == 0 else f"convert[{i}]"], pool="upload")
+            graph.add(f"import_scw[{i}]", stage("import_scw", i), deps=[f"upload_s3[{i}]"], pool="import")
+            # The local qcow2 is dead weight once S3 holds it and the smoke
+            # test (which attaches every disk) is over
+            graph.add(f"reclaim[{i}]", lambda i=i: self._reclaim_disk(state, i),
+                      deps=[f"upload_s3[{i}]", "smoke_test"])
+        graph.add("create_image", stage("create_image"),
+                  deps=[f"import_scw[{i}]" for i in disks], pool="import")
+        graph.add("verify", stage("verify"), deps=["create_image"])
+        graph.add("cleanup", stage("cleanup"), deps=["verify", *(f"reclaim[{i}]" for i in disks)])
+        return graph
+
+    def _num_disks(self, plan: VMMigrationPlan, state: MigrationState) -> int:
+        """Disk count from earlier stages, else from the vCenter inventory."""
+        known = state.artifacts.get("vmdk_paths") or state.artifacts.get("vm_info", {}).get("disks")
+        if known:
+            return len(known)
+
+        # skip_validation: validate didn't record vm_info — fetch it now
+        from vmware2scw.vmware.inventory import VMInventory
+
+        source, vm_name = self._source(plan, state)
+        vm_info = self._vsphere(source).run(lambda client: VMInventory(client).get_vm_info(vm_name))
+        state.artifacts["vm_info"] = vm_info.model_dump()
+        self.state_store.save(state)
+        return len(vm_info.disks)
+
+    def _done_tasks(self, state: MigrationState, graph: TaskGraph, num_disks: int) -> set[str]:
+        """Tasks already completed, including states written by older
+        versions that only recorded whole stages."""
+        done = set(state.completed_stages) | set(state.artifacts.get("completed_tasks", []))
+        for stage_name in ("export", *self.DISK_STAGES):
+            if stage_name in done:
+                done.update(f"{stage_name}[{i}]" for i in range(num_disks))
+        return done & set(graph.tasks)
+
+    def _run_graph(self, plan: VMMigrationPlan, state: MigrationState, resumed: bool = False) -> MigrationResult:
         start_time = time.time()
-        state.error = None
+        # Where a failure outside the graph's tasks is reported
+        failed_stage = "validate"
+        try:
+            return self._run_graph_tasks(plan, state, resumed, start_time)
+        except TaskFailedError as e:
+            failed_stage, error = e.task, e.error
+        except WorkspaceFullError as e:
+            failed_stage, error = "workspace", e
+        except Exception as e:
+            error = e
+
+        elapsed = time.time() - start_time
+        state.error = str(error)
+        self.state_store.save(state)
+
+        logger.error(f"[red]✗ Stage {failed_stage} failed: {error}[/red]")
+        return MigrationResult(
+            success=False,
+            migration_id=state.migration_id,
+            vm_name=plan.vm_name,
+            failed_stage=failed_stage,
+            error=str(error),
+            duration=f"{elapsed:.0f}s",
+            completed_stages=list(state.completed_stages),
+        )
+
+    def _run_graph_tasks(self, plan: VMMigrationPlan, state: MigrationState, resumed: bool,
+                         start_time: float) -> MigrationResult:
+        """Build and run the graph; failures are raised for _run_graph().
+
+        Resolving the VM and counting its disks (before any task) fail as
+        the "validate" stage.
 
-        for stage_name in remaining:
-            state.current_stage = stage_name
+        Raises:
+            TaskFailedError: a task of the graph failed
+            WorkspaceFullError: the footprint can never fit the workspace
+        """
+        graph = self._build_graph(plan, state, self._num_disks(plan, state))
+        num_disks = sum(1 for name in graph.tasks if name.startswith("convert["))
+        done = self._done_tasks(state, graph, num_disks)
+        if plan.skip_validation:
+            done.add("validate")
+        footprint = estimate_footprint(state.artifacts.get("vm_info", {}), done,
+                                       self.config.conversion.stream_data_disks)
+        reservation = None
+
+        running: set[str] = set()
+        suffix = " (resumed)" if resumed else ""
+
+        def on_start(name: str) -> None:
+            logger.info(f"[cyan]▶ Stage: {name}[/cyan]{suffix}")
+            with state.lock:
+                running.add(name)
+                state.current_stage = ", ".join(sorted(running))
             self.state_store.save(state)
 
-            logger.info(f"[cyan]▶ Stage: {stage_name}[/cyan] (resumed)")
-            try:
-                self._execute_stage(stage_name, plan, state)
-                state.completed_stages.append(stage_name)
-                self.state_store.save(state)
-                logger.info(f"[green]✓ Stage {stage_name} complete[/green]")
+        def on_done(name: str) -> None:
+            with state.lock:
+                running.discard(name)
+                state.current_stage = ", ".join(sorted(running))
+                stage_name = name.split("[", 1)[0]
+                if stage_name != name:
+                    tasks = state.artifacts.setdefault("completed_tasks", [])
+                    tasks.append(name)
+                    if stage_name in self.DISK_STAGES and all(
+                            f"{stage_name}[{i}]" in tasks for i in range(num_disks)):
+                        state.completed_stages.append(stage_name)
+                else:
+                    state.completed_stages.append(name)
+            self.state_store.save(state)
+            component = self.RELEASES.get(stage_name)
+            if component and reservation is not None:
+                # "convert[1]" → "vmdk[1]"
+                reservation.release(component + name[len(stage_name):])
+            logger.info(f"[green]✓ Stage {name} complete[/green]")
 
-            except Exception as e:
-                state.error = str(e)
-                self.state_store.save(state)
-                elapsed = time.time() - start_time
-
-                return MigrationResult(
-                    success=False,
-                    migration_id=migration_id,
-                    vm_name=state.vm_name,
-                    failed_stage=stage_name,
-                    error=str(e),
-                    duration=f"{elapsed:.0f}s",
-                    completed_stages=list(state.completed_stages),
-                )
+        try:
+            # Held until the migration ends; shrinks as files are deleted
+            with self.placement.running(state), self.placement.workspace(state).admit(
+                    plan.vm_name, self.placement.path(state, "vmdk"), footprint,
+                    plan.priority) as reservation:
+                graph.run(done=done, on_done=on_done, on_start=on_start, pools=self.pools)
+        except OSError as e:
+            # Scratch tier unusable (mkdir / statvfs)
+            raise TaskFailedError("workspace", e) from e
 
         elapsed = time.time() - start_time
+        state.current_stage = ""
+        self.state_store.save(state)
+        logger.info(f"[bold green]Migration {state.migration_id} complete in {elapsed:.0f}s[/bold green]")
+
         return MigrationResult(
             success=True,
-            migration_id=migration_id,
-            vm_name=state.vm_name,
+            migration_id=state.migration_id,
+            vm_name=plan.vm_name,
             instance_id=state.artifacts.get("scaleway_instance_id"),
             image_id=state.artifacts.get("scaleway_image_id"),
             duration=f"{elapsed:.0f}s",
             completed_stages=list(state.completed_stages),
         )
 
-    def dry_run(self, plan: VMMigrationPlan) -> None:
-        """Simulate a migration without executing any stages."""
-        logger.info(f"[yellow]DRY RUN for VM '{plan.vm_name}'[/yellow]")
-        logger.info(f"Target: {plan.target_type} in {plan.zone}")
-        logger.info(f"Stages that would execute:")
-        for i, stage in enumerate(self.STAGES, 1):
-            if plan.skip_validation and stage == "validate":
-                logger.info(f"  {i}. {stage} [dim](skipped)[/dim]")
-            else:
-                logger.info(f"  {i}. {stage}")
-
-    def _execute_stage(self, stage: str, plan: VMMigrationPlan, state: MigrationState) -> None:
-        """Execute a single pipeline stage.
+    def _execute_stage(self, stage: str, plan: VMMigrationPlan, state: MigrationState,
+                       disk: Optional[int] = None) -> None:
+        """Execute a single pipeline stage (for one disk of a per-disk stage).
 
         Each stage method updates state.artifacts with any intermediate
         results (file paths, IDs, etc.) for use by subsequent stages.
@@ -229,28 +389,22 @@ class MigrationPipeline:
         handler = getattr(self, f"_stage_{stage}", None)
         if handler is None:
             raise NotImplementedError(f"Stage '{stage}' not implemented yet")
-        handler(plan, state)
+        if disk is None:
+            handler(plan, state)
+        else:
+            handler(plan, state, disk)
 
     # ─── Stage implementations ───────────────────────────────────────
 
     def _stage_validate(self, plan: VMMigrationPlan, state: MigrationState) -> None:
         """Pre-flight validation: check VM compatibility with target type."""
         from vmware2scw.pipeline.validator import MigrationValidator
-        from vmware2scw.vmware.client import VSphereClient
         from vmware2scw.vmware.inventory import VMInventory
 
-        client = VSphereClient()
-        pw = self.config.vmware.password.get_secret_value() if self.config.vmware.password else ""
-        client.connect(
-            self.config.vmware.vcenter,
-            self.config.vmware.username,
-            pw,
-            insecure=self.config.vmware.insecure,
-        )
-
-        inv = VMInventory(client)
-        vm_info = inv.get_vm_info(plan.vm_name)
-        state.artifacts["vm_info"] = vm_info.model_dump()
+        source, vm_name = self._source(plan, state)
+        vm_info = self._vsphere(source).run(lambda client: VMInventory(client).get_vm_info(vm_name))
+        with state.lock:
+            state.artifacts["vm_info"] = vm_info.model_dump()
 
         # Log VM characteristics for debugging
         firmware = vm_info.firmware if hasattr(vm_info, 'firmware') else 'unknown'
@@ -263,11 +417,9 @@ class MigrationPipeline:
         else:
             logger.info("  Source VM uses BIOS firmware (will convert to UEFI for Scaleway)")
 
-        validator = MigrationValidator()
+        validator = MigrationValidator(catalog=self._instance_catalog(plan.zone))
         report = validator.validate(vm_info, plan.target_type)
 
-        client.disconnect()
-
         if not report.passed:
             failures = [c for c in report.checks if not c.passed and c.blocking]
             msg = "; ".join(f"{c.name}: {c.message}" for c in failures)
@@ -275,47 +427,42 @@ class MigrationPipeline:
 
     def _stage_snapshot(self, plan: VMMigrationPlan, state: MigrationState) -> None:
         """Create a VMware snapshot for consistent export."""
-        from vmware2scw.vmware.client import VSphereClient
         from vmware2scw.vmware.snapshot import SnapshotManager
 
-        client = VSphereClient()
-        pw = self.config.vmware.password.get_secret_value() if self.config.vmware.password else ""
-        client.connect(
-            self.config.vmware.vcenter,
-            self.config.vmware.username,
-            pw,
-            insecure=self.config.vmware.insecure,
-        )
-
-        snap_mgr = SnapshotManager(client)
         snap_name = f"vmware2scw-{state.migration_id}"
-        snap_mgr.create_migration_snapshot(plan.vm_name, snap_name)
-        state.artifacts["snapshot_name"] = snap_name
+        source, vm_name = self._source(plan, state)
+        with self._vsphere(source).session() as client:
+            SnapshotManager(client).create_migration_snapshot(vm_name, snap_name)
+        with state.lock:
+            state.artifacts["snapshot_name"] = snap_name
 
-        client.disconnect()
+    def _stage_export(self, plan: VMMigrationPlan, state: MigrationState, on_disk_exported=None) -> None:
+        """Export VMDK disks from VMware.
 
-    def _stage_export(self, plan: VMMigrationPlan, state: MigrationState) -> None:
-        """Export VMDK disks from VMware."""
-        from vmware2scw.vmware.client import VSphereClient
+        on_disk_exported(index, path) fires per disk so its conversion can
+        start while the other disks are still downloading.
+        """
         from vmware2scw.vmware.export import VMExporter
 
-        work_dir = self.config.conversion.work_dir / state.migration_id
-        work_dir.mkdir(parents=True, exist_ok=True)
-
-        client = VSphereClient()
-        pw = self.config.vmware.password.get_secret_value() if self.config.vmware.password else ""
-        client.connect(
-            self.config.vmware.vcenter,
-            self.config.vmware.username,
-            pw,
-            insecure=self.config.vmware.insecure,
-        )
-
-        exporter = VMExporter(client)
-        vmdk_paths = exporter.export_vm_disks(plan.vm_name, work_dir)
-        state.artifacts["vmdk_paths"] = [str(p) for p in vmdk_paths]
-
-        client.disconnect()
+        work_dir = self.placement.path(state, "vmdk")
+
+        # Disks a crashed run already exported: convert may have deleted
+        # their VMDK since, and the workspace reservation no longer counts it
+        completed = set(state.artifacts.get("completed_tasks", []))
+        exported = {i for i in range(len(state.artifacts.get("vmdk_paths") or []))
+                    if f"export[{i}]" in completed}
+
+        # The session is held for the whole NFC lease (keepalive via lease progress)
+        source, vm_name = self._source(plan, state)
+        with self._vsphere(source).session() as client:
+            vmdk_paths = VMExporter(client).export_vm_disks(vm_name, work_dir,
+                                                            on_disk_exported=on_disk_exported,
+                                                            skip=exported)
+        expected = len(state.artifacts.get("vmdk_paths") or vmdk_paths)
+        if len(vmdk_paths) != expected:
+            raise RuntimeError(f"Exported {len(vmdk_paths)} disk(s), expected {expected}")
+        with state.lock:
+            state.artifacts["vmdk_paths"] = [str(p) for p in vmdk_paths]
 
     def _stage_clean_tools(self, plan: VMMigrationPlan, state: MigrationState) -> None:
         """Clean VMware tools from converted qcow2 disks.
@@ -357,7 +504,8 @@ class MigrationPipeline:
         import shutil
         import subprocess
         from vmware2scw.scaleway.mapping import ResourceMapper
-        from vmware2scw.utils.subprocess import run_command, check_tool_available
+        from vmware2scw.utils.capabilities import get_capabilities
+        from vmware2scw.utils.subprocess import run_command
 
         mapper = ResourceMapper()
         vm_info_dict = state.artifacts.get("vm_info", {})
@@ -378,8 +526,9 @@ class MigrationPipeline:
         # - virt-v2v runs next for PCI device binding (required for boot).
         #   virt-v2v preserves our staged files but its output is NOT writable
         #   (NTFS dirty flag from virt-v2v's internal modifications).
-        # - Phase 2 boots the virt-v2v output in QEMU (virtio-blk).
-        #   Windows runs pnputil to install all drivers into DriverStore.
+        # - Phase 2 boots the virt-v2v output in QEMU exactly once
+        #   (virtio-blk + virtio-scsi). Windows runs pnputil, binds vioscsi
+        #   and, for BIOS VMs, converts the disk with mbr2gpt.
         #   QEMU writes directly to the qcow2 — NTFS dirty is fine.
         if os_family == "windows":
             virtio_iso = self.config.conversion.virtio_win_iso
@@ -393,90 +542,105 @@ class MigrationPipeline:
 
             self._ensure_rhsrvany()
 
+            # BIOS guests get converted to UEFI inside the Phase 2 boot
+            convert_to_uefi = vm_info_dict.get("firmware", "bios") != "efi"
+
             # Step 1: Phase 1 — offline prep on ORIGINAL writable qcow2
             logger.info("Windows Step 1/3: Offline driver staging (Phase 1)...")
-            from vmware2scw.converter.windows_virtio import _phase1_offline, _phase2_qemu_boot, ensure_prerequisites
-            import tempfile
+            from vmware2scw.converter.windows_virtio import (
+                UEFI_OK_MARKER, _phase1_offline, _phase2_boot_session, ensure_prerequisites,
+            )
             ensure_prerequisites()
-            p1_work = boot_disk.parent / "virtio-phase1"
+            p1_work = self.placement.path(state, "guest", "virtio-phase1")
             p1_work.mkdir(parents=True, exist_ok=True)
-            _phase1_offline(str(boot_disk), str(virtio_iso), p1_work)
+            _phase1_offline(str(boot_disk), str(virtio_iso), p1_work,
+                            cache_dir=self.config.conversion.cache_dir / "virtio-win",
+                            convert_to_uefi=convert_to_uefi)
 
             # Step 2: virt-v2v — PCI device binding
             logger.info("Windows Step 2/3: virt-v2v (PCI device binding)...")
             env = {"LIBGUESTFS_BACKEND": "direct", "VIRTIO_WIN": str(virtio_iso)}
-            out_dir = boot_disk.parent / "v2v-out"
-            out_dir.mkdir(parents=True, exist_ok=True)
-            v2v_name = f"v2v-{boot_disk.stem}"
-
-            v2v_ok = False
-            for i, cmd in enumerate([
-                ["virt-v2v", "-i", "disk", str(boot_disk),
-                 "-o", "qemu", "-os", str(out_dir),
-                 "-on", v2v_name, "-of", "qcow2", "-oc", "qcow2"],
-                ["virt-v2v", "-i", "disk", str(boot_disk),
-                 "-o", "local", "-os", str(out_dir),
-                 "-on", v2v_name, "-of", "qcow2"],
-            ], 1):
-                logger.info(f"  Trying virt-v2v syntax {i}/2...")
-                try:
-                    run_command(cmd, env=env, timeout=3600)
-                    v2v_ok = True
-                    logger.info(f"  virt-v2v syntax {i} succeeded")
-                    break
-                except Exception as e:
-                    logger.warning(f"  virt-v2v syntax {i} failed: {e}")
-                    for f in out_dir.iterdir():
-                        f.unlink(missing_ok=True)
-
-            if not v2v_ok:
-                raise RuntimeError("virt-v2v failed — cannot prepare Windows for KVM")
-
-            # Find virt-v2v output and replace boot disk
-            candidates = sorted(
-                [f for f in out_dir.iterdir()
-                 if f.is_file() and f.stat().st_size > 1024 * 1024
-                 and f.suffix not in ('.xml', '.sh')],
-                key=lambda f: f.stat().st_size, reverse=True,
-            )
-            if not candidates:
-                raise RuntimeError(f"virt-v2v produced no output in {out_dir}")
-
-            converted = candidates[0]
-            logger.info(f"  virt-v2v output: {converted.name} ({converted.stat().st_size / (1024**3):.1f} GB)")
-
-            boot_disk.unlink(missing_ok=True)
-            import shutil as _shutil
-            _shutil.move(str(converted), str(boot_disk))
-            _shutil.rmtree(out_dir, ignore_errors=True)
-            state.artifacts["qcow2_paths"][0] = str(boot_disk)
-            logger.info("  virt-v2v complete — boot disk replaced")
-
-            # Step 3: Phase 2 — QEMU boot for pnputil
-            logger.info("Windows Step 3/4: QEMU virtio-blk boot (pnputil driver installation)...")
-            p2_work = boot_disk.parent / "virtio-phase2"
+            in_place = (self.config.conversion.v2v_in_place
+                        and self._virt_v2v_in_place(boot_disk, env, self.placement.path(state, "overlay")))
+            if not in_place:
+                out_dir = self.placement.path(state, "v2v", "v2v-out")
+                out_dir.mkdir(parents=True, exist_ok=True)
+                v2v_name = f"v2v-{boot_disk.stem}"
+
+                v2v_syntaxes = [
+                    cmd for cmd in (
+                        ["virt-v2v", "-i", "disk", str(boot_disk),
+                         "-o", "qemu", "-os", str(out_dir),
+                         "-on", v2v_name, "-of", "qcow2", "-oc", "qcow2"],
+                        ["virt-v2v", "-i", "disk", str(boot_disk),
+                         "-o", "local", "-os", str(out_dir),
+                         "-on", v2v_name, "-of", "qcow2"],
+                    ) if get_capabilities().v2v_supports(cmd)
+                ]
+
+                v2v_ok = False
+                for i, cmd in enumerate(v2v_syntaxes, 1):
+                    logger.info(f"  Trying virt-v2v syntax {i}/{len(v2v_syntaxes)}...")
+                    try:
+                        run_command(cmd, env=env, timeout=3600)
+                        v2v_ok = True
+                        logger.info(f"  virt-v2v syntax {i} succeeded")
+                        break
+                    except Exception as e:
+                        logger.warning(f"  virt-v2v syntax {i} failed: {e}")
+                        for f in out_dir.iterdir():
+                            f.unlink(missing_ok=True)
+
+                if not v2v_ok:
+                    raise RuntimeError("virt-v2v failed — cannot prepare Windows for KVM")
+
+                # Find virt-v2v output and replace boot disk
+                candidates = sorted(
+                    [f for f in out_dir.iterdir()
+                     if f.is_file() and f.stat().st_size > 1024 * 1024
+                     and f.suffix not in ('.xml', '.sh')],
+                    key=lambda f: f.stat().st_size, reverse=True,
+                )
+                if not candidates:
+                    raise RuntimeError(f"virt-v2v produced no output in {out_dir}")
+
+                converted = candidates[0]
+                logger.info(f"  virt-v2v output: {converted.name} ({converted.stat().st_size / (1024**3):.1f} GB)")
+
+                boot_disk.unlink(missing_ok=True)
+                import shutil as _shutil
+                _shutil.move(str(converted), str(boot_disk))
+                _shutil.rmtree(out_dir, ignore_errors=True)
+                with state.lock:
+                    state.artifacts["qcow2_paths"][0] = str(boot_disk)
+                logger.info("  virt-v2v complete — boot disk replaced")
+
+            # Step 3: Phase 2 — one QEMU boot for pnputil, vioscsi binding
+            # and (BIOS VMs) mbr2gpt
+            logger.info("Windows Step 3/3: QEMU boot (pnputil + virtio-scsi PnP binding)...")
+            p2_work = self.placement.path(state, "guest", "virtio-phase2")
             p2_work.mkdir(parents=True, exist_ok=True)
-            phase2_ok = _phase2_qemu_boot(str(boot_disk), p2_work)
-
-            if not phase2_ok:
-                logger.warning("Phase 2 QEMU boot may have timed out — checking if drivers installed anyway")
-
-            # Step 4: Phase 3 — QEMU dual boot (virtio-blk + virtio-scsi PnP binding)
-            # Scaleway uses virtio-scsi. Phase 2 installed vioscsi in DriverStore,
-            # but Windows needs to see the virtio-scsi PCI device to bind the driver.
-            # We boot with BOTH controllers: virtio-blk (to boot) + virtio-scsi (for PnP).
-            # Windows auto-detects virtio-scsi and binds vioscsi from DriverStore.
-            logger.info("Windows Step 4/4: QEMU dual boot (virtio-scsi PnP binding)...")
-            from vmware2scw.converter.windows_virtio import _phase3_dual_boot
-            p3_work = boot_disk.parent / "virtio-phase3"
-            p3_work.mkdir(parents=True, exist_ok=True)
-            _phase3_dual_boot(str(boot_disk), p3_work)
+            result = _phase2_boot_session(
+                str(boot_disk), p2_work,
+                firmware="bios" if convert_to_uefi else "uefi",
+                vm_info=vm_info_dict,
+            )
+
+            if result is None or not result.completed:
+                logger.warning("Phase 2 QEMU boot did not report completion — drivers may be missing")
+            if result is not None and result.saw(UEFI_OK_MARKER):
+                with state.lock:
+                    state.artifacts["windows_uefi_converted"] = True
+                logger.info("  BIOS → UEFI conversion done in-guest (mbr2gpt)")
 
             return
 
         # ──── Linux: use virt-v2v ────
+        caps = get_capabilities()
+        if not caps.has_tool("virt-v2v"):
             logger.warning("virt-v2v not installed — using virt-customize fallback")
-            self._inject_virtio_fallback(boot_disk, os_family)
+            self._inject_virtio_fallback(boot_disk, os_family, vm_info_dict,
+                                         work_dir=self.placement.path(state, "guest", "virtio-work"))
             return
 
         # Setup environment
@@ -498,8 +662,16 @@ class MigrationPipeline:
             # Ensure rhsrvany.exe is installed (required by virt-v2v on Ubuntu/Debian)
             self._ensure_rhsrvany()
 
+        # In-place conversion: no output copy, no full-disk move
+        if self.config.conversion.v2v_in_place and self._virt_v2v_in_place(
+                boot_disk, env, self.placement.path(state, "overlay")):
+            if os_family == "linux":
+                self._restore_fstab(boot_disk)
+            logger.info("virt-v2v in-place conversion complete")
+            return
+
         # Output directory
-        out_dir = boot_disk.parent / "v2v-out"
+        out_dir = self.placement.path(state, "v2v", "v2v-out")
         out_dir.mkdir(parents=True, exist_ok=True)
         v2v_name = f"v2v-{boot_disk.stem}"
 
@@ -520,6 +692,9 @@ class MigrationPipeline:
              "-on", v2v_name, "-of", "qcow2"],
         ]
 
+        # Only try syntaxes this virt-v2v build accepts (probed once per worker)
+        v2v_syntaxes = [cmd for cmd in v2v_syntaxes if caps.v2v_supports(cmd)]
+
         v2v_ok = False
         for i, cmd in enumerate(v2v_syntaxes, 1):
             logger.info(f"Trying virt-v2v syntax {i}/{len(v2v_syntaxes)}...")
@@ -535,7 +710,8 @@ class MigrationPipeline:
 
         if not v2v_ok:
             logger.warning("All virt-v2v syntaxes failed — using virt-customize fallback")
-            self._inject_virtio_fallback(boot_disk, os_family)
+            self._inject_virtio_fallback(boot_disk, os_family, vm_info_dict,
+                                         work_dir=self.placement.path(state, "guest", "virtio-work"))
             return
 
         # Find the virt-v2v output (named <v2v_name>-sda or similar)
@@ -553,15 +729,7 @@ class MigrationPipeline:
 
         # Linux: restore original fstab (virt-v2v overrides UUIDs with /dev/sda*)
         if os_family == "linux":
-            logger.info("Restoring original fstab (virt-v2v may have replaced UUIDs)...")
-            try:
-                run_command([
-                    "virt-customize", "-a", str(converted),
-                    "--run-command",
-                    "if [ -f /etc/fstab.augsave ]; then cp /etc/fstab.augsave /etc/fstab; echo Restored; fi",
-                ], env={"LIBGUESTFS_BACKEND": "direct"})
-            except Exception as e:
-                logger.warning(f"fstab restore failed (non-critical): {e}")
+            self._restore_fstab(converted)
 
         # Ensure output is qcow2
         import json as _json
@@ -592,23 +760,15 @@ class MigrationPipeline:
         """
         import os
         import subprocess
-        import time
+
+        from vmware2scw.converter import nbd
 
         logger.info("Checking/fixing NTFS dirty flag (Fast Startup / Hibernation)...")
         gf_env = {**os.environ, "LIBGUESTFS_BACKEND": "direct"}
 
         # Method 1: qemu-nbd + ntfsfix (most reliable)
-        nbd_dev = "/dev/nbd0"
-        subprocess.run(["modprobe", "nbd", "max_part=8"], capture_output=True)
-        subprocess.run(["qemu-nbd", "--disconnect", nbd_dev], capture_output=True)
-
-        r = subprocess.run(
-            ["qemu-nbd", "--connect", nbd_dev, str(qcow2_path)],
-            capture_output=True, text=True,
-        )
-        if r.returncode == 0:
-            try:
-                time.sleep(1)
+        try:
+            with nbd.attach(qcow2_path) as nbd_dev:
                 for i in range(1, 8):
                     part = f"{nbd_dev}p{i}"
                     if not os.path.exists(part):
@@ -627,10 +787,8 @@ class MigrationPipeline:
                             logger.info(f"  ntfsfix succeeded on {part}")
                         else:
                             logger.warning(f"  ntfsfix on {part}: {fix_r.stderr.strip()[:200]}")
-            finally:
-                subprocess.run(["qemu-nbd", "--disconnect", nbd_dev], capture_output=True)
-        else:
-            logger.warning(f"  qemu-nbd not available: {r.stderr.strip()[:200]}")
+        except RuntimeError as e:
+            logger.warning(f"  qemu-nbd not available: {e}")
 
         # Method 2: Disable Fast Startup via hivex
         try:
@@ -663,7 +821,7 @@ class MigrationPipeline:
         except Exception as e:
             logger.debug(f"  Fast Startup disable attempt: {e}")
 
-    def _inject_virtio_fallback(self, boot_disk, os_family):
+    def _inject_virtio_fallback(self, boot_disk, os_family, vm_info=None, work_dir=None):
         """Fallback VirtIO injection when virt-v2v fails."""
         if os_family == "windows":
             # Use offline driver injection (registry + sys files) for Windows
@@ -679,7 +837,9 @@ class MigrationPipeline:
             inject_virtio_windows(
                 str(boot_disk),
                 str(virtio_iso),
-                work_dir=boot_disk.parent / "virtio-work",
+                work_dir=work_dir or boot_disk.parent / "virtio-work",
+                cache_dir=self.config.conversion.cache_dir / "virtio-win",
+                vm_info=vm_info,
             )
         else:
             from vmware2scw.converter.disk import VirtIOInjector
@@ -688,6 +848,67 @@ class MigrationPipeline:
             )
             injector.inject(str(boot_disk), os_family=os_family)
 
+    def _restore_fstab(self, disk_path):
+        """Restore the original fstab (virt-v2v overrides UUIDs with /dev/sda*)."""
+        from vmware2scw.utils.subprocess import run_command
+
+        logger.info("Restoring original fstab (virt-v2v may have replaced UUIDs)...")
+        try:
+            run_command([
+                "virt-customize", "-a", str(disk_path),
+                "--run-command",
+                "if [ -f /etc/fstab.augsave ]; then cp /etc/fstab.augsave /etc/fstab; echo Restored; fi",
+            ], env={"LIBGUESTFS_BACKEND": "direct"})
+        except Exception as e:
+            logger.warning(f"fstab restore failed (non-critical): {e}")
+
+    def _virt_v2v_in_place(self, boot_disk: Path, env: dict[str, str],
+                           scratch: Optional[Path] = None) -> bool:
+        """Convert boot_disk in place with virt-v2v-in-place.
+
+        virt-v2v writes into a qcow2 checkpoint overlay backed by the boot
+        disk, and the overlay is committed only if the conversion succeeds,
+        so a failed run leaves the original untouched and the caller can
+        fall back to the output-directory syntaxes.
+
+        Returns False (without side effects) if virt-v2v-in-place is not
+        installed or the conversion fails. The overlay goes to scratch
+        (default: next to the boot disk).
+        """
+        import json as _json
+
+        from vmware2scw.converter.qemu_boot import commit_overlay
+        from vmware2scw.utils.capabilities import get_capabilities
+        from vmware2scw.utils.subprocess import run_command
+
+        if not get_capabilities().virt_v2v_in_place:
+            return False
+
+        info = run_command(["qemu-img", "info", "--output=json", str(boot_disk)], capture_output=True)
+        fmt = _json.loads(info.stdout).get("format", "raw")
+
+        checkpoint = (scratch or boot_disk.parent) / f"{boot_disk.stem}.v2v-checkpoint.qcow2"
+        checkpoint.unlink(missing_ok=True)
+        run_command([
+            "qemu-img", "create", "-f", "qcow2",
+            "-b", str(boot_disk.resolve()), "-F", fmt, str(checkpoint),
+        ], capture_output=True)
+
+        logger.info("Running virt-v2v-in-place on a checkpoint overlay...")
+        try:
+            run_command(
+                ["virt-v2v-in-place", "-i", "disk", "-if", "qcow2", str(checkpoint)],
+                env=env, timeout=3600,
+            )
+        except Exception as e:
+            logger.warning(f"virt-v2v-in-place failed, original disk untouched: {e}")
+            checkpoint.unlink(missing_ok=True)
+            return False
+
+        commit_overlay(checkpoint, boot_disk)
+        checkpoint.unlink(missing_ok=True)
+        return True
+
     def _ensure_rhsrvany(self):
         """Ensure rhsrvany.exe is installed for Windows virt-v2v conversions.
 
@@ -736,13 +957,16 @@ class MigrationPipeline:
         finally:
             tmp_rpm.unlink(missing_ok=True)
 
-    def _stage_convert(self, plan: VMMigrationPlan, state: MigrationState) -> None:
-        """Convert VMDK disks to qcow2 format."""
+    def _stage_convert(self, plan: VMMigrationPlan, state: MigrationState, disk: int) -> None:
+        """Convert one VMDK disk to qcow2 format."""
         from vmware2scw.converter.disk import DiskConverter
         from vmware2scw.scaleway.mapping import ResourceMapper
+        from vmware2scw.utils.capabilities import get_capabilities
 
         converter = DiskConverter()
-        qcow2_paths = []
+        vmdk_paths = state.artifacts.get("vmdk_paths", [])
+        vmdk = Path(vmdk_paths[disk])
+        qcow2_path = vmdk.with_suffix(".qcow2")
 
         # Determine OS family for compression decision
         mapper = ResourceMapper()
@@ -757,32 +981,90 @@ class MigrationPipeline:
             compress = False
             logger.info("Windows VM: disabling qcow2 compression (required for ntfsfix/qemu-nbd)")
 
-        for vmdk_path in state.artifacts.get("vmdk_paths", []):
-            vmdk = Path(vmdk_path)
-            qcow2_path = vmdk.with_suffix(".qcow2")
+        # Data disks aren't touched by later stages: stream them into S3
+        # while converting instead of writing a local qcow2 first
+        stream = self.config.conversion.stream_data_disks and disk > 0
+        if stream and not get_capabilities().has_tool("qemu-nbd"):
+            logger.warning("stream_data_disks needs qemu-nbd — converting data disks locally")
+            stream = False
 
+        if stream:
+            self._stream_data_disk(vmdk, qcow2_path, state, converter)
+        elif qcow2_path.exists() and converter.check(qcow2_path):
             # Skip if already converted and valid
-            if qcow2_path.exists() and converter.check(qcow2_path):
-                logger.info(f"Skipping conversion (already exists): {qcow2_path.name}")
-                qcow2_paths.append(str(qcow2_path))
-                continue
-
+            logger.info(f"Skipping conversion (already exists): {qcow2_path.name}")
+        else:
             converter.convert(
                 vmdk,
                 qcow2_path,
                 compress=compress,
             )
-            qcow2_paths.append(str(qcow2_path))
 
-        state.artifacts["qcow2_paths"] = qcow2_paths
+        with state.lock:
+            qcow2_paths = state.artifacts.setdefault("qcow2_paths", [None] * len(vmdk_paths))
+            qcow2_paths[disk] = str(qcow2_path)
+        self.state_store.save(state)
+
+        # Free disk space: delete the VMDK source file after successful conversion
+        if vmdk.exists():
+            size_mb = vmdk.stat().st_size / (1024**2)
+            vmdk.unlink()
+            logger.info(f"Deleted source VMDK: {vmdk.name} ({size_mb:.0f} MB freed)")
+
+    def _reclaim_disk(self, state: MigrationState, disk: int) -> None:
+        """Delete one disk's local qcow2 once its upload is done.
 
-        # Free disk space: delete VMDK source files after successful conversion
-        for vmdk_path in state.artifacts.get("vmdk_paths", []):
-            vmdk = Path(vmdk_path)
-            if vmdk.exists():
-                size_mb = vmdk.stat().st_size / (1024**2)
-                vmdk.unlink()
-                logger.info(f"Deleted source VMDK: {vmdk.name} ({size_mb:.0f} MB freed)")
+        upload_s3 completes only when every part's ETag is acknowledged
+        (or the existing object matched the image's checksum), so S3 now
+        holds the image; freeing it here rather than in cleanup lets the
+        next migration in. Kept with conversion.cleanup_on_success: false.
+        """
+        qcow2_paths = state.artifacts.get("qcow2_paths", [])
+        path = qcow2_paths[disk] if disk < len(qcow2_paths) else None
+        if not path or not self.config.conversion.cleanup_on_success:
+            return
+        qcow2 = Path(path)
+        if qcow2.exists():
+            size_mb = qcow2.stat().st_size / (1024**2)
+            qcow2.unlink()
+            logger.info(f"Deleted uploaded qcow2: {qcow2.name} ({size_mb:.0f} MB freed)")
+
+    def _stream_data_disk(self, vmdk: Path, qcow2_path: Path, state: MigrationState, converter) -> None:
+        """Convert one data disk directly into its S3 transit object.
+
+        The qcow2 never exists locally; upload_s3 finds the ledger marked
+        streamed/completed and only records the key.
+        """
+        from vmware2scw.converter.qcow2_stream import stream_convert
+
+        key = f"migrations/{state.migration_id}/{qcow2_path.name}"
+        with state.lock:
+            ledger = state.artifacts.setdefault("s3_uploads", {}).setdefault(key, {})
+        if ledger.get("streamed") and ledger.get("completed"):
+            logger.info(f"Skipping conversion (already streamed to S3): {key}")
+            return
+
+        s3 = self._s3_client()
+        bucket = self.config.scaleway.s3_bucket
+        s3.create_bucket_if_not_exists(bucket)
+        fmt = converter.get_info(vmdk).get("format", "vmdk")
+
+        writers = []
+
+        def open_sink(layout):
+            writers.append(s3.open_stream_upload(
+                bucket, key, layout.image_size, ledger,
+                checkpoint=lambda: self.state_store.save(state), lock=state.lock,
+            ))
+            return writers[0]
+
+        try:
+            stream_convert(vmdk, fmt, open_sink)
+            writers[0].close()
+        except Exception:
+            if writers:
+                writers[0].abort()
+            raise
 
     def _stage_fix_bootloader(self, plan: VMMigrationPlan, state: MigrationState) -> None:
         """Fix bootloader for KVM: fstab device names, GRUB config, initramfs.
@@ -918,6 +1200,10 @@ class MigrationPipeline:
 
         boot_disk = qcow2_paths[0]
 
+        if state.artifacts.get("windows_uefi_converted"):
+            logger.info("Windows disk converted to UEFI during inject_virtio — skipping")
+            return
+
         # If virt-v2v succeeded (inject_virtio didn't fall back), disk should already be OK
         # Check anyway to be sure
         boot_type = detect_boot_type(boot_disk)
@@ -932,7 +1218,8 @@ class MigrationPipeline:
             from vmware2scw.converter.bios2uefi_windows import convert_windows_bios_to_uefi
             converted = convert_windows_bios_to_uefi(
                 boot_disk,
-                work_dir=Path(boot_disk).parent / "bios2uefi",
+                work_dir=self.placement.path(state, "guest", "bios2uefi"),
+                vm_info=vm_info_dict,
             )
             if converted:
                 logger.info("Windows BIOS → UEFI conversion successful")
@@ -973,68 +1260,177 @@ class MigrationPipeline:
         # The NTFS is dirty after QEMU Phase 2 — do NOT try to write via virt-customize.
         logger.info("Windows network: DHCP already configured by inject_virtio — skipping")
 
-    def _stage_upload_s3(self, plan: VMMigrationPlan, state: MigrationState) -> None:
-        """Upload qcow2 images to Scaleway Object Storage."""
-        from vmware2scw.scaleway.s3 import ScalewayS3
+    def _vsphere(self, source=None):
+        """Process-wide session pool of a source vCenter (default:
+        config.vmware); checkout with .session() / .run()."""
+        from vmware2scw.vmware.pool import get_session_pool
+
+        return get_session_pool(source or self.config.vmware)
+
+    def _source(self, plan: VMMigrationPlan, state: MigrationState):
+        """(VMwareConfig, name in that vCenter) of the plan's VM.
+
+        Resolved once ("<vcenter>/<vm>" or a lookup in every vCenter) and
+        kept in the state, so resumes go back to the same vCenter.
+        """
+        from vmware2scw.vmware.sources import SourceSet
+
+        sources = SourceSet.from_config(self.config)
+        recorded = state.artifacts.get("source")
+        if recorded and recorded.get("vcenter") in sources.sources:
+            return sources.sources[recorded["vcenter"]], recorded["vm"]
+        source, vm_name = sources.resolve(plan.vm_name)
+        with state.lock:
+            state.artifacts["source"] = {"vcenter": source.label, "vm": vm_name}
+        return source, vm_name
+
+    def _s3_client(self):
+        """Process-wide pooled S3 client for the configured region/credentials."""
+        from vmware2scw.scaleway.s3 import get_s3_client
 
         scw_secret = self.config.scaleway.secret_key
-        s3 = ScalewayS3(
+        return get_s3_client(
             region=self.config.scaleway.s3_region,
             access_key=self.config.scaleway.access_key or "",
             secret_key=scw_secret.get_secret_value() if scw_secret else "",
+            part_concurrency=self.config.migration.upload_part_concurrency,
         )
 
-        bucket = self.config.scaleway.s3_bucket
-        s3.create_bucket_if_not_exists(bucket)
+    def _scw_api(self):
+        """Scaleway Instance API client for the configured project."""
+        from vmware2scw.scaleway.instance import ScalewayInstanceAPI
+
+        return ScalewayInstanceAPI(
+            access_key=self.config.scaleway.access_key or "",
+            secret_key=(self.config.scaleway.secret_key.get_secret_value()
+                        if self.config.scaleway.secret_key else ""),
+            project_id=self.config.scaleway.project_id,
+            api_url=self.config.scaleway.api_url,
+        )
 
-        s3_keys = []
-        for qcow2_path in state.artifacts.get("qcow2_paths", []):
-            p = Path(qcow2_path)
-            key = f"migrations/{state.migration_id}/{p.name}"
+    def _stage_smoke_test(self, plan: VMMigrationPlan, state: MigrationState) -> None:
+        """Boot the final image locally and watch the serial console.
 
-            # Skip if already uploaded with same size
-            if s3.check_object_exists(bucket, key):
-                remote_size = s3.get_object_size(bucket, key)
-                local_size = p.stat().st_size
-                if remote_size == local_size:
-                    logger.info(f"Skipping upload (already exists): {key}")
-                    s3_keys.append(key)
-                    continue
+        Runs on throwaway overlays, so the image is left untouched. A failed
+        boot stops the migration here instead of after upload and import
+        (conversion.smoke_test: enforce); "warn" only logs it. Skipped when
+        KVM or OVMF is missing.
+        """
+        from vmware2scw.converter.qemu_boot import smoke_boot
+        from vmware2scw.utils.capabilities import get_capabilities
+
+        mode = self.config.conversion.smoke_test
+        if mode == "off":
+            logger.info("Smoke test disabled (conversion.smoke_test: off)")
+            return
+        if "upload_s3[0]" in state.artifacts.get("completed_tasks", []) or "upload_s3" in state.completed_stages:
+            logger.info("Image already uploaded — skipping smoke test")
+            return
+        caps = get_capabilities()
+        if not caps.kvm or not caps.ovmf_code:
+            logger.warning("Smoke test skipped — needs /dev/kvm and OVMF on this host")
+            return
+
+        qcow2_paths = state.artifacts.get("qcow2_paths", [])
+        if not qcow2_paths:
+            raise RuntimeError("No qcow2 images found — convert stage may have failed")
+        local = [p for p in qcow2_paths if Path(p).exists()]
+        if local[:1] != qcow2_paths[:1]:
+            raise RuntimeError(f"Boot disk missing: {qcow2_paths[0]}")
+        if len(local) < len(qcow2_paths):
+            logger.info(f"Smoke test without {len(qcow2_paths) - len(local)} streamed data "
+                        f"disk(s) — mounts of those may delay or break the boot")
+
+        work_dir = self.placement.path(state, "smoke", "smoke")
+        logger.info(f"Smoke-booting {Path(qcow2_paths[0]).name} "
+                    f"(virtio-scsi, virtio-net, OVMF, up to {self.config.conversion.smoke_test_timeout}s)")
+        result = smoke_boot(
+            local, work_dir,
+            timeout=self.config.conversion.smoke_test_timeout,
+            vm_info=state.artifacts.get("vm_info"),
+        )
+        with state.lock:
+            state.artifacts["smoke_test"] = {
+                "verdict": result.verdict,
+                "reason": result.reason,
+                "elapsed_s": round(result.elapsed),
+            }
+
+        if result.passed:
+            logger.info(f"✅ Image boots ({result.reason}, {result.elapsed:.0f}s)")
+            return
+        for line in result.serial_tail.splitlines():
+            logger.info(f"  serial: {line}")
+        if result.verdict == "inconclusive":
+            logger.warning(f"⚠️  Smoke test inconclusive: {result.reason}")
+            return
+        message = f"Image failed to boot locally: {result.reason}"
+        if mode == "enforce" and len(local) == len(qcow2_paths):
+            raise RuntimeError(message)
+        logger.warning(f"⚠️  {message}")
 
-            s3.upload_image(qcow2_path, bucket, key)
-            s3_keys.append(key)
+    def _instance_catalog(self, zone: str):
+        """Live instance catalog for a zone (disk-cached, built-in fallback)."""
+        from vmware2scw.scaleway.catalog import get_catalog
 
-        state.artifacts["s3_keys"] = s3_keys
-        state.artifacts["s3_bucket"] = bucket
+        return get_catalog(zone, api=self._scw_api(), cache_dir=self.config.conversion.cache_dir,
+                           ttl=self.config.scaleway.catalog_ttl_hours * 3600)
 
-    def _stage_import_scw(self, plan: VMMigrationPlan, state: MigrationState) -> None:
-        """Import qcow2 image(s) into Scaleway: create snapshot(s) → image.
+    def _stage_upload_s3(self, plan: VMMigrationPlan, state: MigrationState, disk: int) -> None:
+        """Upload one qcow2 image to Scaleway Object Storage.
 
-        Handles multi-disk VMs: boot disk becomes root_volume,
-        additional disks become extra_volumes.
+        Disks upload concurrently (pool "upload", migration.parallel_uploads);
+        their parts share the client's part pool, so total streams stay
+        bounded by migration.upload_part_concurrency.
         """
-        from vmware2scw.scaleway.instance import ScalewayInstanceAPI
+        s3 = self._s3_client()
+        bucket = self.config.scaleway.s3_bucket
+        s3.create_bucket_if_not_exists(bucket)
 
-        api = ScalewayInstanceAPI(
-            access_key=self.config.scaleway.access_key or "",
-            secret_key=(self.config.scaleway.secret_key.get_secret_value()
-                        if self.config.scaleway.secret_key else ""),
-            project_id=self.config.scaleway.project_id,
-        )
+        # Multipart ledger (UploadId, part size, part ETags) persisted in the
+        # migration state so an interrupted upload resumes where it stopped
+        lock = state.lock
+        qcow2_paths = state.artifacts.get("qcow2_paths", [])
+        p = Path(qcow2_paths[disk])
+        key = f"migrations/{state.migration_id}/{p.name}"
+        with lock:
+            ledger = state.artifacts.setdefault("s3_uploads", {}).setdefault(key, {})
+
+        if ledger.get("streamed") and ledger.get("completed"):
+            pass  # written by convert (stream_data_disks)
+        elif s3.is_uploaded(p, bucket, key, ledger, lock=lock):
+            # Skip only if the object provably holds this exact image
+            logger.info(f"Skipping upload (already uploaded, checksum verified): {key}")
+        else:
+            s3.upload_image_resumable(str(p), bucket, key, ledger,
+                                      checkpoint=lambda: self.state_store.save(state), lock=lock)
+
+        with lock:
+            s3_keys = state.artifacts.setdefault("s3_keys", [None] * len(qcow2_paths))
+            s3_keys[disk] = key
+            state.artifacts["s3_bucket"] = bucket
 
+    def _stage_import_scw(self, plan: VMMigrationPlan, state: MigrationState, disk: int) -> None:
+        """Import one uploaded qcow2 into a Scaleway snapshot.
+
+        Imports of different disks run in parallel on Scaleway's side and
+        share one status poller per zone. The snapshot ID is saved as soon
+        as it is created so a resumed stage doesn't import twice.
+        """
+        api = self._scw_api()
         zone = plan.zone
         bucket = state.artifacts["s3_bucket"]
         s3_keys = state.artifacts.get("s3_keys", [])
-
-        if not s3_keys:
-            raise RuntimeError("No S3 keys found — upload stage may have failed")
-
-        # Import ALL disks as snapshots
-        snapshot_ids = []
-        for i, s3_key in enumerate(s3_keys):
-            disk_label = "boot" if i == 0 else f"data-{i}"
-            snap_name = f"vmware2scw-{plan.vm_name}-{state.migration_id}-{disk_label}"
-
+        s3_key = s3_keys[disk] if disk < len(s3_keys) else None
+        if not s3_key:
+            raise RuntimeError(f"No S3 key for disk {disk} — upload stage may have failed")
+
+        disk_label = "boot" if disk == 0 else f"data-{disk}"
+        with state.lock:
+            started = state.artifacts.setdefault("scaleway_snapshot_ids_started", {})
+            snap_id = started.get(s3_key)
+        if not snap_id:
+            snap_name = f"vmware2scw-{plan.vm_name.replace('/', '-')}-{state.migration_id}-{disk_label}"
             logger.info(f"Creating Scaleway snapshot ({disk_label}) from s3://{bucket}/{s3_key}")
             snapshot = api.create_snapshot_from_s3(
                 zone=zone,
@@ -1043,22 +1439,45 @@ class MigrationPipeline:
                 key=s3_key,
             )
             snap_id = snapshot["id"]
-            snapshot_ids.append(snap_id)
+            with state.lock:
+                started[s3_key] = snap_id
+            self.state_store.save(state)
 
-            logger.info(f"Waiting for snapshot {snap_id}...")
-            api.wait_for_snapshot(zone, snap_id)
-            logger.info(f"Snapshot {snap_id} ({disk_label}) is available")
+        size = state.artifacts.get("s3_uploads", {}).get(s3_key, {}).get("size")
+        logger.info(f"Waiting for snapshot import ({disk_label}): {snap_id}")
+        api.wait_for_snapshots(zone, [snap_id], sizes={snap_id: size})
 
-        state.artifacts["scaleway_snapshot_id"] = snapshot_ids[0]
-        state.artifacts["scaleway_snapshot_ids"] = snapshot_ids
+        with state.lock:
+            snapshot_ids = state.artifacts.setdefault("scaleway_snapshot_ids", [None] * len(s3_keys))
+            snapshot_ids[disk] = snap_id
+            if disk == 0:
+                state.artifacts["scaleway_snapshot_id"] = snap_id
 
-        # Create image: boot snapshot + extra volumes
-        image_name = f"migrated-{plan.vm_name}"
+    def _stage_create_image(self, plan: VMMigrationPlan, state: MigrationState) -> None:
+        """Create the Scaleway image: boot snapshot + extra volumes."""
+        api = self._scw_api()
+        zone = plan.zone
+        snapshot_ids = state.artifacts.get("scaleway_snapshot_ids", [])
+        if not snapshot_ids or None in snapshot_ids:
+            raise RuntimeError("Missing snapshot(s) — import stage may have failed")
+
+        image_id = state.artifacts.get("scaleway_image_id")
+        if image_id:
+            logger.info(f"Image already created: {image_id}")
+            api.wait_for_image(zone, image_id)
+            return
+
+        # "<vcenter>/<vm>" → "<vcenter>-<vm>"
+        image_name = f"migrated-{plan.vm_name.replace('/', '-')}"
         logger.info(f"Creating Scaleway image '{image_name}'")
         extra_snaps = snapshot_ids[1:] if len(snapshot_ids) > 1 else None
         image = api.create_image(zone, image_name, snapshot_ids[0],
                                   extra_snapshots=extra_snaps)
-        state.artifacts["scaleway_image_id"] = image["id"]
+        with state.lock:
+            state.artifacts["scaleway_image_id"] = image["id"]
+        self.state_store.save(state)
+        if image.get("state") != "available":
+            api.wait_for_image(zone, image["id"])
 
         logger.info(f"Image created: {image['id']}"
                      + (f" ({len(snapshot_ids)} volume(s))" if len(snapshot_ids) > 1 else ""))
@@ -1078,33 +1497,21 @@ class MigrationPipeline:
 
     def _stage_cleanup(self, plan: VMMigrationPlan, state: MigrationState) -> None:
         """Clean up all temporary resources to free disk space."""
-        import shutil
-
-        # 1. Clean local work directory (VMDK + qcow2 intermediate files)
-        work_dir = self.config.conversion.work_dir / state.migration_id
-        if work_dir.exists():
-            size_gb = sum(f.stat().st_size for f in work_dir.rglob("*") if f.is_file()) / (1024**3)
-            logger.info(f"Cleaning work directory: {work_dir} ({size_gb:.1f} GB)")
-            shutil.rmtree(work_dir, ignore_errors=True)
+        # 1. Clean local work directories on every scratch tier (VMDK + qcow2 intermediate files)
+        work_dirs = [str(d) for d in self.placement.migration_dirs(state)]
+        if work_dirs:
+            size_gb = self.placement.remove(state)
+            logger.info(f"Cleaned work directory: {', '.join(work_dirs)} ({size_gb:.1f} GB)")
 
         # 2. Clean VMware snapshot
         snap_name = state.artifacts.get("snapshot_name")
         if snap_name:
             try:
-                from vmware2scw.vmware.client import VSphereClient
                 from vmware2scw.vmware.snapshot import SnapshotManager
 
-                client = VSphereClient()
-                pw = self.config.vmware.password.get_secret_value() if self.config.vmware.password else ""
-                client.connect(
-                    self.config.vmware.vcenter,
-                    self.config.vmware.username,
-                    pw,
-                    insecure=self.config.vmware.insecure,
-                )
-                snap_mgr = SnapshotManager(client)
-                snap_mgr.delete_migration_snapshot(plan.vm_name, snap_name)
-                client.disconnect()
+                source, vm_name = self._source(plan, state)
+                self._vsphere(source).run(
+                    lambda client: SnapshotManager(client).delete_migration_snapshot(vm_name, snap_name))
                 logger.info(f"Deleted VMware snapshot: {snap_name}")
             except Exception as e:
                 logger.warning(f"Failed to clean VMware snapshot: {e}")
@@ -1112,24 +1519,27 @@ class MigrationPipeline:
         # 3. Clean S3 transit files (safe now — image is created)
         image_id = state.artifacts.get("scaleway_image_id")
         s3_keys = state.artifacts.get("s3_keys", [])
-        bucket = state.artifacts.get("s3_bucket")
-        if image_id and s3_keys and bucket:
-            try:
-                from vmware2scw.scaleway.storage import ScalewayS3Client
-                s3 = ScalewayS3Client(
-                    access_key=self.config.scaleway.access_key,
-                    secret_key=self.config.scaleway.secret_key.get_secret_value() if self.config.scaleway.secret_key else "",
-                    region=self.config.scaleway.region,
-                )
+        bucket = state.artifacts.get("s3_bucket") or self.config.scaleway.s3_bucket
+        try:
+            s3 = self._s3_client()
+
+            # Abandoned multipart uploads are billed as stored data
+            for key, ledger in state.artifacts.get("s3_uploads", {}).items():
+                if ledger.get("upload_id"):
+                    s3.abort_multipart_upload(bucket, key, ledger["upload_id"])
+                    ledger["upload_id"] = None
+            s3.abort_incomplete_uploads(bucket, prefix=f"migrations/{state.migration_id}/")
+
+            if image_id and s3_keys:
                 for key in s3_keys:
                     try:
-                        s3.client.delete_object(Bucket=bucket, Key=key)
+                        s3.delete_object(bucket, key)
                         logger.info(f"Deleted S3 transit: s3://{bucket}/{key}")
                     except Exception as e2:
                         logger.warning(f"Failed to delete {key}: {e2}")
-            except Exception as e:
-                logger.warning(f"S3 cleanup failed: {e}")
-        else:
-            logger.info("S3 transit files retained (image not confirmed or no keys)")
+            else:
+                logger.info("S3 transit files retained (image not confirmed or no keys)")
+        except Exception as e:
+            logger.warning(f"S3 cleanup failed: {e}")
 
         logger.info("Cleanup complete.")
@@ -0,0 +1,187 @@
+"""Placement of migration artifacts on tiered scratch storage.
+
+Workers usually have more than one scratch device: a small fast NVMe, a
+large RAID, sometimes a tmpfs. conversion.scratch_tiers lists them, each
+with a throughput class and an optional capacity:
+
+  fast   rewrite-heavy, random I/O: QEMU overlays and OVMF vars, registry
+         hives and setup scripts, the virt-v2v checkpoint overlay, smoke
+         boot overlays, libguestfs appliance overlays (boot-type probes)
+  bulk   large, sequential: downloaded VMDKs, converted / final qcow2s,
+         the virt-v2v output copy of the boot disk
+
+Each migration gets one directory per class, <tier>/<migration_id>, on
+the tier picked when it starts: the bulk tier with the most space left
+after what admitted migrations still have to write, and the fast tier
+with the fewest migrations, so concurrent VMs are striped across
+devices. The choice is saved in the migration state so a resume finds
+its files. Without a fast tier, fast artifacts go to the bulk directory;
+without scratch_tiers, conversion.work_dir is the only (bulk) tier.
+
+Stages ask for paths with Placement.path(state, kind, name) instead of
+building work_dir / migration_id themselves.
+
+Confidence: 75 — only bulk tiers take part in space admission
+(pipeline/workspace.py); fast-tier artifacts are small but not reserved.
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Optional
+
+from vmware2scw.pipeline.workspace import GB, WorkspaceManager, configure_workspace, dir_usage
+from vmware2scw.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Artifact kind → throughput class
+ARTIFACT_CLASSES = {
+    "vmdk": "bulk",       # exported VMDKs
+    "qcow2": "bulk",      # converted disks, final images
+    "v2v": "bulk",        # virt-v2v output copy of the boot disk
+    "guest": "fast",      # QEMU boot overlays, OVMF vars, hives, setup scripts
+    "overlay": "fast",    # virt-v2v-in-place checkpoint overlay
+    "smoke": "fast",      # smoke-boot overlays and serial log
+}
+
+# A fast tier is skipped when it has less than this left
+MIN_FAST_FREE_GB = 8
+
+
+@dataclass
+class Tier:
+    """One scratch directory."""
+    path: Path
+    throughput: str                       # "fast" or "bulk"
+    workspace: WorkspaceManager
+
+
+class Placement:
+    """Maps (migration, artifact kind) to a directory on a scratch tier.
+
+    Args:
+        conversion_config: ConversionConfig (scratch_tiers, work_dir,
+            workspace_* settings)
+    """
+
+    def __init__(self, conversion_config):
+        c = conversion_config
+        self.work_dir = Path(c.work_dir)
+        specs = c.scratch_tiers or [_default_tier(c)]
+        self.tiers = [
+            Tier(Path(t.path), t.throughput,
+                 configure_workspace(t.path, budget_gb=t.capacity_gb, reserve_gb=c.workspace_reserve_gb))
+            for t in specs
+        ]
+        if not any(t.throughput == "bulk" for t in self.tiers):
+            raise ValueError("conversion.scratch_tiers needs at least one bulk tier")
+        self._lock = threading.Lock()
+        self._fast_users: dict[Path, int] = {}
+
+        # libguestfs appliances (boot-type probes, virt-customize, ...)
+        # keep their overlays in LIBGUESTFS_TMPDIR
+        fast = self._tiers("fast")
+        if fast:
+            tmp = fast[0].path / "libguestfs"
+            tmp.mkdir(parents=True, exist_ok=True)
+            os.environ.setdefault("LIBGUESTFS_TMPDIR", str(tmp))
+
+    def _tiers(self, throughput: str) -> list[Tier]:
+        return [t for t in self.tiers if t.throughput == throughput]
+
+    def _tier(self, path: str | Path) -> Optional[Tier]:
+        return next((t for t in self.tiers if t.path == Path(path)), None)
+
+    # ── Assignment ───────────────────────────────────────────────
+
+    def assign(self, state) -> dict[str, str]:
+        """Pick (once) the migration's bulk and fast tiers.
+
+        Recorded in state.artifacts["placement"]; earlier choices are kept
+        so resumed migrations find their files.
+        """
+        chosen = state.artifacts.get("placement")
+        if chosen:
+            return chosen
+        if (self.work_dir / state.migration_id).is_dir():
+            # Started before scratch tiers were configured
+            root = str(self.work_dir)
+            chosen = state.artifacts["placement"] = {"bulk": root, "fast": root}
+            return chosen
+        with self._lock:
+            bulk = max(self._tiers("bulk"), key=lambda t: t.workspace.available())
+            fast = [t for t in self._tiers("fast")
+                    if t.workspace.available() >= MIN_FAST_FREE_GB * GB]
+            fast_path = (min(fast, key=lambda t: self._fast_users.get(t.path, 0)).path
+                         if fast else bulk.path)
+        chosen = state.artifacts["placement"] = {"bulk": str(bulk.path), "fast": str(fast_path)}
+        if len(self.tiers) > 1:
+            logger.info(f"Scratch for {state.vm_name}: bulk {bulk.path}, fast {fast_path}")
+        return chosen
+
+    @contextmanager
+    def running(self, state) -> Iterator[dict[str, str]]:
+        """Assign tiers and count the migration on its fast tier while
+        the with-block runs (new migrations go to less busy ones)."""
+        fast = Path(self.assign(state)["fast"])
+        with self._lock:
+            self._fast_users[fast] = self._fast_users.get(fast, 0) + 1
+        try:
+            yield state.artifacts["placement"]
+        finally:
+            with self._lock:
+                self._fast_users[fast] -= 1
+
+    # ── Lookup ───────────────────────────────────────────────────
+
+    def dir(self, state, throughput: str) -> Path:
+        """The migration's directory on its tier of that class (created)."""
+        root = self.assign(state)[throughput]
+        path = Path(root) / state.migration_id
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def path(self, state, kind: str, name: str = "") -> Path:
+        """Where artifact kind of this migration lives; name is joined
+        below the migration directory ("" → the directory itself)."""
+        base = self.dir(state, ARTIFACT_CLASSES[kind])
+        return base / name if name else base
+
+    def workspace(self, state) -> WorkspaceManager:
+        """Space admission for the migration's bulk tier."""
+        root = self.assign(state)["bulk"]
+        tier = self._tier(root)
+        return tier.workspace if tier else configure_workspace(root)
+
+    def migration_dirs(self, state) -> Iterator[Path]:
+        """Every existing directory of the migration (all tiers)."""
+        roots = {t.path for t in self.tiers}
+        roots.update(Path(p) for p in state.artifacts.get("placement", {}).values())
+        for root in sorted(roots):
+            path = root / state.migration_id
+            if path.exists():
+                yield path
+
+    def remove(self, state) -> float:
+        """Delete the migration's directories on every tier; GB freed."""
+        freed = 0
+        for path in self.migration_dirs(state):
+            freed += dir_usage(path)
+            shutil.rmtree(path, ignore_errors=True)
+        return freed / GB
+
+    def usage(self) -> dict[str, dict]:
+        return {str(t.path): {"throughput": t.throughput, **t.workspace.usage()} for t in self.tiers}
+
+
+def _default_tier(conversion_config):
+    from vmware2scw.config import ScratchTier
+
+    return ScratchTier(path=conversion_config.work_dir, throughput="bulk",
+                       capacity_gb=conversion_config.workspace_budget_gb)
@@ -3,6 +3,8 @@
 from __future__ import annotations
 
 import json
+import os
+import threading
 from dataclasses import asdict, dataclass, field
 from datetime import datetime
 from pathlib import Path
@@ -19,6 +21,9 @@ class MigrationState:
 
     Stored as JSON in the work directory. Enables resume after failure
     by tracking completed stages and intermediate artifacts.
+
+    Stage tasks run concurrently: they hold `lock` while they change the
+    state, and MigrationStateStore.save() holds it while serialising.
     """
     migration_id: str
     vm_name: str
@@ -30,6 +35,10 @@ class MigrationState:
     started_at: Optional[datetime] = None
     error: Optional[str] = None
 
+    def __post_init__(self) -> None:
+        # Not a field: neither serialised nor compared
+        self.lock = threading.RLock()
+
     def to_dict(self) -> dict:
         d = asdict(self)
         if d["started_at"]:
@@ -55,15 +64,26 @@ class MigrationStateStore:
     def __init__(self, work_dir: Path | str = "/var/lib/vmware2scw/work"):
         self.state_dir = Path(work_dir) / "state"
         self.state_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
 
     def _state_path(self, migration_id: str) -> Path:
         return self.state_dir / f"{migration_id}.json"
 
     def save(self, state: MigrationState) -> None:
-        """Save migration state to disk."""
+        """Save migration state to disk.
+
+        Written to a temp file and renamed so a crash mid-write (e.g.
+        during a per-part upload checkpoint) never leaves a truncated file.
+        Safe to call from concurrent stage tasks.
+        """
         path = self._state_path(state.migration_id)
-        with open(path, "w") as f:
-            json.dump(state.to_dict(), f, indent=2, default=str)
+        # state.lock first: tasks checkpoint while holding it
+        with state.lock, self._lock:
+            data = state.to_dict()
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp, "w") as f:
+                json.dump(data, f, indent=2, default=str)
+            os.replace(tmp, path)
 
     def load(self, migration_id: str) -> Optional[MigrationState]:
         """Load migration state from disk."""
@@ -87,6 +107,29 @@ class MigrationStateStore:
                 states.append(state)
         return sorted(states, key=lambda s: s.started_at or datetime.min, reverse=True)
 
+    # ─── Batches ─────────────────────────────────────────────────────
+
+    def _batch_path(self, batch_id: str) -> Path:
+        return self.state_dir / "batches" / f"{batch_id}.json"
+
+    def save_batch(self, batch_id: str, record: dict[str, Any]) -> None:
+        """Save a batch record ({vm_name: result}, ...) atomically."""
+        path = self._batch_path(batch_id)
+        with self._lock:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp, "w") as f:
+                json.dump(record, f, indent=2, default=str)
+            os.replace(tmp, path)
+
+    def load_batch(self, batch_id: str) -> Optional[dict[str, Any]]:
+        """Load a batch record, or None if unknown."""
+        path = self._batch_path(batch_id)
+        if not path.exists():
+            return None
+        with open(path) as f:
+            return json.load(f)
+
     def delete(self, migration_id: str) -> None:
         """Delete a migration state file."""
         path = self._state_path(migration_id)
@@ -5,10 +5,11 @@ from __future__ import annotations
 from dataclasses import dataclass, field
 from typing import TYPE_CHECKING
 
-from vmware2scw.scaleway.mapping import INSTANCE_TYPES, ResourceMapper
+from vmware2scw.scaleway.mapping import ResourceMapper
 from vmware2scw.utils.logging import get_logger
 
 if TYPE_CHECKING:
+    from vmware2scw.scaleway.catalog import InstanceCatalog
     from vmware2scw.vmware.inventory import VMInfo
 
 logger = get_logger(__name__)
@@ -49,8 +50,9 @@ class MigrationValidator:
     (specific driver issues, kernel modules) may not be caught.
     """
 
-    def __init__(self):
-        self.mapper = ResourceMapper()
+    def __init__(self, catalog: "InstanceCatalog | None" = None):
+        self.mapper = ResourceMapper(catalog)
+        self.catalog = self.mapper.catalog
 
     def validate(self, vm_info: "VMInfo", target_type: str) -> ValidationReport:
         """Run all validation checks against a VM.
@@ -86,8 +88,8 @@ class MigrationValidator:
 
     def _check_target_type_exists(self, vm: "VMInfo", target: str) -> ValidationCheck:
         """Verify the target instance type exists in our catalog."""
-        if target in INSTANCE_TYPES:
-            spec = INSTANCE_TYPES[target]
+        spec = self.catalog.get(target)
+        if spec:
             return ValidationCheck(
                 name="Instance type",
                 passed=True,
@@ -96,12 +98,12 @@ class MigrationValidator:
         return ValidationCheck(
             name="Instance type",
             passed=False,
-            message=f"Unknown instance type '{target}'. Available: {', '.join(sorted(INSTANCE_TYPES.keys())[:10])}...",
+            message=f"Unknown instance type '{target}'. Available: {', '.join(self.catalog.names()[:10])}...",
         )
 
     def _check_cpu_fit(self, vm: "VMInfo", target: str) -> ValidationCheck:
         """Check if VM vCPUs fit in the target instance type."""
-        spec = INSTANCE_TYPES.get(target)
+        spec = self.catalog.get(target)
         if not spec:
             return ValidationCheck("CPU fit", False, "Cannot check — unknown instance type")
 
@@ -115,7 +117,7 @@ class MigrationValidator:
 
     def _check_ram_fit(self, vm: "VMInfo", target: str) -> ValidationCheck:
         """Check if VM RAM fits in the target instance type."""
-        spec = INSTANCE_TYPES.get(target)
+        spec = self.catalog.get(target)
         if not spec:
             return ValidationCheck("RAM fit", False, "Cannot check — unknown instance type")
 
@@ -129,7 +131,7 @@ class MigrationValidator:
 
     def _check_disk_size(self, vm: "VMInfo", target: str) -> ValidationCheck:
         """Check if VM disks fit within storage limits."""
-        spec = INSTANCE_TYPES.get(target)
+        spec = self.catalog.get(target)
         if not spec:
             return ValidationCheck("Disk size", False, "Cannot check — unknown instance type")
 
@@ -157,7 +159,7 @@ class MigrationValidator:
 
     def _check_disk_count(self, vm: "VMInfo", target: str) -> ValidationCheck:
         """Check if VM disk count is within limits."""
-        spec = INSTANCE_TYPES.get(target)
+        spec = self.catalog.get(target)
         if not spec:
             return ValidationCheck("Disk count", False, "Cannot check — unknown instance type")
 
@@ -0,0 +1,278 @@
+"""Disk-space admission for scratch directories (conversion.work_dir or
+the bulk scratch tiers, see pipeline/placement.py).
+
+A migration needs its VMDKs, their qcow2 conversions and a scratch copy
+of the boot disk (virt-v2v output, decompression) on the work_dir
+filesystem at once. Starting two 2 TB VMs on a 3 TB volume fails half
+way through conversion, after hours of export.
+
+The workspace manager estimates each migration's peak footprint from
+VMInfo.disks (allocated size when vCenter reports it, else provisioned
+size) as named components:
+
+  vmdk[i]    exported VMDK         released when convert[i] deletes it
+  qcow2[i]   converted image       released when reclaim[i] deletes it
+                                   (after its verified upload and the
+                                   smoke test)
+  scratch    boot-disk work copy   released when the smoke test is done
+
+and admits a migration only when that fits. The check is against what
+the filesystem actually reports: free space, minus what admitted
+migrations are still expected to write (reservation minus what their
+directory already holds), minus conversion.workspace_reserve_gb. A
+migration that can never fit is rejected up front; one that fits later
+waits, in priority order, until others release space. In a batch this
+makes the disk budget, not a fixed count, decide how many VMs run.
+
+Confidence: 75 — the estimate is an upper bound (compressed VMDKs and
+qcow2s are usually smaller); files written outside the migration
+directory are only seen through free space.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+from vmware2scw.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+GB = 1024**3
+# qcow2 metadata (L1/L2 tables, refcounts) on top of the guest data
+QCOW2_OVERHEAD = 1.05
+
+
+class WorkspaceFullError(RuntimeError):
+    """The migration can never fit in the work_dir budget."""
+
+
+def dir_usage(path: Path) -> int:
+    """Bytes allocated on disk under path (sparse files count what they use)."""
+    total = 0
+    try:
+        for f in path.rglob("*"):
+            try:
+                st = f.lstat()
+            except OSError:
+                continue
+            if f.is_file():
+                total += st.st_blocks * 512
+    except OSError:
+        pass
+    return total
+
+
+def estimate_footprint(
+    vm_info: dict,
+    done: Iterable[str] = (),
+    stream_data_disks: bool = False,
+) -> dict[str, int]:
+    """Peak work_dir bytes of a migration, as releasable components.
+
+    Args:
+        vm_info: VMInfo.model_dump() (disks with size_gb / allocated_gb)
+        done: tasks already completed (resume): their files are gone
+        stream_data_disks: data disks go straight to S3 (no local qcow2)
+    """
+    done = set(done)
+    footprint: dict[str, int] = {}
+    for i, disk in enumerate(vm_info.get("disks", [])):
+        size = disk.get("allocated_gb") or disk.get("size_gb") or 0
+        size = int(min(size, disk.get("size_gb") or size) * GB)
+        if f"convert[{i}]" not in done:
+            footprint[f"vmdk[{i}]"] = size
+        if f"reclaim[{i}]" not in done and not (stream_data_disks and i > 0):
+            footprint[f"qcow2[{i}]"] = int(size * QCOW2_OVERHEAD)
+        if i == 0 and "smoke_test" not in done:
+            footprint["scratch"] = int(size * QCOW2_OVERHEAD)
+    return footprint
+
+
+@dataclass
+class Reservation:
+    """Space held by one admitted migration."""
+    label: str
+    path: Path
+    components: dict[str, int] = field(default_factory=dict)
+    _manager: Optional["WorkspaceManager"] = field(default=None, repr=False)
+
+    @property
+    def reserved(self) -> int:
+        return sum(self.components.values())
+
+    def release(self, component: str) -> None:
+        """The component's files are gone: give its space back."""
+        if self._manager is not None:
+            self._manager._release(self, component)
+
+
+class WorkspaceManager:
+    """Admit migrations against the free space of the work_dir filesystem.
+
+    Args:
+        root: work_dir (each migration uses root/<migration_id>)
+        budget_gb: cap on the space all migrations may hold (None = the
+            whole filesystem)
+        reserve_gb: free space that must remain after admitting one
+    """
+
+    def __init__(self, root: Path, budget_gb: Optional[int] = None, reserve_gb: int = 20):
+        self._cond = threading.Condition()
+        self._waiters: list[tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._active: list[Reservation] = []
+        self.configure(root, budget_gb, reserve_gb)
+
+    def configure(self, root: Path, budget_gb: Optional[int] = None, reserve_gb: int = 20) -> None:
+        """(Re)apply the budget; waiting migrations are re-evaluated."""
+        with self._cond:
+            self.root = Path(root)
+            self.budget = budget_gb * GB if budget_gb else None
+            self.reserve = reserve_gb * GB
+            self._cond.notify_all()
+
+    # ── Admission ────────────────────────────────────────────────
+
+    def _statvfs(self) -> tuple[int, int]:
+        """(total, free) bytes of the work_dir filesystem."""
+        st = os.statvfs(self.root)
+        return st.f_blocks * st.f_frsize, st.f_bavail * st.f_frsize
+
+    def capacity(self) -> int:
+        """Most a single migration can ever get."""
+        total, _ = self._statvfs()
+        cap = total - self.reserve
+        return min(cap, self.budget) if self.budget else cap
+
+    def available(self) -> int:
+        """Bytes a new migration could still be admitted with right now."""
+        with self._cond:
+            _, free = self._statvfs()
+            room = free - sum(self._pending(r) for r in self._active) - self.reserve
+            if self.budget:
+                held = sum(max(r.reserved, dir_usage(r.path)) for r in self._active)
+                room = min(room, self.budget - held)
+            return max(0, room)
+
+    def _pending(self, res: Reservation, used: Optional[int] = None) -> int:
+        """What res is still expected to write."""
+        used = dir_usage(res.path) if used is None else used
+        return max(0, res.reserved - used)
+
+    def _fits(self, need: int) -> bool:
+        _, free = self._statvfs()
+        if free - sum(self._pending(r) for r in self._active) - need < self.reserve:
+            return False
+        if self.budget:
+            held = sum(max(r.reserved, dir_usage(r.path)) for r in self._active)
+            if held + need > self.budget:
+                return False
+        return True
+
+    @contextmanager
+    def admit(self, label: str, path: Path, components: dict[str, int],
+              priority: int = 0) -> Iterator[Reservation]:
+        """Block until the migration fits, hold its space for the with-block.
+
+        Args:
+            label: for log messages (VM name)
+            path: the migration's own directory (its files count as used)
+            components: estimate_footprint() of the migration
+            priority: lower is admitted first (batch order)
+
+        Raises:
+            WorkspaceFullError: the footprint exceeds the whole budget
+        """
+        res = Reservation(label, Path(path), dict(components), self)
+        used = dir_usage(res.path)
+        need = self._pending(res, used)
+        if res.reserved > self.capacity():
+            raise WorkspaceFullError(
+                f"{label} needs up to {res.reserved / GB:.0f} GB in {self.root}, more than "
+                f"the {self.capacity() / GB:.0f} GB available to migrations "
+                f"(conversion.workspace_reserve_gb, workspace_budget_gb / scratch tier capacity_gb)")
+
+        me = (priority, next(self._seq))
+        waited_since = time.time()
+        logged = False
+        with self._cond:
+            heapq.heappush(self._waiters, me)
+            try:
+                while self._waiters[0] != me or not self._fits(need):
+                    if not self._active and self._waiters[0] == me:
+                        # Nothing of ours will release space
+                        _, free = self._statvfs()
+                        raise WorkspaceFullError(
+                            f"{label} needs {need / GB:.0f} GB more in {self.root}, "
+                            f"only {max(0, free - self.reserve) / GB:.0f} GB free "
+                            f"(after the {self.reserve / GB:.0f} GB reserve)")
+                    if not logged:
+                        logger.info(f"  {label}: waiting for {need / GB:.0f} GB in {self.root} "
+                                    f"— {len(self._active)} migration(s) admitted, "
+                                    f"{len(self._waiters) - 1} other(s) queued")
+                        logged = True
+                    # Re-poll periodically: other processes also use the disk
+                    self._cond.wait(timeout=30)
+            finally:
+                self._waiters.remove(me)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+            self._active.append(res)
+
+        if logged:
+            logger.info(f"  {label}: workspace granted after {time.time() - waited_since:.0f}s")
+        logger.debug(f"{label}: reserved {res.reserved / GB:.1f} GB "
+                     f"({', '.join(f'{k}={v / GB:.1f}' for k, v in res.components.items())})")
+        try:
+            yield res
+        finally:
+            with self._cond:
+                self._active.remove(res)
+                res._manager = None
+                self._cond.notify_all()
+
+    def _release(self, res: Reservation, component: str) -> None:
+        with self._cond:
+            if res.components.pop(component, None) is not None:
+                self._cond.notify_all()
+
+    def usage(self) -> dict:
+        with self._cond:
+            _, free = self._statvfs()
+            return {
+                "migrations": len(self._active),
+                "queued": len(self._waiters),
+                "reserved_gb": round(sum(r.reserved for r in self._active) / GB, 1),
+                "free_gb": round(free / GB, 1),
+            }
+
+
+_workspaces: dict[Path, WorkspaceManager] = {}
+_workspaces_lock = threading.Lock()
+
+
+def get_workspace(root: str | Path) -> WorkspaceManager:
+    """Process-wide manager of one scratch directory, shared by every
+    migration on this worker."""
+    root = Path(root)
+    with _workspaces_lock:
+        ws = _workspaces.get(root)
+        if ws is None:
+            ws = _workspaces[root] = WorkspaceManager(root)
+        return ws
+
+
+def configure_workspace(root: str | Path, budget_gb: Optional[int] = None,
+                        reserve_gb: int = 20) -> WorkspaceManager:
+    """Apply a budget to the shared manager of a scratch directory."""
+    ws = get_workspace(root)
+    ws.configure(root, budget_gb=budget_gb, reserve_gb=reserve_gb)
+    return ws
@@ -0,0 +1,242 @@
+"""Live Scaleway instance catalog with an on-disk TTL cache.
+
+The built-in INSTANCE_TYPES table (scaleway/mapping.py) goes stale as
+Scaleway changes prices and adds types. The catalog is fetched per zone
+from GET /instance/v1/zones/{zone}/products/servers, saved as
+cache_dir/scaleway-catalog-{zone}.json, and refreshed after the TTL.
+Offline (or on API errors) a stale cache is used, then the built-in
+table.
+
+For suggestions the catalog keeps compact indexes, built once:
+  - types split by (windows, development) and sorted by (vCPU, RAM,
+    price), with the numeric columns in array.array so a query is a
+    bisect on vCPUs plus a scan of the remaining fitting types;
+  - names grouped by category and sorted by price.
+ResourceMapper.suggest_many() additionally memoises per VM shape, so a
+fleet of thousands of VMs costs one query per distinct
+(vCPU, RAM, OS, disks) combination.
+
+Confidence: 80 — products/servers field names follow the public API;
+category / shared-vCPU flags of unknown new types are inferred from the
+type name.
+"""
+
+from __future__ import annotations
+
+import bisect
+import json
+import os
+import threading
+import time
+from array import array
+from dataclasses import asdict
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator, Optional
+
+from vmware2scw.scaleway.mapping import INSTANCE_TYPES, InstanceTypeSpec
+from vmware2scw.utils.logging import get_logger
+
+if TYPE_CHECKING:
+    from vmware2scw.scaleway.instance import ScalewayInstanceAPI
+
+logger = get_logger(__name__)
+
+CATALOG_TTL = 24 * 3600
+DEFAULT_CACHE_DIR = Path("/var/lib/vmware2scw/cache")
+
+
+def _category_for(name: str) -> str:
+    if name.endswith("-WIN"):
+        return "windows"
+    if name.startswith(("DEV1", "STARDUST")):
+        return "development"
+    if name.startswith("POP2-HC"):
+        return "compute"
+    if name.startswith("POP2-HM"):
+        return "memory"
+    if name.startswith("POP2"):
+        return "general_dedicated"
+    return "general"
+
+
+def spec_from_product(name: str, product: dict) -> InstanceTypeSpec:
+    """InstanceTypeSpec from one products/servers entry.
+
+    Fields the API doesn't expose (max volumes, category) come from the
+    built-in table when the type is known there.
+    """
+    known = INSTANCE_TYPES.get(name)
+    block = product.get("capabilities", {}).get("block_storage", True)
+    local_gb = 0 if block else int(product.get("volumes_constraint", {}).get("max_size", 0) / 1e9)
+    bandwidth = int(product.get("network", {}).get("sum_internal_bandwidth", 0) / 1e6)
+    category = known.category if known else _category_for(name)
+    return InstanceTypeSpec(
+        name=name,
+        vcpus=int(product.get("ncpus", known.vcpus if known else 0)),
+        ram_gb=round(product.get("ram", 0) / 1024**3) or (known.ram_gb if known else 0),
+        bandwidth_mbps=bandwidth or (known.bandwidth_mbps if known else 200),
+        block_storage=block,
+        max_volumes=known.max_volumes if known else (16 if block else 1),
+        local_storage_gb=local_gb,
+        category=category,
+        windows=category == "windows",
+        shared_vcpu=known.shared_vcpu if known else not name.startswith("POP2"),
+        price_hour_eur=float(product.get("hourly_price") or (known.price_hour_eur if known else 0.0)),
+        arch=product.get("arch", "x86_64"),
+    )
+
+
+class _Group:
+    """Types of one (windows, development) group, sorted by vCPU/RAM/price."""
+
+    def __init__(self, specs: list[InstanceTypeSpec]):
+        specs = sorted(specs, key=lambda s: (s.vcpus, s.ram_gb, s.price_hour_eur))
+        self.specs = specs
+        self.vcpus = array("H", (s.vcpus for s in specs))
+        self.ram_gb = array("I", (s.ram_gb for s in specs))
+        self.max_volumes = array("H", (s.max_volumes for s in specs))
+        self.local_gb = array("I", (0 if s.block_storage else s.local_storage_gb for s in specs))
+        self.block = array("b", (s.block_storage for s in specs))
+
+    def fitting(self, vcpus: int, ram_gb: float, num_disks: int, disk_gb: float) -> Iterator[InstanceTypeSpec]:
+        start = bisect.bisect_left(self.vcpus, vcpus)
+        ram, vols, local, block = self.ram_gb, self.max_volumes, self.local_gb, self.block
+        for i in range(start, len(self.specs)):
+            if ram[i] >= ram_gb and vols[i] >= num_disks and (block[i] or local[i] >= disk_gb):
+                yield self.specs[i]
+
+
+class InstanceCatalog:
+    """Instance types available in a zone, with suggestion indexes."""
+
+    def __init__(self, specs: dict[str, InstanceTypeSpec], source: str = "builtin",
+                 zone: Optional[str] = None, fetched_at: Optional[float] = None):
+        self.specs = specs
+        self.source = source
+        self.zone = zone
+        self.fetched_at = fetched_at
+
+        groups: dict[tuple[bool, bool], list[InstanceTypeSpec]] = {}
+        for spec in specs.values():
+            if spec.arch != "x86_64":
+                continue
+            groups.setdefault((spec.windows, spec.category == "development"), []).append(spec)
+        self._groups = {key: _Group(members) for key, members in groups.items()}
+
+        self.by_category: dict[str, list[str]] = {}
+        for spec in sorted(specs.values(), key=lambda s: s.price_hour_eur):
+            self.by_category.setdefault(spec.category, []).append(spec.name)
+
+    @classmethod
+    def builtin(cls) -> "InstanceCatalog":
+        return cls(dict(INSTANCE_TYPES))
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.specs
+
+    def get(self, name: str) -> Optional[InstanceTypeSpec]:
+        return self.specs.get(name)
+
+    def names(self) -> list[str]:
+        return sorted(self.specs)
+
+    def candidates(
+        self,
+        vcpus: int,
+        ram_gb: float,
+        windows: bool = False,
+        exclude_dev: bool = True,
+        num_disks: int = 1,
+        disk_gb: float = 0.0,
+    ) -> list[InstanceTypeSpec]:
+        """Every type that fits the requirements (Windows VMs → -WIN types only)."""
+        out: list[InstanceTypeSpec] = []
+        for dev in (False,) if exclude_dev else (False, True):
+            group = self._groups.get((windows, dev))
+            if group:
+                out.extend(group.fitting(vcpus, ram_gb, num_disks, disk_gb))
+        return out
+
+    # ── Persistence ──────────────────────────────────────────────
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({
+            "zone": self.zone,
+            "fetched_at": self.fetched_at,
+            "types": [asdict(s) for s in self.specs.values()],
+        }, indent=1))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "InstanceCatalog":
+        data = json.loads(path.read_text())
+        specs = {t["name"]: InstanceTypeSpec(**t) for t in data["types"]}
+        return cls(specs, source=f"cache:{path}", zone=data.get("zone"),
+                   fetched_at=data.get("fetched_at"))
+
+    def age(self) -> Optional[float]:
+        return time.time() - self.fetched_at if self.fetched_at else None
+
+
+_catalogs: dict[Optional[str], InstanceCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(
+    zone: Optional[str] = None,
+    api: Optional["ScalewayInstanceAPI"] = None,
+    cache_dir: str | Path | None = None,
+    ttl: int = CATALOG_TTL,
+    refresh: bool = False,
+) -> InstanceCatalog:
+    """Catalog for a zone: memory → fresh disk cache → API → stale cache → built-in.
+
+    Without a zone the built-in table is returned (no I/O).
+    """
+    with _catalogs_lock:
+        cached = _catalogs.get(zone)
+        if cached and not refresh and (zone is None or (cached.age() or 0) < ttl):
+            return cached
+        if zone is None:
+            catalog = _catalogs[None] = InstanceCatalog.builtin()
+            return catalog
+
+        path = Path(cache_dir or DEFAULT_CACHE_DIR) / f"scaleway-catalog-{zone}.json"
+        stale = None
+        if path.exists():
+            try:
+                stale = InstanceCatalog.load(path)
+                if not refresh and (stale.age() or ttl) < ttl:
+                    _catalogs[zone] = stale
+                    return stale
+            except (ValueError, KeyError, TypeError) as e:
+                logger.debug(f"Ignoring unreadable catalog cache {path}: {e}")
+
+        catalog = None
+        if api is not None:
+            try:
+                products = api.list_instance_types(zone)
+                specs = {name: spec_from_product(name, p) for name, p in products.items()
+                         if not p.get("end_of_service") and not p.get("baremetal")}
+                catalog = InstanceCatalog(specs, source="api", zone=zone, fetched_at=time.time())
+                try:
+                    catalog.save(path)
+                except OSError as e:
+                    logger.debug(f"Could not write catalog cache {path}: {e}")
+                logger.info(f"Instance catalog for {zone}: {len(specs)} types from the API")
+            except Exception as e:
+                logger.warning(f"Could not fetch instance catalog for {zone}: {e}")
+
+        if catalog is None and stale is not None:
+            logger.info(f"Using cached instance catalog for {zone} "
+                        f"({(stale.age() or 0) / 3600:.0f}h old)")
+            catalog = stale
+        if catalog is None:
+            logger.info("Using built-in instance catalog")
+            catalog = InstanceCatalog.builtin()
+            catalog.zone = zone
+            catalog.fetched_at = time.time() - ttl + 300      # retry the API in 5 min
+        _catalogs[zone] = catalog
+        return catalog
@@ -12,45 +12,279 @@ Confidence: 85 — Based on current Scaleway documentation (Feb 2026).
 
 from __future__ import annotations
 
+import random
+import threading
 import time
-from typing import Any, Optional
-
-import requests
+from concurrent.futures import Future, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
 
+from vmware2scw.scaleway.api_client import ScalewayAPIError, get_api_client
 from vmware2scw.utils.logging import get_logger
 
 logger = get_logger(__name__)
 
-SCW_API_BASE = "https://api.scaleway.com"
+# Snapshot import polling bounds (seconds)
+MIN_POLL_INTERVAL = 5
+MAX_POLL_INTERVAL = 60
+
+
+def poll_delay(size_bytes: Optional[int], elapsed: float, errors: int = 0) -> float:
+    """Seconds until the next status check of an import.
+
+    Small images are checked often (they finish in a minute or two);
+    large ones and long-running imports less so. Consecutive errors back
+    off exponentially. ±20% jitter keeps concurrent waiters from polling
+    in lockstep.
+    """
+    size_gb = (size_bytes or 0) / (1024**3)
+    delay = max(MIN_POLL_INTERVAL, size_gb / 10, elapsed / 10)
+    if errors:
+        delay = max(delay, MIN_POLL_INTERVAL * 2 ** errors)
+    return min(MAX_POLL_INTERVAL, delay) * random.uniform(0.8, 1.2)
+
+
+# Resource kinds the shared poller can watch:
+#   kind -> (API, list path, list key, project filter, page-size param, ready, failed)
+_POLLED_KINDS = {
+    "snapshot": ("block", "/snapshots", "snapshots", "project_id", "page_size",
+                 {"available"}, {"error", "in_error"}),
+    "image": ("instance", "/images", "images", "project", "per_page",
+              {"available"}, {"error"}),
+}
+LIST_PAGE_SIZE = 100
+MISSING_ROUNDS_BEFORE_GET = 3
+# Wait before the first round, so a burst of watch() calls shares it
+FIRST_ROUND_DELAY = 1
+
+
+@dataclass
+class _Watch:
+    resource_id: str
+    size: Optional[int]
+    deadline: float
+    future: Future = field(default_factory=Future)
+    started: float = field(default_factory=time.time)
+    status: str = "unknown"
+    missing: int = 0
+
+
+class ResourcePoller:
+    """Fleet-wide status poller for one resource kind in one zone/project.
+
+    Every waiter in the process (all migrations, all disks) registers
+    here instead of polling on its own. One background thread issues a
+    paginated, project-filtered list call per round and resolves each
+    waiter's future when its resource becomes ready or fails. The API
+    cost is therefore about one call per page per round, regardless of
+    how many resources are outstanding.
+
+    The round interval is the shortest poll_delay() wanted by any
+    waiter, but at least MIN_POLL_INTERVAL per page listed, so large
+    fleets slow down instead of multiplying calls. API errors back off
+    exponentially and honour Retry-After. A resource that is missing from
+    the list for a few rounds (e.g. list not yet consistent) is fetched
+    directly.
+    """
+
+    _registry: dict[tuple, "ResourcePoller"] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, api: "ScalewayInstanceAPI", kind: str, zone: str):
+        self.api = api
+        self.kind = kind
+        self.zone = zone
+        self._watches: dict[str, _Watch] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._errors = 0
+        self._pages = 1
+
+    @classmethod
+    def get(cls, api: "ScalewayInstanceAPI", kind: str, zone: str) -> "ResourcePoller":
+        key = (kind, zone, api.project_id)
+        with cls._registry_lock:
+            poller = cls._registry.get(key)
+            if poller is None:
+                poller = cls._registry[key] = cls(api, kind, zone)
+            return poller
+
+    def watch(self, resource_id: str, size: Optional[int] = None, timeout: float = 1800) -> Future:
+        """Future resolved with the resource dict once it is ready."""
+        with self._lock:
+            existing = self._watches.get(resource_id)
+            if existing:
+                return existing.future
+            w = _Watch(resource_id, size, deadline=time.time() + timeout)
+            self._watches[resource_id] = w
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name=f"scw-poll-{self.kind}-{self.zone}", daemon=True)
+                self._thread.start()
+        return w.future
+
+    def outstanding(self) -> int:
+        with self._lock:
+            return len(self._watches)
+
+    # ── Polling thread ───────────────────────────────────────────
+
+    def _run(self) -> None:
+        try:
+            self._poll()
+        except BaseException as e:
+            # Nothing would resolve the outstanding futures any more
+            with self._lock:
+                pending = list(self._watches.values())
+                self._watches.clear()
+                self._thread = None
+            logger.error(f"{self.kind} poller for {self.zone} stopped: {e!r}")
+            for w in pending:
+                w.future.set_exception(RuntimeError(
+                    f"{self.kind.capitalize()} {w.resource_id}: status poller stopped ({e!r})"))
+            raise
+
+    def _poll(self) -> None:
+        time.sleep(FIRST_ROUND_DELAY)
+        while True:
+            with self._lock:
+                if not self._watches:
+                    self._thread = None
+                    return
+            try:
+                self._round()
+                self._errors = 0
+                delay = self._interval()
+            except Exception as e:
+                # API errors, but also undecodable or unexpected responses
+                self._errors += 1
+                retry_after = e.retry_after if isinstance(e, ScalewayAPIError) else None
+                delay = max(poll_delay(None, 0, self._errors), retry_after or 0)
+                logger.warning(f"{self.kind} status list failed in {self.zone} ({e!r}) — "
+                               f"retrying in {delay:.0f}s")
+            self._expire()
+            time.sleep(delay)
+
+    def _interval(self) -> float:
+        now = time.time()
+        with self._lock:
+            wanted = [poll_delay(w.size, now - w.started) for w in self._watches.values()]
+        if not wanted:
+            return 0
+        return min(MAX_POLL_INTERVAL * self._pages, max(min(wanted), MIN_POLL_INTERVAL * self._pages))
+
+    def _round(self) -> None:
+        with self._lock:
+            ids = set(self._watches)
+        if not ids:
+            return
+        found = {}
+        for item in self._list_all():
+            if item.get("id") in ids:
+                found[item["id"]] = item
+        for rid in ids - found.keys():
+            with self._lock:
+                w = self._watches.get(rid)
+                if w is None:
+                    continue
+                w.missing += 1
+                fetch = w.missing >= MISSING_ROUNDS_BEFORE_GET
+            if fetch:
+                found[rid] = self._get_one(rid)
+        for rid, item in found.items():
+            self._update(rid, item)
+
+    def _list_all(self) -> list[dict]:
+        api_name, path, list_key, project_param, size_param, _, _ = _POLLED_KINDS[self.kind]
+        url = (self.api._url_block if api_name == "block" else self.api._url_instance)(self.zone, path)
+        items: list[dict] = []
+        page = 1
+        while True:
+            result = self.api._request("GET", url, params={
+                project_param: self.api.project_id, "page": page, size_param: LIST_PAGE_SIZE,
+            })
+            batch = result.get(list_key, [])
+            items.extend(batch)
+            total = result.get("total_count")
+            if len(batch) < LIST_PAGE_SIZE or (total is not None and len(items) >= total):
+                break
+            page += 1
+        self._pages = page
+        return items
+
+    def _get_one(self, resource_id: str) -> dict:
+        if self.kind == "snapshot":
+            return self.api.get_snapshot(self.zone, resource_id)
+        return self.api.get_image(self.zone, resource_id)
+
+    def _update(self, resource_id: str, item: dict) -> None:
+        _, _, _, _, _, ready, failed = _POLLED_KINDS[self.kind]
+        status = item.get("status") or item.get("state") or "unknown"
+        with self._lock:
+            w = self._watches.get(resource_id)
+            if w is None:
+                return
+            w.missing = 0
+            if status in ready:
+                del self._watches[resource_id]
+            elif status in failed:
+                del self._watches[resource_id]
+            else:
+                if status != w.status:
+                    logger.info(f"{self.kind.capitalize()} {resource_id} status: {status} "
+                                f"({time.time() - w.started:.0f}s elapsed, "
+                                f"{len(self._watches)} {self.kind}(s) pending in {self.zone})")
+                    w.status = status
+                return
+        if status in ready:
+            w.future.set_result(item)
+        else:
+            w.future.set_exception(RuntimeError(f"{self.kind.capitalize()} {resource_id} failed: {status}"))
+
+    def _expire(self) -> None:
+        now = time.time()
+        with self._lock:
+            expired = [w for w in self._watches.values() if now > w.deadline]
+            for w in expired:
+                del self._watches[w.resource_id]
+        for w in expired:
+            w.future.set_exception(TimeoutError(
+                f"{self.kind.capitalize()} {w.resource_id} not ready after "
+                f"{now - w.started:.0f}s (status: {w.status})"))
 
 
 class ScalewayInstanceAPI:
     """Interact with Scaleway APIs for importing images and creating instances."""
 
-    def __init__(self, access_key: str, secret_key: str, project_id: str):
+    def __init__(self, access_key: str, secret_key: str, project_id: str,
+                 api_url: Optional[str] = None):
         self.project_id = project_id
-        self.session = requests.Session()
-        self.session.headers.update({
-            "X-Auth-Token": secret_key,
-            "Content-Type": "application/json",
-        })
+        # Shared per process: connection pool, rate limits, retries, metrics
+        self.client = get_api_client(secret_key, base_url=api_url)
 
     def _url_block(self, zone: str, path: str) -> str:
         """Block Storage API URL."""
-        return f"{SCW_API_BASE}/block/v1/zones/{zone}{path}"
+        return f"{self.client.base_url}/block/v1/zones/{zone}{path}"
 
     def _url_instance(self, zone: str, path: str) -> str:
         """Instance API URL."""
-        return f"{SCW_API_BASE}/instance/v1/zones/{zone}{path}"
+        return f"{self.client.base_url}/instance/v1/zones/{zone}{path}"
+
+    def _request(self, method: str, url: str, json: Any = None, params: Optional[dict] = None,
+                 dedup: Optional[Callable[[], Optional[dict]]] = None) -> dict[str, Any]:
+        return self.client.request(method, url, json=json, params=params, dedup=dedup)
 
-    def _request(self, method: str, url: str, **kwargs) -> dict[str, Any]:
-        resp = self.session.request(method, url, **kwargs)
-        if not resp.ok:
-            logger.error(f"API error {resp.status_code}: {resp.text[:500]}")
-            resp.raise_for_status()
-        if resp.status_code == 204:
-            return {}
-        return resp.json()
+    def _find_by_name(self, url: str, list_key: str, name: str, project_param: str) -> Optional[dict]:
+        """Resource with exactly this name in the project (dedup for creates)."""
+        result = self._request("GET", url, params={project_param: self.project_id, "name": name})
+        matches = [r for r in result.get(list_key, []) if r.get("name") == name]
+        if not matches:
+            return None
+        return {list_key[:-1]: max(matches, key=lambda r: r.get("creation_date") or "")}
+
+    def metrics(self) -> dict[str, dict]:
+        """Latency / retry / error counters of the shared API client."""
+        return self.client.metrics()
 
     # ── Snapshots (Block Storage API) ────────────────────────────
 
@@ -85,7 +319,8 @@ class ScalewayInstanceAPI:
             payload["size"] = size
 
         logger.info(f"Importing snapshot via Block Storage API from s3://{bucket}/{key}")
-        result = self._request("POST", url, json=payload)
+        result = self._request("POST", url, json=payload, dedup=lambda: self._find_by_name(
+            self._url_block(zone, "/snapshots"), "snapshots", name, "project_id"))
         snapshot = result.get("snapshot", result)
         logger.info(f"Snapshot import initiated: {snapshot.get('id', 'unknown')} "
                      f"(status: {snapshot.get('status', 'unknown')})")
@@ -102,31 +337,61 @@ class ScalewayInstanceAPI:
         zone: str,
         snapshot_id: str,
         timeout: int = 1800,
-        poll_interval: int = 15,
+        size: Optional[int] = None,
     ) -> dict:
         """Wait for snapshot import to complete.
 
         Import can take a while for large images (10-30min for multi-GB).
         """
-        start = time.time()
-        while True:
-            snapshot = self.get_snapshot(zone, snapshot_id)
-            status = snapshot.get("status", "unknown")
+        return self.wait_for_snapshots(zone, [snapshot_id], sizes={snapshot_id: size},
+                                       timeout=timeout)[snapshot_id]
 
-            if status == "available":
-                logger.info(f"Snapshot {snapshot_id} is available")
-                return snapshot
-            elif status in ("error", "in_error"):
-                raise RuntimeError(f"Snapshot {snapshot_id} failed: {status}")
+    def wait_for_snapshots(
+        self,
+        zone: str,
+        snapshot_ids: list[str],
+        sizes: Optional[dict[str, Optional[int]]] = None,
+        timeout: Optional[int] = None,
+        on_available: Optional[Callable[[dict], None]] = None,
+    ) -> dict[str, dict]:
+        """Wait for several snapshot imports at once.
+
+        Status checks go through the shared ResourcePoller for the zone,
+        so concurrent migrations share list calls instead of each
+        polling its own snapshots. Returns as soon as the last one is
+        available, so the total wait is that of the slowest import, not
+        the sum.
 
-            elapsed = time.time() - start
-            if elapsed > timeout:
-                raise TimeoutError(
-                    f"Snapshot {snapshot_id} not ready after {timeout}s (status: {status})"
-                )
+        Args:
+            sizes: Image size in bytes per snapshot id (drives poll rate
+                and the default timeout)
+            timeout: Per-snapshot limit in seconds (default: 30 min, plus
+                30s per GB above 60 GB)
+            on_available: Called with each snapshot as it becomes available
+
+        Raises:
+            RuntimeError: A snapshot ended in error
+            TimeoutError: A snapshot did not become available in time
+        """
+        sizes = sizes or {}
+        poller = ResourcePoller.get(self, "snapshot", zone)
+        start = time.time()
 
-            logger.info(f"Snapshot status: {status} ({elapsed:.0f}s elapsed)")
-            time.sleep(poll_interval)
+        futures = {}
+        for sid in snapshot_ids:
+            size_gb = (sizes.get(sid) or 0) / (1024**3)
+            limit = timeout or 1800 + max(0.0, size_gb - 60) * 30
+            futures[poller.watch(sid, size=sizes.get(sid), timeout=limit)] = sid
+
+        done: dict[str, dict] = {}
+        for fut in as_completed(futures):
+            snapshot = fut.result()          # raises RuntimeError / TimeoutError
+            sid = futures[fut]
+            logger.info(f"Snapshot {sid} is available ({time.time() - start:.0f}s)")
+            done[sid] = snapshot
+            if on_available:
+                on_available(snapshot)
+        return done
 
     # ── Images (Instance API) ────────────────────────────────────
 
@@ -166,7 +431,8 @@ class ScalewayInstanceAPI:
 
         logger.info(f"Creating image '{name}' from snapshot {root_volume_snapshot_id}"
                      + (f" + {len(extra_snapshots)} extra volume(s)" if extra_snapshots else ""))
-        result = self._request("POST", url, json=payload)
+        result = self._request("POST", url, json=payload, dedup=lambda: self._find_by_name(
+            url, "images", name, "project"))
         image = result.get("image", result)
         logger.info(f"Image created: {image.get('id', 'unknown')}")
         return image
@@ -176,6 +442,12 @@ class ScalewayInstanceAPI:
         result = self._request("GET", url)
         return result.get("image", result)
 
+    def wait_for_image(self, zone: str, image_id: str, timeout: int = 600) -> dict:
+        """Wait for an image to become available (via the shared poller)."""
+        image = ResourcePoller.get(self, "image", zone).watch(image_id, timeout=timeout).result()
+        logger.info(f"Image {image_id} is available")
+        return image
+
     # ── Instances ────────────────────────────────────────────────
 
     def create_instance(
@@ -197,11 +469,21 @@ class ScalewayInstanceAPI:
             payload["tags"] = tags
 
         logger.info(f"Creating instance '{name}' ({commercial_type})")
-        result = self._request("POST", url, json=payload)
+        result = self._request("POST", url, json=payload, dedup=lambda: self._find_by_name(
+            url, "servers", name, "project"))
         server = result.get("server", result)
         logger.info(f"Instance created: {server.get('id', 'unknown')}")
         return server
 
     def list_instance_types(self, zone: str) -> dict:
+        """All server products of a zone: {name: product}, every page."""
         url = self._url_instance(zone, "/products/servers")
-        return self._request("GET", url).get("servers", {})
+        servers: dict = {}
+        page = 1
+        while True:
+            batch = self._request("GET", url, params={"page": page, "per_page": LIST_PAGE_SIZE}
+                                  ).get("servers", {})
+            servers.update(batch)
+            if len(batch) < LIST_PAGE_SIZE:
+                return servers
+            page += 1
@@ -2,16 +2,20 @@
 
 Catalogue updated from: https://www.scaleway.com/en/pricing/virtual-instances/
 Last update: 2026-02-19
+
+INSTANCE_TYPES is the offline fallback; scaleway/catalog.py fetches the
+live per-zone catalog and indexes it for suggestions.
 """
 
 from __future__ import annotations
 
 from dataclasses import dataclass, field
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Iterable
 
 from vmware2scw.utils.logging import get_logger
 
 if TYPE_CHECKING:
+    from vmware2scw.scaleway.catalog import InstanceCatalog
     from vmware2scw.vmware.inventory import VMInfo
 
 logger = get_logger(__name__)
@@ -166,8 +170,18 @@ class ResourceMapper:
     """Maps VMware VM resources to Scaleway instance types.
 
     For Windows VMs, automatically filters to POP2-*-WIN types.
+
+    Args:
+        catalog: InstanceCatalog to pick from (default: built-in table).
+            Use scaleway.catalog.get_catalog(zone, api) for live prices.
     """
 
+    def __init__(self, catalog: "InstanceCatalog | None" = None):
+        if catalog is None:
+            from vmware2scw.scaleway.catalog import get_catalog
+            catalog = get_catalog()
+        self.catalog = catalog
+
     def suggest_instance_type(
         self,
         vm_info: "VMInfo",
@@ -175,34 +189,49 @@ class ResourceMapper:
         prefer_dedicated: bool = True,
     ) -> list[InstanceTypeSuggestion]:
         """Suggest the best Scaleway instance types for a VM."""
-        required_cpu = vm_info.cpu
-        required_ram_gb = vm_info.memory_mb / 1024
-        num_disks = len(vm_info.disks)
+        return list(self._suggest(self._requirements(vm_info), exclude_dev, prefer_dedicated))
 
+    def suggest_many(
+        self,
+        vms: "Iterable[VMInfo]",
+        exclude_dev: bool = True,
+        prefer_dedicated: bool = True,
+    ) -> dict[str, list[InstanceTypeSuggestion]]:
+        """Suggestions for a whole fleet, keyed by (vCenter-qualified) VM name.
+
+        VMs with the same shape (vCPU, RAM, OS family, disks) share one
+        catalog query.
+        """
+        memo: dict[tuple, tuple[InstanceTypeSuggestion, ...]] = {}
+        out = {}
+        for vm in vms:
+            req = self._requirements(vm)
+            if req not in memo:
+                memo[req] = self._suggest(req, exclude_dev, prefer_dedicated)
+            out[vm.qualified_name] = list(memo[req])
+        logger.debug(f"Suggested instance types for {len(out)} VMs ({len(memo)} distinct shapes)")
+        return out
+
+    def _requirements(self, vm_info: "VMInfo") -> tuple:
         os_family, _ = self.get_os_family(vm_info.guest_os)
-        is_windows = os_family == "windows"
+        return (
+            vm_info.cpu,
+            vm_info.memory_mb / 1024,
+            os_family == "windows",
+            len(vm_info.disks),
+            vm_info.total_disk_gb,
+        )
+
+    def _suggest(
+        self, req: tuple, exclude_dev: bool, prefer_dedicated: bool,
+    ) -> tuple[InstanceTypeSuggestion, ...]:
+        required_cpu, required_ram_gb, is_windows, num_disks, total_disk_gb = req
 
         suggestions = []
-
-        for name, spec in INSTANCE_TYPES.items():
-            if exclude_dev and spec.category == "development":
-                continue
-            # Windows VMs → only Windows types
-            if is_windows and not spec.windows:
-                continue
-            # Non-Windows → exclude Windows types
-            if not is_windows and spec.windows:
-                continue
-            if spec.vcpus < required_cpu:
-                continue
-            if spec.ram_gb < required_ram_gb:
-                continue
-            if num_disks > spec.max_volumes:
-                continue
-            if not spec.block_storage:
-                if spec.local_storage_gb < vm_info.total_disk_gb:
-                    continue
-
+        for spec in self.catalog.candidates(
+            required_cpu, required_ram_gb, windows=is_windows, exclude_dev=exclude_dev,
+            num_disks=num_disks, disk_gb=total_disk_gb,
+        ):
             cpu_ratio = required_cpu / spec.vcpus
             ram_ratio = required_ram_gb / spec.ram_gb
             fit_score = (cpu_ratio + ram_ratio) / 2
@@ -220,7 +249,7 @@ class ResourceMapper:
                 notes_parts.append(f"Local SSD ({spec.local_storage_gb}GB)")
 
             suggestions.append(InstanceTypeSuggestion(
-                instance_type=name,
+                instance_type=spec.name,
                 vcpus=spec.vcpus,
                 ram_gb=spec.ram_gb,
                 bandwidth_mbps=spec.bandwidth_mbps,
@@ -232,8 +261,9 @@ class ResourceMapper:
                 price_month_eur=round(spec.price_hour_eur * 730, 2),
             ))
 
-        suggestions.sort(key=lambda s: s.fit_score, reverse=True)
-        return suggestions[:5]
+        # Best fit first; cheapest wins a tie
+        suggestions.sort(key=lambda s: (-s.fit_score, s.price_hour_eur))
+        return tuple(suggestions[:5])
 
     def get_os_family(self, guest_os_id: str) -> tuple[str, str]:
         """Map VMware guest OS ID to OS family."""
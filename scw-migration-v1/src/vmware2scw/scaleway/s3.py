@@ -2,7 +2,15 @@
 
 from __future__ import annotations
 
+import base64
+import contextlib
+import hashlib
+import math
+import mmap
 import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, CancelledError, ThreadPoolExecutor, wait
 from pathlib import Path
 from typing import Callable, Optional
 
@@ -13,6 +21,162 @@ from vmware2scw.utils.logging import get_logger
 
 logger = get_logger(__name__)
 
+MIN_PART_SIZE = 64 * 1024 * 1024          # 64MB, same as the managed upload used
+MAX_PART_SIZE = 512 * 1024 * 1024         # keeps a retried part cheap
+MAX_PARTS = 10_000                        # S3 multipart hard limit
+TARGET_PART_SECONDS = 10                  # aim for parts that take ~10s per stream
+CHECKPOINT_INTERVAL = 2.0                 # min seconds between ledger checkpoints
+# Streamed parts are buffered in RAM: keep them small, and bound how many
+# buffers all streams of this process hold at once
+STREAM_PART_SIZE = MIN_PART_SIZE
+STREAM_BUFFERS = 16                       # 1 GB at 64MB parts
+
+
+class _MmapSlice:
+    """Read-only, seekable file-like view of one part of an mmap (or bytearray).
+
+    botocore streams (and checksums) the body from this without the
+    whole part ever being copied into a bytes object.
+    """
+
+    def __init__(self, mm: mmap.mmap, start: int, length: int):
+        self._mm = mm
+        self._start = start
+        self._len = length
+        self._pos = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def read(self, size: int = -1) -> bytes:
+        remaining = self._len - self._pos
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        begin = self._start + self._pos
+        self._pos += size
+        return self._mm[begin:begin + size]
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self._pos, os.SEEK_END: self._len}[whence]
+        self._pos = min(max(0, base + offset), self._len)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def md5(self) -> bytes:
+        with memoryview(self._mm) as view:
+            return hashlib.md5(view[self._start:self._start + self._len]).digest()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+
+class _AdaptiveWindow:
+    """Parts in flight for one file, tuned by hill-climbing on throughput.
+
+    Every window's worth of completed parts, the aggregate rate is
+    compared with the best recent one: more streams while it keeps
+    improving, fewer when it drops (congestion / throttling).
+    """
+
+    def __init__(self, initial: int, maximum: int):
+        self.maximum = max(1, maximum)
+        self.size = max(1, min(initial, self.maximum))
+        self._best = 0.0
+        self._reset()
+
+    def _reset(self) -> None:
+        self._bytes = 0
+        self._count = 0
+        self._since = time.monotonic()
+
+    def record(self, nbytes: int) -> None:
+        self._bytes += nbytes
+        self._count += 1
+        if self._count < self.size:
+            return
+        rate = self._bytes / max(time.monotonic() - self._since, 1e-6)
+        if rate > self._best * 1.1 and self.size < self.maximum:
+            self.size = min(self.maximum, self.size + 2)
+        elif rate < self._best * 0.8 and self.size > 2:
+            self.size -= 1
+        self._best = max(self._best * 0.9, rate)
+        self._reset()
+
+
+class _StreamRate:
+    """Process-wide EWMA of single-stream upload throughput (bytes/s)."""
+
+    def __init__(self, alpha: float = 0.2):
+        self._alpha = alpha
+        self._rate: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def record(self, nbytes: int, seconds: float) -> None:
+        if seconds <= 0 or nbytes <= 0:
+            return
+        sample = nbytes / seconds
+        with self._lock:
+            self._rate = sample if self._rate is None else (
+                self._alpha * sample + (1 - self._alpha) * self._rate)
+
+    @property
+    def rate(self) -> Optional[float]:
+        return self._rate
+
+
+_stream_rate = _StreamRate()
+
+SHA256_TAG = "vmware2scw-sha256"
+HASH_CHUNK = 16 * 1024 * 1024
+
+
+def _md5_of(body) -> bytes:
+    """MD5 digest of a part body (bytes or _MmapSlice) without copying it."""
+    if isinstance(body, _MmapSlice):
+        return body.md5()
+    return hashlib.md5(body).digest()
+
+
+def multipart_etag(part_md5s: list[bytes]) -> str:
+    """The ETag S3 assigns to a multipart object: MD5 of the part MD5s, "-N"."""
+    return f"{hashlib.md5(b''.join(part_md5s)).hexdigest()}-{len(part_md5s)}"
+
+
+def _hash_pass(mm, file_size: int, part_size: int, resumed: dict[int, str],
+               stop: Optional[threading.Event] = None) -> tuple[str, list[int]]:
+    """One sequential pass: full-object SHA-256, and the MD5 of the parts
+    uploaded by an earlier run (new parts are hashed by _upload_part).
+
+    Returns (sha256 hex, resumed parts whose ETag doesn't match the
+    local data). Stops early, raising CancelledError, once stop is set.
+    """
+    sha = hashlib.sha256()
+    stale = []
+    view = memoryview(mm) if file_size else memoryview(b"")
+    try:
+        n = 1
+        for start in range(0, max(file_size, 1), part_size):
+            end = min(start + part_size, file_size)
+            md5 = hashlib.md5() if n in resumed else None
+            for pos in range(start, end, HASH_CHUNK):
+                if stop is not None and stop.is_set():
+                    raise CancelledError()
+                chunk = view[pos:min(pos + HASH_CHUNK, end)]
+                sha.update(chunk)
+                if md5 is not None:
+                    md5.update(chunk)
+            if md5 is not None and resumed[n].strip('"') != md5.hexdigest():
+                stale.append(n)
+            n += 1
+    finally:
+        view.release()
+    return sha.hexdigest(), stale
+
 
 class ScalewayS3:
     """Manages uploads to Scaleway Object Storage (S3-compatible).
@@ -24,9 +188,12 @@ class ScalewayS3:
     implementation is mature.
     """
 
-    def __init__(self, region: str, access_key: str, secret_key: str):
+    def __init__(self, region: str, access_key: str, secret_key: str, part_concurrency: int = 16):
         self.region = region
         self.endpoint_url = f"https://s3.{region}.scw.cloud"
+        self.part_concurrency = part_concurrency
+        self._credentials = (access_key, secret_key)
+        self._resource = None
 
         self.client = boto3.client(
             "s3",
@@ -36,18 +203,31 @@ class ScalewayS3:
             region_name=region,
             config=Config(
                 retries={"max_attempts": 3, "mode": "adaptive"},
-                max_pool_connections=10,
+                # One connection per in-flight part plus headroom for control calls
+                max_pool_connections=part_concurrency + 4,
             ),
         )
-        self.resource = boto3.resource(
-            "s3",
-            endpoint_url=self.endpoint_url,
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key,
-            region_name=region,
-        )
+        # Shared by every upload through this client, across disks and VMs
+        self._part_pool = ThreadPoolExecutor(max_workers=part_concurrency,
+                                             thread_name_prefix="s3-part")
+        # Full-object hash passes, one per upload in progress
+        self._hash_pool = ThreadPoolExecutor(max_workers=10, thread_name_prefix="s3-hash")
+
+        logger.info(f"Initialized Scaleway S3 client (region: {region}, "
+                    f"{part_concurrency} part streams)")
 
-        logger.info(f"Initialized Scaleway S3 client (region: {region})")
+    @property
+    def resource(self):
+        if self._resource is None:
+            access_key, secret_key = self._credentials
+            self._resource = boto3.resource(
+                "s3",
+                endpoint_url=self.endpoint_url,
+                aws_access_key_id=access_key,
+                aws_secret_access_key=secret_key,
+                region_name=self.region,
+            )
+        return self._resource
 
     def create_bucket_if_not_exists(self, bucket: str) -> None:
         """Create the transit bucket if it doesn't exist."""
@@ -63,25 +243,50 @@ class ScalewayS3:
             else:
                 raise
 
-    def upload_image(
+    def upload_image(self, local_path: str | Path, bucket: str, key: str) -> str:
+        """Upload a qcow2 image in one go (nothing persisted to resume from).
+
+        Same part sizing, pooling and verification as
+        upload_image_resumable(), with a throwaway ledger.
+
+        Returns:
+            S3 URL of the uploaded image
+        """
+        return self.upload_image_resumable(local_path, bucket, key, {})
+
+    # ── Resumable multipart upload ───────────────────────────────
+
+    def upload_image_resumable(
         self,
         local_path: str | Path,
         bucket: str,
         key: str,
-        progress_callback: Optional[Callable[[int], None]] = None,
+        ledger: dict,
+        checkpoint: Optional[Callable[[], None]] = None,
+        lock: Optional[threading.Lock] = None,
     ) -> str:
-        """Upload a qcow2 image to S3 using multipart upload.
+        """Upload a qcow2 image as a multipart upload that survives restarts.
+
+        ledger is a JSON-serialisable dict owned by the caller (the
+        migration state). It records the UploadId, the part size, the
+        source file's size/mtime and the ETag of every completed part;
+        checkpoint() is called whenever it changes so the caller can
+        persist it. On a later call with the same ledger, the upload is
+        reconciled with ListParts and only the missing parts are sent.
 
-        Uses boto3's managed upload which automatically handles:
-        - Multipart upload for large files
-        - Retry logic
-        - Concurrency
+        Parts are read straight from an mmap of the file and sent through
+        the client's shared part pool; the number in flight adapts to
+        the measured throughput.
 
         Args:
             local_path: Path to local qcow2 file
             bucket: S3 bucket name
             key: Object key (path within bucket)
-            progress_callback: Optional callback(bytes_transferred)
+            ledger: Per-object upload ledger (mutated in place)
+            checkpoint: Called after ledger changes (at most every
+                CHECKPOINT_INTERVAL seconds, plus start and finish)
+            lock: Held while the ledger is mutated / checkpointed; share it
+                when several uploads write into the same state
 
         Returns:
             S3 URL of the uploaded image
@@ -89,53 +294,276 @@ class ScalewayS3:
         local_path = Path(local_path)
         if not local_path.exists():
             raise FileNotFoundError(f"Image file not found: {local_path}")
+        checkpoint = checkpoint or (lambda: None)
+        lock = lock or threading.Lock()
 
-        file_size = local_path.stat().st_size
-        logger.info(
-            f"Uploading {local_path.name} ({file_size / (1024**3):.2f} GB) "
-            f"to s3://{bucket}/{key}"
-        )
+        st = local_path.stat()
+        file_size = st.st_size
+        with lock:
+            done_parts = self._resume_parts(bucket, key, ledger, st)
 
-        # Configure multipart upload
-        transfer_config = boto3.s3.transfer.TransferConfig(
-            multipart_threshold=64 * 1024 * 1024,     # 64MB threshold
-            multipart_chunksize=64 * 1024 * 1024,     # 64MB chunks
-            max_concurrency=4,
-            use_threads=True,
-        )
+        if not ledger.get("upload_id"):
+            part_size = self.part_size_for(file_size, _stream_rate.rate, self.part_concurrency)
+            resp = self.client.create_multipart_upload(Bucket=bucket, Key=key)
+            with lock:
+                ledger.clear()
+                ledger.update({
+                    "upload_id": resp["UploadId"],
+                    "part_size": part_size,
+                    "size": file_size,
+                    "mtime_ns": st.st_mtime_ns,
+                    "parts": {},
+                })
+                checkpoint()
+            done_parts = {}
+            logger.info(
+                f"Uploading {local_path.name} ({file_size / (1024**3):.2f} GB) "
+                f"to s3://{bucket}/{key} ({part_size // (1024**2)}MB parts)"
+            )
 
-        # Progress tracking
-        class ProgressTracker:
-            def __init__(self, total_size, callback):
-                self.total_size = total_size
-                self.transferred = 0
-                self.callback = callback
-                self.last_logged_pct = -5  # Track last logged percentage
-
-            def __call__(self, bytes_amount):
-                self.transferred += bytes_amount
-                if self.callback:
-                    self.callback(self.transferred)
-                # Log every 5%
-                pct = self.transferred / self.total_size * 100
-                if pct - self.last_logged_pct >= 5:
-                    logger.info(f"Upload progress: {pct:.0f}% ({self.transferred / (1024**3):.2f} GB)")
-                    self.last_logged_pct = pct
-
-        tracker = ProgressTracker(file_size, progress_callback)
-
-        self.client.upload_file(
-            str(local_path),
-            bucket,
-            key,
-            Config=transfer_config,
-            Callback=tracker,
+        upload_id = ledger["upload_id"]
+        part_size = ledger["part_size"]
+        total_parts = max(1, math.ceil(file_size / part_size))
+        with lock:
+            ledger["parts"] = {str(n): etag for n, etag in done_parts.items()}
+            checkpoint()
+
+        with open(local_path, "rb") as f, \
+                (mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                 if file_size else contextlib.nullcontext(b"")) as mm:
+            # Full-object SHA-256 (and MD5 of parts uploaded by an earlier
+            # run) on the hashing pool, alongside the part uploads: both
+            # walk the same pages, so the file is read once
+            resumed = {n: etag for n, etag in done_parts.items()}
+            stop = threading.Event()
+            hashing = self._hash_pool.submit(_hash_pass, mm, file_size, part_size, resumed, stop)
+            try:
+                missing = [n for n in range(1, total_parts + 1) if n not in done_parts]
+                if missing:
+                    self._upload_parts(mm, local_path, bucket, key, upload_id, part_size,
+                                       file_size, missing, done_parts, ledger, checkpoint,
+                                       lock, total_parts)
+                sha256, stale = hashing.result()
+                if stale:
+                    logger.warning(f"{len(stale)} previously uploaded part(s) of {key} "
+                                   f"don't match the local file — re-uploading them")
+                    for n in stale:
+                        done_parts.pop(n, None)
+                    self._upload_parts(mm, local_path, bucket, key, upload_id, part_size,
+                                       file_size, stale, done_parts, ledger, checkpoint,
+                                       lock, total_parts)
+            except BaseException:
+                # Report the failure now, not after hashing the rest of the file
+                stop.set()
+                hashing.cancel()
+                raise
+            finally:
+                # The hash pass reads the mmap, which can't close under it
+                wait([hashing])
+
+        # Every ETag in done_parts is the MD5 of the local part: checked by
+        # _upload_part for new parts, by the hash pass for resumed ones
+        expected_etag = multipart_etag([bytes.fromhex(done_parts[n].strip('"'))
+                                        for n in sorted(done_parts)])
+        resp = self.client.complete_multipart_upload(
+            Bucket=bucket, Key=key, UploadId=upload_id,
+            MultipartUpload={"Parts": [
+                {"PartNumber": n, "ETag": done_parts[n]} for n in sorted(done_parts)
+            ]},
         )
+        self._verify_completed(bucket, key, resp.get("ETag", ""), expected_etag, sha256)
+        with lock:
+            ledger.update({"completed": True, "upload_id": None, "parts": {},
+                           "etag": expected_etag, "sha256": sha256})
+            checkpoint()
 
         url = f"{self.endpoint_url}/{bucket}/{key}"
-        logger.info(f"Upload complete: {url}")
+        logger.info(f"Upload complete: {url} (etag {expected_etag}, verified)")
         return url
 
+    def _upload_parts(self, mm, local_path, bucket, key, upload_id, part_size, file_size,
+                      missing, done_parts, ledger, checkpoint, lock, total_parts) -> None:
+        """Send the given parts concurrently, recording each in the ledger."""
+        window = _AdaptiveWindow(initial=4, maximum=self.part_concurrency)
+        queue = iter(missing)
+        pending: dict = {}
+        last_checkpoint = time.monotonic()
+        last_logged_pct = -5.0
+        started = time.monotonic()
+        sent_bytes = 0
+
+        try:
+            while True:
+                while len(pending) < window.size:
+                    n = next(queue, None)
+                    if n is None:
+                        break
+                    start = (n - 1) * part_size
+                    length = min(part_size, file_size - start)
+                    fut = self._part_pool.submit(
+                        self._upload_part, _MmapSlice(mm, start, length),
+                        bucket, key, upload_id, n)
+                    pending[fut] = n
+                if not pending:
+                    break
+
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    n = pending.pop(fut)
+                    etag, nbytes = fut.result()
+                    window.record(nbytes)
+                    sent_bytes += nbytes
+                    done_parts[n] = etag
+                    with lock:
+                        ledger["parts"][str(n)] = etag
+                        if time.monotonic() - last_checkpoint >= CHECKPOINT_INTERVAL:
+                            checkpoint()
+                            last_checkpoint = time.monotonic()
+
+                # Log every 5%
+                pct = len(done_parts) / total_parts * 100
+                if pct - last_logged_pct >= 5:
+                    rate = sent_bytes / max(time.monotonic() - started, 1e-6)
+                    logger.info(f"Upload progress {local_path.name}: {pct:.0f}% "
+                                f"({len(done_parts)}/{total_parts} parts, "
+                                f"{rate * 8 / 1e9:.2f} Gbit/s, {window.size} streams)")
+                    last_logged_pct = pct
+        finally:
+            for fut in pending:
+                fut.cancel()
+            wait(pending)
+            with lock:
+                checkpoint()
+
+    def _upload_part(self, body, bucket, key, upload_id, part_number):
+        """Upload one part with Content-MD5; the returned ETag must match it."""
+        length = len(body)
+        digest = _md5_of(body)
+        for attempt in range(3):
+            if hasattr(body, "seek"):
+                body.seek(0)
+            t0 = time.monotonic()
+            resp = self.client.upload_part(
+                Bucket=bucket, Key=key, UploadId=upload_id,
+                PartNumber=part_number, Body=body, ContentLength=length,
+                ContentMD5=base64.b64encode(digest).decode(),
+            )
+            _stream_rate.record(length, time.monotonic() - t0)
+            if resp["ETag"].strip('"') == digest.hex():
+                return resp["ETag"], length
+            logger.warning(f"Part {part_number} of {key}: ETag mismatch "
+                           f"(attempt {attempt + 1}/3) — re-sending")
+        raise RuntimeError(f"Part {part_number} of s3://{bucket}/{key} failed verification")
+
+    def _verify_completed(self, bucket: str, key: str, completed_etag: str,
+                          expected_etag: str, sha256: str) -> None:
+        """Check the assembled object against the locally computed ETag, then tag it.
+
+        A mismatch deletes the object, so a later run can't mistake it
+        for a good upload.
+        """
+        remote = completed_etag.strip('"') or self.get_object_etag(bucket, key)
+        if remote != expected_etag:
+            self.delete_object(bucket, key)
+            raise RuntimeError(f"Upload verification failed for s3://{bucket}/{key}: "
+                               f"ETag {remote} != expected {expected_etag}")
+        self.set_object_checksum(bucket, key, sha256)
+
+    def open_stream_upload(
+        self,
+        bucket: str,
+        key: str,
+        size: int,
+        ledger: dict,
+        checkpoint: Optional[Callable[[], None]] = None,
+        lock: Optional[threading.Lock] = None,
+    ) -> "MultipartStreamWriter":
+        """Start a multipart upload fed by write() calls (see MultipartStreamWriter).
+
+        size is the final object size, used to pick the part size. Any
+        upload left in the ledger by an interrupted stream is aborted:
+        a stream cannot resume mid-way.
+        """
+        lock = lock or threading.Lock()
+        with lock:
+            if ledger.get("upload_id"):
+                self.abort_multipart_upload(bucket, key, ledger["upload_id"])
+                ledger.clear()
+        return MultipartStreamWriter(self, bucket, key, size, ledger,
+                                     checkpoint or (lambda: None), lock)
+
+    @staticmethod
+    def part_size_for(file_size: int, stream_rate: Optional[float] = None, streams: int = 16) -> int:
+        """MB-aligned part size for a file.
+
+        At least MIN_PART_SIZE and large enough to stay within MAX_PARTS;
+        with a measured single-stream rate, sized so a part takes about
+        TARGET_PART_SECONDS (fewer requests on fast links), capped at
+        MAX_PART_SIZE and at one part per stream so small files still
+        upload in parallel.
+        """
+        mb = 1024 * 1024
+        needed = math.ceil(file_size / MAX_PARTS / mb) * mb
+        size = MIN_PART_SIZE
+        if stream_rate:
+            size = max(size, int(stream_rate * TARGET_PART_SECONDS) // mb * mb)
+            size = min(size, MAX_PART_SIZE, max(MIN_PART_SIZE, file_size // streams // mb * mb))
+        return max(size, needed)
+
+    def _resume_parts(self, bucket: str, key: str, ledger: dict, st: os.stat_result) -> dict[int, str]:
+        """Parts already on S3 for the ledger's upload, {PartNumber: ETag}.
+
+        Clears the ledger (aborting the stale upload) if the local file
+        changed since the upload started or the upload no longer exists.
+        """
+        upload_id = ledger.get("upload_id")
+        if not upload_id:
+            return {}
+
+        if ledger.get("size") != st.st_size or ledger.get("mtime_ns") != st.st_mtime_ns:
+            logger.info(f"Local image changed since upload started — restarting s3://{bucket}/{key}")
+            self.abort_multipart_upload(bucket, key, upload_id)
+            ledger.clear()
+            return {}
+
+        part_size = ledger["part_size"]
+        last_part = max(1, math.ceil(st.st_size / part_size))
+        remote: dict[int, str] = {}
+        try:
+            paginator = self.client.get_paginator("list_parts")
+            for page in paginator.paginate(Bucket=bucket, Key=key, UploadId=upload_id):
+                for part in page.get("Parts", []):
+                    n = part["PartNumber"]
+                    expected = part_size if n < last_part else st.st_size - part_size * (last_part - 1)
+                    if part["Size"] == expected:
+                        remote[n] = part["ETag"]
+        except self.client.exceptions.NoSuchUpload:
+            logger.info(f"Multipart upload for s3://{bucket}/{key} no longer exists — restarting")
+            ledger.clear()
+            return {}
+
+        logger.info(f"Resuming upload of s3://{bucket}/{key}: "
+                    f"{len(remote)}/{last_part} parts already on S3")
+        return remote
+
+    def abort_multipart_upload(self, bucket: str, key: str, upload_id: str) -> None:
+        """Abort one multipart upload (ignores uploads that are already gone)."""
+        try:
+            self.client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+            logger.info(f"Aborted incomplete upload s3://{bucket}/{key}")
+        except self.client.exceptions.NoSuchUpload:
+            pass
+
+    def abort_incomplete_uploads(self, bucket: str, prefix: str = "") -> int:
+        """Abort every in-progress multipart upload under prefix."""
+        aborted = 0
+        paginator = self.client.get_paginator("list_multipart_uploads")
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for upload in page.get("Uploads", []):
+                self.abort_multipart_upload(bucket, upload["Key"], upload["UploadId"])
+                aborted += 1
+        return aborted
+
     def check_object_exists(self, bucket: str, key: str) -> bool:
         """Check if an object already exists in S3."""
         try:
@@ -144,6 +572,69 @@ class ScalewayS3:
         except self.client.exceptions.ClientError:
             return False
 
+    def get_object_etag(self, bucket: str, key: str) -> str:
+        """ETag of an object, without quotes."""
+        return self.client.head_object(Bucket=bucket, Key=key)["ETag"].strip('"')
+
+    def set_object_checksum(self, bucket: str, key: str, sha256: str) -> None:
+        """Record the full-object SHA-256 as an object tag.
+
+        User metadata can only be set when a multipart upload is created,
+        before the hash is known; a tag can be added afterwards without
+        rewriting the object.
+        """
+        self.client.put_object_tagging(
+            Bucket=bucket, Key=key,
+            Tagging={"TagSet": [{"Key": SHA256_TAG, "Value": sha256}]},
+        )
+
+    def get_object_checksum(self, bucket: str, key: str) -> Optional[str]:
+        """SHA-256 recorded by set_object_checksum(), if any."""
+        try:
+            tags = self.client.get_object_tagging(Bucket=bucket, Key=key)["TagSet"]
+        except self.client.exceptions.ClientError:
+            return None
+        return next((t["Value"] for t in tags if t["Key"] == SHA256_TAG), None)
+
+    def is_uploaded(self, local_path: str | Path, bucket: str, key: str, ledger: dict,
+                    lock: Optional[threading.Lock] = None) -> bool:
+        """Whether s3://bucket/key already holds exactly local_path.
+
+        Same size is not enough. With a completed ledger for the unchanged
+        local file, the remote ETag must equal the one computed during
+        that upload (no local read). Otherwise the file is hashed once and
+        compared with the object's recorded SHA-256.
+        """
+        if ledger.get("upload_id"):
+            return False                    # unfinished upload: resume it instead
+        try:
+            head = self.client.head_object(Bucket=bucket, Key=key)
+        except self.client.exceptions.ClientError:
+            return False
+
+        st = Path(local_path).stat()
+        if head["ContentLength"] != st.st_size:
+            return False
+        remote_etag = head["ETag"].strip('"')
+        if (ledger.get("completed") and ledger.get("etag")
+                and ledger.get("size") == st.st_size and ledger.get("mtime_ns") == st.st_mtime_ns):
+            return remote_etag == ledger["etag"]
+
+        remote_sha = self.get_object_checksum(bucket, key)
+        if not remote_sha:
+            return False
+        logger.info(f"Hashing {Path(local_path).name} to compare with s3://{bucket}/{key}...")
+        h = hashlib.sha256()
+        with open(local_path, "rb") as f:
+            while chunk := f.read(HASH_CHUNK):
+                h.update(chunk)
+        if h.hexdigest() != remote_sha:
+            return False
+        with lock or contextlib.nullcontext():
+            ledger.update({"completed": True, "upload_id": None, "parts": {}, "size": st.st_size,
+                           "mtime_ns": st.st_mtime_ns, "etag": remote_etag, "sha256": remote_sha})
+        return True
+
     def get_object_size(self, bucket: str, key: str) -> int:
         """Get the size of an S3 object in bytes."""
         response = self.client.head_object(Bucket=bucket, Key=key)
@@ -178,3 +669,148 @@ class ScalewayS3:
                     "last_modified": obj["LastModified"],
                 })
         return objects
+
+
+
+class MultipartStreamWriter:
+    """Append-only file-like sink that uploads a byte stream as multipart parts.
+
+    Each full part is handed to the client's part pool as soon as it is
+    buffered, and uploaded straight from its buffer. write() blocks while
+    max_in_flight parts are outstanding, or while the process already
+    holds STREAM_BUFFERS part buffers, which bounds memory and
+    back-pressures the producer to the upload rate. Parts are
+    STREAM_PART_SIZE unless the object needs larger ones to stay within
+    MAX_PARTS. The ledger records the UploadId (so cleanup can abort it)
+    and is marked completed/streamed by close().
+    """
+
+    def __init__(self, s3: ScalewayS3, bucket: str, key: str, size: int, ledger: dict,
+                 checkpoint: Callable[[], None], lock: threading.Lock, max_in_flight: int = 4):
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        mb = 1024 * 1024
+        self.part_size = max(STREAM_PART_SIZE, math.ceil(size / MAX_PARTS / mb) * mb)
+        self._ledger = ledger
+        self._checkpoint = checkpoint
+        self._lock = lock
+        self._buf: Optional[bytearray] = None     # part being filled
+        self._fill = 0
+        self._next_part = 1
+        self._futures: dict = {}
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._sha256 = hashlib.sha256()
+
+        resp = s3.client.create_multipart_upload(Bucket=bucket, Key=key)
+        self.upload_id = resp["UploadId"]
+        with lock:
+            ledger.clear()
+            ledger.update({"upload_id": self.upload_id, "part_size": self.part_size,
+                           "size": size, "streamed": True, "parts": {}})
+            checkpoint()
+        logger.info(f"Streaming upload to s3://{bucket}/{key} "
+                    f"({size / (1024**3):.2f} GB, {self.part_size // (1024**2)}MB parts)")
+
+    def write(self, data: bytes) -> int:
+        self._sha256.update(data)
+        view = memoryview(data)
+        while view:
+            if self._buf is None:
+                _stream_buffers.acquire()
+                self._buf = bytearray(self.part_size)
+            n = min(len(view), self.part_size - self._fill)
+            self._buf[self._fill:self._fill + n] = view[:n]
+            self._fill += n
+            view = view[n:]
+            if self._fill == self.part_size:
+                self._submit()
+        return len(data)
+
+    def _submit(self) -> None:
+        """Upload the buffered part; its buffer is freed when it is sent."""
+        if self._buf is None:
+            _stream_buffers.acquire()
+            self._buf = bytearray()
+        body = _MmapSlice(self._buf, 0, self._fill)
+        self._buf, self._fill = None, 0
+        try:
+            self._raise_failed()
+            self._slots.acquire()
+        except BaseException:
+            _stream_buffers.release()
+            raise
+        n = self._next_part
+        self._next_part += 1
+        fut = self.s3._part_pool.submit(self.s3._upload_part, body, self.bucket, self.key,
+                                        self.upload_id, n)
+        fut.add_done_callback(self._part_done)
+        self._futures[fut] = n
+
+    def _part_done(self, _future) -> None:
+        self._slots.release()
+        _stream_buffers.release()
+
+    def _raise_failed(self) -> None:
+        for fut in [f for f in self._futures if f.done()]:
+            fut.result()
+
+    def close(self) -> str:
+        """Flush the last part, wait for all parts and complete the upload."""
+        if self._fill or self._next_part == 1:
+            self._submit()
+        wait(self._futures)
+        etags = {n: fut.result()[0] for fut, n in self._futures.items()}
+        # Each ETag was checked against the part's MD5 by _upload_part
+        expected_etag = multipart_etag([bytes.fromhex(etags[n].strip('"')) for n in sorted(etags)])
+        sha256 = self._sha256.hexdigest()
+        resp = self.s3.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+            MultipartUpload={"Parts": [
+                {"PartNumber": n, "ETag": etags[n]} for n in sorted(etags)
+            ]},
+        )
+        self.s3._verify_completed(self.bucket, self.key, resp.get("ETag", ""),
+                                  expected_etag, sha256)
+        with self._lock:
+            self._ledger.update({"completed": True, "upload_id": None,
+                                 "etag": expected_etag, "sha256": sha256})
+            self._checkpoint()
+        url = f"{self.s3.endpoint_url}/{self.bucket}/{self.key}"
+        logger.info(f"Streaming upload complete: {url}")
+        return url
+
+    def abort(self) -> None:
+        if self._buf is not None:
+            self._buf = None
+            _stream_buffers.release()
+        for fut in self._futures:
+            fut.cancel()
+        wait(self._futures)
+        self.s3.abort_multipart_upload(self.bucket, self.key, self.upload_id)
+        with self._lock:
+            self._ledger.clear()
+            self._checkpoint()
+
+
+# Part buffers held by all MultipartStreamWriters of this process
+_stream_buffers = threading.BoundedSemaphore(STREAM_BUFFERS)
+
+_clients: dict[tuple, ScalewayS3] = {}
+_clients_lock = threading.Lock()
+
+
+def get_s3_client(region: str, access_key: str, secret_key: str,
+                  part_concurrency: int = 16) -> ScalewayS3:
+    """Pooled ScalewayS3 per (region, credentials) for this process.
+
+    Reusing the client keeps its connection pool and part thread pool
+    warm across stages, disks and migrations.
+    """
+    cache_key = (region, access_key, secret_key, part_concurrency)
+    with _clients_lock:
+        client = _clients.get(cache_key)
+        if client is None:
+            client = ScalewayS3(region, access_key, secret_key, part_concurrency=part_concurrency)
+            _clients[cache_key] = client
+        return client
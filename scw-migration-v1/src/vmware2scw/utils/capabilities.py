@@ -0,0 +1,263 @@
+"""Host tool capability probe, cached on disk.
+
+virt-v2v, qemu-img and the firmware/kernel bits around them vary a lot
+between distributions. Instead of discovering that by trial and error
+for every VM (a failed virt-v2v attempt can take minutes), the worker
+probes once and records:
+
+  - tool locations (virt-v2v, virt-v2v-in-place, qemu-img, qemu-nbd, ...)
+  - virt-v2v input/output modes and command-line options
+  - qemu-img convert flags (-W, -m, --target-is-zero, ...) and qcow2
+    compression types
+  - OVMF firmware files, the nbd kernel module, /dev/kvm
+
+The result is stored as JSON in the cache directory and keyed by a
+fingerprint of the probed binaries (path, size, mtime), so a package
+upgrade invalidates it automatically.
+
+Confidence: 85 — option lists come from each tool's own --help /
+--machine-readable output rather than version-number guesses.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from vmware2scw.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Bump when the probe logic changes so stale caches are ignored
+PROBE_VERSION = 1
+
+DEFAULT_CACHE_DIR = Path("/var/lib/vmware2scw/cache")
+CACHE_FILE = "host-capabilities.json"
+
+PROBED_TOOLS = [
+    "virt-v2v", "virt-v2v-in-place", "virt-customize", "virt-win-reg",
+    "guestfish", "hivexregedit", "qemu-img", "qemu-nbd", "qemu-system-x86_64",
+    "nbdkit", "ntfsfix", "sgdisk",
+]
+
+# (code, vars) pairs in order of preference
+OVMF_CANDIDATES = [
+    ("/usr/share/OVMF/OVMF_CODE_4M.fd", "/usr/share/OVMF/OVMF_VARS_4M.fd"),
+    ("/usr/share/OVMF/OVMF_CODE.fd", "/usr/share/OVMF/OVMF_VARS.fd"),
+    ("/usr/share/edk2/ovmf/OVMF_CODE.fd", "/usr/share/edk2/ovmf/OVMF_VARS.fd"),
+    ("/usr/share/edk2/x64/OVMF_CODE.4m.fd", "/usr/share/edk2/x64/OVMF_VARS.4m.fd"),
+]
+
+_QEMU_IMG_FLAGS = ["-W", "-m", "-n", "-C", "-U", "--target-is-zero", "--bitmaps", "--salvage"]
+
+
+@dataclass
+class HostCapabilities:
+    """What the conversion host can do. Built by probe(), read everywhere else."""
+
+    fingerprint: str = ""
+    probed_at: str = ""
+    tools: dict[str, Optional[str]] = field(default_factory=dict)
+
+    virt_v2v_version: str = ""
+    virt_v2v_features: list[str] = field(default_factory=list)   # --machine-readable lines
+    virt_v2v_options: list[str] = field(default_factory=list)    # from --help
+    virt_v2v_in_place: bool = False
+
+    qemu_img_version: str = ""
+    qemu_img_convert_flags: list[str] = field(default_factory=list)
+    qemu_img_compression_types: list[str] = field(default_factory=list)
+    qemu_system_version: str = ""
+
+    ovmf_code: Optional[str] = None
+    ovmf_vars: Optional[str] = None
+    nbd: bool = False
+    kvm: bool = False
+
+    # ── Queries ──────────────────────────────────────────────────
+
+    def has_tool(self, name: str) -> bool:
+        return bool(self.tools.get(name))
+
+    def v2v_output_modes(self) -> list[str]:
+        return [f.split(":", 1)[1] for f in self.virt_v2v_features if f.startswith("output:")]
+
+    def v2v_supports(self, cmd: list[str]) -> bool:
+        """Whether a virt-v2v command line only uses supported modes/options.
+
+        Unknown capability data (e.g. --machine-readable missing on very old
+        builds) is treated as "supported" so the caller still gets to try.
+        """
+        if not self.has_tool("virt-v2v"):
+            return False
+        outputs = self.v2v_output_modes()
+        for i, arg in enumerate(cmd[1:], 1):
+            if arg == "-o" and outputs and i + 1 < len(cmd) and cmd[i + 1] not in outputs:
+                return False
+            if arg.startswith("-") and self.virt_v2v_options and arg not in self.virt_v2v_options:
+                return False
+        return True
+
+    def qemu_img_has(self, flag: str) -> bool:
+        return flag in self.qemu_img_convert_flags
+
+    def qemu_system_at_least(self, major: int, minor: int = 0) -> bool:
+        m = re.match(r"(\d+)\.(\d+)", self.qemu_system_version)
+        return bool(m) and (int(m.group(1)), int(m.group(2))) >= (major, minor)
+
+    def summary(self) -> str:
+        missing = [t for t, p in self.tools.items() if not p]
+        return (f"virt-v2v {self.virt_v2v_version or 'n/a'} "
+                f"(outputs: {','.join(self.v2v_output_modes()) or '?'}, "
+                f"in-place: {'yes' if self.virt_v2v_in_place else 'no'}), "
+                f"qemu-img {self.qemu_img_version or 'n/a'}, "
+                f"kvm: {'yes' if self.kvm else 'no'}, "
+                f"ovmf: {'yes' if self.ovmf_code else 'no'}"
+                + (f", missing: {', '.join(missing)}" if missing else ""))
+
+
+# ── Probing ──────────────────────────────────────────────────────────
+
+def _capture(cmd: list[str], timeout: int = 30) -> str:
+    try:
+        r = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout,
+                           env={**os.environ, "LIBGUESTFS_BACKEND": "direct"})
+    except (OSError, subprocess.TimeoutExpired):
+        return ""
+    return (r.stdout or "") + (r.stderr or "")
+
+
+def _fingerprint(tools: dict[str, Optional[str]]) -> str:
+    h = hashlib.sha256(f"probe-v{PROBE_VERSION}".encode())
+    paths = [p for p in tools.values() if p]
+    paths += [p for pair in OVMF_CANDIDATES for p in pair]
+    for p in sorted(paths):
+        try:
+            st = os.stat(p)
+            h.update(f"{p}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+        except OSError:
+            h.update(f"{p}:-\n".encode())
+    h.update(f"kvm:{os.path.exists('/dev/kvm')}".encode())
+    return h.hexdigest()
+
+
+def _probe_virt_v2v(caps: HostCapabilities) -> None:
+    if not caps.has_tool("virt-v2v"):
+        return
+    version = _capture(["virt-v2v", "--version"])
+    m = re.search(r"(\d+\.\d+(\.\d+)?)", version)
+    caps.virt_v2v_version = m.group(1) if m else ""
+
+    machine = _capture(["virt-v2v", "--machine-readable"])
+    caps.virt_v2v_features = sorted({l.strip() for l in machine.splitlines() if l.strip()})
+
+    help_text = _capture(["virt-v2v", "--help"])
+    caps.virt_v2v_options = sorted(set(re.findall(r"(?<![\w-])(--?[a-zA-Z][\w-]*)", help_text)))
+
+
+def _probe_qemu_img(caps: HostCapabilities) -> None:
+    if not caps.has_tool("qemu-img"):
+        return
+    version = _capture(["qemu-img", "--version"])
+    m = re.search(r"version (\d+\.\d+(\.\d+)?)", version)
+    caps.qemu_img_version = m.group(1) if m else ""
+
+    help_text = _capture(["qemu-img", "--help"])
+    convert_line = next((l for l in help_text.splitlines() if l.strip().startswith("convert ")), "")
+    caps.qemu_img_convert_flags = [f for f in _QEMU_IMG_FLAGS
+                                   if re.search(rf"\[{re.escape(f)}[\] ]", convert_line)]
+
+    types = ["zlib"]
+    with tempfile.TemporaryDirectory(prefix="vmware2scw-probe-") as tmp:
+        r = subprocess.run(
+            ["qemu-img", "create", "-f", "qcow2", "-o", "compression_type=zstd",
+             str(Path(tmp) / "probe.qcow2"), "1M"],
+            capture_output=True, text=True,
+        )
+        if r.returncode == 0:
+            types.append("zstd")
+    caps.qemu_img_compression_types = types
+
+
+def _probe_platform(caps: HostCapabilities) -> None:
+    if caps.has_tool("qemu-system-x86_64"):
+        m = re.search(r"version (\d+\.\d+(\.\d+)?)", _capture(["qemu-system-x86_64", "--version"]))
+        caps.qemu_system_version = m.group(1) if m else ""
+
+    for code, vars_ in OVMF_CANDIDATES:
+        if os.path.exists(code) and os.path.exists(vars_):
+            caps.ovmf_code, caps.ovmf_vars = code, vars_
+            break
+
+    caps.kvm = os.path.exists("/dev/kvm") and os.access("/dev/kvm", os.R_OK | os.W_OK)
+    caps.nbd = os.path.exists("/sys/module/nbd") or bool(
+        _capture(["modinfo", "-n", "nbd"]).strip().endswith((".ko", ".ko.xz", ".ko.zst")))
+
+
+def probe() -> HostCapabilities:
+    """Run every probe now (no caching)."""
+    tools = {t: shutil.which(t) for t in PROBED_TOOLS}
+    caps = HostCapabilities(
+        fingerprint=_fingerprint(tools),
+        probed_at=datetime.now().isoformat(timespec="seconds"),
+        tools=tools,
+        virt_v2v_in_place=bool(tools.get("virt-v2v-in-place")),
+    )
+    _probe_virt_v2v(caps)
+    _probe_qemu_img(caps)
+    _probe_platform(caps)
+    return caps
+
+
+# ── Cache ────────────────────────────────────────────────────────────
+
+_caps: Optional[HostCapabilities] = None
+_caps_lock = threading.Lock()
+
+
+def get_capabilities(cache_dir: str | Path | None = None, refresh: bool = False) -> HostCapabilities:
+    """Host capabilities, probed at most once per worker.
+
+    The first call loads cache_dir/host-capabilities.json if its
+    fingerprint still matches the installed binaries, otherwise probes
+    and rewrites it. Later calls return the in-process copy.
+    """
+    global _caps
+    with _caps_lock:
+        if _caps is not None and not refresh:
+            return _caps
+
+        cache_file = Path(cache_dir or DEFAULT_CACHE_DIR) / CACHE_FILE
+        tools = {t: shutil.which(t) for t in PROBED_TOOLS}
+        current = _fingerprint(tools)
+
+        if not refresh and cache_file.exists():
+            try:
+                data = json.loads(cache_file.read_text())
+                if data.get("fingerprint") == current:
+                    _caps = HostCapabilities(**data)
+                    logger.debug(f"Host capabilities loaded from {cache_file}")
+                    return _caps
+            except (ValueError, TypeError):
+                pass
+
+        _caps = probe()
+        logger.info(f"Host capabilities: {_caps.summary()}")
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp = cache_file.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(asdict(_caps), indent=2))
+            os.replace(tmp, cache_file)
+        except OSError as e:
+            logger.debug(f"Could not write capability cache {cache_file}: {e}")
+        return _caps
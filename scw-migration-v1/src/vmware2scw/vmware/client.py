@@ -6,10 +6,10 @@ import atexit
 import hashlib
 import ssl
 import time
-from typing import Optional
+from typing import Any, Iterator, Optional
 
 from pyVim.connect import Disconnect, SmartConnect
-from pyVmomi import vim
+from pyVmomi import vim, vmodl
 
 from vmware2scw.utils.logging import get_logger
 
@@ -29,6 +29,7 @@ class VSphereClient:
         self._si: Optional[vim.ServiceInstance] = None
         self._content: Optional[vim.ServiceInstanceContent] = None
         self._host: str = ""
+        self._atexit_registered = False
 
     @property
     def service_instance(self) -> vim.ServiceInstance:
@@ -86,7 +87,10 @@ class VSphereClient:
                     sslContext=ssl_context,
                 )
                 self._content = self._si.RetrieveContent()
-                atexit.register(Disconnect, self._si)
+                if not self._atexit_registered:
+                    # Once per client, not per (re)connect
+                    atexit.register(self.disconnect)
+                    self._atexit_registered = True
 
                 logger.info(f"Connected to vCenter: {host} "
                             f"(API version: {self._content.about.apiVersion}, "
@@ -136,12 +140,96 @@ class VSphereClient:
                 thumbprint = ":".join(sha1[i:i+2] for i in range(0, len(sha1), 2))
                 return thumbprint
 
-    def get_container_view(self, obj_type: list, recursive: bool = True):
-        """Create a container view for efficient object retrieval."""
+    def get_container_view(self, obj_type: list, recursive: bool = True, root=None):
+        """Create a container view for efficient object retrieval
+        (below root, default the root folder)."""
         return self.content.viewManager.CreateContainerView(
-            self.content.rootFolder, obj_type, recursive
+            root or self.content.rootFolder, obj_type, recursive
         )
 
+    def retrieve_properties(
+        self,
+        view_types: list,
+        properties: dict[Any, list[str]],
+        page_size: int = 500,
+        root=None,
+    ) -> Iterator[tuple[Any, dict[str, Any]]]:
+        """(MoRef, {property path: value}) of every object of view_types.
+
+        One RetrievePropertiesEx over a ContainerView of root (default the
+        root folder),
+        with only the property paths asked for, then
+        ContinueRetrievePropertiesEx page by page. Stopping early cancels
+        the remaining pages.
+
+        Args:
+            view_types: managed object types to collect (vim.VirtualMachine, ...)
+            properties: {type: [property path, ...]}
+            page_size: objects per page (RetrieveOptions.maxObjects)
+            root: folder / datacenter to collect below
+        """
+        view = self.get_container_view(view_types, root=root)
+        try:
+            yield from self._retrieve_paged(self.view_filter_spec(view, properties), page_size)
+        finally:
+            view.Destroy()
+
+    def retrieve_objects(
+        self,
+        objs: list,
+        paths: list[str],
+        page_size: int = 500,
+    ) -> Iterator[tuple[Any, dict[str, Any]]]:
+        """(MoRef, {property path: value}) of the given objects (one type)."""
+        if not objs:
+            return
+        pc = vmodl.query.PropertyCollector
+        spec = pc.FilterSpec(
+            objectSet=[pc.ObjectSpec(obj=obj, skip=False) for obj in objs],
+            propSet=[pc.PropertySpec(type=type(objs[0]), pathSet=paths, all=False)],
+        )
+        yield from self._retrieve_paged(spec, page_size)
+
+    def retrieve_object(self, obj: Any, paths: list[str]) -> dict[str, Any]:
+        """{property path: value} of a single managed object."""
+        return next((props for _, props in self.retrieve_objects([obj], paths)), {})
+
+    @staticmethod
+    def view_filter_spec(view, properties: dict[Any, list[str]]):
+        """FilterSpec for the given properties of every object of a ContainerView."""
+        pc = vmodl.query.PropertyCollector
+        return pc.FilterSpec(
+            objectSet=[pc.ObjectSpec(obj=view, skip=True, selectSet=[
+                pc.TraversalSpec(name="traverseView", path="view", skip=False,
+                                 type=vim.view.ContainerView),
+            ])],
+            propSet=[pc.PropertySpec(type=t, pathSet=paths, all=False)
+                     for t, paths in properties.items()],
+        )
+
+    def _retrieve_paged(self, spec, page_size: int) -> Iterator[tuple[Any, dict[str, Any]]]:
+        """RetrievePropertiesEx, then ContinueRetrievePropertiesEx while a
+        token is returned; an abandoned iteration cancels the rest."""
+        pc = vmodl.query.PropertyCollector
+        collector = self.content.propertyCollector
+        token = None
+        try:
+            result = collector.RetrievePropertiesEx([spec], pc.RetrieveOptions(maxObjects=page_size))
+            while result:
+                token = result.token
+                for obj in result.objects:
+                    yield obj.obj, {p.name: p.val for p in obj.propSet or []}
+                if not token:
+                    break
+                result = collector.ContinueRetrievePropertiesEx(token)
+                token = None
+        finally:
+            if token:
+                try:
+                    collector.CancelRetrievePropertiesEx(token)
+                except Exception:
+                    pass
+
     def get_datacenters(self) -> list:
         """List all datacenters."""
         view = self.get_container_view([vim.Datacenter])
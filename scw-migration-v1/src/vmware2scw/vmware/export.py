@@ -15,13 +15,14 @@ from __future__ import annotations
 import os
 import ssl
 from pathlib import Path
-from typing import Optional
+from typing import Collection, Optional
 from urllib.request import Request, urlopen
 
 from pyVmomi import vim
 
 from vmware2scw.utils.logging import get_logger
 from vmware2scw.vmware.client import VSphereClient
+from vmware2scw.vmware.index import get_vm_index
 
 logger = get_logger(__name__)
 
@@ -41,20 +42,24 @@ class VMExporter:
         vm_name: str,
         output_dir: Path,
         progress_callback=None,
+        on_disk_exported=None,
+        skip: Optional[Collection[int]] = None,
     ) -> list[Path]:
-        """Export all disks of a VM to local VMDK files."""
+        """Export all disks of a VM to local VMDK files.
+
+        on_disk_exported(index, path) is called as each disk lands, so
+        callers can start converting it while the next one downloads.
+
+        skip: indices of disks exported by an earlier run (their VMDK may
+        already be converted and deleted); they are neither downloaded nor
+        reported, and any other disk is downloaded afresh, overwriting a
+        partial file. Without it, a disk whose file exists is kept.
+        """
         import threading
 
         output_dir.mkdir(parents=True, exist_ok=True)
 
-        container = self.client.get_container_view([vim.VirtualMachine])
-        vm_obj = None
-        for vm in container.view:
-            if vm.name == vm_name:
-                vm_obj = vm
-                break
-        container.Destroy()
-
+        vm_obj = get_vm_index(self.client).lookup(self.client, vm_name)
         if vm_obj is None:
             raise ValueError(f"VM '{vm_name}' not found")
 
@@ -100,15 +105,19 @@ class VMExporter:
                 file_name = f"{vm_name}-{safe_key}.vmdk"
                 file_path = output_dir / file_name
 
-                if file_path.exists():
-                    logger.info(f"Disk file already exists, skipping: {file_name}")
+                if skip is not None and disk_idx in skip:
+                    logger.info(f"Disk already exported, skipping: {file_name}")
                     exported_files.append(file_path)
                     disk_idx += 1
                     continue
-
-                logger.info(f"Downloading disk: {file_name}")
-                self._download_disk(url, file_path, lease, disk_idx, total_disks, progress_callback)
+                if skip is None and file_path.exists():
+                    logger.info(f"Disk file already exists, skipping: {file_name}")
+                else:
+                    logger.info(f"Downloading disk: {file_name}")
+                    self._download_disk(url, file_path, lease, disk_idx, total_disks, progress_callback)
                 exported_files.append(file_path)
+                if on_disk_exported:
+                    on_disk_exported(disk_idx, file_path)
                 disk_idx += 1
 
             self._lease_done = True
@@ -0,0 +1,171 @@
+"""Cached VM name → MoRef index, one per vCenter.
+
+Resolving a VM by name used to mean a ContainerView over every VM and a
+`.name` round trip per object until the match — in VMInventory,
+SnapshotManager and VMExporter alike, several times per migration, and
+slower the larger the vCenter.
+
+VMIndex builds {name: moId} with one paginated PropertyCollector call
+(pathSet ["name"]) and answers lookups from memory. The index is shared
+by every session to the same vCenter (pooled or not): it keeps moIds,
+which are valid across sessions, and binds them to the caller's session
+on lookup. It is rebuilt when older than its TTL, or on a miss (a VM
+created since), at most once per MIN_REFRESH_INTERVAL; concurrent misses
+share one rebuild.
+
+UUIDs are resolved with SearchIndex.FindByUuid (BIOS UUID, config.uuid)
+and cached the same way.
+
+Confidence: 80 — a VM renamed within the TTL is still found under its
+old name; callers that read the VM's name back (VMInventory.get_vm_info)
+invalidate the entry and retry.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Optional
+
+from pyVmomi import vim
+
+from vmware2scw.utils.logging import get_logger
+from vmware2scw.vmware.client import VSphereClient
+
+logger = get_logger(__name__)
+
+INDEX_TTL = 300
+# A miss rebuilds the index at most this often (seconds)
+MIN_REFRESH_INTERVAL = 10
+
+
+class VMIndex:
+    """VM name / UUID → moId for one vCenter.
+
+    Args:
+        host: vCenter the index describes
+        ttl: seconds before the name map is rebuilt on next use
+    """
+
+    def __init__(self, host: str, ttl: int = INDEX_TTL):
+        self.host = host
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._by_name: dict[str, str] = {}
+        self._by_uuid: dict[str, str] = {}
+        self._duplicates: set[str] = set()
+        self._built_at = 0.0
+        self._refreshes = 0
+
+    # ── Lookups ──────────────────────────────────────────────────
+
+    def lookup(self, client: VSphereClient, vm_name: str) -> Optional[vim.VirtualMachine]:
+        """MoRef of the VM with that name, bound to client's session."""
+        asked = time.time()
+        if asked - self._built_at > self.ttl:
+            self.refresh(client, since=asked - self.ttl)
+        with self._lock:
+            moid = self._by_name.get(vm_name)
+        if moid is None and time.time() - self._built_at > MIN_REFRESH_INTERVAL:
+            # Created since the last build?
+            self.refresh(client, since=asked)
+            with self._lock:
+                moid = self._by_name.get(vm_name)
+        if moid is None:
+            return None
+        if vm_name in self._duplicates:
+            logger.warning(f"Several VMs are named '{vm_name}' on {self.host} — using {moid}")
+        return _bind(client, moid)
+
+    def find_by_uuid(self, client: VSphereClient, uuid: str) -> Optional[vim.VirtualMachine]:
+        """MoRef of the VM with that BIOS UUID (SearchIndex.FindByUuid)."""
+        with self._lock:
+            moid = self._by_uuid.get(uuid)
+        if moid is not None:
+            return _bind(client, moid)
+        vm = client.content.searchIndex.FindByUuid(None, uuid, vmSearch=True, instanceUuid=False)
+        if vm is None:
+            return None
+        with self._lock:
+            self._by_uuid[uuid] = vm._moId
+        return vm
+
+    def invalidate(self, vm_name: Optional[str] = None) -> None:
+        """Forget one name (it resolved to the wrong VM) or everything."""
+        with self._lock:
+            if vm_name is None:
+                self._by_name.clear()
+                self._by_uuid.clear()
+                self._built_at = 0.0
+            else:
+                self._by_name.pop(vm_name, None)
+
+    # ── Build ────────────────────────────────────────────────────
+
+    def refresh(self, client: VSphereClient, since: Optional[float] = None) -> None:
+        """Rebuild the name map with one PropertyCollector call.
+
+        since: skip if another thread rebuilt it after that time (their
+        result is as fresh as ours would be)
+        """
+        with self._refresh_lock:
+            if since is not None and self._built_at > since:
+                return
+            started = time.time()
+            by_name: dict[str, str] = {}
+            duplicates: set[str] = set()
+            for obj, props in client.retrieve_properties([vim.VirtualMachine],
+                                                         {vim.VirtualMachine: ["name"]}):
+                name = props.get("name")
+                if not name:
+                    continue
+                if name in by_name:
+                    duplicates.add(name)
+                else:
+                    by_name[name] = obj._moId
+            with self._lock:
+                self._by_name = by_name
+                self._duplicates = duplicates
+                self._built_at = started
+                self._refreshes += 1
+            logger.debug(f"VM index for {self.host}: {len(by_name)} VMs "
+                         f"in {time.time() - started:.1f}s")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "vms": len(self._by_name),
+                "uuids": len(self._by_uuid),
+                "age": round(time.time() - self._built_at) if self._built_at else None,
+                "refreshes": self._refreshes,
+            }
+
+
+def _bind(client: VSphereClient, moid: str) -> vim.VirtualMachine:
+    """A VirtualMachine MoRef on client's session."""
+    return vim.VirtualMachine(moid, client.service_instance._stub)
+
+
+_indexes: dict[str, VMIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_vm_index(client: VSphereClient) -> VMIndex:
+    """Process-wide index of the vCenter client is connected to."""
+    host = client._host
+    with _indexes_lock:
+        index = _indexes.get(host)
+        if index is None:
+            index = _indexes[host] = VMIndex(host)
+        return index
+
+
+def configure_vm_index(host: str, ttl: int = INDEX_TTL) -> VMIndex:
+    """Apply a TTL to the shared index of a vCenter."""
+    with _indexes_lock:
+        index = _indexes.get(host)
+        if index is None:
+            index = _indexes[host] = VMIndex(host, ttl)
+        index.ttl = ttl
+        return index
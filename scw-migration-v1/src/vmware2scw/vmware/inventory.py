@@ -1,11 +1,37 @@
-"""VMware VM inventory collection and data models."""
+"""VMware VM inventory collection and data models.
+
+Inventory is read with the PropertyCollector: RetrievePropertiesEx over a
+ContainerView, with an explicit pathSet of only the properties VMInfo
+needs, in pages of PAGE_SIZE objects (ContinueRetrievePropertiesEx).
+Accessing managed-object attributes one by one costs a SOAP round trip
+each (vm.config, vm.runtime.host.parent.parent.name, ...), which made a
+6,000-VM inventory take close to an hour; property sets make it a
+handful of calls.
+
+Names of hosts, clusters, datacenters, datastores and networks come from
+one more retrieval over the same kind of view (name + parent of every
+managed entity), resolved locally into host → cluster → datacenter.
+
+Records are slotted dataclasses and iter_vms() is a generator fed page by
+page, so collecting or exporting (write_inventory: NDJSON or a JSON
+array, gzip by file extension) holds one page of VMs at a time,
+whatever the size of the estate. A name pattern is applied on a
+names-only pass, before full property sets are fetched.
+
+Confidence: 80 — property paths follow the vSphere API reference; a VM
+whose properties can't be read (missingSet) gets defaults for them.
+"""
 
 from __future__ import annotations
 
+import fnmatch
+import gzip
+import json
 from dataclasses import dataclass, field
-from typing import Optional
+from pathlib import Path
+from typing import IO, Any, Iterable, Iterator, Optional
 
-from pyVmomi import vim
+from pyVmomi import vim, vmodl
 
 from vmware2scw.utils.logging import get_logger
 from vmware2scw.vmware.client import VSphereClient
@@ -13,7 +39,7 @@ from vmware2scw.vmware.client import VSphereClient
 logger = get_logger(__name__)
 
 
-@dataclass
+@dataclass(slots=True)
 class DiskInfo:
     """Information about a VM disk."""
     name: str
@@ -23,9 +49,10 @@ class DiskInfo:
     path: str                # e.g. "[datastore1] vm/vm.vmdk"
     controller_type: str     # "scsi", "nvme", "ide"
     key: int = 0             # vSphere device key
+    allocated_gb: Optional[float] = None  # on the datastore, incl. snapshot deltas
 
 
-@dataclass
+@dataclass(slots=True)
 class NICInfo:
     """Information about a VM network adapter."""
     mac_address: str
@@ -35,7 +62,7 @@ class NICInfo:
     ip_addresses: list[str] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class VMInfo:
     """Complete information about a VMware virtual machine."""
     name: str
@@ -55,6 +82,12 @@ class VMInfo:
     datacenter: str = ""
     cluster: str = ""
     annotation: str = ""
+    vcenter: str = ""          # source label in multi-vCenter views ("" = the only one)
+
+    @property
+    def qualified_name(self) -> str:
+        """"<vcenter>/<name>" when the source is known, else the name."""
+        return f"{self.vcenter}/{self.name}" if self.vcenter else self.name
 
     @property
     def total_disk_gb(self) -> float:
@@ -72,6 +105,14 @@ class VMInfo:
     def is_uefi(self) -> bool:
         return self.firmware == "efi"
 
+    @classmethod
+    def from_dict(cls, data: dict) -> "VMInfo":
+        """Inverse of dataclasses.asdict() (lossless, unlike model_dump)."""
+        data = dict(data)
+        data["disks"] = [DiskInfo(**d) for d in data.get("disks", [])]
+        data["nics"] = [NICInfo(**n) for n in data.get("nics", [])]
+        return cls(**data)
+
     def model_dump(self) -> dict:
         """Serialize to dict for JSON output."""
         return {
@@ -84,8 +125,9 @@ class VMInfo:
             "guest_os_full": self.guest_os_full,
             "firmware": self.firmware,
             "total_disk_gb": self.total_disk_gb,
-            "disks": [{"name": d.name, "size_gb": d.size_gb, "thin": d.thin_provisioned,
-                        "datastore": d.datastore, "controller": d.controller_type} for d in self.disks],
+            "disks": [{"name": d.name, "size_gb": d.size_gb, "allocated_gb": d.allocated_gb,
+                        "thin": d.thin_provisioned, "datastore": d.datastore,
+                        "controller": d.controller_type} for d in self.disks],
             "nics": [{"mac": n.mac_address, "network": n.network, "type": n.adapter_type,
                        "connected": n.connected, "ips": n.ip_addresses} for n in self.nics],
             "tools_status": self.tools_status,
@@ -93,105 +135,194 @@ class VMInfo:
             "host": self.host,
             "datacenter": self.datacenter,
             "cluster": self.cluster,
+            "vcenter": self.vcenter,
         }
 
 
 class VMInventory:
     """Collects VM inventory from a vCenter instance.
 
-    Uses PropertyCollector for efficient batch retrieval of VM properties
-    rather than querying each VM individually.
+    Uses PropertyCollector (RetrievePropertiesEx) for batch retrieval of
+    VM properties rather than querying each VM attribute by attribute.
     """
 
+    # VirtualMachine properties VMInfo is built from
+    VM_PROPERTIES = [
+        "name",
+        "config.uuid",
+        "config.hardware.numCPU",
+        "config.hardware.memoryMB",
+        "config.hardware.device",
+        "config.guestId",
+        "config.guestFullName",
+        "config.firmware",
+        "config.annotation",
+        "runtime.powerState",
+        "runtime.host",
+        "guest.toolsStatus",
+        "guest.toolsVersion",
+        "guest.net",
+        "snapshot",
+        "layoutEx.disk",
+        "layoutEx.file",
+    ]
+    # Entities whose names VMInfo refers to
+    TOPOLOGY_TYPES = [vim.HostSystem, vim.ComputeResource, vim.Datacenter, vim.Folder,
+                      vim.Datastore, vim.Network]
+    PAGE_SIZE = 500
+
     def __init__(self, client: VSphereClient):
         self.client = client
+        self._topology: Optional[_Topology] = None
 
     def list_all_vms(self) -> list[VMInfo]:
         """Retrieve information about all VMs in the vCenter."""
-        container = self.client.get_container_view([vim.VirtualMachine])
-        vms = []
+        vms = list(self.iter_vms())
+        logger.info(f"Collected inventory for {len(vms)} VMs")
+        return vms
+
+    def iter_vms(self, pattern: Optional[str] = None, root=None) -> Iterator[VMInfo]:
+        """VMInfo for every VM (whose name matches pattern), one
+        retrieval page at a time.
 
-        for vm_obj in container.view:
+        root: only VMs below this folder / datacenter
+        """
+        topology = self.topology()
+        if pattern is None:
+            results = self.retrieve([vim.VirtualMachine], {vim.VirtualMachine: self.VM_PROPERTIES}, root=root)
+        else:
+            results = self._retrieve_matching(pattern, root)
+        for obj, props in results:
             try:
-                vm_info = self._extract_vm_info(vm_obj)
-                vms.append(vm_info)
+                yield self._vm_from_props(props, topology)
             except Exception as e:
-                logger.warning(f"Error collecting info for VM: {e}")
-
-        container.Destroy()
-        logger.info(f"Collected inventory for {len(vms)} VMs")
-        return vms
+                logger.warning(f"Error collecting info for VM {props.get('name', obj)}: {e}")
 
     def get_vm_info(self, vm_name: str) -> VMInfo:
         """Get detailed info for a specific VM by name.
 
-        Searches across all datacenters.
+        Searches across all datacenters (through the shared VM index).
         """
-        container = self.client.get_container_view([vim.VirtualMachine])
-
-        for vm_obj in container.view:
-            if vm_obj.name == vm_name:
-                container.Destroy()
-                return self._extract_vm_info(vm_obj)
+        from vmware2scw.vmware.index import get_vm_index
 
-        container.Destroy()
+        index = get_vm_index(self.client)
+        for attempt in range(2):
+            vm_ref = index.lookup(self.client, vm_name)
+            if vm_ref is None:
+                break
+            try:
+                props = self.client.retrieve_object(vm_ref, self.VM_PROPERTIES)
+            except vmodl.fault.ManagedObjectNotFound:
+                props = {}
+            if props.get("name") == vm_name:
+                return self._vm_from_props(props, self.topology())
+            # Renamed, deleted or re-registered since the index was built
+            index.invalidate()
         raise ValueError(f"VM '{vm_name}' not found in vCenter")
 
+    def find_vm(self, vm_name: str) -> Optional[vim.VirtualMachine]:
+        """MoRef of the VM with that name (shared VM index)."""
+        from vmware2scw.vmware.index import get_vm_index
+
+        return get_vm_index(self.client).lookup(self.client, vm_name)
+
     def get_vm_by_pattern(self, pattern: str) -> list[VMInfo]:
         """Get VMs matching a name pattern (supports * wildcard)."""
-        import fnmatch
-        all_vms = self.list_all_vms()
-        return [vm for vm in all_vms if fnmatch.fnmatch(vm.name, pattern)]
+        return list(self.iter_vms(pattern))
 
-    def _extract_vm_info(self, vm: vim.VirtualMachine) -> VMInfo:
-        """Extract all relevant information from a VM managed object."""
-        config = vm.config
-        summary = vm.summary
-        runtime = vm.runtime
+    def _retrieve_matching(self, pattern: str, root=None) -> Iterator[tuple[Any, dict[str, Any]]]:
+        """Full property sets of the VMs whose name matches pattern.
 
-        # Basic info
+        Names come from a names-only pass; matches are fetched in pages of
+        PAGE_SIZE as they are found.
+        """
+        batch = []
+        for obj, props in self.retrieve([vim.VirtualMachine], {vim.VirtualMachine: ["name"]}, root=root):
+            if fnmatch.fnmatch(props.get("name", ""), pattern):
+                batch.append(obj)
+                if len(batch) >= self.PAGE_SIZE:
+                    yield from self.client.retrieve_objects(batch, self.VM_PROPERTIES)
+                    batch = []
+        if batch:
+            yield from self.client.retrieve_objects(batch, self.VM_PROPERTIES)
+
+    # ── PropertyCollector ────────────────────────────────────────
+
+    def retrieve(
+        self,
+        view_types: list,
+        properties: dict[Any, list[str]],
+        page_size: Optional[int] = None,
+        root=None,
+    ) -> Iterator[tuple[Any, dict[str, Any]]]:
+        """Paginated property retrieval (VSphereClient.retrieve_properties)."""
+        return self.client.retrieve_properties(view_types, properties, page_size or self.PAGE_SIZE, root=root)
+
+    def topology(self) -> "_Topology":
+        """Names and parents of hosts, clusters, datacenters, datastores
+        and networks (retrieved once per inventory object)."""
+        if self._topology is None:
+            topo = _Topology()
+            for obj, props in self.retrieve(self.TOPOLOGY_TYPES, {
+                vim.ManagedEntity: ["name", "parent"],
+                vim.dvs.DistributedVirtualPortgroup: ["key"],
+            }):
+                moid = obj._moId
+                topo.names[moid] = props.get("name", "")
+                parent = props.get("parent")
+                if parent is not None:
+                    topo.parents[moid] = parent._moId
+                if isinstance(obj, vim.ClusterComputeResource):
+                    topo.clusters.add(moid)
+                elif isinstance(obj, vim.Datacenter):
+                    topo.datacenters.add(moid)
+                if props.get("key"):
+                    topo.portgroups[props["key"]] = props.get("name", "")
+            self._topology = topo
+        return self._topology
+
+    # ── VMInfo from property sets ────────────────────────────────
+
+    def _vm_from_props(self, props: dict[str, Any], topology: "_Topology") -> VMInfo:
+        """Build a VMInfo from one VM's retrieved properties."""
         info = VMInfo(
-            name=vm.name,
-            uuid=config.uuid if config else "",
-            cpu=config.hardware.numCPU if config else 0,
-            memory_mb=config.hardware.memoryMB if config else 0,
-            power_state=str(runtime.powerState) if runtime else "unknown",
-            guest_os=config.guestId if config else "unknown",
-            guest_os_full=config.guestFullName if config else None,
-            firmware=config.firmware if config and hasattr(config, 'firmware') else "bios",
-            annotation=config.annotation if config and config.annotation else "",
+            name=props.get("name", ""),
+            uuid=props.get("config.uuid") or "",
+            cpu=props.get("config.hardware.numCPU") or 0,
+            memory_mb=props.get("config.hardware.memoryMB") or 0,
+            power_state=str(props.get("runtime.powerState", "unknown")),
+            guest_os=props.get("config.guestId") or "unknown",
+            guest_os_full=props.get("config.guestFullName"),
+            firmware=props.get("config.firmware") or "bios",
+            annotation=props.get("config.annotation") or "",
         )
 
-        # Host info
-        if runtime and runtime.host:
-            info.host = runtime.host.name
-            # Navigate up to find datacenter and cluster
-            parent = runtime.host.parent
-            while parent:
-                if isinstance(parent, vim.ClusterComputeResource):
-                    info.cluster = parent.name
-                elif isinstance(parent, vim.Datacenter):
-                    info.datacenter = parent.name
-                    break
-                parent = getattr(parent, 'parent', None)
+        # Host info: navigate up to find cluster and datacenter
+        host = props.get("runtime.host")
+        if host is not None:
+            info.host = topology.names.get(host._moId, "")
+            info.cluster, info.datacenter = topology.locate(host._moId)
 
         # VMware Tools status
-        if vm.guest:
-            info.tools_status = vm.guest.toolsStatus or "unknown"
-            info.tools_version = vm.guest.toolsVersion or ""
+        info.tools_status = props.get("guest.toolsStatus") or "unknown"
+        info.tools_version = props.get("guest.toolsVersion") or ""
 
         # Disks and NICs
-        if config and config.hardware:
-            info.disks = self._extract_disks(config.hardware.device)
-            info.nics = self._extract_nics(config.hardware.device, vm.guest)
+        devices = props.get("config.hardware.device") or []
+        info.disks = self._extract_disks(devices, topology)
+        allocated = self._disk_allocations(props.get("layoutEx.disk"), props.get("layoutEx.file"))
+        for disk in info.disks:
+            disk.allocated_gb = allocated.get(disk.key)
+        info.nics = self._extract_nics(devices, props.get("guest.net"), topology)
 
         # Snapshots
-        if vm.snapshot and vm.snapshot.rootSnapshotList:
-            info.snapshots = self._extract_snapshot_names(vm.snapshot.rootSnapshotList)
+        snapshot = props.get("snapshot")
+        if snapshot and snapshot.rootSnapshotList:
+            info.snapshots = self._extract_snapshot_names(snapshot.rootSnapshotList)
 
         return info
 
-    def _extract_disks(self, devices: list) -> list[DiskInfo]:
+    def _extract_disks(self, devices: list, topology: "_Topology") -> list[DiskInfo]:
         """Extract disk information from VM hardware devices."""
         disks = []
         controllers = {}
@@ -215,10 +346,12 @@ class VMInventory:
 
                 if hasattr(backing, 'fileName'):
                     path = backing.fileName
-                if hasattr(backing, 'datastore') and backing.datastore:
-                    datastore = backing.datastore.name
+                if getattr(backing, 'datastore', None) is not None:
+                    datastore = topology.names.get(backing.datastore._moId, "")
+                if not datastore and path.startswith("["):
+                    datastore = path[1:path.find("]")]
                 if hasattr(backing, 'thinProvisioned'):
-                    thin = backing.thinProvisioned
+                    thin = bool(backing.thinProvisioned)
 
                 controller_type = controllers.get(device.controllerKey, "unknown")
 
@@ -234,16 +367,31 @@ class VMInventory:
 
         return disks
 
-    def _extract_nics(self, devices: list, guest: vim.vm.GuestInfo | None) -> list[NICInfo]:
+    def _disk_allocations(self, layout_disks, layout_files) -> dict[int, float]:
+        """{device key: GB allocated on the datastore} from layoutEx.
+
+        Sums the extents of every link of the disk's chain (snapshot
+        deltas included); thin disks report what they really use.
+        """
+        if not layout_disks:
+            return {}
+        file_sizes = {f.key: f.size or 0 for f in layout_files or []}
+        allocated = {}
+        for disk in layout_disks:
+            total = sum(file_sizes.get(k, 0) for link in disk.chain or [] for k in link.fileKey)
+            if total:
+                allocated[disk.key] = round(total / 1024**3, 2)
+        return allocated
+
+    def _extract_nics(self, devices: list, guest_net: Optional[list], topology: "_Topology") -> list[NICInfo]:
         """Extract NIC information from VM hardware devices."""
         nics = []
 
         # Build IP map from guest info
         ip_map: dict[str, list[str]] = {}
-        if guest and guest.net:
-            for net_info in guest.net:
-                if net_info.macAddress and net_info.ipAddress:
-                    ip_map[net_info.macAddress] = list(net_info.ipAddress)
+        for net_info in guest_net or []:
+            if net_info.macAddress and net_info.ipAddress:
+                ip_map[net_info.macAddress] = list(net_info.ipAddress)
 
         for device in devices:
             if isinstance(device, vim.vm.device.VirtualEthernetCard):
@@ -259,10 +407,11 @@ class VMInventory:
                 adapter_type = type_map.get(adapter_type, adapter_type)
 
                 network = ""
-                if hasattr(device.backing, 'network') and device.backing.network:
-                    network = device.backing.network.name
+                if getattr(device.backing, 'network', None) is not None:
+                    network = topology.names.get(device.backing.network._moId, "")
                 elif hasattr(device.backing, 'port'):
-                    network = f"dvs-{device.backing.port.portgroupKey}"
+                    key = device.backing.port.portgroupKey
+                    network = topology.portgroups.get(key) or f"dvs-{key}"
 
                 mac = device.macAddress or ""
                 nics.append(NICInfo(
@@ -284,3 +433,57 @@ class VMInventory:
             if snap.childSnapshotList:
                 names.extend(self._extract_snapshot_names(snap.childSnapshotList, full_name))
         return names
+
+
+@dataclass
+class _Topology:
+    """Names and parent links of the entities VMInfo refers to, by MoRef id."""
+    names: dict[str, str] = field(default_factory=dict)
+    parents: dict[str, str] = field(default_factory=dict)
+    clusters: set[str] = field(default_factory=set)
+    datacenters: set[str] = field(default_factory=set)
+    portgroups: dict[str, str] = field(default_factory=dict)   # DVS portgroup key → name
+
+    def locate(self, host_moid: str) -> tuple[str, str]:
+        """(cluster, datacenter) names above a host."""
+        cluster = datacenter = ""
+        moid = self.parents.get(host_moid)
+        while moid:
+            if moid in self.clusters and not cluster:
+                cluster = self.names.get(moid, "")
+            elif moid in self.datacenters:
+                datacenter = self.names.get(moid, "")
+                break
+            moid = self.parents.get(moid)
+        return cluster, datacenter
+
+
+# ── Export ───────────────────────────────────────────────────────
+
+def open_output(path: str | Path) -> IO[str]:
+    """Text file for writing; gzip-compressed when path ends in .gz."""
+    path = Path(path)
+    if path.suffix == ".gz":
+        return gzip.open(path, "wt", encoding="utf-8")
+    return path.open("w", encoding="utf-8")
+
+
+def write_inventory(vms: Iterable[VMInfo], out: IO[str], fmt: str = "ndjson") -> int:
+    """Write VMs to out as they come; number written.
+
+    fmt: "ndjson" (one compact object per line) or "json" (an indented
+    array, still written record by record)
+    """
+    count = 0
+    if fmt == "json":
+        out.write("[")
+    for vm in vms:
+        record = vm.model_dump()
+        if fmt == "json":
+            out.write(("," if count else "") + "\n" + json.dumps(record, indent=2, default=str))
+        else:
+            out.write(json.dumps(record, separators=(",", ":"), default=str) + "\n")
+        count += 1
+    if fmt == "json":
+        out.write("\n]\n" if count else "]\n")
+    return count
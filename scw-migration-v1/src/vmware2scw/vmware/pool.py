@@ -0,0 +1,240 @@
+"""Process-wide pool of vCenter sessions.
+
+Every stage used to build a VSphereClient, log in with SmartConnect and
+log out again. A 100-VM batch meant hundreds of SOAP logins, which hits
+vCenter's session limits and costs seconds per stage.
+
+One pool per (vCenter, port, user) keeps logged-in sessions:
+  - checkout() hands out an idle session, logs in a new one while fewer
+    than max_sessions exist, and otherwise waits for a checkin;
+  - a keepalive thread pings idle sessions with CurrentTime() so vCenter
+    doesn't expire them (default session timeout: 30 min);
+  - a session whose ping fails with NotAuthenticated (expired, or
+    terminated by an administrator) logs in again transparently, on
+    checkout or when the with-block itself hit NotAuthenticated;
+  - all sessions are logged out once, at exit.
+
+Confidence: 80 — pyVmomi stubs are safe to share between threads, but
+one session per concurrent caller keeps long NFC exports from holding up
+short property reads.
+"""
+
+from __future__ import annotations
+
+import atexit
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from pyVmomi import vim
+
+from vmware2scw.utils.logging import get_logger
+from vmware2scw.vmware.client import VSphereClient
+from vmware2scw.vmware.index import configure_vm_index
+
+logger = get_logger(__name__)
+
+DEFAULT_MAX_SESSIONS = 4
+KEEPALIVE_INTERVAL = 300
+
+
+class VSphereSessionPool:
+    """Bounded set of logged-in VSphereClients for one vCenter user.
+
+    Args:
+        host, username, password, port, insecure: as VSphereClient.connect()
+        max_sessions: most sessions logged in at once
+        keepalive: seconds between CurrentTime() pings of idle sessions
+    """
+
+    def __init__(
+        self,
+        host: str,
+        username: str,
+        password: str,
+        port: int = 443,
+        insecure: bool = False,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        keepalive: int = KEEPALIVE_INTERVAL,
+    ):
+        self.host = host
+        self.username = username
+        self._password = password
+        self.port = port
+        self.insecure = insecure
+        self.max_sessions = max_sessions
+        self.keepalive = keepalive
+        self._cond = threading.Condition()
+        self._idle: list[tuple[VSphereClient, float]] = []   # (client, last used)
+        self._count = 0
+        self._logins = 0
+        self._closed = False
+        self._keepalive_thread: Optional[threading.Thread] = None
+
+    # ── Checkout / checkin ───────────────────────────────────────
+
+    @contextmanager
+    def session(self) -> Iterator[VSphereClient]:
+        """Check out a logged-in client for the with-block."""
+        client = self._checkout()
+        broken = False
+        try:
+            yield client
+        except vim.fault.NotAuthenticated:
+            broken = True
+            raise
+        finally:
+            self._checkin(client, broken)
+
+    def run(self, fn, retries: int = 1):
+        """fn(client) with a pooled session; re-run on a fresh login if
+        the session turned out to be unauthenticated."""
+        for attempt in range(retries + 1):
+            try:
+                with self.session() as client:
+                    return fn(client)
+            except vim.fault.NotAuthenticated:
+                if attempt == retries:
+                    raise
+                logger.info(f"vCenter session on {self.host} expired — logging in again")
+
+    def _checkout(self) -> VSphereClient:
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise ConnectionError(f"Session pool for {self.host} is closed")
+                if self._idle:
+                    client, last_used = self._idle.pop()
+                    break
+                if self._count < self.max_sessions:
+                    self._count += 1
+                    client, last_used = None, 0.0
+                    break
+                self._cond.wait()
+            self._start_keepalive()
+
+        try:
+            if client is None:
+                client = self._login()
+            elif time.time() - last_used > self.keepalive and not self._alive(client):
+                client.disconnect()
+                client = self._login()
+        except BaseException:
+            with self._cond:
+                self._count -= 1
+                self._cond.notify_all()
+            raise
+        return client
+
+    def _checkin(self, client: VSphereClient, broken: bool = False) -> None:
+        with self._cond:
+            # A broken session is logged out; the next checkout logs in anew
+            drop = broken or self._closed
+            if drop:
+                self._count -= 1
+            else:
+                self._idle.append((client, time.time()))
+            self._cond.notify_all()
+        if drop:
+            client.disconnect()
+
+    def _login(self) -> VSphereClient:
+        client = VSphereClient()
+        client.connect(self.host, self.username, self._password, port=self.port,
+                       insecure=self.insecure)
+        with self._cond:
+            self._logins += 1
+        return client
+
+    @staticmethod
+    def _alive(client: VSphereClient) -> bool:
+        try:
+            client.service_instance.CurrentTime()
+            return True
+        except vim.fault.NotAuthenticated:
+            return False
+        except Exception as e:
+            logger.debug(f"vCenter keepalive failed: {e}")
+            return False
+
+    # ── Keepalive ────────────────────────────────────────────────
+
+    def _start_keepalive(self) -> None:
+        if self._keepalive_thread is None:
+            self._keepalive_thread = threading.Thread(
+                target=self._keepalive_loop, daemon=True, name=f"vsphere-keepalive-{self.host}")
+            self._keepalive_thread.start()
+
+    def _keepalive_loop(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait(timeout=self.keepalive / 2)
+                if self._closed:
+                    return
+                now = time.time()
+                due = [entry for entry in self._idle if now - entry[1] >= self.keepalive / 2]
+                for entry in due:
+                    self._idle.remove(entry)
+            # Ping outside the lock; due sessions are out of the idle list
+            for client, _ in due:
+                alive = self._alive(client)
+                if not alive:
+                    logger.debug(f"Idle vCenter session on {self.host} expired — dropping it")
+                self._checkin(client, broken=not alive)
+
+    # ── Lifecycle ────────────────────────────────────────────────
+
+    def close(self) -> None:
+        """Log out every idle session; checked-out ones on checkin."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._count -= len(idle)
+            self._cond.notify_all()
+        for client, _ in idle:
+            client.disconnect()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "sessions": self._count,
+                "idle": len(self._idle),
+                "max": self.max_sessions,
+                "logins": self._logins,
+            }
+
+
+_pools: dict[tuple, VSphereSessionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_session_pool(vmware_config) -> VSphereSessionPool:
+    """Process-wide pool for a VMwareConfig's (vCenter, port, user)."""
+    key = (vmware_config.vcenter, vmware_config.port, vmware_config.username)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            if not _pools:
+                atexit.register(close_all)
+            password = vmware_config.password.get_secret_value() if vmware_config.password else ""
+            configure_vm_index(vmware_config.vcenter, ttl=vmware_config.vm_index_ttl)
+            pool = _pools[key] = VSphereSessionPool(
+                vmware_config.vcenter,
+                vmware_config.username,
+                password,
+                port=vmware_config.port,
+                insecure=vmware_config.insecure,
+                max_sessions=vmware_config.max_sessions,
+                keepalive=vmware_config.keepalive_seconds,
+            )
+        return pool
+
+
+def close_all() -> None:
+    """Log out of every pooled session (registered with atexit)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
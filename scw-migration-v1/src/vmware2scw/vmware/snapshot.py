@@ -2,10 +2,9 @@
 
 from __future__ import annotations
 
-from pyVmomi import vim
-
 from vmware2scw.utils.logging import get_logger
 from vmware2scw.vmware.client import VSphereClient
+from vmware2scw.vmware.index import get_vm_index
 
 logger = get_logger(__name__)
 
@@ -71,13 +70,10 @@ class SnapshotManager:
         logger.info(f"Snapshot '{snapshot_name}' deleted")
 
     def _get_vm(self, vm_name: str):
-        container = self.client.get_container_view([vim.VirtualMachine])
-        for vm in container.view:
-            if vm.name == vm_name:
-                container.Destroy()
-                return vm
-        container.Destroy()
-        raise ValueError(f"VM '{vm_name}' not found")
+        vm = get_vm_index(self.client).lookup(self.client, vm_name)
+        if vm is None:
+            raise ValueError(f"VM '{vm_name}' not found")
+        return vm
 
     def _find_snapshot(self, snapshot_list, name: str):
         for snap in snapshot_list:
@@ -0,0 +1,258 @@
+"""Several source vCenters behind one inventory and one scheduler.
+
+AppConfig.sources() lists every vCenter (`vmware`, then `vcenters`),
+each with a label (VMwareConfig.name, default its hostname). A VM is
+referenced as "<label>/<vm>"; an unqualified name is looked up in every
+vCenter and must be unique. All sources share one MigrationPipeline and
+its pools, so a batch drives exports from every vCenter at once, each
+bounded by its own "vcenter:<host>" pool.
+
+SourceSet gives the merged view:
+  - sync() brings every vCenter's inventory cache up to date, one thread
+    per vCenter, each through that vCenter's session pool;
+  - iter_query() merges the per-vCenter caches (each sorted by name) into
+    one stream, records tagged with VMInfo.vcenter;
+  - iter_live() collects straight from vCenter: every vCenter in
+    parallel, split by datacenter with at most inventory_concurrency
+    datacenters of a vCenter in flight, records yielded as they arrive.
+
+Confidence: 75 — VM names may themselves contain "/"; a prefix is only
+taken as a qualifier when it is a configured label.
+"""
+
+from __future__ import annotations
+
+import heapq
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator, Optional
+
+from vmware2scw.utils.logging import get_logger
+from vmware2scw.vmware.inventory import VMInfo
+
+if TYPE_CHECKING:
+    from vmware2scw.config import AppConfig, VMwareConfig
+    from vmware2scw.vmware.cache import InventoryCache
+
+logger = get_logger(__name__)
+
+SEPARATOR = "/"
+# VMs buffered between live collectors and the consumer
+LIVE_BUFFER = 1000
+
+
+def split_qualified(vm_name: str, labels) -> tuple[Optional[str], str]:
+    """("<label>", "<vm>") of a qualified name; (None, vm_name) otherwise."""
+    label, sep, rest = vm_name.partition(SEPARATOR)
+    if sep and rest and label in labels:
+        return label, rest
+    return None, vm_name
+
+
+class SourceSet:
+    """The configured source vCenters.
+
+    Args:
+        sources: VMwareConfigs, the default source first
+        cache_dir: where their inventory caches live
+    """
+
+    def __init__(self, sources: list[VMwareConfig], cache_dir: str | Path | None = None):
+        self.sources: dict[str, VMwareConfig] = {s.label: s for s in sources}
+        self.default = sources[0]
+        self.cache_dir = cache_dir
+
+    @classmethod
+    def from_config(cls, config: AppConfig) -> "SourceSet":
+        return cls(config.sources(), config.conversion.cache_dir)
+
+    @property
+    def multiple(self) -> bool:
+        return len(self.sources) > 1
+
+    def qualify(self, source: VMwareConfig, vm_name: str) -> str:
+        """Name to use for the VM in plans and reports."""
+        return f"{source.label}{SEPARATOR}{vm_name}" if self.multiple else vm_name
+
+    # ── Resolution ───────────────────────────────────────────────
+
+    def resolve(self, vm_name: str) -> tuple[VMwareConfig, str]:
+        """(source vCenter, name in that vCenter) of a plan's VM.
+
+        Unqualified names are looked up in every vCenter's VM index.
+
+        Raises:
+            ValueError: the unqualified name exists in several vCenters
+        """
+        label, name = split_qualified(vm_name, self.sources)
+        if label is not None:
+            return self.sources[label], name
+        if not self.multiple:
+            return self.default, name
+
+        from vmware2scw.vmware.index import get_vm_index
+        from vmware2scw.vmware.pool import get_session_pool
+
+        def has_vm(source: VMwareConfig) -> bool:
+            return get_session_pool(source).run(
+                lambda client: get_vm_index(client).lookup(client, name) is not None)
+
+        with ThreadPoolExecutor(max_workers=len(self.sources), thread_name_prefix="resolve") as pool:
+            found = [s for s, hit in zip(self.sources.values(), pool.map(has_vm, self.sources.values()))
+                     if hit]
+        if len(found) > 1:
+            raise ValueError(f"VM '{name}' exists in several vCenters "
+                             f"({', '.join(s.label for s in found)}) — use '<vcenter>{SEPARATOR}{name}'")
+        return (found[0] if found else self.default), name
+
+    # ── Cached inventory ─────────────────────────────────────────
+
+    def cache(self, source: VMwareConfig) -> InventoryCache:
+        from vmware2scw.vmware.cache import get_inventory_cache
+
+        return get_inventory_cache(source.vcenter, self.cache_dir)
+
+    def sync(
+        self,
+        refresh: bool = False,
+        vm_name: Optional[str] = None,
+        ttl: Optional[int] = None,
+    ) -> dict[str, Optional[dict]]:
+        """Sync the inventory caches that are stale, all vCenters at once.
+
+        refresh: sync even fresh caches
+        vm_name: also sync when this VM is in none of the caches
+        ttl: staleness threshold (default: each vCenter's inventory_cache_ttl)
+
+        Returns {label: sync stats, or None when the cache was fresh}; a
+        vCenter that can't be reached is logged and keeps its cache.
+        """
+        from vmware2scw.vmware.pool import get_session_pool
+
+        missing: set[str] = set()
+        if vm_name is not None:
+            try:
+                if self.get(vm_name) is None:
+                    label, _ = split_qualified(vm_name, self.sources)
+                    missing = {label} if label is not None else set(self.sources)
+            except ValueError:
+                pass        # in several caches already
+
+        def sync_one(source: VMwareConfig) -> Optional[dict]:
+            cache = self.cache(source)
+            stale = cache.is_stale(source.inventory_cache_ttl if ttl is None else ttl)
+            if not (refresh or source.label in missing or stale):
+                return None
+            return get_session_pool(source).run(cache.sync)
+
+        results: dict[str, Optional[dict]] = {}
+        with ThreadPoolExecutor(max_workers=len(self.sources), thread_name_prefix="inventory") as pool:
+            futures = {label: pool.submit(sync_one, s) for label, s in self.sources.items()}
+            for label, future in futures.items():
+                try:
+                    results[label] = future.result()
+                except Exception as e:
+                    logger.warning(f"Could not sync the inventory of {label}: {e} — using the cached one")
+                    results[label] = None
+        return results
+
+    def age(self) -> Optional[float]:
+        """Seconds since the least recently synced cache was synced."""
+        ages = [self.cache(s).age() for s in self.sources.values()]
+        return None if None in ages else max(ages)
+
+    def get(self, vm_name: str) -> Optional[VMInfo]:
+        """Cached VMInfo of a (qualified) VM name.
+
+        Raises:
+            ValueError: the unqualified name exists in several vCenters
+        """
+        label, name = split_qualified(vm_name, self.sources)
+        labels = [label] if label is not None else list(self.sources)
+        found = []
+        for lbl in labels:
+            vm = self.cache(self.sources[lbl]).get(name)
+            if vm is not None:
+                if self.multiple:
+                    vm.vcenter = lbl
+                found.append(vm)
+        if len(found) > 1:
+            raise ValueError(f"VM '{name}' exists in several vCenters "
+                             f"({', '.join(v.vcenter for v in found)}) — use '<vcenter>{SEPARATOR}{name}'")
+        return found[0] if found else None
+
+    def iter_query(self, **filters) -> Iterator[VMInfo]:
+        """InventoryCache.iter_query() over every vCenter, merged by name."""
+        def tagged(label: str, cache: InventoryCache) -> Iterator[VMInfo]:
+            for vm in cache.iter_query(**filters):
+                if self.multiple:
+                    vm.vcenter = label
+                yield vm
+
+        streams = [tagged(label, self.cache(s)) for label, s in self.sources.items()]
+        return heapq.merge(*streams, key=lambda vm: (vm.name, vm.vcenter))
+
+    # ── Live inventory ───────────────────────────────────────────
+
+    def iter_live(self, pattern: Optional[str] = None) -> Iterator[VMInfo]:
+        """VMs straight from every vCenter, in arrival order."""
+        from vmware2scw.vmware.inventory import VMInventory
+        from vmware2scw.vmware.pool import get_session_pool
+
+        out: queue.Queue = queue.Queue(maxsize=LIVE_BUFFER)
+        stop = threading.Event()
+        done = object()
+
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    out.put(item, timeout=1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def collect_datacenter(source: VMwareConfig, datacenter, topology) -> None:
+            label = source.label if self.multiple else ""
+            with get_session_pool(source).session() as client:
+                inv = VMInventory(client)
+                inv._topology = topology
+                for vm in inv.iter_vms(pattern, root=datacenter):
+                    vm.vcenter = label
+                    if not put(vm):
+                        return
+
+        def collect_source(source: VMwareConfig) -> None:
+            try:
+                pool = get_session_pool(source)
+                with pool.session() as client:
+                    topology = VMInventory(client).topology()
+                    datacenters = client.get_datacenters()
+                workers = min(source.inventory_concurrency, pool.max_sessions, len(datacenters) or 1)
+                with ThreadPoolExecutor(max_workers=workers,
+                                        thread_name_prefix=f"inventory-{source.label}") as executor:
+                    for future in [executor.submit(collect_datacenter, source, dc, topology)
+                                   for dc in datacenters]:
+                        future.result()
+            except Exception as e:
+                logger.warning(f"Inventory collection failed on {source.label}: {e}")
+            finally:
+                put(done)
+
+        threads = [threading.Thread(target=collect_source, args=(s,), daemon=True,
+                                    name=f"inventory-{s.label}")
+                   for s in self.sources.values()]
+        for t in threads:
+            t.start()
+        remaining = len(threads)
+        try:
+            while remaining:
+                item = out.get()
+                if item is done:
+                    remaining -= 1
+                else:
+                    yield item
+        finally:
+            stop.set()
@@ -0,0 +1,164 @@
+"""Tests for the Scaleway API client (scaleway/api_client.py) against a
+local mock server.
+
+The server answers each request with the next scripted response for its
+path and records what it received.
+"""
+
+import json
+import threading
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from vmware2scw.scaleway import api_client
+from vmware2scw.scaleway.api_client import ScalewayAPIError, SyncScalewayClient
+
+
+class MockScalewayAPI(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.script: dict[str, deque] = defaultdict(deque)
+        self.received: list[tuple[str, str, dict, object]] = []
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def respond(self, path: str, status: int, body=None, headers=None) -> None:
+        self.script[path].append((status, body, headers or {}))
+
+    def calls(self, method: str, path: str) -> int:
+        return sum(1 for m, p, _h, _b in self.received if (m, p) == (method, path))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def _serve(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        path = self.path.split("?", 1)[0]
+        self.server.received.append((self.command, path, dict(self.headers), body))
+        script = self.server.script[path]
+        status, payload, headers = script.popleft() if script else (404, {"message": "not scripted"}, {})
+        data = b"" if payload is None else json.dumps(payload).encode()
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    # http.server dispatches on these names
+    do_GET = do_POST = do_PUT = do_DELETE = _serve  # noqa: N815
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    srv = MockScalewayAPI()
+    thread = threading.Thread(target=srv.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def client(server, monkeypatch):
+    # No jitter: backoff waits only what Retry-After asks for
+    monkeypatch.setattr(api_client.random, "uniform", lambda a, b: 0.0)
+    c = SyncScalewayClient("secret", base_url=server.url, max_retries=2, timeout=5)
+    yield c
+    c.close()
+
+
+SERVERS = "/instance/v1/zones/fr-par-1/servers"
+
+
+def test_get_sends_token_and_decodes_json(server, client):
+    server.respond(SERVERS, 200, {"servers": [{"id": "s-1"}]})
+    server.respond(SERVERS + "/s-1", 204)
+
+    assert client.request("GET", SERVERS) == {"servers": [{"id": "s-1"}]}
+    assert client.request("DELETE", SERVERS + "/s-1") == {}
+    _method, _path, headers, _body = server.received[0]
+    assert headers["X-Auth-Token"] == "secret"
+
+
+def test_idempotent_call_retries_5xx(server, client):
+    server.respond(SERVERS, 503, {"message": "maintenance"})
+    server.respond(SERVERS, 502)
+    server.respond(SERVERS, 200, {"servers": []})
+
+    assert client.request("GET", SERVERS) == {"servers": []}
+    stats = client.metrics()["instance GET"]
+    assert stats["calls"] == 3 and stats["retries"] == 2 and stats["errors"] == 0
+    assert stats["statuses"] == {503: 1, 502: 1, 200: 1}
+
+
+def test_retries_exhausted(server, client):
+    for _ in range(3):
+        server.respond(SERVERS, 500, {"message": "boom"})
+
+    with pytest.raises(ScalewayAPIError) as excinfo:
+        client.request("GET", SERVERS)
+    assert excinfo.value.status == 500
+    assert server.calls("GET", SERVERS) == 3
+
+
+def test_post_retried_after_429(server, client):
+    server.respond(SERVERS, 429, {"message": "slow down"}, {"Retry-After": "0.1"})
+    server.respond(SERVERS, 201, {"server": {"id": "s-2"}})
+
+    assert client.request("POST", SERVERS, json={"name": "vm"}) == {"server": {"id": "s-2"}}
+    assert server.calls("POST", SERVERS) == 2
+    assert client.metrics()["instance POST"]["throttled_s"] >= 0.05
+
+
+def test_post_client_error_is_not_retried(server, client):
+    server.respond(SERVERS, 400, {"message": "invalid commercial_type"})
+
+    with pytest.raises(ScalewayAPIError) as excinfo:
+        client.request("POST", SERVERS, json={"name": "vm"})
+    assert excinfo.value.status == 400
+    assert "invalid commercial_type" in excinfo.value.body
+    assert server.calls("POST", SERVERS) == 1
+
+
+def test_ambiguous_post_reuses_the_resource_found_by_dedup(server, client):
+    server.respond(SERVERS, 500, {"message": "gateway"})
+    lookups = []
+
+    def dedup():
+        lookups.append(True)
+        return {"server": {"id": "s-created-anyway"}}
+
+    result = client.request("POST", SERVERS, json={"name": "vm"}, dedup=dedup)
+
+    assert result == {"server": {"id": "s-created-anyway"}}
+    assert lookups and server.calls("POST", SERVERS) == 1
+
+
+def test_ambiguous_post_without_a_duplicate_is_retried(server, client):
+    server.respond(SERVERS, 504)
+    server.respond(SERVERS, 201, {"server": {"id": "s-3"}})
+
+    result = client.request("POST", SERVERS, json={"name": "vm"}, dedup=lambda: None)
+
+    assert result == {"server": {"id": "s-3"}}
+    assert server.calls("POST", SERVERS) == 2
+    assert server.received[-1][3] == {"name": "vm"}
+
+
+def test_ambiguous_post_without_dedup_is_not_retried(server, client):
+    server.respond(SERVERS, 502)
+
+    with pytest.raises(ScalewayAPIError):
+        client.request("POST", SERVERS, json={"name": "vm"})
+    assert server.calls("POST", SERVERS) == 1
@@ -0,0 +1,125 @@
+"""Tests for the inventory command (cli.py) on its live and multi-vCenter paths."""
+
+import json
+from unittest import mock
+
+import pytest
+import yaml
+from click.testing import CliRunner
+
+from vmware2scw import cli
+from vmware2scw.vmware import inventory as inventory_module
+from vmware2scw.vmware import sources as sources_module
+from vmware2scw.vmware.inventory import DiskInfo, VMInfo
+
+
+def vm(name: str, vcenter: str = "") -> VMInfo:
+    disk = DiskInfo("Hard disk 1", 20.0, True, "ds1", f"[ds1] {name}/{name}.vmdk", "scsi")
+    return VMInfo(name=name, uuid=f"uuid-{name}", cpu=2, memory_mb=4096, power_state="poweredOn",
+                  guest_os="ubuntu64Guest", guest_os_full=None, firmware="bios", disks=[disk],
+                  vcenter=vcenter)
+
+
+class FakeCache:
+    def __init__(self, vms, age=42.0):
+        self.vms = vms
+        self._age = age
+
+    def iter_query(self, **filters):
+        return iter(sorted(self.vms, key=lambda v: v.name))
+
+    def age(self):
+        return self._age
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    path = tmp_path / "config.yaml"
+    path.write_text(yaml.safe_dump({
+        "vcenters": [
+            {"vcenter": "vc1.example.com", "name": "paris", "username": "u", "password": "p"},
+            {"vcenter": "vc2.example.com", "name": "lyon", "username": "u", "password": "p"},
+        ],
+        "scaleway": {"organization_id": "org", "project_id": "proj",
+                     "access_key": "SCWXXX", "secret_key": "secret"},
+        "conversion": {"cache_dir": str(tmp_path / "cache")},
+    }))
+    return str(path)
+
+
+@pytest.fixture
+def vsphere(monkeypatch):
+    client = mock.MagicMock()
+    monkeypatch.setattr("vmware2scw.vmware.client.VSphereClient", lambda: client)
+    return client
+
+
+def invoke(*args):
+    return CliRunner().invoke(cli.main, ["inventory", *args], catch_exceptions=False)
+
+
+def test_live_single_vcenter(monkeypatch, vsphere):
+    monkeypatch.setattr(inventory_module.VMInventory, "iter_vms",
+                        lambda self, pattern=None: iter([vm("web-1"), vm("db-1")]))
+
+    result = invoke("--vcenter", "vc1.example.com", "--username", "u", "--password", "p", "--live")
+
+    assert result.exit_code == 0, result.output
+    assert "web-1" in result.output and "db-1" in result.output
+    assert "Total: 2 VMs (live)" in result.output
+    vsphere.connect.assert_called_once_with("vc1.example.com", "u", "p", insecure=False)
+    vsphere.disconnect.assert_called_once()
+
+
+def test_live_disconnects_on_error(monkeypatch, vsphere):
+    def broken(self, pattern=None):
+        yield vm("web-1")
+        raise RuntimeError("session lost")
+
+    monkeypatch.setattr(inventory_module.VMInventory, "iter_vms", broken)
+
+    with pytest.raises(RuntimeError, match="session lost"):
+        invoke("--vcenter", "vc1.example.com", "--username", "u", "--password", "p", "--live")
+    vsphere.disconnect.assert_called_once()
+
+
+def test_live_filters(monkeypatch, vsphere):
+    off = vm("old-1")
+    off.power_state = "poweredOff"
+    monkeypatch.setattr(inventory_module.VMInventory, "iter_vms",
+                        lambda self, pattern=None: iter([vm("web-1"), off]))
+
+    result = invoke("--vcenter", "vc1.example.com", "--username", "u", "--password", "p", "--live",
+                    "--power-state", "poweredOff", "--format", "ndjson")
+
+    assert result.exit_code == 0, result.output
+    assert '"old-1"' in result.output and '"web-1"' not in result.output
+
+
+def test_multi_source_cached(monkeypatch, config_path):
+    caches = {"vc1.example.com": FakeCache([vm("web-2"), vm("app")], age=30.0),
+              "vc2.example.com": FakeCache([vm("web-1"), vm("app")], age=90.0)}
+    monkeypatch.setattr(sources_module.SourceSet, "sync", lambda self, **kw: {})
+    monkeypatch.setattr(sources_module.SourceSet, "cache", lambda self, source: caches[source.vcenter])
+
+    result = invoke("--config", config_path, "--format", "ndjson")
+
+    assert result.exit_code == 0, result.output
+    names = [line for line in result.output.splitlines() if line.startswith("{")]
+    assert [json.loads(line)["name"] for line in names] == ["app", "app", "web-1", "web-2"]
+
+    result = invoke("--config", config_path)
+    assert result.exit_code == 0, result.output
+    assert "paris/web-2" in result.output and "lyon/web-1" in result.output
+    assert "Total: 4 VMs (inventory cache synced 90s ago)" in result.output
+
+
+def test_multi_source_live(monkeypatch, config_path):
+    monkeypatch.setattr(sources_module.SourceSet, "iter_live",
+                        lambda self, pattern=None: iter([vm("web-1", "paris"), vm("web-1", "lyon")]))
+
+    result = invoke("--config", config_path, "--live")
+
+    assert result.exit_code == 0, result.output
+    assert "paris/web-1" in result.output and "lyon/web-1" in result.output
+    assert "Total: 2 VMs (live)" in result.output
@@ -0,0 +1,73 @@
+"""Tests for the validate command (cli.py) against the zone's instance catalog."""
+
+import pytest
+import yaml
+from click.testing import CliRunner
+
+from vmware2scw import cli
+from vmware2scw.scaleway import catalog as catalog_module
+from vmware2scw.scaleway.catalog import InstanceCatalog
+from vmware2scw.scaleway.mapping import InstanceTypeSpec
+from vmware2scw.vmware import sources as sources_module
+from vmware2scw.vmware.inventory import DiskInfo, VMInfo
+
+VM = VMInfo(name="web-1", uuid="uuid-1", cpu=2, memory_mb=4096, power_state="poweredOff",
+            guest_os="ubuntu64Guest", guest_os_full=None, firmware="efi", tools_status="toolsOk",
+            disks=[DiskInfo("Hard disk 1", 20.0, True, "ds1", "[ds1] web-1/web-1.vmdk", "scsi")])
+
+
+class FakeCache:
+    def get(self, name):
+        return VM if name == VM.name else None
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    path = tmp_path / "config.yaml"
+    path.write_text(yaml.safe_dump({
+        "vmware": {"vcenter": "vc1.example.com", "username": "u", "password": "p"},
+        "scaleway": {"organization_id": "org", "project_id": "proj", "default_zone": "nl-ams-1",
+                     "access_key": "SCWXXX", "secret_key": "secret"},
+        "conversion": {"cache_dir": str(tmp_path / "cache")},
+    }))
+    return str(path)
+
+
+@pytest.fixture
+def zone_catalogs(monkeypatch):
+    """get_catalog() calls; each zone offers one type the built-in table lacks."""
+    calls = []
+
+    def get_catalog(zone=None, api=None, cache_dir=None, ttl=0, refresh=False):
+        calls.append({"zone": zone, "cache_dir": str(cache_dir), "refresh": refresh})
+        spec = InstanceTypeSpec(name=f"ZONE-{zone}", vcpus=4, ram_gb=16)
+        return InstanceCatalog({spec.name: spec}, source="api", zone=zone)
+
+    monkeypatch.setattr(catalog_module, "get_catalog", get_catalog)
+    monkeypatch.setattr("vmware2scw.scaleway.instance.ScalewayInstanceAPI", lambda **kw: object())
+    monkeypatch.setattr(sources_module.SourceSet, "sync", lambda self, **kw: {})
+    monkeypatch.setattr(sources_module.SourceSet, "cache", lambda self, source: FakeCache())
+    return calls
+
+
+def invoke(*args):
+    return CliRunner().invoke(cli.main, ["validate", *args], catch_exceptions=False)
+
+
+def test_validate_uses_the_default_zone_catalog(config_path, zone_catalogs):
+    result = invoke("--vm", "web-1", "--target-type", "ZONE-nl-ams-1", "--config", config_path)
+
+    assert result.exit_code == 0, result.output
+    assert "Validation passed" in result.output
+    assert zone_catalogs == [{"zone": "nl-ams-1", "cache_dir": config_path.replace("config.yaml", "cache"),
+                              "refresh": False}]
+
+
+def test_validate_with_zone_and_refresh(config_path, zone_catalogs):
+    result = invoke("--vm", "web-1", "--target-type", "ZONE-nl-ams-1", "--zone", "pl-waw-2",
+                    "--refresh", "--config", config_path)
+
+    # The type isn't offered in that zone
+    assert result.exit_code == 1
+    assert "Unknown instance type 'ZONE-nl-ams-1'" in result.output
+    assert zone_catalogs[0]["zone"] == "pl-waw-2" and zone_catalogs[0]["refresh"]
@@ -0,0 +1,180 @@
+"""Tests for the migration task graph (pipeline/dag.py)."""
+
+import threading
+import time
+
+import pytest
+
+from vmware2scw.pipeline.dag import PrioritySemaphore, ResourcePools, TaskFailedError, TaskGraph
+
+
+def recorder():
+    events: list[str] = []
+    lock = threading.Lock()
+
+    def task(name, delay=0.0):
+        def run():
+            time.sleep(delay)
+            with lock:
+                events.append(name)
+        return run
+
+    return events, task
+
+
+def test_dependency_order():
+    events, task = recorder()
+    graph = TaskGraph()
+    graph.add("a", task("a", 0.05))
+    graph.add("b", task("b"), deps=["a"])
+    graph.add("c", task("c"), deps=["a"])
+    graph.add("d", task("d"), deps=["b", "c"])
+
+    graph.run()
+
+    assert events[0] == "a"
+    assert set(events[1:3]) == {"b", "c"}
+    assert events[3] == "d"
+
+
+def test_order_rejects_cycles_and_unknown_deps():
+    graph = TaskGraph()
+    graph.add("a", lambda: None, deps=["b"])
+    graph.add("b", lambda: None, deps=["a"])
+    with pytest.raises(ValueError, match="cycle"):
+        graph.order()
+
+    graph = TaskGraph()
+    graph.add("a", lambda: None, deps=["missing"])
+    with pytest.raises(ValueError, match="Unknown"):
+        graph.run()
+
+
+def test_milestone_completes_before_its_owner():
+    events, task = recorder()
+    graph = TaskGraph()
+    owner_may_finish = threading.Event()
+
+    def export():
+        graph.complete("export[0]")
+        # The dependant of the milestone runs while the owner is still busy
+        assert owner_may_finish.wait(5)
+        events.append("export")
+
+    def convert():
+        events.append("convert[0]")
+        owner_may_finish.set()
+
+    graph.add("export", export)
+    graph.milestone("export[0]", owner="export")
+    graph.milestone("export[1]", owner="export")
+    graph.add("convert[0]", convert, deps=["export[0]"])
+    graph.add("convert[1]", task("convert[1]"), deps=["export[1]"])
+
+    completed = []
+    graph.run(on_done=completed.append)
+
+    assert events[:2] == ["convert[0]", "export"]
+    assert events[2] == "convert[1]"
+    # Milestones not completed explicitly are completed with their owner
+    assert completed.index("export[1]") < completed.index("export")
+
+
+def test_failure_drains_running_tasks_and_starts_nothing_new():
+    events, task = recorder()
+
+    def boom():
+        raise RuntimeError("disk full")
+
+    graph = TaskGraph()
+    graph.add("slow", task("slow", 0.2))
+    graph.add("boom", boom)
+    graph.add("after_boom", task("after_boom"), deps=["boom"])
+    graph.add("after_slow", task("after_slow"), deps=["slow"])
+
+    with pytest.raises(TaskFailedError) as excinfo:
+        graph.run()
+
+    assert excinfo.value.task == "boom"
+    assert isinstance(excinfo.value.error, RuntimeError)
+    # The running task finished; nothing was started after the failure
+    assert events == ["slow"]
+
+
+def test_resume_skips_done_tasks_and_their_milestones():
+    events, task = recorder()
+    graph = TaskGraph()
+    graph.add("export", task("export"))
+    graph.milestone("export[0]", owner="export")
+    graph.add("convert[0]", task("convert[0]"), deps=["export[0]"])
+    graph.add("upload[0]", task("upload[0]"), deps=["convert[0]"])
+
+    graph.run(done={"export", "convert[0]", "not-a-task"})
+
+    assert events == ["upload[0]"]
+
+
+def test_pools_bound_concurrency():
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def work():
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+
+    graph = TaskGraph()
+    for i in range(6):
+        graph.add(f"convert[{i}]", work, pool="convert")
+    graph.run(pools=ResourcePools({"convert": 2}))
+
+    assert peak == 2
+
+
+def test_wildcard_pool_limits():
+    pools = ResourcePools({"esxi:*": 1, "vcenter:*": 2, "vcenter:big": 5})
+    assert pools.get("esxi:host-1").limit == 1
+    assert pools.get("esxi:host-1") is pools.get("esxi:host-1")
+    assert pools.get("esxi:host-1") is not pools.get("esxi:host-2")
+    assert pools.get("vcenter:small").limit == 2
+    assert pools.get("vcenter:big").limit == 5
+    assert pools.get("unbounded") is None
+
+
+def test_priority_semaphore_serves_lowest_priority_first():
+    sem = PrioritySemaphore(1)
+    order: list[int] = []
+    holding = threading.Event()
+    release = threading.Event()
+
+    def holder():
+        with sem.slot(0):
+            holding.set()
+            release.wait(5)
+
+    def waiter(priority):
+        with sem.slot(priority):
+            order.append(priority)
+
+    threading.Thread(target=holder).start()
+    assert holding.wait(5)
+    waiters = []
+    for priority in (5, 1, 3, 1):
+        t = threading.Thread(target=waiter, args=(priority,))
+        t.start()
+        waiters.append(t)
+        time.sleep(0.02)           # queue them in this order
+    assert sem.waiting() == 4
+
+    release.set()
+    for t in waiters:
+        t.join(5)
+
+    # By priority, FIFO among equals
+    assert order == [1, 1, 3, 5]
+    assert sem.in_use() == 0
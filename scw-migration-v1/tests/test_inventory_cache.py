@@ -0,0 +1,184 @@
+"""Tests for the incremental inventory cache (vmware/cache.py) against a fake PropertyCollector."""
+
+from types import SimpleNamespace
+
+import pytest
+from pyVmomi import vim
+
+from vmware2scw.vmware import cache as cache_module
+from vmware2scw.vmware.cache import CHANGE_PROPERTIES, InventoryCache
+from vmware2scw.vmware.inventory import VMInfo
+
+
+class FakeVCenter:
+    """VMs as {moid: props}; collectors report changes since a version."""
+
+    def __init__(self, vms: dict[str, str]):
+        self.vms: dict[str, dict] = {}
+        for moid, name in vms.items():
+            self.add(moid, name)
+        self.collectors: list[FakeCollector] = []
+        self.fetched: list[list[str]] = []
+
+    def add(self, moid: str, name: str) -> None:
+        self.vms[moid] = dict.fromkeys(CHANGE_PROPERTIES) | {
+            "name": name, "config.changeVersion": "1", "runtime.powerState": "poweredOn"}
+
+    def markers(self) -> dict[str, tuple]:
+        return {moid: tuple(props[p] for p in CHANGE_PROPERTIES) for moid, props in self.vms.items()}
+
+
+class FakeCollector:
+    def __init__(self, vcenter: FakeVCenter, session: "FakeClient"):
+        self.vcenter = vcenter
+        self.session = session
+        self.versions: list[str] = []
+        self.reported: dict[str, dict[str, tuple]] = {}
+        self.destroyed = False
+
+    def CreateFilter(self, spec, partialUpdates):  # noqa: N802, N803
+        assert spec.propSet[0].pathSet == CHANGE_PROPERTIES
+
+    def WaitForUpdatesEx(self, version, options):  # noqa: N802
+        if not self.session.alive or self.destroyed:
+            raise vim.fault.NotAuthenticated()
+        self.versions.append(version)
+        before = self.reported.get(version, {})
+        now = self.vcenter.markers()
+        updates = []
+        for moid, marker in now.items():
+            if before.get(moid) != marker:
+                changes = [SimpleNamespace(name=p, val=v) for p, v in zip(CHANGE_PROPERTIES, marker)]
+                updates.append(SimpleNamespace(obj=vim.VirtualMachine(moid), changeSet=changes,
+                                               kind="enter" if moid not in before else "modify"))
+        updates += [SimpleNamespace(obj=vim.VirtualMachine(moid), changeSet=[], kind="leave")
+                    for moid in before if moid not in now]
+        if version and not updates:
+            return None
+        new_version = str(len(self.reported) + 1)
+        self.reported[new_version] = now
+        return SimpleNamespace(version=new_version, truncated=False,
+                               filterSet=[SimpleNamespace(objectSet=updates)])
+
+    def DestroyPropertyCollector(self):  # noqa: N802
+        self.destroyed = True
+
+
+class FakeClient:
+    """One pooled session of the fake vCenter."""
+
+    def __init__(self, vcenter: FakeVCenter):
+        self.vcenter = vcenter
+        self.alive = True
+        self.content = SimpleNamespace(propertyCollector=SimpleNamespace(
+            CreatePropertyCollector=self._create_collector))
+
+    def _create_collector(self):
+        collector = FakeCollector(self.vcenter, self)
+        self.vcenter.collectors.append(collector)
+        return collector
+
+    def get_container_view(self, obj_type):
+        return SimpleNamespace(Destroy=lambda: None)
+
+    def view_filter_spec(self, view, properties):
+        return SimpleNamespace(propSet=[SimpleNamespace(pathSet=properties[vim.VirtualMachine])])
+
+    def retrieve_objects(self, objs, paths):
+        self.vcenter.fetched.append(sorted(obj._moId for obj in objs))
+        for obj in objs:
+            yield obj, dict(self.vcenter.vms[obj._moId])
+
+
+class FakeInventory:
+    VM_PROPERTIES = ["name", "runtime.powerState"]
+
+    def __init__(self, client):
+        self.client = client
+
+    def topology(self):
+        return None
+
+    def _vm_from_props(self, props, topology):
+        return VMInfo(name=props["name"], uuid=f"uuid-{props['name']}", cpu=2, memory_mb=4096,
+                      power_state=props["runtime.powerState"], guest_os="ubuntu64Guest",
+                      guest_os_full=None, firmware="bios")
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_module, "VMInventory", FakeInventory)
+    cache = InventoryCache("vc1.example.com", tmp_path)
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def vcenter():
+    return FakeVCenter({"vm-1": "web-1", "vm-2": "web-2", "vm-3": "db-1"})
+
+
+def test_initial_sync(cache, vcenter):
+    stats = cache.sync(FakeClient(vcenter))
+
+    assert stats == {"changed": 3, "removed": 0, "total": 3}
+    assert [c.versions for c in vcenter.collectors] == [[""]]
+    assert vcenter.fetched == [["vm-1", "vm-2", "vm-3"]]
+    assert cache.get("web-2").power_state == "poweredOn"
+
+
+def test_incremental_sync_on_another_pooled_session(cache, vcenter):
+    cache.sync(FakeClient(vcenter))
+    vcenter.vms["vm-2"].update({"config.changeVersion": "2", "runtime.powerState": "poweredOff"})
+    vcenter.add("vm-4", "app-1")
+
+    stats = cache.sync(FakeClient(vcenter))
+
+    assert stats == {"changed": 2, "removed": 0, "total": 4}
+    # The filter of the first session answered with the changes since its token
+    assert len(vcenter.collectors) == 1
+    assert vcenter.collectors[0].versions == ["", "1"]
+    assert vcenter.fetched[-1] == ["vm-2", "vm-4"]
+    assert cache.get("web-2").power_state == "poweredOff"
+
+    # Nothing changed: no fetch at all
+    assert cache.sync(FakeClient(vcenter)) == {"changed": 0, "removed": 0, "total": 4}
+    assert vcenter.collectors[0].versions == ["", "1", "2"]
+    assert len(vcenter.fetched) == 2
+
+
+def test_removed_vm(cache, vcenter):
+    cache.sync(FakeClient(vcenter))
+    del vcenter.vms["vm-1"]
+
+    stats = cache.sync(FakeClient(vcenter))
+
+    assert stats == {"changed": 0, "removed": 1, "total": 2}
+    assert cache.get("web-1") is None
+    assert len(vcenter.collectors) == 1
+
+
+def test_filter_session_gone_falls_back_to_markers(cache, vcenter):
+    first = FakeClient(vcenter)
+    cache.sync(first)
+    first.alive = False
+    del vcenter.vms["vm-3"]
+    vcenter.vms["vm-1"]["guest.ipAddress"] = "10.0.0.5"
+
+    stats = cache.sync(FakeClient(vcenter))
+
+    assert stats == {"changed": 1, "removed": 1, "total": 2}
+    assert len(vcenter.collectors) == 2
+    assert vcenter.collectors[1].versions == [""]
+    assert vcenter.collectors[1].session is not first
+    assert vcenter.fetched[-1] == ["vm-1"]
+
+
+def test_full_sync_refetches_everything(cache, vcenter):
+    cache.sync(FakeClient(vcenter))
+
+    stats = cache.sync(FakeClient(vcenter), full=True)
+
+    assert stats == {"changed": 3, "removed": 0, "total": 3}
+    assert vcenter.collectors[0].destroyed
+    assert vcenter.collectors[1].versions == [""]
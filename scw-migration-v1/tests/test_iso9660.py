@@ -0,0 +1,169 @@
+"""Tests for the read-only ISO9660 / Joliet reader (converter/iso9660.py).
+
+Images are built here with a minimal ECMA-119 writer: a primary
+(upper-case 8.3) tree and, optionally, a Joliet tree over the same file
+extents.
+"""
+
+import struct
+
+import pytest
+
+from vmware2scw.converter.iso9660 import SECTOR_SIZE, ISO9660Image
+
+FILES = {
+    "NetKVM": {"2k22": {"amd64": {"netkvm.inf": b"[Version]\r\n", "netkvm.sys": b"\x4d\x5a" * 3000}}},
+    "viostor": {"2k22": {"amd64": {f"file{i:02d}_with_a_long_name.cat": bytes([i]) * 10 for i in range(40)}}},
+    "README.txt": b"virtio-win",
+}
+
+
+def _both(fmt: str, value: int) -> bytes:
+    le = struct.pack("<" + fmt, value)
+    be = struct.pack(">" + fmt, value)
+    return le + be
+
+
+def _record(name: bytes, extent: int, size: int, is_dir: bool) -> bytes:
+    body = (b"\0" + _both("I", extent) + _both("I", size) + b"\0" * 7
+            + bytes([2 if is_dir else 0]) + b"\0\0" + _both("H", 1) + bytes([len(name)]) + name)
+    if len(body) % 2 == 0:       # total record length (with the length byte) must be even
+        body += b"\0"
+    return bytes([len(body) + 1]) + body
+
+
+def build_iso(tree: dict, joliet: bool = True) -> bytes:
+    sectors: dict[int, bytes] = {}
+    next_free = [19 if joliet else 18]
+
+    def alloc(size: int) -> int:
+        lba = next_free[0]
+        next_free[0] += max(1, -(-size // SECTOR_SIZE))
+        return lba
+
+    # File data is shared by both trees
+    file_extents: dict[int, tuple[int, int]] = {}
+
+    def place_files(node: dict) -> None:
+        for value in node.values():
+            if isinstance(value, dict):
+                place_files(value)
+            else:
+                lba = alloc(len(value))
+                sectors[lba] = value
+                file_extents[id(value)] = (lba, len(value))
+
+    place_files(tree)
+
+    def encode(name: str, is_dir: bool, as_joliet: bool) -> bytes:
+        if as_joliet:
+            return name.encode("utf-16-be")
+        name = name.upper()
+        return name.encode() if is_dir else (name + ";1").encode()
+
+    def write_dir(node: dict, parent: tuple[int, int] | None, as_joliet: bool) -> tuple[int, int]:
+        children = []
+        for name, value in node.items():
+            if isinstance(value, dict):
+                children.append((name, value, None))
+            else:
+                children.append((name, value, file_extents[id(value)]))
+        # Sizes first: records never straddle a sector
+        records = [None, None] + [encode(n, c is None, as_joliet) for n, _v, c in children]
+        size = 0
+        for name in records:
+            rec_len = len(_record(name or b"\0", 0, 0, True))
+            if size % SECTOR_SIZE + rec_len > SECTOR_SIZE:
+                size = (size // SECTOR_SIZE + 1) * SECTOR_SIZE
+            size += rec_len
+        size = -(-size // SECTOR_SIZE) * SECTOR_SIZE
+        lba = alloc(size)
+        me = (lba, size)
+
+        entries = [_record(b"\0", lba, size, True), _record(b"\1", *(parent or me), True)]
+        for (name, value, extent), raw in zip(children, records[2:]):
+            if extent is None:
+                extent = write_dir(value, me, as_joliet)
+                entries.append(_record(raw, *extent, True))
+            else:
+                entries.append(_record(raw, *extent, False))
+        data = bytearray()
+        for rec in entries:
+            if len(data) % SECTOR_SIZE + len(rec) > SECTOR_SIZE:
+                data += b"\0" * (SECTOR_SIZE - len(data) % SECTOR_SIZE)
+            data += rec
+        sectors[lba] = bytes(data)
+        return me
+
+    def descriptor(vd_type: int, root: tuple[int, int], escape: bytes = b"") -> bytes:
+        vd = bytearray(SECTOR_SIZE)
+        vd[0] = vd_type
+        vd[1:7] = b"CD001\1"
+        vd[88:88 + len(escape)] = escape
+        vd[156:156 + 34] = _record(b"\0", *root, True)
+        return bytes(vd)
+
+    sectors[16] = descriptor(1, write_dir(tree, None, as_joliet=False))
+    if joliet:
+        sectors[17] = descriptor(2, write_dir(tree, None, as_joliet=True), b"%/E")
+    terminator = bytearray(SECTOR_SIZE)
+    terminator[0] = 255
+    terminator[1:7] = b"CD001\1"
+    sectors[18 if joliet else 17] = bytes(terminator)
+
+    image = bytearray(next_free[0] * SECTOR_SIZE)
+    for lba, data in sectors.items():
+        image[lba * SECTOR_SIZE:lba * SECTOR_SIZE + len(data)] = data
+    return bytes(image)
+
+
+@pytest.fixture
+def iso(tmp_path):
+    path = tmp_path / "virtio-win.iso"
+    path.write_bytes(build_iso(FILES))
+    with ISO9660Image(path) as image:
+        yield image
+
+
+def test_joliet_names_and_case_insensitive_lookup(iso):
+    assert iso.joliet
+    names = {e.name for e in iso.listdir("/")}
+    assert names == {"NetKVM", "viostor", "README.txt"}
+    entry = iso.find("netkvm\\2K22/AMD64/NetKVM.INF")
+    assert entry is not None and not entry.is_dir
+    assert entry.name == "netkvm.inf"
+    assert iso.find("NetKVM/2k22/arm64") is None
+    assert iso.find("README.txt/child") is None
+
+
+def test_directory_spanning_several_sectors(iso):
+    entries = iso.listdir("viostor/2k22/amd64")
+    assert sorted(e.name for e in entries) == sorted(FILES["viostor"]["2k22"]["amd64"])
+
+
+def test_extract_dir_and_walk(iso, tmp_path):
+    written = iso.extract_dir("NetKVM/2k22/amd64", tmp_path / "out")
+    assert sorted(p.name for p in written) == ["netkvm.inf", "netkvm.sys"]
+    assert (tmp_path / "out" / "netkvm.sys").read_bytes() == FILES["NetKVM"]["2k22"]["amd64"]["netkvm.sys"]
+
+    dirs = {path for path, _entries in iso.walk("/")}
+    assert {"", "NetKVM", "NetKVM/2k22", "NetKVM/2k22/amd64", "viostor/2k22/amd64"} <= dirs
+    with pytest.raises(FileNotFoundError):
+        iso.listdir("NetKVM/2k22/amd64/netkvm.inf")
+
+
+def test_primary_tree_without_joliet(tmp_path):
+    path = tmp_path / "plain.iso"
+    path.write_bytes(build_iso({"README.TXT": b"x", "DRIVERS": {"A.INF": b"inf"}}, joliet=False))
+    with ISO9660Image(path) as image:
+        assert not image.joliet
+        # The ";1" version suffix is stripped
+        assert {e.name for e in image.listdir("/")} == {"README.TXT", "DRIVERS"}
+        assert image.find("drivers/a.inf").size == 3
+
+
+def test_not_an_iso(tmp_path):
+    path = tmp_path / "junk.iso"
+    path.write_bytes(b"\0" * SECTOR_SIZE * 20)
+    with pytest.raises(ValueError, match="not an ISO9660 image"):
+        ISO9660Image(path)
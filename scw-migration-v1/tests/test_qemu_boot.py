@@ -0,0 +1,72 @@
+"""Tests for the QEMU session runner (converter/qemu_boot.py) with a fake QEMU."""
+
+import logging
+import os
+import stat
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from vmware2scw.converter import qemu_boot
+
+FAKE_QEMU = f"""#!{sys.executable}
+import os, sys
+args = sys.argv[1:]
+serial = args[args.index("-serial") + 1].removeprefix("file:")
+# Far more than a pipe buffer of warnings before the guest gets anywhere
+for i in range(20000):
+    sys.stderr.write(f"qemu-system-x86_64: warning: noisy device {{i}}\\n")
+sys.stderr.flush()
+with open(serial, "a") as f:
+    f.write("BOOTED\\n")
+sys.exit(int(os.environ.get("FAKE_QEMU_EXIT", "0")))
+"""
+
+
+@pytest.fixture
+def fake_qemu(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    qemu = bin_dir / "qemu-system-x86_64"
+    qemu.write_text(FAKE_QEMU)
+    qemu.chmod(qemu.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setattr(qemu_boot, "io_uring_supported", lambda: False)
+
+    def no_qmp(path):
+        raise OSError("no QMP in the fake")
+
+    monkeypatch.setattr(qemu_boot, "QMPClient", no_qmp)
+
+
+def run(tmp_path, timeout=20):
+    work_dir = tmp_path / "work"
+    work_dir.mkdir(exist_ok=True)
+    res = SimpleNamespace(memory_mb=2048, vcpus=2, hugepages=False)
+    started = time.time()
+    result = qemu_boot._run_session(work_dir, [work_dir / "disk.qcow2"], work_dir / "serial.log",
+                                    "bios", (), "VMWARE2SCW_DONE", ("BOOTED",), timeout, res)
+    return result, time.time() - started, work_dir
+
+
+def test_noisy_stderr_does_not_stall_qemu(tmp_path, fake_qemu):
+    (reason, _, serial, seen), took, work_dir = run(tmp_path)
+
+    assert reason == "exited"
+    assert took < 10
+    assert seen == ["BOOTED"]
+    assert (work_dir / "serial-qemu.log").stat().st_size > 64 * 1024
+
+
+def test_exit_warning_shows_the_log_tail(tmp_path, fake_qemu, monkeypatch, caplog):
+    monkeypatch.setenv("FAKE_QEMU_EXIT", "1")
+    with caplog.at_level(logging.WARNING, logger=qemu_boot.logger.name):
+        (reason, *_), _, work_dir = run(tmp_path)
+
+    assert reason == "exited"
+    message = next(r.getMessage() for r in caplog.records if "exited with code 1" in r.getMessage())
+    assert "noisy device 19999" in message
+    assert "noisy device 0\n" not in message
+    assert str(work_dir / "serial-qemu.log") in message
@@ -0,0 +1,166 @@
+"""Tests for the shared snapshot/image status poller (scaleway/instance.py)."""
+
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from vmware2scw.scaleway import instance as instance_module
+from vmware2scw.scaleway.api_client import ScalewayAPIError
+from vmware2scw.scaleway.instance import ResourcePoller, ScalewayInstanceAPI
+
+BASE = "https://api.test"
+LIST_URL = f"{BASE}/block/v1/zones/fr-par-1/snapshots"
+
+
+class FakeAPI(ScalewayInstanceAPI):
+    """Block snapshots in memory; hidden ones are left out of list calls."""
+
+    def __init__(self, snapshots=None):
+        self.project_id = "proj"
+        self.client = SimpleNamespace(base_url=BASE)
+        self.snapshots: dict[str, str] = dict(snapshots or {})
+        self.hidden: set[str] = set()
+        self.calls: list[tuple[str, dict]] = []
+        self.fail: list[Exception] = []
+        self._lock = threading.Lock()
+
+    def _request(self, method, url, json=None, params=None, dedup=None):
+        with self._lock:
+            self.calls.append((url, dict(params or {})))
+            if self.fail:
+                raise self.fail.pop(0)
+            if url == LIST_URL:
+                assert params["project_id"] == "proj"
+                items = [{"id": k, "status": v} for k, v in sorted(self.snapshots.items())
+                         if k not in self.hidden]
+                size, page = params["page_size"], params["page"]
+                return {"snapshots": items[(page - 1) * size:page * size], "total_count": len(items)}
+            rid = url.rsplit("/", 1)[1]
+            return {"id": rid, "status": self.snapshots[rid]}
+
+    def list_calls(self) -> list[dict]:
+        with self._lock:
+            return [params for url, params in self.calls if url == LIST_URL]
+
+    def get_calls(self) -> list[str]:
+        with self._lock:
+            return [url for url, _ in self.calls if url != LIST_URL]
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(instance_module, "FIRST_ROUND_DELAY", 0.05)
+    monkeypatch.setattr(instance_module, "MIN_POLL_INTERVAL", 0.02)
+    monkeypatch.setattr(instance_module, "MAX_POLL_INTERVAL", 0.05)
+    monkeypatch.setattr(instance_module.random, "uniform", lambda a, b: 1.0)
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_watchers_share_list_calls():
+    api = FakeAPI({"a": "creating", "b": "creating", "c": "creating"})
+    poller = ResourcePoller(api, "snapshot", "fr-par-1")
+    futures = [poller.watch(rid) for rid in "abc"]
+    assert poller.watch("a") is futures[0]
+
+    wait_until(lambda: len(api.list_calls()) >= 2)
+    api.snapshots.update(a="available", b="available", c="available")
+
+    results = [f.result(timeout=5) for f in futures]
+    assert [r["id"] for r in results] == ["a", "b", "c"]
+    # One list call per round for all three, never a per-resource GET
+    assert api.get_calls() == []
+    wait_until(lambda: poller._thread is None)
+    assert poller.outstanding() == 0
+
+
+def test_pagination(monkeypatch):
+    monkeypatch.setattr(instance_module, "LIST_PAGE_SIZE", 2)
+    api = FakeAPI({f"s{i}": "creating" for i in range(5)})
+    api.snapshots["s4"] = "available"
+    poller = ResourcePoller(api, "snapshot", "fr-par-1")
+
+    assert poller.watch("s4").result(timeout=5)["id"] == "s4"
+    assert [p["page"] for p in api.list_calls()[:3]] == [1, 2, 3]
+    assert poller._pages == 3
+
+
+def test_missing_from_list_falls_back_to_get():
+    api = FakeAPI({"a": "available"})
+    api.hidden.add("a")
+    poller = ResourcePoller(api, "snapshot", "fr-par-1")
+
+    assert poller.watch("a").result(timeout=5)["status"] == "available"
+    assert len(api.list_calls()) == instance_module.MISSING_ROUNDS_BEFORE_GET
+    assert api.get_calls() == [f"{LIST_URL}/a"]
+
+
+def test_failed_status():
+    api = FakeAPI({"a": "in_error"})
+    poller = ResourcePoller(api, "snapshot", "fr-par-1")
+
+    with pytest.raises(RuntimeError, match="Snapshot a failed: in_error"):
+        poller.watch("a").result(timeout=5)
+
+
+def test_deadline_expires():
+    api = FakeAPI({"a": "creating"})
+    poller = ResourcePoller(api, "snapshot", "fr-par-1")
+
+    with pytest.raises(TimeoutError, match="status: creating"):
+        poller.watch("a", timeout=0.2).result(timeout=5)
+    assert poller.outstanding() == 0
+
+
+@pytest.mark.parametrize("error", [
+    ScalewayAPIError("GET -> 503", status=503),
+    ValueError("Expecting value: line 1 column 1 (char 0)"),
+    KeyError("snapshots"),
+])
+def test_errors_back_off_and_recover(error):
+    api = FakeAPI({"a": "available"})
+    api.fail = [error, error]
+    poller = ResourcePoller(api, "snapshot", "fr-par-1")
+
+    assert poller.watch("a").result(timeout=5)["id"] == "a"
+    assert len(api.list_calls()) == 3
+    wait_until(lambda: poller._errors == 0)
+
+
+def test_errors_still_expire():
+    api = FakeAPI({"a": "available"})
+    api.fail = [ValueError("bad body")] * 1000
+    poller = ResourcePoller(api, "snapshot", "fr-par-1")
+
+    with pytest.raises(TimeoutError):
+        poller.watch("a", timeout=0.2).result(timeout=5)
+
+
+def test_dead_thread_fails_pending_futures(monkeypatch):
+    api = FakeAPI({"a": "creating", "b": "creating"})
+    poller = ResourcePoller(api, "snapshot", "fr-par-1")
+
+    def broken():
+        raise MemoryError("boom")
+
+    monkeypatch.setattr(poller, "_expire", broken)
+    monkeypatch.setattr(threading, "excepthook", lambda args: None)
+    futures = [poller.watch("a"), poller.watch("b")]
+
+    for f in futures:
+        with pytest.raises(RuntimeError, match="status poller stopped"):
+            f.result(timeout=5)
+    assert poller.outstanding() == 0
+    assert poller._thread is None
+
+    # A later watch starts a new thread
+    monkeypatch.delattr(poller, "_expire")
+    api.snapshots["a"] = "available"
+    assert poller.watch("a").result(timeout=5)["id"] == "a"
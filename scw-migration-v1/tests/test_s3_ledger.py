@@ -0,0 +1,266 @@
+"""Tests for resumable multipart uploads and their part ledger (scaleway/s3.py).
+
+The boto3 client is replaced by an in-memory fake of the multipart API.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import types
+
+import pytest
+
+from vmware2scw.scaleway import s3 as s3_module
+from vmware2scw.scaleway.s3 import ScalewayS3, multipart_etag
+
+MB = 1024 * 1024
+
+
+class NoSuchUploadError(Exception):
+    pass
+
+
+class ClientError(Exception):
+    pass
+
+
+class FakeS3Client:
+    """Just enough of the S3 multipart API, with failure injection.
+
+    Methods take boto3's keyword arguments (Bucket=, Key=, UploadId=, ...).
+    """
+
+    exceptions = types.SimpleNamespace(NoSuchUpload=NoSuchUploadError, ClientError=ClientError)
+
+    def __init__(self):
+        self.uploads: dict[str, dict[int, bytes]] = {}
+        self.objects: dict[str, bytes] = {}
+        self.tags: dict[str, list] = {}
+        self.sent: list[int] = []
+        self.fail_part: int | None = None
+        self.aborted: list[str] = []
+        self._lock = threading.Lock()
+
+    def create_multipart_upload(self, **kw):
+        upload_id = f"upload-{len(self.uploads) + 1}"
+        self.uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, **kw):
+        number = kw["PartNumber"]
+        if number == self.fail_part:
+            raise ConnectionError("connection reset")
+        data = kw["Body"].read()
+        assert len(data) == kw["ContentLength"]
+        with self._lock:
+            self.uploads[kw["UploadId"]][number] = bytes(data)
+            self.sent.append(number)
+        return {"ETag": f'"{hashlib.md5(data).hexdigest()}"'}
+
+    def get_paginator(self, name):
+        assert name == "list_parts"
+        client = self
+
+        class Paginator:
+            def paginate(self, **kw):
+                parts = client.uploads.get(kw["UploadId"])
+                if parts is None:
+                    raise NoSuchUploadError(kw["UploadId"])
+                yield {"Parts": [{"PartNumber": n, "Size": len(d),
+                                  "ETag": f'"{hashlib.md5(d).hexdigest()}"'}
+                                 for n, d in sorted(parts.items())]}
+
+        return Paginator()
+
+    def complete_multipart_upload(self, **kw):
+        parts = self.uploads.pop(kw["UploadId"])
+        numbers = [p["PartNumber"] for p in kw["MultipartUpload"]["Parts"]]
+        assert numbers == sorted(parts)
+        self.objects[kw["Key"]] = b"".join(parts[n] for n in numbers)
+        etag = multipart_etag([hashlib.md5(parts[n]).digest() for n in numbers])
+        return {"ETag": f'"{etag}"'}
+
+    def abort_multipart_upload(self, **kw):
+        if self.uploads.pop(kw["UploadId"], None) is None:
+            raise NoSuchUploadError(kw["UploadId"])
+        self.aborted.append(kw["UploadId"])
+
+    def head_object(self, **kw):
+        if kw["Key"] not in self.objects:
+            raise ClientError("404")
+        data = self.objects[kw["Key"]]
+        parts = [data[i:i + MB] for i in range(0, len(data), MB)]
+        return {"ContentLength": len(data),
+                "ETag": f'"{multipart_etag([hashlib.md5(p).digest() for p in parts])}"'}
+
+    def put_object_tagging(self, **kw):
+        self.tags[kw["Key"]] = kw["Tagging"]["TagSet"]
+
+    def delete_object(self, **kw):
+        self.objects.pop(kw["Key"], None)
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setattr(s3_module, "MIN_PART_SIZE", MB)
+    monkeypatch.setattr(s3_module, "_stream_rate", s3_module._StreamRate())
+    client = ScalewayS3("fr-par", "access", "secret", part_concurrency=4)
+    client.client = FakeS3Client()
+    return client
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = tmp_path / "disk.qcow2"
+    path.write_bytes(os.urandom(3 * MB + MB // 2))
+    return path
+
+
+def checkpointer(ledger):
+    saved = []
+    return saved, lambda: saved.append(json.loads(json.dumps(ledger)))
+
+
+def test_upload_completes_and_records_ledger(s3, image):
+    ledger: dict = {}
+    saved, checkpoint = checkpointer(ledger)
+
+    s3.upload_image_resumable(image, "bucket", "disk.qcow2", ledger, checkpoint)
+
+    data = image.read_bytes()
+    assert s3.client.objects["disk.qcow2"] == data
+    assert sorted(s3.client.sent) == [1, 2, 3, 4]
+    assert ledger["completed"] and ledger["upload_id"] is None
+    assert ledger["sha256"] == hashlib.sha256(data).hexdigest()
+    assert s3.client.tags["disk.qcow2"][0]["Value"] == ledger["sha256"]
+    # The upload id was persisted before any part was sent
+    assert saved[0]["upload_id"] == "upload-1" and saved[0]["parts"] == {}
+    assert s3.is_uploaded(image, "bucket", "disk.qcow2", ledger)
+
+
+def test_upload_image_goes_through_the_multipart_path(s3, image):
+    url = s3.upload_image(image, "bucket", "disk.qcow2")
+
+    assert url.endswith("/bucket/disk.qcow2")
+    assert s3.client.objects["disk.qcow2"] == image.read_bytes()
+    assert sorted(s3.client.sent) == [1, 2, 3, 4]
+
+
+def test_interrupted_upload_resumes_missing_parts_only(s3, image):
+    ledger: dict = {}
+    saved, checkpoint = checkpointer(ledger)
+    s3.client.fail_part = 3
+    with pytest.raises(ConnectionError):
+        s3.upload_image_resumable(image, "bucket", "disk.qcow2", ledger, checkpoint)
+
+    persisted = saved[-1]
+    assert persisted["upload_id"] == "upload-1"
+    assert "3" not in persisted["parts"]
+    uploaded_before = set(s3.client.sent)
+    assert 3 not in uploaded_before
+
+    # A new process: only the persisted ledger survives
+    s3.client.fail_part = None
+    s3.client.sent.clear()
+    ledger = persisted
+    s3.upload_image_resumable(image, "bucket", "disk.qcow2", ledger, checkpoint)
+
+    assert set(s3.client.sent) == {1, 2, 3, 4} - uploaded_before
+    assert s3.client.objects["disk.qcow2"] == image.read_bytes()
+    assert ledger["completed"]
+
+
+def test_changed_local_file_restarts_the_upload(s3, image):
+    ledger: dict = {}
+    s3.client.fail_part = 2
+    with pytest.raises(ConnectionError):
+        s3.upload_image_resumable(image, "bucket", "disk.qcow2", ledger)
+
+    image.write_bytes(os.urandom(2 * MB))
+    st = image.stat()
+    os.utime(image, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    s3.client.fail_part = None
+    s3.client.sent.clear()
+    s3.upload_image_resumable(image, "bucket", "disk.qcow2", ledger)
+
+    assert s3.client.aborted == ["upload-1"]
+    assert sorted(s3.client.sent) == [1, 2]
+    assert s3.client.objects["disk.qcow2"] == image.read_bytes()
+
+
+def test_remote_part_not_matching_local_data_is_resent(s3, image):
+    ledger: dict = {}
+    s3.client.fail_part = 4
+    with pytest.raises(ConnectionError):
+        s3.upload_image_resumable(image, "bucket", "disk.qcow2", ledger)
+
+    # Same size, different content: only the ETag tells them apart
+    parts = s3.client.uploads["upload-1"]
+    parts[1] = bytes(len(parts[1]))
+    s3.client.fail_part = None
+    s3.client.sent.clear()
+    s3.upload_image_resumable(image, "bucket", "disk.qcow2", ledger)
+
+    assert sorted(s3.client.sent) == [1, 4]
+    assert s3.client.objects["disk.qcow2"] == image.read_bytes()
+
+
+def test_vanished_upload_restarts(s3, image):
+    ledger: dict = {}
+    s3.client.fail_part = 2
+    with pytest.raises(ConnectionError):
+        s3.upload_image_resumable(image, "bucket", "disk.qcow2", ledger)
+
+    s3.client.uploads.clear()           # expired by a bucket lifecycle rule
+    s3.client.fail_part = None
+    s3.client.sent.clear()
+    s3.upload_image_resumable(image, "bucket", "disk.qcow2", ledger)
+
+    assert sorted(s3.client.sent) == [1, 2, 3, 4]
+    assert ledger["completed"]
+
+
+def test_failed_part_stops_the_hash_pass(s3, image, monkeypatch):
+    real_hash_pass = s3_module._hash_pass
+    outcome = []
+
+    def hash_pass(mm, file_size, part_size, resumed, stop):
+        # Only proceeds once the upload gave up; must then stop at once
+        assert stop.wait(5), "the failed upload did not stop the hash pass"
+        try:
+            return real_hash_pass(mm, file_size, part_size, resumed, stop)
+        except BaseException as e:
+            outcome.append(e)
+            raise
+
+    monkeypatch.setattr(s3_module, "_hash_pass", hash_pass)
+    s3.client.fail_part = 2
+    with pytest.raises(ConnectionError):
+        s3.upload_image_resumable(image, "bucket", "disk.qcow2", {})
+    assert [type(e) for e in outcome] == [s3_module.CancelledError]
+
+
+def test_each_part_is_md5_hashed_once(s3, image, monkeypatch):
+    hashed = []
+
+    def md5(data=b""):
+        h = hashlib.md5(data)
+        hashed.append(h)
+        return h
+
+    monkeypatch.setattr(s3_module, "hashlib", types.SimpleNamespace(md5=md5, sha256=hashlib.sha256))
+    ledger: dict = {}
+    s3.client.fail_part = 3
+    with pytest.raises(ConnectionError):
+        s3.upload_image_resumable(image, "bucket", "disk.qcow2", ledger)
+    sent_before = len(s3.client.sent)
+    assert len(hashed) == sent_before + 1          # one per sent part (+ part 3)
+
+    hashed.clear()
+    s3.client.fail_part = None
+    s3.upload_image_resumable(image, "bucket", "disk.qcow2", ledger)
+    # Resumed parts by the hash pass, the others by the upload, plus the
+    # multipart ETag (computed by us and by the fake server)
+    assert len(hashed) == 4 + 2
+    assert ledger["completed"]
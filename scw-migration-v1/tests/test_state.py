@@ -0,0 +1,69 @@
+"""Tests for migration state persistence (pipeline/state.py)."""
+
+import json
+import threading
+from datetime import datetime
+
+from vmware2scw.pipeline.state import MigrationState, MigrationStateStore
+
+
+def test_round_trip(tmp_path):
+    store = MigrationStateStore(tmp_path)
+    state = MigrationState("m1", "web-1", started_at=datetime(2026, 1, 2, 3, 4, 5),
+                           completed_stages=["validate"], artifacts={"vmdk_paths": ["/a.vmdk"]})
+    store.save(state)
+
+    loaded = store.load("m1")
+    assert loaded == state
+    assert loaded.lock is not state.lock
+    assert "lock" not in json.loads((tmp_path / "state" / "m1.json").read_text())
+
+
+def test_checkpoint_while_holding_the_lock(tmp_path):
+    store = MigrationStateStore(tmp_path)
+    state = MigrationState("m1", "web-1")
+    with state.lock:
+        state.artifacts["s3_uploads"] = {"key": {"parts": {"1": '"etag"'}}}
+        store.save(state)
+    assert store.load("m1").artifacts["s3_uploads"]["key"]["parts"] == {"1": '"etag"'}
+
+
+def test_concurrent_tasks_and_saves(tmp_path):
+    """Saves never see a half-applied change of a concurrent task."""
+    store = MigrationStateStore(tmp_path)
+    state = MigrationState("m1", "web-1")
+    stop = threading.Event()
+    errors = []
+
+    def task(disk: int) -> None:
+        for n in range(2000):
+            with state.lock:
+                ledger = state.artifacts.setdefault("s3_uploads", {}).setdefault(f"disk{disk}", {})
+                ledger[f"part{n}"] = n
+                ledger["count"] = n + 1
+                state.artifacts[f"key{disk}-{n}"] = n
+
+    def saver() -> None:
+        while not stop.is_set():
+            try:
+                store.save(state)
+                saved = store.load("m1").artifacts
+                for ledger in saved.get("s3_uploads", {}).values():
+                    assert ledger["count"] == len(ledger) - 1
+            except Exception as e:
+                errors.append(e)
+                return
+
+    savers = [threading.Thread(target=saver) for _ in range(2)]
+    tasks = [threading.Thread(target=task, args=(i,)) for i in range(4)]
+    for t in savers + tasks:
+        t.start()
+    for t in tasks:
+        t.join()
+    stop.set()
+    for t in savers:
+        t.join()
+
+    assert errors == []
+    store.save(state)
+    assert len(store.load("m1").artifacts) == 1 + 4 * 2000
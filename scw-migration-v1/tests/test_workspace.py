@@ -0,0 +1,115 @@
+"""Tests for work_dir space admission (pipeline/workspace.py)."""
+
+import threading
+import time
+
+import pytest
+
+from vmware2scw.pipeline.workspace import (
+    GB,
+    QCOW2_OVERHEAD,
+    WorkspaceFullError,
+    WorkspaceManager,
+    estimate_footprint,
+)
+
+VM_INFO = {"disks": [{"size_gb": 100, "allocated_gb": 40}, {"size_gb": 50}]}
+
+
+def manager(tmp_path, budget_gb=None, free_gb=1000, total_gb=1000, reserve_gb=0) -> WorkspaceManager:
+    ws = WorkspaceManager(tmp_path, budget_gb=budget_gb, reserve_gb=reserve_gb)
+    ws._statvfs = lambda: (total_gb * GB, free_gb * GB)
+    return ws
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_estimate_footprint():
+    fp = estimate_footprint(VM_INFO)
+    assert fp == {
+        "vmdk[0]": 40 * GB,
+        "qcow2[0]": int(40 * GB * QCOW2_OVERHEAD),
+        "scratch": int(40 * GB * QCOW2_OVERHEAD),
+        "vmdk[1]": 50 * GB,
+        "qcow2[1]": int(50 * GB * QCOW2_OVERHEAD),
+    }
+
+
+def test_estimate_footprint_resume_and_streaming():
+    fp = estimate_footprint(VM_INFO, done={"convert[0]", "smoke_test", "reclaim[0]"},
+                            stream_data_disks=True)
+    # Disk 0's files are gone; disk 1 streams to S3 without a local qcow2
+    assert fp == {"vmdk[1]": 50 * GB}
+
+
+def test_rejects_a_migration_that_can_never_fit(tmp_path):
+    ws = manager(tmp_path, budget_gb=10)
+    with pytest.raises(WorkspaceFullError):
+        with ws.admit("big", tmp_path / "big", {"vmdk[0]": 11 * GB}):
+            pass
+
+
+def test_rejects_when_nothing_admitted_can_free_space(tmp_path):
+    # Space is taken by files outside any migration
+    ws = manager(tmp_path, free_gb=5)
+    with pytest.raises(WorkspaceFullError, match="only 5 GB free"):
+        with ws.admit("vm", tmp_path / "vm", {"vmdk[0]": 4 * GB, "qcow2[0]": 4 * GB}):
+            pass
+
+
+def test_waits_for_released_space(tmp_path):
+    ws = manager(tmp_path, budget_gb=10)
+    admitted = threading.Event()
+
+    with ws.admit("first", tmp_path / "first", {"vmdk[0]": 6 * GB, "qcow2[0]": 3 * GB}) as first:
+        def second():
+            with ws.admit("second", tmp_path / "second", {"vmdk[0]": 4 * GB}):
+                admitted.set()
+
+        t = threading.Thread(target=second)
+        t.start()
+        wait_until(lambda: ws.usage()["queued"] == 1)
+        assert not admitted.is_set()
+
+        first.release("vmdk[0]")
+        assert admitted.wait(5)
+        t.join(5)
+    assert ws.usage()["migrations"] == 0
+
+
+def test_waiters_are_admitted_in_priority_order(tmp_path):
+    ws = manager(tmp_path, budget_gb=10)
+    order: list[str] = []
+    lock = threading.Lock()
+
+    def migrate(label, priority):
+        with ws.admit(label, tmp_path / label, {"vmdk[0]": 10 * GB}, priority=priority):
+            with lock:
+                order.append(label)
+
+    with ws.admit("running", tmp_path / "running", {"vmdk[0]": 10 * GB}):
+        threads = []
+        for label, priority in (("low", 5), ("high", 1), ("mid", 3)):
+            t = threading.Thread(target=migrate, args=(label, priority))
+            t.start()
+            threads.append(t)
+            wait_until(lambda n=len(threads): ws.usage()["queued"] == n)
+    for t in threads:
+        t.join(5)
+
+    assert order == ["high", "mid", "low"]
+
+
+def test_files_already_written_count_as_used(tmp_path):
+    ws = manager(tmp_path, free_gb=5)
+    path = tmp_path / "vm"
+    path.mkdir()
+    (path / "disk.vmdk").write_bytes(b"\1" * 1024 * 1024)
+    # Needs 4 GB of which 1 MB already exists: fits in 5 GB free
+    with ws.admit("vm", path, {"vmdk[0]": 4 * GB}) as res:
+        assert res.reserved == 4 * GB